@@ -0,0 +1,417 @@
+"""
+Answer Cache for Project Samarth
+Whole answers shared across processes and replicas, with pluggable backends
+"""
+
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse, unquote
+from request_coalescer import normalize_question
+from config import (
+    ANSWER_CACHE_BACKEND, ANSWER_CACHE_PATH, ANSWER_CACHE_REDIS_URL,
+    ANSWER_CACHE_FRESH_SECONDS, ANSWER_CACHE_STALE_SECONDS, ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_MAX_ENTRY_BYTES, ANSWER_CACHE_RETRY_SECONDS
+)
+
+# Keys are namespaced so a shared Redis can hold other data too
+KEY_PREFIX = 'samarth:answer:'
+
+# The SQLite backend trims expired and excess rows every this many writes
+SQLITE_PRUNE_EVERY = 100
+
+
+class AnswerCacheBackend:
+    """
+    Byte values under string keys, each with its own time to live.
+    Backends may raise on I/O errors; AnswerCache treats those as misses.
+    """
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl_seconds: float):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryAnswerBackend(AnswerCacheBackend):
+    """LRU in this process, at most max_entries"""
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: bytes, ttl_seconds: float):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class SQLiteAnswerBackend(AnswerCacheBackend):
+    """
+    One SQLite file (WAL mode) shared by every process on the machine, one
+    connection per thread. Expired rows are removed, and the rows expiring
+    soonest beyond max_entries, every SQLITE_PRUNE_EVERY writes.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS answers (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        expires_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_answers_expires_at ON answers (expires_at);
+    """
+
+    def __init__(self, path: str = ANSWER_CACHE_PATH, max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._connection().execute(
+            "SELECT value FROM answers WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl_seconds: float):
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?)", (key, value, time.time() + ttl_seconds)
+            )
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % SQLITE_PRUNE_EVERY == 1
+        if prune:
+            self._prune(conn)
+
+    def delete(self, key: str):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def _prune(self, conn: sqlite3.Connection):
+        with conn:
+            conn.execute("DELETE FROM answers WHERE expires_at <= ?", (time.time(),))
+            conn.execute(
+                "DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'connection', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self.SCHEMA)
+            self._local.connection = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+
+class RedisError(Exception):
+    """An error reply from the server"""
+
+
+class RedisAnswerBackend(AnswerCacheBackend):
+    """
+    Speaks the Redis protocol (RESP) directly over one socket per thread:
+    GET, SET with PX, DEL (plus AUTH and SELECT from the URL), so any
+    compatible server works and no client library is needed. Entries expire
+    on the server; its maxmemory policy bounds the total size.
+
+    URL: redis://[:password@]host[:port][/db]
+    """
+
+    def __init__(self, url: str = ANSWER_CACHE_REDIS_URL, timeout: float = 2.0):
+        parsed = urlparse(url)
+        if parsed.scheme != 'redis':
+            raise ValueError(f"Unsupported answer cache URL: {url}")
+        self.url = url
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._command('GET', key)
+
+    def set(self, key: str, value: bytes, ttl_seconds: float):
+        self._command('SET', key, value, 'PX', max(1, int(ttl_seconds * 1000)))
+
+    def delete(self, key: str):
+        self._command('DEL', key)
+
+    def ping(self) -> bool:
+        return self._command('PING') == 'PONG'
+
+    def close(self):
+        self._disconnect()
+
+    def _command(self, *args: Any) -> Any:
+        """Send one command and read its reply, reconnecting once if the connection dropped"""
+        for attempt in (1, 2):
+            sock, reader = self._connection()
+            try:
+                sock.sendall(self._encode(args))
+                return self._read_reply(reader)
+            except (ConnectionError, EOFError):
+                self._disconnect()
+                if attempt == 2:
+                    raise
+            except OSError:
+                self._disconnect()
+                raise
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connection = (sock, sock.makefile('rb'))
+            self._local.connection = connection
+            try:
+                if self.password is not None:
+                    self._command('AUTH', self.password)
+                if self.db:
+                    self._command('SELECT', self.db)
+            except Exception:
+                self._disconnect()
+                raise
+        return connection
+
+    def _disconnect(self):
+        connection = getattr(self._local, 'connection', None)
+        self._local.connection = None
+        if connection is not None:
+            try:
+                connection[1].close()
+                connection[0].close()
+            except OSError:
+                pass
+
+    def _encode(self, args) -> bytes:
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(parts)
+
+    def _read_reply(self, reader) -> Any:
+        line = reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise EOFError("Connection closed by the server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode('utf-8')
+        if kind == b'-':
+            raise RedisError(payload.decode('utf-8', 'replace'))
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = reader.read(length + 2)
+            if len(data) != length + 2:
+                raise EOFError("Connection closed by the server")
+            return data[:-2]
+        if kind == b'*':
+            count = int(payload)
+            return None if count < 0 else [self._read_reply(reader) for _ in range(count)]
+        raise RedisError(f"Unexpected reply: {line[:50]!r}")
+
+
+class AnswerCache:
+    """
+    Whole answers (answer text, citations and the code that produced them)
+    stored as JSON in a backend.
+
+    lookup() returns an answer for up to fresh_seconds after it was stored,
+    and for stale_seconds after that marked stale: the caller serves it and
+    refreshes it in the background (begin_refresh() makes sure only one
+    refresh per key runs in this process). Backend errors count as misses,
+    and after one the backend is left alone for retry_seconds, so a cache
+    that is down costs at most one timeout per interval.
+    """
+
+    def __init__(
+        self,
+        backend: AnswerCacheBackend,
+        fresh_seconds: float = ANSWER_CACHE_FRESH_SECONDS,
+        stale_seconds: float = ANSWER_CACHE_STALE_SECONDS,
+        max_entry_bytes: int = ANSWER_CACHE_MAX_ENTRY_BYTES,
+        retry_seconds: float = ANSWER_CACHE_RETRY_SECONDS
+    ):
+        self.backend = backend
+        self.fresh_seconds = fresh_seconds
+        self.stale_seconds = stale_seconds
+        self.max_entry_bytes = max_entry_bytes
+        self.retry_seconds = retry_seconds
+        self._refreshing = set()
+        self._unavailable_until = 0.0
+        self._lock = threading.Lock()
+        self.counters = {
+            'hits': 0, 'stale_hits': 0, 'misses': 0, 'stores': 0,
+            'too_large': 0, 'refreshes': 0, 'errors': 0, 'skipped': 0
+        }
+
+    def key(self, question: str, data_version: Optional[str], prompt_version: str) -> str:
+        """Backend key for a question under the given data and prompt-template versions"""
+        identity = f"{normalize_question(question)}\0{data_version}\0{prompt_version}"
+        return KEY_PREFIX + hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+    def lookup(self, key: str) -> Optional[Tuple[Dict[str, Any], bool]]:
+        """
+        Returns:
+            (answer, fresh) or None on a miss
+        """
+        if not self._available():
+            return None
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            self._failed('read', e)
+            return None
+        try:
+            entry = json.loads(value) if value is not None else None
+            age = time.time() - entry['stored_at'] if entry is not None else None
+        except Exception as e:
+            # A corrupt or foreign value: drop it so the next store replaces it
+            self._failed('read', e)
+            try:
+                self.backend.delete(key)
+            except Exception:
+                pass
+            return None
+        with self._lock:
+            if entry is None or age > self.fresh_seconds + self.stale_seconds:
+                self.counters['misses'] += 1
+                return None
+            fresh = age <= self.fresh_seconds
+            self.counters['hits' if fresh else 'stale_hits'] += 1
+        return entry['answer'], fresh
+
+    def store(self, key: str, answer: Dict[str, Any]) -> bool:
+        """Store an answer (JSON-serializable); returns False if it was not stored"""
+        value = json.dumps({'stored_at': time.time(), 'answer': answer}, ensure_ascii=False, default=str).encode('utf-8')
+        if len(value) > self.max_entry_bytes:
+            with self._lock:
+                self.counters['too_large'] += 1
+            return False
+        if not self._available():
+            return False
+        try:
+            self.backend.set(key, value, self.fresh_seconds + self.stale_seconds)
+        except Exception as e:
+            self._failed('write', e)
+            return False
+        with self._lock:
+            self.counters['stores'] += 1
+        return True
+
+    def begin_refresh(self, key: str) -> bool:
+        """Claim the background refresh of a stale answer; False if one is already running"""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            self.counters['refreshes'] += 1
+            return True
+
+    def end_refresh(self, key: str):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit ratio (stale hits included), refreshes and backend errors"""
+        with self._lock:
+            hits = self.counters['hits'] + self.counters['stale_hits']
+            lookups = hits + self.counters['misses']
+            return {
+                **self.counters,
+                'backend': type(self.backend).__name__,
+                'hit_ratio': round(hits / lookups, 3) if lookups else 0.0,
+                'available': time.monotonic() >= self._unavailable_until
+            }
+
+    def close(self):
+        self.backend.close()
+
+    def _available(self) -> bool:
+        with self._lock:
+            if time.monotonic() >= self._unavailable_until:
+                return True
+            self.counters['skipped'] += 1
+            return False
+
+    def _failed(self, operation: str, error: Exception):
+        with self._lock:
+            self.counters['errors'] += 1
+            self._unavailable_until = time.monotonic() + self.retry_seconds
+        print(f"Warning: Answer cache {operation} failed ({type(error).__name__}: {str(error)}); "
+              f"skipping it for {self.retry_seconds:g}s")
+
+
+def create_answer_cache(backend: Optional[str] = None, url: Optional[str] = None) -> Optional[AnswerCache]:
+    """
+    The configured answer cache (ANSWER_CACHE_BACKEND, or $SAMARTH_ANSWER_CACHE:
+    'memory', 'sqlite', 'redis' or 'none'), or None when disabled
+    """
+    mode = backend or os.getenv('SAMARTH_ANSWER_CACHE', ANSWER_CACHE_BACKEND or 'none')
+    if mode == 'none':
+        return None
+    if mode == 'memory':
+        return AnswerCache(MemoryAnswerBackend())
+    if mode == 'sqlite':
+        return AnswerCache(SQLiteAnswerBackend(url or os.getenv('SAMARTH_ANSWER_CACHE_URL', ANSWER_CACHE_PATH)))
+    if mode == 'redis':
+        return AnswerCache(RedisAnswerBackend(url or os.getenv('SAMARTH_ANSWER_CACHE_URL', ANSWER_CACHE_REDIS_URL)))
+    raise ValueError(f"Unknown answer cache backend: {mode}")
@@ -3,13 +3,14 @@ Answer Synthesizer using Gemini
 LLM Call #2: Context Manager + Answer Synthesis
 """
 
-import json
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Generator
 from gemini_client import GeminiClient
+from evidence_encoder import EvidenceEncoder
 
 class AnswerSynthesizer:
     def __init__(self, api_key: str):
-        self.gemini = GeminiClient(api_key)
+        self.gemini = GeminiClient.shared(api_key)
+        self.evidence_encoder = EvidenceEncoder(count_tokens=self.gemini.count_tokens)
     
     def synthesize_answer(
         self, 
@@ -22,57 +23,166 @@ class AnswerSynthesizer:
         LLM Call #2: Synthesize final answer from evidence
         
         Returns:
-            Dict with answer, citations, log_id
+            Dict with answer, citations, log_id, evidence_tokens; when the
+            call failed, answer holds the error text and error is set
         """
         try:
-            # Build XML prompt
-            prompt = self._build_synthesis_prompt(question, executed_code, evidence, citations)
-            
-            # Call LLM
-            response = self.gemini.call_llm(prompt, 'answer_synthesis')
-            
-            # Validate response
-            if response is None:
-                return {
-                    'answer': "Error: Failed to synthesize answer (API returned None)",
-                    'citations': citations,
-                    'log_id': 'error',
-                    'raw_response': ''
-                }
-            
-            if 'response' not in response:
-                return {
-                    'answer': "Error: Failed to synthesize answer (invalid response format)",
-                    'citations': citations,
-                    'log_id': response.get('log_id', 'error'),
-                    'raw_response': ''
-                }
-            
+            prepared = self.prepare_synthesis(question, executed_code, evidence, citations)
+            response = self.gemini.call_llm(prepared['prompt'], 'answer_synthesis')
+            return self.complete_synthesis(prepared, response, citations)
+        except Exception as e:
+            return self._error_result(e, citations)
+    
+    async def synthesize_answer_async(self, prepared: Dict[str, Any], citations: List[Dict[str, str]]) -> Dict[str, Any]:
+        """Async LLM Call #2 for a prompt from prepare_synthesis()"""
+        try:
+            response = await self.gemini.call_llm_async(prepared['prompt'], 'answer_synthesis')
+            return self.complete_synthesis(prepared, response, citations)
+        except Exception as e:
+            return self._error_result(e, citations)
+    
+    def prepare_synthesis(
+        self,
+        question: str,
+        executed_code: str,
+        evidence: Dict[str, Any],
+        citations: List[Dict[str, str]]
+    ) -> Dict[str, Any]:
+        """
+        CPU part of synthesis: encode the evidence and build the prompt
+        
+        Returns:
+            Dict with prompt and evidence_tokens
+        """
+        # Compact, token-budgeted evidence keeps the prompt (and call latency) small
+        encoded = self.evidence_encoder.encode(question, executed_code, evidence)
+        return {
+            'prompt': self._build_synthesis_prompt(question, executed_code, encoded['text'], citations),
+            'evidence_tokens': encoded['tokens']
+        }
+    
+    def complete_synthesis(
+        self,
+        prepared: Dict[str, Any],
+        response: Dict[str, Any],
+        citations: List[Dict[str, str]]
+    ) -> Dict[str, Any]:
+        """Turn the call_llm response for a prepared prompt into the synthesis result"""
+        # Validate response
+        if response is None:
+            return {
+                'answer': "Error: Failed to synthesize answer (API returned None)",
+                'error': "Failed to synthesize answer (API returned None)",
+                'citations': citations,
+                'log_id': 'error',
+                'raw_response': ''
+            }
+        
+        if 'response' not in response:
+            return {
+                'answer': "Error: Failed to synthesize answer (invalid response format)",
+                'error': "Failed to synthesize answer (invalid response format)",
+                'citations': citations,
+                'log_id': response.get('log_id', 'error'),
+                'raw_response': ''
+            }
+        
+        if not response.get('success', True):
+            return {
+                'answer': f"Error: Failed to synthesize answer ({response['error']})",
+                'error': f"Failed to synthesize answer ({response['error']})",
+                'citations': citations,
+                'log_id': response.get('log_id', 'error'),
+                'raw_response': ''
+            }
+        
+        if not response.get('response'):
             return {
-                'answer': response.get('response', 'Error: Empty response'),
+                'answer': "Error: Empty response",
+                'error': "Failed to synthesize answer (empty response)",
+                'citations': citations,
+                'log_id': response.get('log_id', 'error'),
+                'raw_response': ''
+            }
+        
+        return {
+            'answer': response['response'],
+            'citations': citations,
+            'log_id': response.get('log_id', 'unknown'),
+            'raw_response': response.get('response', ''),
+            'evidence_tokens': prepared['evidence_tokens'],
+            'prompt_chars': len(prepared['prompt'])
+        }
+    
+    def synthesize_answer_stream(
+        self,
+        question: str,
+        executed_code: str,
+        evidence: Dict[str, Any],
+        citations: List[Dict[str, str]]
+    ) -> Generator[str, None, Dict[str, Any]]:
+        """
+        Streaming LLM Call #2: yields answer text chunks as the model produces them
+        
+        Returns (as the generator's return value):
+            Same dict as synthesize_answer, plus time_to_first_chunk_ms
+        """
+        try:
+            prepared = self.prepare_synthesis(question, executed_code, evidence, citations)
+            response = yield from self.gemini.call_llm_stream(prepared['prompt'], 'answer_synthesis')
+            answer = response.get('response') or ''
+            error = None
+            if not response.get('success', True):
+                error = f"Failed to synthesize answer ({response['error']})"
+                # Keep whatever streamed before the failure, and say so
+                error_text = f"Error: {error}"
+                if answer:
+                    error_text = "\n\n" + error_text
+                yield error_text
+                answer += error_text
+            elif not answer:
+                error = "Failed to synthesize answer (empty response)"
+            result = {
+                'answer': answer or 'Error: Empty response',
                 'citations': citations,
                 'log_id': response.get('log_id', 'unknown'),
-                'raw_response': response.get('response', '')
+                'raw_response': response.get('response', ''),
+                'evidence_tokens': prepared['evidence_tokens'],
+                'prompt_chars': len(prepared['prompt']),
+                'time_to_first_chunk_ms': response.get('time_to_first_chunk_ms')
             }
+            if error is not None:
+                result['error'] = error
+            return result
         except Exception as e:
+            answer = f"Error synthesizing answer: {str(e)}"
+            yield answer
             return {
-                'answer': f"Error synthesizing answer: {str(e)}",
+                'answer': answer,
+                'error': f"Failed to synthesize answer ({str(e)})",
                 'citations': citations,
                 'log_id': 'error',
-                'raw_response': ''
+                'raw_response': '',
+                'time_to_first_chunk_ms': None
             }
     
+    def _error_result(self, error: Exception, citations: List[Dict[str, str]]) -> Dict[str, Any]:
+        return {
+            'answer': f"Error synthesizing answer: {str(error)}",
+            'error': f"Failed to synthesize answer ({str(error)})",
+            'citations': citations,
+            'log_id': 'error',
+            'raw_response': ''
+        }
+    
     def _build_synthesis_prompt(
         self, 
         question: str, 
         executed_code: str, 
-        evidence: Dict[str, Any],
+        evidence_text: str,
         citations: List[Dict[str, str]]
     ) -> str:
-        """Build XML-structured prompt for answer synthesis"""
-        
-        # Format evidence as clean JSON
-        evidence_json = json.dumps(evidence, indent=2, ensure_ascii=False)
+        """Build XML-structured prompt for answer synthesis (evidence already encoded)"""
         
         # Format citations
         citations_xml = "<CITATIONS>\n"
@@ -95,7 +205,7 @@ class AnswerSynthesizer:
 </EXECUTED_CODE>
 
 <EVIDENCE>
-{evidence_json}
+{evidence_text}
 </EVIDENCE>
 
 {citations_xml}
@@ -106,6 +216,8 @@ class AnswerSynthesizer:
 - Call out data gaps/limits (row caps, missing fields)
 - Keep answer compact; use bullets where helpful
 - Be specific with numbers and names from the evidence
+- Tabular evidence is a table: a header line of column names, then one "|"-separated line per row
+- "summary_stats" covers the full result, not just the rows shown
 - If evidence shows the data was capped, mention "showing top N results"
 </INSTRUCTIONS>
 
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Answer cache benchmark for SamarthPipeline
+Asks the same question from two fresh processes per answer cache backend
+and reports each one's latency and whether the answer came from the cache.
+The 'redis' backend runs against stub_redis_server.py
+
+Usage:
+  python benchmark_answer_cache.py [QUESTION] [LLM_LATENCY]
+
+LLM_LATENCY is the stub LLM backend's simulated latency in seconds (default 0.5)
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from stub_redis_server import StubRedisServer
+
+QUESTION = "Which districts in Punjab have the most mandis?"
+
+# Runs in a child process, so nothing is cached in memory
+CHILD = r"""
+import json, sys, time
+from pipeline import SamarthPipeline
+pipeline = SamarthPipeline('offline')
+t0 = time.perf_counter()
+result = pipeline.process_question(sys.argv[1])
+t1 = time.perf_counter()
+print('BENCHMARK ' + json.dumps({
+    'ms': (t1 - t0) * 1000,
+    'from_cache': result['trace']['steps'][0]['stage'] == 'answer_cache',
+    'success': result['success']
+}))
+"""
+
+def run_once(env):
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD, env['QUESTION']],
+        env=env, capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    ).stdout
+    line = next(line for line in output.splitlines() if line.startswith('BENCHMARK '))
+    return json.loads(line[len('BENCHMARK '):])
+
+def main():
+    question = sys.argv[1] if len(sys.argv) > 1 else QUESTION
+    latency = sys.argv[2] if len(sys.argv) > 2 else '0.5'
+    scratch = tempfile.mkdtemp(prefix='samarth-answer-cache-')
+    redis = StubRedisServer().start()
+    env = {
+        **os.environ,
+        'QUESTION': question,
+        'SAMARTH_LLM_BACKEND': 'stub',
+        'SAMARTH_LLM_LATENCY': latency,
+        'SAMARTH_METRICS_PORT': '0'
+    }
+    backends = {
+        'none': {},
+        'memory': {},
+        'sqlite': {'SAMARTH_ANSWER_CACHE_URL': os.path.join(scratch, 'answers.db')},
+        'redis': {'SAMARTH_ANSWER_CACHE_URL': redis.url}
+    }
+
+    print()
+    print("=" * 70)
+    print(f"ANSWER CACHE BENCHMARK: same question from two fresh processes (LLM latency {latency}s)")
+    print("=" * 70)
+    print(f"{'backend':<10} {'first (ms)':>12} {'second (ms)':>12}   second from cache")
+    try:
+        for backend, extra in backends.items():
+            backend_env = {**env, 'SAMARTH_ANSWER_CACHE': backend, **extra}
+            first, second = run_once(backend_env), run_once(backend_env)
+            print(f"{backend:<10} {first['ms']:>12.1f} {second['ms']:>12.1f}   {second['from_cache']}")
+    finally:
+        redis.shutdown()
+        shutil.rmtree(scratch, ignore_errors=True)
+    print(f"Stub Redis commands served: {redis.command_count}")
+
+if __name__ == "__main__":
+    main()
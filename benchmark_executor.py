@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for QueryExecutor.submit()
+Runs N synthetic queries serially, then concurrently on thread and process pools
+
+Usage: python benchmark_executor.py [N] [WORKERS]
+"""
+
+import sys
+import time
+from executor import QueryExecutor
+
+STATES = ['Punjab', 'Gujarat', 'Maharashtra', 'Bihar', 'Haryana', 'Karnataka', 'Kerala', 'Odisha']
+
+QUERY_TEMPLATES = [
+    # Filter + count
+    """mandis_df = data_loader.get_dataframe('agmark_mandis_and_locations')
+result = len(mandis_df[mandis_df['State Name'].str.contains('{state}', case=False)])""",
+    # Groupby + sort
+    """mandis_df = data_loader.get_dataframe('agmark_mandis_and_locations')
+state_df = mandis_df[mandis_df['State Name'].str.contains('{state}', case=False)]
+result = state_df.groupby('District Name - Agmark').size().sort_values(ascending=False)""",
+    # Cross-dataset merge
+    """mandis_df = data_loader.get_dataframe('agmark_mandis_and_locations')
+imd_df = data_loader.get_dataframe('imd_agromet_advisory_locations')
+state_mandis = mandis_df[mandis_df['State Name'].str.contains('{state}', case=False)]
+result = pd.merge(state_mandis, imd_df, left_on='District ID', right_on='District ID')""",
+    # Mutation of a query-local view
+    """hierarchy_df = data_loader.get_dataframe('location_hierarchy')
+hierarchy_df['State Upper'] = hierarchy_df['State Name'].str.upper()
+result = hierarchy_df[hierarchy_df['State Name'] == '{state}'][['District Name', 'Block Name', 'State Upper']]""",
+]
+
+def synthetic_queries(n):
+    """N queries cycling through templates and states"""
+    return [
+        QUERY_TEMPLATES[i % len(QUERY_TEMPLATES)].format(state=STATES[i % len(STATES)])
+        for i in range(n)
+    ]
+
+def report(label, elapsed, latencies, results):
+    failures = sum(1 for r in results if not r['success'])
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2] * 1000
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    print(f"{label:<10} {len(results) / elapsed:8.1f} q/s   p50 {p50:7.1f} ms   p95 {p95:7.1f} ms   failures {failures}")
+
+def run_serial(executor, queries):
+    latencies, results = [], []
+    start = time.perf_counter()
+    for code in queries:
+        t0 = time.perf_counter()
+        results.append(executor.execute_query(code))
+        latencies.append(time.perf_counter() - t0)
+    return time.perf_counter() - start, latencies, results
+
+def run_concurrent(executor, queries):
+    # Warm every worker (process workers load their own data) before timing
+    for future in [executor.submit(queries[0]) for _ in range(executor.workers)]:
+        future.result()
+
+    start = time.perf_counter()
+    latencies, futures = [], []
+    for i, code in enumerate(queries):
+        t0 = time.perf_counter()
+        future = executor.submit(code, client_id=f"client_{i % 4}")
+        future.add_done_callback(lambda _, t0=t0: latencies.append(time.perf_counter() - t0))
+        futures.append(future)
+
+    results = [future.result() for future in futures]
+    return time.perf_counter() - start, latencies, results
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    queries = synthetic_queries(n)
+
+    print("=" * 70)
+    print(f"EXECUTOR THROUGHPUT: {n} queries, {workers} workers")
+    print("=" * 70)
+
+    executor = QueryExecutor(mode='thread', workers=workers)
+    report('serial', *run_serial(executor, queries))
+    report('thread', *run_concurrent(executor, queries))
+    executor.shutdown()
+
+    executor = QueryExecutor(mode='process', workers=workers)
+    report('process', *run_concurrent(executor, queries))
+    executor.shutdown()
+
+    print("=" * 70)
+
+if __name__ == "__main__":
+    main()
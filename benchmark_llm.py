@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Offline throughput benchmark for GeminiClient against the local stub server
+Compares sequential blocking calls with concurrent async calls on the shared client
+
+Usage: python benchmark_llm.py [N] [LATENCY_SECONDS] [MAX_CONCURRENCY]
+"""
+
+import asyncio
+import sys
+import time
+from gemini_client import GeminiClient
+from stub_gemini_server import StubGeminiServer
+
+PROMPT = "<QUESTION>How many mandis are there in Punjab?</QUESTION>\nReturn <PANDAS_CODE> tags."
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+
+    server = StubGeminiServer(latency=latency).start()
+    client = GeminiClient(
+        api_key='stub-key',
+        base_url=server.base_url,
+        max_concurrency=concurrency,
+        requests_per_minute=100_000
+    )
+
+    print("=" * 70)
+    print(f"LLM CLIENT THROUGHPUT: {n} calls, stub latency {latency}s, concurrency {concurrency}")
+    print("=" * 70)
+
+    # Sequential blocking calls (today's behaviour)
+    sequential = min(n, 10)
+    start = time.perf_counter()
+    for _ in range(sequential):
+        client.call_llm(PROMPT, 'benchmark')
+    elapsed = time.perf_counter() - start
+    print(f"sync      {sequential / elapsed:8.1f} calls/s  ({sequential} calls in {elapsed:.2f}s)")
+
+    # Concurrent async calls through the shared semaphore and connection pool
+    async def burst():
+        return await asyncio.gather(*(client.call_llm_async(PROMPT, 'benchmark') for _ in range(n)))
+
+    start = time.perf_counter()
+    responses = asyncio.run(burst())
+    elapsed = time.perf_counter() - start
+    errors = sum(1 for r in responses if not r['success'])
+    print(f"async     {n / elapsed:8.1f} calls/s  ({n} calls in {elapsed:.2f}s, {errors} errors)")
+    print(f"server    {server.request_count} requests over {len(server.connections)} connections")
+    print("=" * 70)
+
+    client.close()
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
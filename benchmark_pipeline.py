@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end benchmark for SamarthPipeline
+Runs questions with a replay or stub LLM backend, so no network is needed
+
+Usage:
+  python benchmark_pipeline.py stub [N]
+  python benchmark_pipeline.py replay [N] [CASSETTE] [LATENCY_SECONDS]
+
+Record a cassette first with a live key:
+  SAMARTH_LLM_BACKEND=record python test_limits.py
+"""
+
+import os
+import sys
+import time
+
+QUESTIONS = [
+    "How many mandis are in Punjab?",
+    "Which state has more mandis: Gujarat or Maharashtra?",
+    "What districts in Punjab have IMD weather coverage?",
+    "Show me the top 5 crops in the Agmark system",
+    "How many districts have more than 20 mandis?",
+    "Which districts neighbor Central Delhi?"
+]
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+def main():
+    backend = sys.argv[1] if len(sys.argv) > 1 else 'stub'
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    os.environ['SAMARTH_LLM_BACKEND'] = backend
+    if len(sys.argv) > 3:
+        os.environ['SAMARTH_LLM_CASSETTE'] = sys.argv[3]
+    if len(sys.argv) > 4:
+        os.environ['SAMARTH_LLM_LATENCY'] = sys.argv[4]
+
+    # Imported after the environment is set so the shared client picks it up
+    from pipeline import SamarthPipeline
+
+    pipeline = SamarthPipeline(os.getenv('GEMINI_API_KEY', 'offline'))
+
+    latencies, failures = [], 0
+    start = time.perf_counter()
+    for i in range(n):
+        t0 = time.perf_counter()
+        result = pipeline.process_question(QUESTIONS[i % len(QUESTIONS)])
+        latencies.append(time.perf_counter() - t0)
+        if not result['success']:
+            failures += 1
+    elapsed = time.perf_counter() - start
+
+    print()
+    print("=" * 70)
+    print(f"PIPELINE BENCHMARK ({backend} backend): {n} questions")
+    print("=" * 70)
+    print(f"Throughput: {n / elapsed:.2f} questions/s")
+    print(f"Latency:    p50 {percentile(latencies, 0.5) * 1000:.1f} ms   "
+          f"p95 {percentile(latencies, 0.95) * 1000:.1f} ms   "
+          f"max {max(latencies) * 1000:.1f} ms")
+    print(f"Failures:   {failures}/{n}")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for SamarthPipeline
+Measures, in fresh processes, the time to import the pipeline module, to
+construct SamarthPipeline, to warm it up and to answer the first question
+
+Usage:
+  python benchmark_startup.py [RUNS] [BACKEND]
+
+BACKEND is 'stub' (default) or 'replay'; see benchmark_pipeline.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+FIRST_QUESTION = "How many mandis are in Punjab?"
+
+# Runs in a child process so every measurement starts cold
+CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+from pipeline import SamarthPipeline
+t1 = time.perf_counter()
+pipeline = SamarthPipeline('offline', warmup=False)
+t2 = time.perf_counter()
+pipeline.warmup()
+t3 = time.perf_counter()
+result = pipeline.process_question(sys.argv[1])
+t4 = time.perf_counter()
+print('BENCHMARK ' + json.dumps({
+    'import': t1 - t0,
+    'construct': t2 - t1,
+    'warmup': t3 - t2,
+    'first_answer': t4 - t3,
+    'time_to_first_answer': t4 - t0,
+    'pandas_at_import': 'pandas' in sys.modules,
+    'success': result['success']
+}))
+"""
+
+STEPS = ['import', 'construct', 'warmup', 'first_answer', 'time_to_first_answer']
+
+def run_once(env):
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD, FIRST_QUESTION],
+        env=env, capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    ).stdout
+    line = next(line for line in output.splitlines() if line.startswith('BENCHMARK '))
+    return json.loads(line[len('BENCHMARK '):])
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    backend = sys.argv[2] if len(sys.argv) > 2 else 'stub'
+    env = {**os.environ, 'SAMARTH_LLM_BACKEND': backend, 'SAMARTH_METRICS_PORT': '0'}
+
+    # `import pipeline` alone, to see whether heavy modules come with it
+    probe = subprocess.run(
+        [sys.executable, '-c', "import sys, pipeline; print('pandas' in sys.modules, 'httpx' in sys.modules)"],
+        env=env, capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    ).stdout.split()
+
+    samples = [run_once(env) for _ in range(runs)]
+
+    print()
+    print("=" * 70)
+    print(f"STARTUP BENCHMARK ({backend} backend): {runs} cold runs")
+    print("=" * 70)
+    print(f"`import pipeline` loads pandas: {probe[0]}, httpx: {probe[1]}")
+    print(f"{'step':<22} {'median':>10} {'min':>10} {'max':>10}   (ms)")
+    for step in STEPS:
+        values = sorted(sample[step] * 1000 for sample in samples)
+        print(f"{step:<22} {values[len(values) // 2]:>10.1f} {values[0]:>10.1f} {values[-1]:>10.1f}")
+    failures = sum(1 for sample in samples if not sample['success'])
+    if failures:
+        print(f"First question failed in {failures}/{runs} runs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Candidate Racer for Project Samarth
+Runs alternative generated snippets concurrently and keeps the first that works
+"""
+
+import threading
+import time
+from concurrent.futures import as_completed
+from typing import Dict, Any, List, Optional
+from executor import QueryExecutor
+from llm_resilience import LatencyTracker
+
+
+class CandidateRacer:
+    """
+    Submits every candidate snippet to the executor's worker pool and takes
+    the first (in completion order) that succeeds with a non-empty result.
+    Candidates still queued are then cancelled; one already running cannot be
+    interrupted, so it finishes in the background and is discarded.
+
+    If no candidate produces rows, the first successful empty result is
+    returned (the honest answer may be "none"); if all fail, the result is
+    candidate 0's failure with every candidate's error attached.
+
+    Race outcomes and effective latency (submit to winner) are kept for
+    stats(), to weigh QUERY_CANDIDATES against its extra cost.
+    """
+
+    def __init__(self, executor: QueryExecutor):
+        self.executor = executor
+        self._lock = threading.Lock()
+        self.latencies = LatencyTracker(window=500)
+        self.counters = {
+            'races': 0, 'won': 0, 'empty_only': 0, 'all_failed': 0,
+            'candidates_run': 0, 'candidates_cancelled': 0
+        }
+        self.wins_by_candidate: Dict[int, int] = {}
+
+    def race(
+        self,
+        candidates: List[str],
+        max_results: int = 20,
+        context: Optional[Dict[str, Any]] = None,
+        return_frame: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Args:
+            context, return_frame: Passed to execute_query for every candidate
+
+        Returns:
+            The winning execute_query result plus race (candidates, winner
+            index, failed, cancelled, effective_ms)
+        """
+        started = time.perf_counter()
+        futures = {
+            self.executor.submit(code, max_results, context=context, return_frame=return_frame): i
+            for i, code in enumerate(candidates)
+        }
+        results: Dict[int, Dict[str, Any]] = {}
+        winner: Optional[int] = None
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                results[index] = {'success': False, 'error': str(e), 'executed_code': candidates[index]}
+            if results[index]['success'] and not self._is_empty(results[index]['evidence']):
+                winner = index
+                break
+        cancelled = sum(1 for future in futures if future.cancel())
+        effective = time.perf_counter() - started
+
+        empty = sorted(i for i, result in results.items() if result['success'])
+        if winner is not None:
+            outcome, chosen = 'won', winner
+        elif empty:
+            outcome, chosen = 'empty_only', empty[0]
+        else:
+            outcome, chosen = 'all_failed', min(results)
+
+        result = dict(results[chosen])
+        if outcome == 'all_failed':
+            result['candidate_errors'] = [results[i]['error'] for i in sorted(results)]
+        result['race'] = {
+            'candidates': len(candidates),
+            'winner': chosen if outcome != 'all_failed' else None,
+            'failed': sum(1 for r in results.values() if not r['success']),
+            'cancelled': cancelled,
+            'effective_ms': round(effective * 1000, 1)
+        }
+
+        with self._lock:
+            self.counters['races'] += 1
+            self.counters[outcome] += 1
+            self.counters['candidates_run'] += len(candidates) - cancelled
+            self.counters['candidates_cancelled'] += cancelled
+            if outcome != 'all_failed':
+                self.wins_by_candidate[chosen] = self.wins_by_candidate.get(chosen, 0) + 1
+            self.latencies.add(effective)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Success rate, winners by candidate position and effective latency"""
+        with self._lock:
+            races = self.counters['races']
+            samples = self.latencies.samples
+            return {
+                **self.counters,
+                'success_rate': round((races - self.counters['all_failed']) / races, 3) if races else 0.0,
+                'wins_by_candidate': dict(sorted(self.wins_by_candidate.items())),
+                'effective_ms_mean': round(sum(samples) / len(samples) * 1000, 1) if samples else None,
+                'effective_ms_p95': round(self.latencies.percentile(95) * 1000, 1) if samples else None
+            }
+
+    def _is_empty(self, evidence: Dict[str, Any]) -> bool:
+        """No rows, no items, or a missing scalar"""
+        stats = evidence.get('summary_stats') or {}
+        if 'total_rows' in stats:
+            return stats['total_rows'] == 0
+        if 'total_items' in stats:
+            return stats['total_items'] == 0
+        value = evidence.get('values')
+        return value is None or (isinstance(value, float) and value != value)
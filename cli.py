@@ -2,40 +2,160 @@
 """
 CLI Tool for Project Samarth
 Simple command-line interface for the Q&A system
+
+Usage:
+    python cli.py                                   # interactive
+    python cli.py --batch in.jsonl --out out.jsonl  # bulk run
 """
 
+import argparse
+import json
 import sys
 import os
+import time
 from pipeline import SamarthPipeline
+from config import BATCH_CONCURRENCY, LLM_BACKEND
+
+PAGE_SIZE = 20
+
+# Interactive mode is one conversation: follow-ups can refine the last result
+CLI_SESSION = 'cli'
+
+def print_page(page):
+    """Print one page of a spilled result"""
+    start = page['cursor'] + 1
+    end = page['cursor'] + len(page['rows'])
+    print(f"Rows {start}-{end} of {page['total_rows']}:")
+    print(page['rows'].to_string(index=False))
+    if page['next_cursor'] is not None:
+        print("(type 'more' for the next page)")
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+def read_batch(path):
+    """
+    Questions from a JSONL file: one {"question": ..., "id": ...} object
+    (id optional) or one JSON string per line; plain text lines also work
+    """
+    items = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                item = line
+            if isinstance(item, str):
+                item = {'question': item}
+            items.append(item)
+    return items
+
+def run_batch(pipeline, in_path, out_path, concurrency):
+    """Answer every question in in_path, writing each result to out_path as it finishes"""
+    items = read_batch(in_path)
+    print(f"Processing {len(items)} questions from {in_path} (concurrency {concurrency})...")
+    
+    latencies = []
+    succeeded = 0
+    start = time.perf_counter()
+    with open(out_path, 'w', encoding='utf-8') as out:
+        results = pipeline.process_questions([item['question'] for item in items], concurrency=concurrency)
+        for done, result in enumerate(results, 1):
+            record = {
+                'id': items[result['index']].get('id'),
+                'index': result['index'],
+                'question': result['question'],
+                'success': result['success'],
+                'answer': result.get('answer'),
+                'error': result.get('error'),
+                'citations': [citation['name'] for citation in result.get('citations', [])],
+                'result_handle': result.get('result_handle'),
+                'latency_ms': result['latency_ms']
+            }
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            out.flush()
+            
+            latencies.append(result['latency_ms'])
+            succeeded += result['success']
+            status = "✓" if result['success'] else "✗"
+            print(f"[{done}/{len(items)}] {status} {result['latency_ms']:.0f} ms  {result['question'][:60]}")
+    elapsed = time.perf_counter() - start
+    
+    print()
+    print("=" * 60)
+    print(f"BATCH COMPLETE: {len(items)} questions -> {out_path}")
+    print("=" * 60)
+    if latencies:
+        print(f"Succeeded:  {succeeded}/{len(items)}")
+        print(f"Wall time:  {elapsed:.2f} s")
+        print(f"Throughput: {len(items) / elapsed:.2f} questions/s")
+        print(f"Latency:    p50 {percentile(latencies, 0.5):.0f} ms   "
+              f"p90 {percentile(latencies, 0.9):.0f} ms   "
+              f"p95 {percentile(latencies, 0.95):.0f} ms   "
+              f"p99 {percentile(latencies, 0.99):.0f} ms   "
+              f"max {max(latencies):.0f} ms")
+        print("Stages:")
+        for name, stage in pipeline.get_stats()['stages'].items():
+            print(f"  {name:<10} ({stage['kind']}) processed {stage['processed']}   "
+                  f"service mean {stage['service_ms']['mean']} ms / p95 {stage['service_ms']['p95']} ms   "
+                  f"queue wait mean {stage['wait_ms']['mean']} ms / p95 {stage['wait_ms']['p95']} ms")
+    print("=" * 60)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Project Samarth - Agricultural Q&A System")
+    parser.add_argument('--batch', metavar='IN_JSONL', help="answer the questions in this JSONL file instead of prompting")
+    parser.add_argument('--out', metavar='OUT_JSONL', help="where to write batch results (default: <IN>.out.jsonl)")
+    parser.add_argument('--concurrency', type=int, default=BATCH_CONCURRENCY, help="questions processed at once in batch mode")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+    
     print("=" * 60)
     print("PROJECT SAMARTH - Agricultural Q&A System")
     print("=" * 60)
     print()
     
-    # Get API key
+    # Get API key (offline backends don't need one)
     api_key = os.getenv('GEMINI_API_KEY')
-    if not api_key:
+    if not api_key and os.getenv('SAMARTH_LLM_BACKEND', LLM_BACKEND) in ('live', 'record'):
         print("Error: GEMINI_API_KEY environment variable not set")
         print("Please set it with: export GEMINI_API_KEY='your-key-here'")
         sys.exit(1)
     
-    # Initialize pipeline
+    # Initialize pipeline: batch mode waits for the data, interactive mode
+    # loads it in the background while the first question is typed
     print("Initializing pipeline...")
     try:
-        pipeline = SamarthPipeline(api_key)
+        pipeline = SamarthPipeline(api_key, warmup=False)
+        if args.batch:
+            pipeline.warmup()
+        else:
+            pipeline.warmup(background=True)
         print("✓ Pipeline initialized")
         print()
     except Exception as e:
         print(f"Error initializing pipeline: {e}")
         sys.exit(1)
     
+    if args.batch:
+        out_path = args.out or os.path.splitext(args.batch)[0] + '.out.jsonl'
+        run_batch(pipeline, args.batch, out_path, args.concurrency)
+        return
+    
     # Interactive mode
-    print("Enter your questions (type 'exit' to quit)")
+    print("Enter your questions (type 'more' to page results, 'stats' for LLM savings, 'exit' to quit)")
     print("-" * 60)
     print()
     
+    # Cursor into the full result of the last answered question
+    last_handle = None
+    next_cursor = None
+    
     while True:
         try:
             question = input("Question: ").strip()
@@ -47,24 +167,61 @@ def main():
                 print("Goodbye!")
                 break
             
+            if question.lower() == 'stats':
+                for name, stats in pipeline.get_stats().items():
+                    print(f"{name}: " + ", ".join(f"{k}={v}" for k, v in stats.items()))
+                print()
+                continue
+            
+            if question.lower() == 'more':
+                if last_handle is None or next_cursor is None:
+                    print("No more rows to show.")
+                else:
+                    page = pipeline.get_result_page(last_handle, next_cursor, PAGE_SIZE)
+                    next_cursor = page['next_cursor']
+                    print_page(page)
+                print()
+                continue
+            
             print()
             print("Processing...")
             print("-" * 60)
             
-            # Process question
-            result = pipeline.process_question(question)
+            # Process question, printing the answer as it streams in
+            result = None
+            answer_started = False
+            for event in pipeline.process_question_stream(question, session_id=CLI_SESSION):
+                if event['type'] == 'chunk':
+                    if not answer_started:
+                        print()
+                        print("=" * 60)
+                        print("ANSWER:")
+                        answer_started = True
+                    print(event['text'], end='', flush=True)
+                else:
+                    result = event['result']
             
-            print()
-            print("=" * 60)
+            if not answer_started:
+                print()
+                print("=" * 60)
+                if result['success']:
+                    print("ANSWER:")
+                    print(result['answer'], end='')
             
             if result['success']:
-                print("ANSWER:")
-                print(result['answer'])
+                print()
                 print()
                 print("CITATIONS:")
                 for citation in result['citations']:
                     print(f"  • {citation['name']}")
                     print(f"    Source: {citation['source']}")
+                
+                # Full result was spilled: later pages are read from disk, not recomputed
+                last_handle = result.get('result_handle')
+                next_cursor = 0 if last_handle else None
+                if last_handle:
+                    print()
+                    print("Full result available (type 'more' to page through it)")
             else:
                 print("ERROR:")
                 print(result['error'])
@@ -6,9 +6,169 @@
 # Data directory
 DATA_DIR = "data"
 
+# Excel sources are converted to Parquet here on first load and read from
+# the copy while it is newer than the source (openpyxl is slow to import
+# and parse). None always reads the Excel files
+DATA_CACHE_DIR = "data_cache"
+
 # Maximum results per query
 MAX_RESULTS = 20
 
+# Evidence bundle bounds
+EVIDENCE_MAX_CHARS = 500            # longest single value before truncation
+EVIDENCE_MAX_SUMMARY_COLUMNS = 10   # columns described in summary stats
+EVIDENCE_TOP_CATEGORIES = 5         # top values listed per text column
+
+# Common question shapes (mandi counts, districts of a state, neighbours of
+# a district, crops of a type) get ready-made code instead of LLM Call #1
+INTENT_PARSER = True
+
+# Speculative query generation: LLM Call #1 asks for this many alternative
+# snippets, which are executed concurrently; the first to succeed with a
+# non-empty result is used. 1 disables it (one snippet, as before)
+QUERY_CANDIDATES = 1
+
+# Failed queries are sent back to the model with the error and the schema of
+# the datasets they use, up to this many times. Fixes that worked are
+# remembered per error signature and reapplied without an LLM call
+QUERY_REPAIR_ATTEMPTS = 2
+QUERY_REPAIR_MEMO_SIZE = 500
+
+# Answers for simple results (a count, a short list of names) are rendered
+# from templates instead of LLM Call #2
+ANSWER_FAST_PATH = True
+FAST_PATH_MAX_LIST_ITEMS = 15
+
+# Synthesis prompt: evidence is rendered as a compact table fitted to a
+# token budget by estimate. When the final estimate is above
+# EVIDENCE_COUNT_TOKENS_ABOVE x budget, it is checked once with the model's
+# own token count (LLM_COUNT_TOKENS_TIMEOUT_SECONDS, then the estimate stands)
+EVIDENCE_TOKEN_BUDGET = 2000
+EVIDENCE_COUNT_TOKENS_ABOVE = 0.5
+
+# Full results beyond MAX_RESULTS are spilled to Parquet for paging; files
+# older than the TTL are swept at most every SPILL_EXPIRE_INTERVAL_SECONDS
+SPILL_DIR = "result_spill"
+SPILL_ROW_GROUP_SIZE = 1000
+SPILL_TTL_SECONDS = 24 * 3600
+SPILL_EXPIRE_INTERVAL_SECONDS = 600
+
+# Conversations: each session's last tabular result is kept for follow-up
+# questions (exposed to generated code as `previous_result`). Frames up to
+# CONVERSATION_MAX_FRAME_BYTES stay in memory, CONVERSATION_MAX_BYTES in
+# total across sessions (least recently used evicted first); larger ones
+# are reloaded from their spill file
+CONVERSATION_MAX_SESSIONS = 1000
+CONVERSATION_MAX_BYTES = 256 * 1024 * 1024
+CONVERSATION_MAX_FRAME_BYTES = 16 * 1024 * 1024
+
+# Query planner: refuse (or warn about) queries whose estimated
+# intermediate row count exceeds the limit. Modes: 'refuse', 'warn', 'off'.
+# Estimates that rest on a filter the planner cannot read are only warned about
+MAX_ESTIMATED_ROWS = 1_000_000
+PLANNER_MODE = 'refuse'
+EXPLODE_DEFAULT_FACTOR = 10         # assumed list length when it cannot be measured
+
+# Concurrent execution (QueryExecutor.submit): 'thread' shares the loaded
+# data, 'process' gives each worker its own copy and sidesteps the GIL
+EXECUTOR_MODE = 'thread'
+EXECUTOR_WORKERS = 4
+
+# Intermediate frames shared across queries, per data version: those built
+# with data_loader.cached() in generated code, and subexpressions (by
+# normalized AST) that INTERMEDIATE_CACHE_PROMOTE_AFTER different snippets
+# have computed. Least recently used are evicted first above the byte budget
+INTERMEDIATE_CACHE_MAX_BYTES = 128 * 1024 * 1024
+INTERMEDIATE_CACHE_PROMOTE_AFTER = 2
+INTERMEDIATE_CACHE_TRACKED = 10_000     # distinct subexpressions counted
+
+# Questions in flight at once in SamarthPipeline.process_questions / cli.py --batch
+BATCH_CONCURRENCY = 32
+
+# Identical questions (after normalizing case, spacing and trailing
+# punctuation, for the same data version) asked while one is being answered
+# share that answer; successful answers are reused for ANSWER_CACHE_TTL_SECONDS
+ANSWER_CACHE_TTL_SECONDS = 60
+ANSWER_CACHE_SIZE = 500
+
+# Persistent answer cache (answer_cache.py) behind that, keyed by the
+# normalized question, data version and prompt-template version. Backends:
+# 'memory' (this process), 'sqlite' (ANSWER_CACHE_PATH, shared by processes
+# on one machine), 'redis' (any server speaking the Redis protocol at
+# ANSWER_CACHE_REDIS_URL, shared by replicas; its maxmemory policy bounds
+# the size) or None; override with $SAMARTH_ANSWER_CACHE and
+# $SAMARTH_ANSWER_CACHE_URL. Answers are fresh for ANSWER_CACHE_FRESH_SECONDS,
+# then served stale for up to ANSWER_CACHE_STALE_SECONDS more while a
+# background run refreshes them. An unreachable backend is skipped for
+# ANSWER_CACHE_RETRY_SECONDS
+ANSWER_CACHE_BACKEND = 'sqlite'
+ANSWER_CACHE_PATH = "answer_cache/answers.db"
+ANSWER_CACHE_REDIS_URL = "redis://127.0.0.1:6379/0"
+ANSWER_CACHE_FRESH_SECONDS = 6 * 3600
+ANSWER_CACHE_STALE_SECONDS = 24 * 3600
+ANSWER_CACHE_MAX_ENTRIES = 10_000       # memory and sqlite backends
+ANSWER_CACHE_MAX_ENTRY_BYTES = 256 * 1024
+ANSWER_CACHE_RETRY_SECONDS = 30
+
+# Staged pipeline (staged_pipeline.py): bounded queue per stage, threads per
+# CPU stage (plan, execute) and worker coroutines per LLM stage
+STAGE_QUEUE_SIZE = 16
+STAGE_CPU_WORKERS = 4
+STAGE_IO_WORKERS = 16
+
+# Gemini settings (GEMINI_BASE_URL can be overridden from the environment,
+# e.g. to point at stub_gemini_server.py)
+GEMINI_MODEL = "gemini-2.5-flash"
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+LLM_MAX_CONCURRENCY = 8             # in-flight calls across all components
+LLM_REQUESTS_PER_MINUTE = 600
+LLM_TIMEOUT_SECONDS = 60            # per HTTP request
+LLM_COUNT_TOKENS_TIMEOUT_SECONDS = 2    # exact evidence count; the estimate is used past it
+
+# LLM resilience: one deadline per call covering retries and hedges,
+# jittered exponential backoff on transient errors, a hedged duplicate
+# request once a call runs past the recent p95 latency (None disables),
+# and a circuit breaker that fails fast while the upstream is down
+LLM_DEADLINE_SECONDS = 90
+LLM_MAX_RETRIES = 3
+LLM_RETRY_BASE_SECONDS = 0.5
+LLM_RETRY_MAX_SECONDS = 8
+LLM_HEDGE_PERCENTILE = 95
+LLM_HEDGE_MIN_SAMPLES = 20
+LLM_HEDGE_MIN_DELAY_SECONDS = 0.5
+LLM_BREAKER_FAILURES = 5
+LLM_BREAKER_RESET_SECONDS = 30
+
+# LLM backend: 'live', 'record', 'replay' or 'stub' (override with
+# $SAMARTH_LLM_BACKEND, $SAMARTH_LLM_CASSETTE, $SAMARTH_LLM_LATENCY).
+# Simulated latency is in seconds; None replays each recorded duration
+LLM_BACKEND = 'live'
+LLM_CASSETTE = "llm_cassette.jsonl"
+LLM_REPLAY_LATENCY = None
+
+# Background log writer: LLM calls and traces go to rotating
+# gzip JSONL segments in LOG_DIR
+LOG_DIR = "llm_logs"
+LOG_BUFFER_SIZE = 10_000            # queued records before new ones are dropped
+LOG_BATCH_SIZE = 200
+LOG_FLUSH_SECONDS = 1.0
+LOG_SEGMENT_MAX_BYTES = 16 * 1024 * 1024
+LOG_SEGMENT_MAX_SECONDS = 3600
+LOG_MAX_SEGMENTS = 48
+
+# Pipeline traces (per-step timings, sizes, cache hits, errors) go to a
+# SQLite database in WAL mode; query it with `python trace_store.py`
+TRACE_DB_PATH = "llm_logs/traces.db"
+TRACE_RETENTION_DAYS = 7
+
+# Prometheus metrics (metrics.py) are served on 127.0.0.1:METRICS_PORT/metrics
+# (override with $SAMARTH_METRICS_PORT; 0 disables the endpoint, get_metrics()
+# still works)
+METRICS_PORT = 9464
+
+# Generated code reused across questions differing only in entity names
+QUERY_TEMPLATE_CACHE_SIZE = 1000
+
 # Model settings
 OPENAI_MODEL = "gpt-3.5-turbo"
 TEMPERATURE = 0.3
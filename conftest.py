@@ -0,0 +1,35 @@
+"""
+Shared test setup: the pipeline runs offline (stub LLM backend, no metrics
+server, in-memory answer cache), and LLM logs and traces go to a temporary
+directory instead of LOG_DIR and TRACE_DB_PATH
+"""
+
+import os
+
+os.environ.setdefault('SAMARTH_LLM_BACKEND', 'stub')
+os.environ.setdefault('SAMARTH_METRICS_PORT', '0')
+os.environ.setdefault('SAMARTH_ANSWER_CACHE', 'memory')
+
+import pytest
+import log_writer
+import trace_store
+
+
+@pytest.fixture(scope='session', autouse=True)
+def log_dir(tmp_path_factory):
+    """Replace the process-wide log writer and trace store with ones under tmp"""
+    path = tmp_path_factory.mktemp('llm_logs')
+    writer = log_writer.BackgroundLogWriter(log_dir=str(path))
+    store = trace_store.TraceStore(path=str(path / 'traces.db'))
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(log_writer, '_log_writer', writer)
+        patch.setattr(trace_store, '_trace_store', store)
+        yield path
+    writer.close()
+    store.close()
+
+
+@pytest.fixture(scope='module')
+def pipeline():
+    from pipeline import SamarthPipeline
+    return SamarthPipeline('offline')
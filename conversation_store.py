@@ -0,0 +1,186 @@
+"""
+Conversation Store for Project Samarth
+Keeps each session's last result so follow-up questions can refine it
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Any, List, Optional
+from config import CONVERSATION_MAX_SESSIONS, CONVERSATION_MAX_BYTES, CONVERSATION_MAX_FRAME_BYTES
+
+# Imported by pipeline.py for the names below, so pandas stays out of its imports
+if TYPE_CHECKING:
+    import pandas as pd
+    from result_store import ResultStore
+
+# Name the previous result goes by in generated code
+PREVIOUS_RESULT = 'previous_result'
+
+_PREVIOUS_RESULT_RE = re.compile(rf"\b{PREVIOUS_RESULT}\b")
+
+
+def uses_previous_result(query_code: str) -> bool:
+    """Whether code reads the previous result (and so depends on the conversation)"""
+    return bool(_PREVIOUS_RESULT_RE.search(query_code or ''))
+
+
+# Questions that point back at the previous answer ("those", "of them",
+# "now only ...")
+FOLLOW_UP_RE = re.compile(
+    r"\b(those|these|them|they|their|it|its|above|previous|same|now|only|instead|among|remaining|rest)\b",
+    re.IGNORECASE
+)
+
+
+def is_follow_up(question: str) -> bool:
+    """Whether a question reads as refining the previous answer"""
+    return FOLLOW_UP_RE.search(question) is not None
+
+
+class ConversationStore:
+    """
+    Per-session LRU of the last tabular result (as a DataFrame; Series
+    results are stored in their evidence form, index levels as columns).
+
+    A follow-up such as "now only those with more than 10 mandis" is then
+    answered by filtering that small frame instead of regenerating and
+    rescanning the source datasets. Scalar results do not replace the stored
+    frame, so "how many of those are in Punjab?" still refers to the last
+    table.
+
+    Frames are held in memory up to max_bytes in total, evicting the least
+    recently used sessions; a frame over max_frame_bytes is kept only as its
+    result-store handle and reloaded from the spill file on use.
+    """
+
+    def __init__(
+        self,
+        result_store: 'ResultStore',
+        max_sessions: int = CONVERSATION_MAX_SESSIONS,
+        max_bytes: int = CONVERSATION_MAX_BYTES,
+        max_frame_bytes: int = CONVERSATION_MAX_FRAME_BYTES
+    ):
+        self.result_store = result_store
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.max_frame_bytes = max_frame_bytes
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {'stored': 0, 'spilled_only': 0, 'lookups': 0, 'found': 0, 'reused': 0, 'evicted': 0}
+
+    def get(self, session_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Returns:
+            Dict with question, query_code, frame, rows, columns, dtypes and
+            datasets_used for the session's last result, or None
+        """
+        if session_id is None:
+            return None
+        with self._lock:
+            self.counters['lookups'] += 1
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            self._sessions.move_to_end(session_id)
+            entry = dict(entry)
+
+        if entry['frame'] is None:
+            try:
+                entry['frame'] = self.result_store.load(entry['result_handle'])
+            except KeyError:
+                # Spill file expired: the follow-up runs without it
+                self.clear(session_id)
+                return None
+        with self._lock:
+            self.counters['found'] += 1
+        return entry
+
+    def put(
+        self,
+        session_id: Optional[str],
+        question: str,
+        query_code: str,
+        frame: 'pd.DataFrame',
+        datasets_used: List[str],
+        result_handle: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Remember a session's latest tabular result
+
+        Returns:
+            The stored entry (see share()), or None if nothing was stored
+        """
+        if session_id is None:
+            return None
+        size = int(frame.memory_usage(index=True, deep=True).sum())
+        entry = {
+            'question': question,
+            'query_code': query_code,
+            'frame': frame,
+            'rows': len(frame),
+            'columns': [str(col) for col in frame.columns],
+            'dtypes': [str(dtype) for dtype in frame.dtypes],
+            'datasets_used': list(datasets_used),
+            'result_handle': result_handle,
+            'bytes': size
+        }
+        if size > self.max_frame_bytes:
+            if result_handle is None:
+                # Too large to hold and not spilled: nothing to refine later
+                self.clear(session_id)
+                return None
+            entry['frame'] = None
+            entry['bytes'] = 0
+        self._insert(session_id, entry)
+        return entry
+
+    def share(self, session_id: Optional[str], entry: Dict[str, Any]):
+        """
+        Give another session the same previous result (e.g. it asked the same
+        question and was answered by another session's run); the frame is shared
+        """
+        if session_id is not None:
+            self._insert(session_id, dict(entry))
+
+    def has(self, session_id: Optional[str]) -> bool:
+        """Whether the session has a previous result (without loading it)"""
+        with self._lock:
+            return session_id in self._sessions
+
+    def _insert(self, session_id: str, entry: Dict[str, Any]):
+        with self._lock:
+            previous = self._sessions.pop(session_id, None)
+            if previous is not None:
+                self._bytes -= previous['bytes']
+            self._sessions[session_id] = entry
+            self._bytes += entry['bytes']
+            self.counters['stored'] += 1
+            if entry['frame'] is None:
+                self.counters['spilled_only'] += 1
+            while len(self._sessions) > 1 and (len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes):
+                _, evicted = self._sessions.popitem(last=False)
+                self._bytes -= evicted['bytes']
+                self.counters['evicted'] += 1
+
+    def record_reuse(self):
+        """Note a query that read previous_result"""
+        with self._lock:
+            self.counters['reused'] += 1
+
+    def clear(self, session_id: str):
+        """Forget a session (e.g. the user cleared the conversation)"""
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            if entry is not None:
+                self._bytes -= entry['bytes']
+
+    def stats(self) -> Dict[str, Any]:
+        """Sessions held, memory used and how often follow-ups reused a result"""
+        with self._lock:
+            return {
+                **self.counters,
+                'sessions': len(self._sessions),
+                'bytes': self._bytes
+            }
@@ -5,18 +5,41 @@ Loads and preprocesses agricultural and climate data from bolbhav-data repositor
 
 import pandas as pd
 import os
-from typing import Dict, List, Any
+import hashlib
+import types
+from typing import Dict, List, Any, Callable, Optional
 import json
+from intermediate_cache import IntermediateCache, function_fingerprint
+from config import DATA_CACHE_DIR
+
+
+def enable_copy_on_write():
+    """
+    Turn on pandas copy-on-write so shallow copies of the shared frames are
+    safe to hand out (QueryDataView). Called by whatever executes queries
+    (pipeline start-up, QueryExecutor) rather than at import, since it is a
+    process-wide option. It is always on from pandas 3.0, where the option
+    is deprecated, so this is a no-op there.
+    """
+    if int(pd.__version__.split('.')[0]) < 3:
+        pd.set_option('mode.copy_on_write', True)
+
 
 class AgriculturalDataLoader:
-    def __init__(self, data_dir: str = "data"):
+    def __init__(self, data_dir: str = "data", cache_dir: Optional[str] = DATA_CACHE_DIR):
         self.data_dir = data_dir
+        self.cache_dir = cache_dir
         self.dataframes = {}
         self.schema_info = {}
+        self._key_frequencies = {}
+        # Identifies the loaded source files (names, sizes, mtimes); set by load_all_data
+        self.data_version: Optional[str] = None
+        self.intermediates = IntermediateCache()
         
     def load_all_data(self) -> Dict[str, pd.DataFrame]:
         """Load all available datasets"""
         print("Loading agricultural and climate data...")
+        sources = []
         
         # Load CSV files
         csv_files = [
@@ -31,6 +54,7 @@ class AgriculturalDataLoader:
             if os.path.exists(file_path):
                 df_name = file.replace(".csv", "").replace(" ", "_").replace("(", "").replace(")", "").lower()
                 self.dataframes[df_name] = pd.read_csv(file_path)
+                sources.append(self._source_signature(file_path))
                 print(f"Loaded {file}: {self.dataframes[df_name].shape}")
         
         # Load Excel files
@@ -43,14 +67,45 @@ class AgriculturalDataLoader:
             file_path = os.path.join(self.data_dir, file)
             if os.path.exists(file_path):
                 df_name = file.replace(".xlsx", "").replace(" ", "_").replace("(", "").replace(")", "").lower()
-                self.dataframes[df_name] = pd.read_excel(file_path)
+                self.dataframes[df_name] = self._read_excel(file_path, df_name)
+                sources.append(self._source_signature(file_path))
                 print(f"Loaded {file}: {self.dataframes[df_name].shape}")
         
         # Generate schema information for each dataframe
         self._generate_schema_info()
         
+        # Intermediates computed from earlier data no longer apply
+        self.data_version = hashlib.sha1(repr(sources).encode('utf-8')).hexdigest()[:12]
+        self._key_frequencies = {}
+        self.intermediates.clear()
+        
         return self.dataframes
     
+    def _source_signature(self, file_path: str) -> tuple:
+        stat = os.stat(file_path)
+        return (os.path.basename(file_path), stat.st_size, stat.st_mtime_ns)
+    
+    def _read_excel(self, file_path: str, df_name: str) -> pd.DataFrame:
+        """read_excel through a Parquet copy in cache_dir, refreshed when the source changes"""
+        if self.cache_dir is None:
+            return pd.read_excel(file_path)
+        cache_path = os.path.join(self.cache_dir, f"{df_name}.parquet")
+        if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(file_path):
+            try:
+                return pd.read_parquet(cache_path)
+            except Exception as e:
+                print(f"Warning: Ignoring data cache {cache_path}: {str(e)}")
+        
+        df = pd.read_excel(file_path)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            df.to_parquet(cache_path + '.tmp', compression='zstd')
+            os.replace(cache_path + '.tmp', cache_path)
+        except Exception as e:
+            # e.g. object columns Arrow cannot type; keep reading the Excel file
+            print(f"Warning: Could not cache {file_path}: {str(e)}")
+        return df
+    
     def _generate_schema_info(self):
         """Generate detailed schema information for LLM context"""
         for df_name, df in self.dataframes.items():
@@ -86,6 +141,42 @@ class AgriculturalDataLoader:
         """List all available dataframe names"""
         return list(self.dataframes.keys())
     
+    def get_key_frequencies(self, name: str, columns: List[str]) -> Optional[pd.Series]:
+        """
+        Frequency of each distinct key (tuple of column values) in a dataframe.
+        Cached per (dataframe, columns); returns None if any column is missing.
+        """
+        cache_key = (name, tuple(columns))
+        if cache_key not in self._key_frequencies:
+            df = self.dataframes.get(name)
+            if df is None or not columns or any(col not in df.columns for col in columns):
+                return None
+            self._key_frequencies[cache_key] = df[list(columns)].value_counts(dropna=True)
+        return self._key_frequencies[cache_key]
+    
+    def cached(self, name: str, fn: Callable[[], Any]) -> Any:
+        """
+        fn() computed once per data version and shared by every query that
+        asks for name with the same function. Functions that read anything
+        but the datasets (e.g. a frame the query filtered) are just called
+        """
+        fingerprint = function_fingerprint(fn, shared=(AgriculturalDataLoader, QueryDataView))
+        if fingerprint is None:
+            return fn()
+        return self.intermediates.get_or_compute(('named', self.data_version, name, fingerprint), self._on_fresh_view(fn))
+    
+    def _on_fresh_view(self, fn: types.FunctionType) -> types.FunctionType:
+        """fn reading a new QueryDataView, so changes the query made to its own view cannot leak into a shared value"""
+        fresh = QueryDataView(self)
+        fn_globals = {name: fresh if isinstance(value, QueryDataView) else value for name, value in fn.__globals__.items()}
+        rebound = types.FunctionType(fn.__code__, fn_globals, fn.__name__, fn.__defaults__, fn.__closure__)
+        rebound.__kwdefaults__ = fn.__kwdefaults__
+        return rebound
+    
+    def cached_expression(self, digest: str, fn: Callable[[], Any]) -> Any:
+        """A common subexpression (see CommonSubexpressions), computed once per data version"""
+        return self.intermediates.get_or_compute(('expression', self.data_version, digest), fn)
+    
     def search_dataframes(self, query: str) -> List[str]:
         """Search for dataframes that might contain relevant information"""
         query_lower = query.lower()
@@ -97,6 +188,60 @@ class AgriculturalDataLoader:
         
         return relevant_dfs
 
+
+class QueryDataView:
+    """
+    Read-only, per-query view over a loaded AgriculturalDataLoader.
+
+    Frames are shallow copies that share memory with the loader. Under
+    copy-on-write, anything query code does to them (new columns, inplace=True,
+    .loc assignment) is copied into this view's overlay and never reaches the
+    shared data, so concurrent queries can use one in-memory copy.
+    """
+
+    def __init__(self, data_loader: AgriculturalDataLoader):
+        self._source = data_loader
+        self._overlay: Dict[str, pd.DataFrame] = {}
+
+    def get_dataframe(self, name: str) -> Optional[pd.DataFrame]:
+        """Get a query-local view of a dataframe by name"""
+        if name not in self._overlay:
+            df = self._source.get_dataframe(name)
+            if df is None:
+                return None
+            self._overlay[name] = df.copy(deep=False)
+        return self._overlay[name]
+
+    def list_dataframes(self) -> List[str]:
+        """List all available dataframe names"""
+        return self._source.list_dataframes()
+
+    @property
+    def dataframes(self) -> Dict[str, pd.DataFrame]:
+        """Query-local views of every dataframe, keyed by name"""
+        return {name: self.get_dataframe(name) for name in self.list_dataframes()}
+
+    def cached(self, name: str, fn: Callable[[], Any]) -> Any:
+        """An intermediate shared with other queries; see AgriculturalDataLoader.cached"""
+        return self._source.cached(name, fn)
+
+    def cached_expression(self, digest: str, fn: Callable[[], Any]) -> Any:
+        """Used by queries CommonSubexpressions rewrote"""
+        return self._source.cached_expression(digest, fn)
+
+    @property
+    def schema_info(self) -> Dict[str, Dict[str, Any]]:
+        """The loader's per-dataset schema summaries (read-only)"""
+        return self._source.schema_info
+
+    def get_schema_context(self) -> str:
+        """See AgriculturalDataLoader.get_schema_context"""
+        return self._source.get_schema_context()
+
+    def search_dataframes(self, query: str) -> List[str]:
+        """See AgriculturalDataLoader.search_dataframes"""
+        return self._source.search_dataframes(query)
+
 # Example usage and testing
 if __name__ == "__main__":
     loader = AgriculturalDataLoader()
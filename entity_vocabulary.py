@@ -0,0 +1,97 @@
+"""
+Entity Vocabulary for Project Samarth
+Recognizes states, districts and crops from the loaded data in free-text questions
+"""
+
+import re
+from typing import Dict, List, Tuple, NamedTuple
+from data_loader import AgriculturalDataLoader
+
+# Columns holding entity names, per entity type, in lookup priority order
+ENTITY_COLUMNS = {
+    'state': [
+        ('agmark_mandis_and_locations', 'State Name'),
+        ('location_hierarchy', 'State Name'),
+        ('mandi_apmc_map', 'State Name'),
+        ('imd_agromet_advisory_locations', 'State'),
+    ],
+    'district': [
+        ('agmark_mandis_and_locations', 'District Name - Agmark'),
+        ('location_hierarchy', 'District Name'),
+        ('mandi_apmc_map', 'District Name'),
+        ('imd_agromet_advisory_locations', 'District'),
+    ],
+    'crop': [
+        ('agmark_crops', 'Crop Name - Cleaned'),
+    ],
+}
+
+# Words that name things in the domain rather than entities (e.g. the
+# district "Mandi" or the crop "Other"); they are never read as entity mentions
+DOMAIN_WORDS = {
+    'mandi', 'mandis', 'market', 'markets', 'state', 'states', 'district', 'districts',
+    'block', 'blocks', 'division', 'divisions', 'crop', 'crops', 'variety', 'varieties',
+    'type', 'types', 'other', 'others', 'all', 'total', 'india', 'name', 'names'
+}
+
+MAX_ENTITY_WORDS = 6
+
+
+class EntityMention(NamedTuple):
+    entity_type: str
+    value: str      # canonical name as it appears in the data
+    start: int      # character span in the question
+    end: int
+
+
+class EntityVocabulary:
+    """
+    Lowercased entity name -> (type, canonical value), built once from the
+    loaded datasets. Mentions are matched greedily on whole words, longest
+    name first, so "West Bengal" wins over a district called "Bengal".
+    """
+
+    def __init__(self, data_loader: AgriculturalDataLoader):
+        self.entities: Dict[str, Tuple[str, str]] = {}
+        for entity_type, columns in ENTITY_COLUMNS.items():
+            for df_name, column in columns:
+                df = data_loader.get_dataframe(df_name)
+                if df is None or column not in df.columns:
+                    continue
+                for value in df[column].dropna().astype(str).str.strip().unique():
+                    key = self._normalize(value)
+                    if len(key) < 3 or key in DOMAIN_WORDS:
+                        continue
+                    # Earlier types (state before district before crop) take priority
+                    self.entities.setdefault(key, (entity_type, value))
+
+    def find_mentions(self, question: str) -> List[EntityMention]:
+        """Non-overlapping entity mentions in question order"""
+        words = list(re.finditer(r"[\w&.'-]+", question))
+        mentions = []
+        i = 0
+        while i < len(words):
+            match = None
+            for size in range(min(MAX_ENTITY_WORDS, len(words) - i), 0, -1):
+                start, end = words[i].start(), words[i + size - 1].end()
+                key = self._normalize(question[start:end])
+                if key in self.entities:
+                    match = (size, start, end, key)
+                    break
+            if match is None:
+                i += 1
+                continue
+            size, start, end, key = match
+            entity_type, value = self.entities[key]
+            mentions.append(EntityMention(entity_type, value, start, end))
+            i += size
+        return mentions
+
+    def lookup(self, text: str) -> Tuple[str, str]:
+        """(type, canonical value) for an exact entity name, or (None, None)"""
+        return self.entities.get(self._normalize(text), (None, None))
+
+    def _normalize(self, text: str) -> str:
+        text = re.sub(r"\s+", ' ', text.strip().lower())
+        # Trailing punctuation ("Punjab?", "Gujarat.") is not part of a name
+        return text.rstrip(".'-")
@@ -0,0 +1,188 @@
+"""
+Evidence Encoder for Project Samarth
+Renders executor evidence for the synthesis prompt within a token budget
+"""
+
+import json
+import math
+import re
+from typing import Dict, Any, Callable, List, Optional, Set, Tuple
+from config import EVIDENCE_TOKEN_BUDGET, EVIDENCE_COUNT_TOKENS_ABOVE
+
+# Column name words marking identifiers and translations, which answers
+# rarely need unless the question asks for them
+IDENTIFIER_WORDS = {'id', 'code'}
+TRANSLATION_WORDS = {'hindi', 'hi'}
+
+MAX_FIT_ROUNDS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count: about four ASCII characters per token, and one token
+    per non-ASCII character (Devanagari splits into many more tokens than
+    its character count suggests, so this errs high)
+    """
+    if text.isascii():
+        return math.ceil(len(text) / 4)
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return math.ceil((len(text) - non_ascii) / 4) + non_ascii
+
+
+class EvidenceEncoder:
+    """
+    Tabular evidence becomes one header line of column names followed by one
+    pipe-separated line per row, instead of JSON that repeats structure around
+    every value. Identifier and translated-name columns are dropped unless
+    the executed code or the question refers to them, summary stats are
+    limited to the kept columns, and rows are trimmed until the text fits the
+    token budget.
+
+    count_tokens, if given, returns the model's exact count for a text (or
+    None); it is called at most once per encode(), on the final text, and
+    only when the local estimate is close enough to the budget for the
+    difference to matter.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = EVIDENCE_TOKEN_BUDGET,
+        count_tokens: Optional[Callable[[str], Optional[int]]] = None,
+        count_above: float = EVIDENCE_COUNT_TOKENS_ABOVE
+    ):
+        self.token_budget = token_budget
+        self.count_tokens = count_tokens
+        self.count_above = count_above
+
+    def encode(self, question: str, executed_code: str, evidence: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict with text, tokens, token_source ('api' or 'estimate'),
+            rows_shown and columns_dropped
+        """
+        if not evidence.get('columns'):
+            text = self._render_other(evidence)
+            tokens, source = self._count(text, estimate_tokens(text))
+            return {
+                'text': text,
+                'tokens': tokens,
+                'token_source': source,
+                'rows_shown': None,
+                'columns_dropped': []
+            }
+
+        keep = self._select_columns(question, executed_code, evidence)
+        dropped = [col for i, col in enumerate(evidence['columns']) if i not in keep]
+        total_rows = len(evidence['values'][0]) if evidence['values'] else 0
+
+        rows, text, estimate = self._fit(evidence, keep, dropped, total_rows, 1.0)
+        tokens, source = self._count(text, estimate)
+        if source == 'api' and tokens > self.token_budget and rows > 1:
+            # The estimate ran low for this text: trim again with it scaled
+            # to the exact count, without another countTokens call
+            rows, text, tokens = self._fit(evidence, keep, dropped, rows, tokens / max(1, estimate))
+            source = 'estimate'
+
+        return {
+            'text': text,
+            'tokens': tokens,
+            'token_source': source,
+            'rows_shown': rows,
+            'columns_dropped': dropped
+        }
+
+    def _select_columns(self, question: str, executed_code: str, evidence: Dict[str, Any]) -> List[int]:
+        """Indices of the columns worth showing"""
+        question_words = self._words(question)
+        question_non_ascii = any(ord(ch) > 127 for ch in question)
+        keep = []
+        for i, column in enumerate(evidence['columns']):
+            column_words = self._words(column)
+            referenced = re.search(r"['\"]" + re.escape(column) + r"['\"]", executed_code) is not None
+            asked_for = bool(column_words & question_words & (IDENTIFIER_WORDS | TRANSLATION_WORDS))
+            if referenced or asked_for:
+                keep.append(i)
+            elif column_words & IDENTIFIER_WORDS:
+                continue
+            elif (column_words & TRANSLATION_WORDS or self._mostly_non_ascii(evidence['values'][i])) and not question_non_ascii:
+                continue
+            else:
+                keep.append(i)
+        # Never drop everything: a result of only IDs still needs showing
+        return keep or list(range(len(evidence['columns'])))
+
+    def _render_table(self, evidence: Dict[str, Any], keep: List[int], dropped: List[str], rows: int) -> str:
+        columns = [evidence['columns'][i] for i in keep]
+        shape = evidence.get('shape') or []
+        total = evidence['summary_stats'].get('total_rows', shape[0] if shape else rows)
+        lines = [
+            f"type: {evidence['type']}",
+            f"shape: {shape}",
+            f"datasets_used: {', '.join(evidence.get('datasets_used') or [])}",
+            f"table (rows 1-{rows} of {total}):"
+        ]
+        if dropped:
+            lines[-1] = f"table (rows 1-{rows} of {total}; omitted columns: {', '.join(dropped)}):"
+        lines.append('|'.join(self._cell(c) for c in columns))
+        for r in range(rows):
+            lines.append('|'.join(self._cell(evidence['values'][i][r]) for i in keep))
+        lines.append(f"summary_stats: {self._compact(self._filter_stats(evidence['summary_stats'], set(columns)))}")
+        return '\n'.join(lines)
+
+    def _render_other(self, evidence: Dict[str, Any]) -> str:
+        prompt_evidence = {
+            k: v for k, v in evidence.items()
+            if k not in ('result_handle', 'columns') and v not in (None, {})
+        }
+        return self._compact(prompt_evidence)
+
+    def _filter_stats(self, stats: Dict[str, Any], columns: Set[str]) -> Dict[str, Any]:
+        """Summary stats restricted to the shown columns"""
+        filtered = {}
+        for key, value in stats.items():
+            if key in ('numeric', 'top_categories'):
+                value = {col: col_stats for col, col_stats in value.items() if col in columns}
+                if not value:
+                    continue
+            filtered[key] = value
+        return filtered
+
+    def _fit(self, evidence: Dict[str, Any], keep: List[int], dropped: List[str], rows: int, scale: float) -> Tuple[int, str, int]:
+        """Trim rows until the estimated tokens (times scale) fit the budget; returns (rows, text, tokens)"""
+        text = self._render_table(evidence, keep, dropped, rows)
+        tokens = math.ceil(estimate_tokens(text) * scale)
+        for _ in range(MAX_FIT_ROUNDS):
+            if tokens <= self.token_budget or rows <= 1:
+                break
+            # Shrink in proportion to the overshoot, with a little headroom
+            rows = max(1, min(rows - 1, int(rows * self.token_budget / tokens * 0.95)))
+            text = self._render_table(evidence, keep, dropped, rows)
+            tokens = math.ceil(estimate_tokens(text) * scale)
+        return rows, text, tokens
+
+    def _count(self, text: str, estimate: int) -> Tuple[int, str]:
+        """The exact count for the final text when it is near the budget, else the estimate"""
+        if self.count_tokens is not None and estimate > self.token_budget * self.count_above:
+            exact = self.count_tokens(text)
+            if exact is not None:
+                return exact, 'api'
+        return estimate, 'estimate'
+
+    def _cell(self, value: Any) -> str:
+        if value is None:
+            return ''
+        return re.sub(r"\s+", ' ', str(value)).replace('|', '/')
+
+    def _compact(self, value: Any) -> str:
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=str)
+
+    def _words(self, text: str) -> Set[str]:
+        """Lowercase words, plurals folded ("IDs" -> "id")"""
+        words = re.findall(r"[a-z]+", str(text).lower())
+        return {w[:-1] if len(w) > 2 and w.endswith('s') else w for w in words}
+
+    def _mostly_non_ascii(self, values: List[Any]) -> bool:
+        texts = [v for v in values if isinstance(v, str) and v]
+        if not texts:
+            return False
+        return sum(1 for v in texts if any(ord(ch) > 127 for ch in v)) > len(texts) / 2
@@ -2,99 +2,365 @@
 Query Executor - Deterministic code execution and evidence building
 """
 
+import numpy as np
 import pandas as pd
 import json
-from typing import Dict, Any, List
-from data_loader import AgriculturalDataLoader
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, Any, List, Optional
+from data_loader import AgriculturalDataLoader, QueryDataView, enable_copy_on_write
+from query_planner import QueryPlanner
+from intermediate_cache import CommonSubexpressions
+from result_store import ResultStore
+from scheduler import FairScheduler
+from metrics import REGISTRY, SIZE_BUCKETS
+from config import (
+    EVIDENCE_MAX_CHARS, EVIDENCE_MAX_SUMMARY_COLUMNS, EVIDENCE_TOP_CATEGORIES,
+    EXECUTOR_MODE, EXECUTOR_WORKERS
+)
+
+# Per-process executor used by the process pool workers
+_worker_executor = None
+
+def _init_worker():
+    """Process pool initializer: each worker loads its own copy of the data"""
+    global _worker_executor
+    _worker_executor = QueryExecutor()
+
+def _execute_in_worker(query_code: str, max_results: int, context: Optional[Dict[str, Any]], return_frame: bool) -> Dict[str, Any]:
+    return _worker_executor.execute_query(query_code, max_results, context, return_frame)
 
 class QueryExecutor:
-    def __init__(self):
-        self.data_loader = AgriculturalDataLoader()
-        self.data_loader.load_all_data()
+    def __init__(self, mode: str = EXECUTOR_MODE, workers: int = EXECUTOR_WORKERS, data_loader: Optional[AgriculturalDataLoader] = None):
+        if mode not in ('thread', 'process'):
+            raise ValueError(f"Unknown executor mode: {mode}")
+        # Query views share the loaded frames (see QueryDataView)
+        enable_copy_on_write()
+        # Pass an already loaded data loader to share it; process mode workers load their own
+        if data_loader is None:
+            data_loader = AgriculturalDataLoader()
+            data_loader.load_all_data()
+        self.data_loader = data_loader
+        self.planner = QueryPlanner(self.data_loader)
+        self.subexpressions = CommonSubexpressions()
+        self.result_store = ResultStore()
+        self.mode = mode
+        self.workers = workers
+        self._scheduler: Optional[FairScheduler] = None
+        self._scheduler_lock = threading.Lock()
+    
+    def submit(
+        self,
+        query_code: str,
+        max_results: int = 20,
+        client_id: str = 'default',
+        context: Optional[Dict[str, Any]] = None,
+        return_frame: bool = False
+    ) -> Future:
+        """
+        Run a query on the worker pool; returns a Future of the execute_query result
+        
+        Each query gets its own namespace and dataset view, so any number can be
+        in flight at once. Jobs are dispatched round-robin across client_id
+        values (e.g. one per Streamlit session), and future.cancel() works
+        until the job starts.
+        
+        Thread mode shares the loaded data; process mode gives each worker its
+        own copy so long pandas calls are not serialized on the GIL.
+        """
+        return self._get_scheduler().submit(client_id, *self._job(query_code, max_results, context, return_frame))
+    
+    def shutdown(self, wait: bool = True, cancel_pending: bool = False):
+        """Stop the worker pool (a later submit() starts a new one)"""
+        with self._scheduler_lock:
+            scheduler, self._scheduler = self._scheduler, None
+        if scheduler is not None:
+            scheduler.shutdown(wait=wait, cancel_pending=cancel_pending)
     
-    def execute_query(self, query_code: str, max_results: int = 20) -> Dict[str, Any]:
+    def _get_scheduler(self) -> FairScheduler:
+        with self._scheduler_lock:
+            if self._scheduler is None:
+                if self.mode == 'process':
+                    pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+                else:
+                    pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='query')
+                self._scheduler = FairScheduler(pool, max_in_flight=self.workers)
+            return self._scheduler
+    
+    def _job(self, query_code: str, max_results: int, context: Optional[Dict[str, Any]], return_frame: bool):
+        if self.mode == 'process':
+            return _execute_in_worker, query_code, max_results, context, return_frame
+        return self.execute_query, query_code, max_results, context, return_frame
+    
+    def execute_query(
+        self,
+        query_code: str,
+        max_results: int = 20,
+        context: Optional[Dict[str, Any]] = None,
+        return_frame: bool = False
+    ) -> Dict[str, Any]:
         """
         Execute pandas query and build evidence bundle
         Pure deterministic execution
+        
+        Args:
+            context: Extra names for the query's namespace (e.g.
+                previous_result); DataFrames are passed as shallow
+                copy-on-write copies
+            return_frame: Add result_frame, the full result as a DataFrame
+                (Series as index columns plus values; None for scalars)
         """
+        started = time.perf_counter()
+        exec_result = self._run_query(query_code, max_results, context or {}, return_frame)
+        self._record_metrics(exec_result, time.perf_counter() - started)
+        return exec_result
+    
+    def _record_metrics(self, exec_result: Dict[str, Any], seconds: float):
+        """Duration and outcome per query, and result size for successful ones (in this process)"""
+        outcome = 'ok' if exec_result['success'] else exec_result.get('error_type', 'error')
+        REGISTRY.histogram('samarth_exec_seconds', 'Query execution time, evidence building included').observe(seconds)
+        REGISTRY.counter('samarth_exec_total', 'Executed queries by outcome', outcome=outcome).inc()
+        if exec_result['success']:
+            stats = exec_result['evidence'].get('summary_stats') or {}
+            rows = stats.get('total_rows', stats.get('total_items', 1))
+            REGISTRY.histogram('samarth_exec_result_rows', 'Rows (or items) in the full query result', unit=1, buckets=SIZE_BUCKETS).observe(rows)
+    
+    def _run_query(self, query_code: str, max_results: int, context: Dict[str, Any], return_frame: bool) -> Dict[str, Any]:
+        # Estimate cost before running anything
+        plan = self.planner.plan(query_code)
+        if plan['exceeds_limit']:
+            message = self._describe_plan(plan)
+            # An estimate that hinges on an unknown filter is only warned about
+            if self.planner.mode == 'refuse' and not plan['uncertain']:
+                return {
+                    'success': False,
+                    'error': f"Query refused: {message}",
+                    'error_type': 'QueryRefused',
+                    'executed_code': query_code,
+                    'plan': plan
+                }
+            print(f"Warning: {message}")
+        
         try:
-            # Create safe execution environment
+            # Create safe execution environment; the query gets its own
+            # copy-on-write view so it can never mutate the shared frames
             safe_globals = {
-                'data_loader': self.data_loader,
+                'data_loader': QueryDataView(self.data_loader),
                 'pd': pd,
                 'result': None
             }
+            for name, value in context.items():
+                safe_globals[name] = value.copy(deep=False) if isinstance(value, pd.DataFrame) else value
             
-            # Execute query
-            exec(query_code, safe_globals)
+            # Execute query, with subexpressions other queries also compute
+            # read from the shared intermediate cache
+            exec(self.subexpressions.prepare(query_code), safe_globals)
             
             result = safe_globals.get('result')
             
             if result is None:
                 return {
                     'success': False,
-                    'error': 'No result variable found in query'
+                    'error': 'No result variable found in query',
+                    'error_type': 'NoResult',
+                    'executed_code': query_code,
+                    'plan': plan
                 }
             
             # Build evidence bundle
             evidence = self._build_evidence(result, query_code, max_results)
             
-            return {
+            exec_result = {
                 'success': True,
                 'evidence': evidence,
-                'executed_code': query_code
+                'executed_code': query_code,
+                'plan': plan
             }
+            if return_frame:
+                exec_result['result_frame'] = self._as_frame(result)
+            return exec_result
             
         except Exception as e:
             return {
                 'success': False,
                 'error': str(e),
-                'executed_code': query_code
+                'error_type': type(e).__name__,
+                'executed_code': query_code,
+                'plan': plan
             }
     
+    def _describe_plan(self, plan: Dict[str, Any]) -> str:
+        """Explain which operation pushed the estimate over the limit"""
+        worst = max(plan['operations'], key=lambda op: op['estimated_rows'])
+        detail = f"{worst['op']} on line {worst['line']}"
+        if worst.get('left_keys') or worst.get('right_keys'):
+            detail += f" (keys {worst.get('left_keys')} / {worst.get('right_keys')})"
+        if worst.get('after_filter'):
+            # The estimate assumes that filter keeps every row
+            detail += " (after a filter of unknown selectivity)"
+        return (
+            f"{detail} is estimated to produce {worst['estimated_rows']:,} rows, "
+            f"over the limit of {self.planner.max_estimated_rows:,}. "
+            f"Join on unique keys (e.g. District ID plus State) or aggregate before merging."
+        )
+    
     def _build_evidence(self, result: Any, query_code: str, max_results: int) -> Dict[str, Any]:
-        """Build structured evidence bundle from query result"""
+        """
+        Build structured evidence bundle from query result
+
+        Tabular results are encoded column-wise (column names once, then one
+        value array per column) and capped to max_results rows; summary stats
+        are computed vectorized over the full result. Every result type is
+        bounded, so the bundle stays small whatever the query returns.
+        
+        Capped tabular results are spilled in full to the result store, and
+        the evidence carries a result_handle for paging through the rest.
+        """
         evidence = {
             'type': None,
             'shape': None,
             'columns': None,
-            'records': None,
+            'values': None,
             'summary_stats': {},
+            'result_handle': None,
             'datasets_used': self._extract_datasets_used(query_code)
         }
         
+        if isinstance(result, (np.ndarray, pd.Index, pd.api.extensions.ExtensionArray)) and result.ndim == 1:
+            # e.g. df['District Name'].unique(): treat as a Series of values
+            result = pd.Series(result)
+        
+        if isinstance(result, pd.Series):
+            # Encode a Series as a two-column frame: index, then values
+            evidence['type'] = 'Series'
+            evidence['shape'] = list(result.shape)
+            result = self._series_to_frame(result)
+        
         if isinstance(result, pd.DataFrame):
-            evidence['type'] = 'DataFrame'
-            evidence['shape'] = result.shape
-            evidence['columns'] = result.columns.tolist()
+            if evidence['type'] is None:
+                evidence['type'] = 'DataFrame'
+                evidence['shape'] = list(result.shape)
             
             # Cap to max_results
             capped_result = result.head(max_results)
-            evidence['records'] = capped_result.to_dict('records')
+            evidence['columns'] = [str(col) for col in capped_result.columns]
+            evidence['values'] = [
+                self._encode_column(capped_result.iloc[:, i])
+                for i in range(capped_result.shape[1])
+            ]
             
-            # Add summary stats
             evidence['summary_stats'] = {
                 'total_rows': len(result),
                 'rows_returned': len(capped_result),
                 'capped': len(result) > max_results
             }
+            evidence['summary_stats'].update(self._summarize_frame(result))
             
-        elif isinstance(result, pd.Series):
-            evidence['type'] = 'Series'
-            evidence['shape'] = result.shape
-            evidence['records'] = result.head(max_results).to_dict()
+            if len(result) > max_results:
+                evidence['result_handle'] = self.result_store.save(result)
+            
+        elif isinstance(result, (str, bytes, int, float, bool)) or pd.api.types.is_scalar(result):
+            evidence['type'] = 'Scalar'
+            evidence['values'] = self._bounded_value(result)
+            
+        elif isinstance(result, (list, tuple, set, dict)):
+            items = list(result.items()) if isinstance(result, dict) else list(result)
+            evidence['type'] = 'Other'
+            evidence['shape'] = [len(items)]
+            evidence['values'] = [self._bounded_value(item) for item in items[:max_results]]
             evidence['summary_stats'] = {
-                'total_items': len(result),
-                'items_returned': min(len(result), max_results),
-                'capped': len(result) > max_results
+                'total_items': len(items),
+                'items_returned': min(len(items), max_results),
+                'capped': len(items) > max_results
             }
             
         else:
             evidence['type'] = 'Other'
-            evidence['records'] = str(result)
+            evidence['values'] = self._bounded_value(result)
         
         return evidence
     
+    def _as_frame(self, result: Any) -> Optional[pd.DataFrame]:
+        """A tabular result as a DataFrame, in the same form as its evidence"""
+        if isinstance(result, (np.ndarray, pd.Index, pd.api.extensions.ExtensionArray)) and result.ndim == 1:
+            result = pd.Series(result)
+        if isinstance(result, pd.Series):
+            return self._series_to_frame(result)
+        if isinstance(result, pd.DataFrame):
+            return result
+        return None
+    
+    def _series_to_frame(self, series: pd.Series) -> pd.DataFrame:
+        """
+        Turn a Series into a frame with its index levels as leading columns;
+        an unnamed integer index (positions or source row labels) is dropped
+        """
+        value_name = str(series.name) if series.name is not None else 'value'
+        if value_name in [str(name) for name in series.index.names]:
+            value_name = 'value'
+        index = series.index
+        positional = index.nlevels == 1 and index.name is None and (
+            isinstance(index, pd.RangeIndex) or pd.api.types.is_integer_dtype(index.dtype)
+        )
+        return series.to_frame(name=value_name).reset_index(drop=positional)
+    
+    def get_result_page(self, result_handle: str, cursor: int = 0, page_size: int = 20) -> Dict[str, Any]:
+        """Read a page of a spilled result without re-running the query"""
+        return self.result_store.read_page(result_handle, cursor, page_size)
+    
+    def _encode_column(self, column: pd.Series) -> List[Any]:
+        """Convert one column to a JSON-safe value array (NaN -> None)"""
+        if pd.api.types.is_datetime64_any_dtype(column):
+            column = column.dt.strftime('%Y-%m-%d %H:%M:%S')
+        values = column.astype(object).where(column.notna(), None).tolist()
+        return [self._bounded_value(v) for v in values]
+    
+    def _bounded_value(self, value: Any) -> Any:
+        """Return a JSON-safe scalar, truncating anything larger than the char limit"""
+        if hasattr(value, 'item') and pd.api.types.is_scalar(value):
+            value = value.item()
+        if value is None or isinstance(value, (bool, int, float)):
+            return value
+        text = value if isinstance(value, str) else str(value)
+        if len(text) > EVIDENCE_MAX_CHARS:
+            return text[:EVIDENCE_MAX_CHARS] + f'... [truncated {len(text) - EVIDENCE_MAX_CHARS} chars]'
+        return text
+    
+    def _summarize_frame(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """Vectorized summary over the full (uncapped) result: numeric describe and top categories"""
+        summary = {}
+        if df.empty:
+            return summary
+        
+        numeric = df.select_dtypes(include='number').iloc[:, :EVIDENCE_MAX_SUMMARY_COLUMNS]
+        if not numeric.empty:
+            described = numeric.describe().loc[['count', 'mean', 'min', 'max']]
+            described.loc['sum'] = numeric.sum()
+            summary['numeric'] = {
+                str(col): {stat: self._bounded_value(round(val, 4)) for stat, val in described[col].dropna().items()}
+                for col in described.columns
+            }
+        
+        categorical = df.select_dtypes(exclude=['number', 'datetime']).iloc[:, :EVIDENCE_MAX_SUMMARY_COLUMNS]
+        top_categories = {}
+        for col in categorical.columns:
+            try:
+                counts = categorical[col].value_counts()
+            except TypeError:
+                # Unhashable cells (lists, dicts) have no category counts
+                continue
+            top_categories[str(col)] = {'unique': int(len(counts))}
+            if len(counts) and counts.iloc[0] > 1:
+                top_categories[str(col)]['top'] = {
+                    str(self._bounded_value(k)): int(v)
+                    for k, v in counts.head(EVIDENCE_TOP_CATEGORIES).items()
+                }
+        if top_categories:
+            summary['top_categories'] = top_categories
+        
+        return summary
+    
     def _extract_datasets_used(self, query_code: str) -> List[str]:
         """Extract dataset names used in the query (deterministic)"""
         datasets = []
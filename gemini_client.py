@@ -3,100 +3,327 @@ Gemini Client for Project Samarth
 Handles all LLM calls to Google Gemini with XML-structured prompts
 """
 
-import google.generativeai as genai
+import asyncio
 import os
-import json
+import queue
+import threading
+import time
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, AsyncIterator, Callable, Generator, Optional
+from log_writer import get_log_writer
+from evidence_encoder import estimate_tokens
+from metrics import REGISTRY, SIZE_BUCKETS
+from llm_backends import LLMBackend, LiveBackend, RecordingBackend, ReplayBackend, StubBackend
+from llm_resilience import ResilientCaller
+from config import (
+    GEMINI_MODEL, GEMINI_BASE_URL, LLM_MAX_CONCURRENCY,
+    LLM_REQUESTS_PER_MINUTE, LLM_TIMEOUT_SECONDS, LLM_COUNT_TOKENS_TIMEOUT_SECONDS,
+    LLM_BACKEND, LLM_CASSETTE, LLM_REPLAY_LATENCY
+)
+
+
+class AsyncRateLimiter:
+    """Token bucket allowing requests_per_minute calls, with bursts up to one second's worth"""
+
+    def __init__(self, requests_per_minute: int):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
 
 class GeminiClient:
-    def __init__(self, api_key: Optional[str] = None):
+    """
+    Asyncio-native Gemini client.
+
+    All calls run on one background event loop that owns the backend (a
+    pooled HTTP connection for live calls), a global concurrency semaphore
+    and a rate limiter. Use GeminiClient.shared() so every component goes
+    through the same client; call_llm() is a blocking wrapper for
+    synchronous callers.
+
+    The backend is chosen by LLM_BACKEND (or $SAMARTH_LLM_BACKEND): 'live',
+    'record' (live, saving prompt/response pairs to LLM_CASSETTE), 'replay'
+    (serve LLM_CASSETTE offline) or 'stub' (canned responses).
+
+    Every call goes through a ResilientCaller (deadline, retries, hedging,
+    circuit breaker). A call that still fails returns success False and an
+    error message instead of response text.
+    """
+
+    _shared: Dict[str, 'GeminiClient'] = {}
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, api_key: Optional[str] = None) -> 'GeminiClient':
+        """Process-wide client for this API key, created on first use"""
+        api_key = api_key or os.getenv('GEMINI_API_KEY')
+        with cls._shared_lock:
+            if api_key not in cls._shared:
+                cls._shared[api_key] = cls(api_key)
+            return cls._shared[api_key]
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: str = GEMINI_MODEL,
+        base_url: Optional[str] = None,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        requests_per_minute: int = LLM_REQUESTS_PER_MINUTE,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+        backend: Optional[LLMBackend] = None,
+        resilience: Optional[ResilientCaller] = None
+    ):
         """Initialize Gemini client"""
         self.api_key = api_key or os.getenv('GEMINI_API_KEY')
-        if not self.api_key:
-            raise ValueError("GEMINI_API_KEY not provided")
-        
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
-        
-        # Create logs directory
-        os.makedirs('llm_logs', exist_ok=True)
-    
+        self.model_name = model
+        self.base_url = base_url or os.getenv('GEMINI_BASE_URL', GEMINI_BASE_URL)
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.timeout = timeout
+        self.backend = backend or self._create_backend(os.getenv('SAMARTH_LLM_BACKEND', LLM_BACKEND))
+        self.resilience = resilience or ResilientCaller()
+
+        # Background event loop shared by sync and async callers
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='gemini-client', daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._setup(), self._loop).result()
+
+    def _create_backend(self, mode: str) -> LLMBackend:
+        cassette = os.getenv('SAMARTH_LLM_CASSETTE', LLM_CASSETTE)
+        latency = os.getenv('SAMARTH_LLM_LATENCY')
+        latency = float(latency) if latency else LLM_REPLAY_LATENCY
+        if mode == 'stub':
+            return StubBackend(latency=latency or 0.0)
+        if mode == 'replay':
+            return ReplayBackend.from_cassette(cassette, latency=latency)
+        live = LiveBackend(self.api_key, self.model_name, self.base_url, self.timeout, self.max_concurrency)
+        if mode == 'record':
+            return RecordingBackend(live, cassette)
+        if mode != 'live':
+            raise ValueError(f"Unknown LLM backend: {mode}")
+        return live
+
+    async def _setup(self):
+        """Create loop-bound resources on the client's own loop"""
+        await self.backend.start()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._rate_limiter = AsyncRateLimiter(self.requests_per_minute)
+
     def call_llm(self, prompt: str, call_type: str) -> Dict[str, Any]:
         """
-        Make a single LLM call and log everything
-        
+        Make a single LLM call and log everything (blocking)
+
         Args:
             prompt: Full XML-structured prompt
             call_type: 'query_generation' or 'answer_synthesis'
-        
+
         Returns:
-            Dict with response text and metadata
+            Dict with success, response text and metadata (error on failure)
         """
+        return asyncio.run_coroutine_threadsafe(self._call_llm(prompt, call_type), self._loop).result()
+
+    async def call_llm_async(self, prompt: str, call_type: str) -> Dict[str, Any]:
+        """Async version of call_llm; safe to await from any event loop"""
+        future = asyncio.run_coroutine_threadsafe(self._call_llm(prompt, call_type), self._loop)
+        return await asyncio.wrap_future(future)
+
+    def call_llm_stream(self, prompt: str, call_type: str) -> Generator[str, None, Dict[str, Any]]:
+        """
+        Streaming call_llm: yields response text chunks as they arrive
+
+        The generator's return value is the usual call_llm dict (success, full
+        response, log_id, timestamp) plus time_to_first_chunk_ms; the call is logged once
+        the stream finishes.
+        """
+        chunks: "queue.Queue[Optional[str]]" = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(
+            self._stream_llm(prompt, call_type, chunks.put), self._loop
+        )
+        finished = False
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is None:
+                    finished = True
+                    break
+                yield chunk
+        finally:
+            if not finished:
+                # Closed early: stop the upstream stream
+                future.cancel()
+        return future.result()
+
+    def count_tokens(self, text: str, timeout: float = LLM_COUNT_TOKENS_TIMEOUT_SECONDS) -> Optional[int]:
+        """
+        Exact token count from the model's tokenizer (countTokens), or None
+        when the backend has none, the call fails or it takes longer than
+        timeout (waiting for a concurrency slot and the rate limiter included)
+        """
+        future = asyncio.run_coroutine_threadsafe(
+            asyncio.wait_for(self._count_tokens(text), timeout), self._loop
+        )
+        try:
+            return future.result()
+        except Exception:
+            return None
+
+    def warmup(self) -> bool:
+        """
+        Resolve the model and open a pooled connection before the first call
+
+        Returns:
+            False (with a warning) if the backend could not reach the model
+        """
+        try:
+            asyncio.run_coroutine_threadsafe(self.backend.warmup(), self._loop).result(timeout=self.timeout)
+            return True
+        except Exception as e:
+            print(f"Warning: Model warmup failed: {type(e).__name__}: {str(e)}")
+            return False
+
+    def resilience_stats(self) -> Dict[str, Any]:
+        """Retry, hedge and circuit breaker counters"""
+        return asyncio.run_coroutine_threadsafe(self._resilience_stats(), self._loop).result()
+
+    async def _resilience_stats(self) -> Dict[str, Any]:
+        return self.resilience.stats()
+
+    def close(self):
+        """Close the backend and stop the background loop"""
+        asyncio.run_coroutine_threadsafe(self.backend.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    async def _call_llm(self, prompt: str, call_type: str) -> Dict[str, Any]:
         timestamp = datetime.now().isoformat()
         log_id = f"{call_type}_{timestamp.replace(':', '-')}"
-        
-        # Log input
-        input_log = {
+        started = time.perf_counter()
+
+        # Make LLM call (hedged duplicates share the caller's concurrency slot)
+        error = None
+        try:
+            async with self._semaphore:
+                response_text = await self.resilience.call(
+                    lambda: self._generate(prompt), key=call_type, hedge=self.backend.remote
+                )
+        except Exception as e:
+            response_text = ''
+            error = f"{type(e).__name__}: {str(e)}"
+
+        # Log input and output as one record, written in the background
+        get_log_writer().log({
+            'kind': 'llm_call',
+            'log_id': log_id,
             'timestamp': timestamp,
             'call_type': call_type,
+            'model': self.model_name,
+            'backend': self.backend.name,
             'prompt': prompt,
-            'model': 'gemini-1.5-flash'
+            'response': response_text,
+            'error': error,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+        })
+        self._record_metrics(call_type, prompt, response_text, error, time.perf_counter() - started)
+
+        result = {
+            'success': error is None,
+            'response': response_text,
+            'log_id': log_id,
+            'timestamp': timestamp
         }
-        
-        try:
-            with open(f'llm_logs/{log_id}_INPUT.json', 'w', encoding='utf-8') as f:
-                json.dump(input_log, f, indent=2, ensure_ascii=False)
-            
-            # Also save raw prompt
-            with open(f'llm_logs/{log_id}_INPUT_RAW.txt', 'w', encoding='utf-8') as f:
-                f.write(prompt)
-        except Exception as e:
-            print(f"Warning: Could not save input logs: {str(e)}")
-        
-        # Make LLM call
+        if error:
+            result['error'] = error
+        return result
+
+    def _record_metrics(self, call_type: str, prompt: str, response_text: str, error: Optional[str], seconds: float):
+        """Duration, outcome and (estimated) prompt/response tokens per call type"""
+        REGISTRY.histogram('samarth_llm_call_seconds', 'LLM call duration including retries and hedges', call_type=call_type).observe(seconds)
+        REGISTRY.counter('samarth_llm_calls_total', 'LLM calls by outcome', call_type=call_type, outcome='error' if error else 'ok').inc()
+        for direction, text in (('prompt', prompt), ('response', response_text)):
+            REGISTRY.histogram(
+                'samarth_llm_tokens', 'Estimated tokens per LLM call', unit=1, buckets=SIZE_BUCKETS,
+                call_type=call_type, direction=direction
+            ).observe(estimate_tokens(text))
+
+    async def _count_tokens(self, text: str) -> Optional[int]:
+        """countTokens counts against the same concurrency and rate limits as generation"""
+        async with self._semaphore:
+            if self.backend.remote:
+                await self._rate_limiter.acquire()
+            return await self.backend.count_tokens(text)
+
+    async def _generate(self, prompt: str) -> str:
+        """One upstream request"""
+        if self.backend.remote:
+            await self._rate_limiter.acquire()
+        return await self.backend.generate(prompt)
+
+    async def _open_stream(self, prompt: str) -> AsyncIterator[str]:
+        """One upstream streaming request"""
+        if self.backend.remote:
+            await self._rate_limiter.acquire()
+        async for chunk in self.backend.generate_stream(prompt):
+            yield chunk
+
+    async def _stream_llm(self, prompt: str, call_type: str, emit: Callable[[Optional[str]], None]) -> Dict[str, Any]:
+        """Run a streaming call on the loop, handing each chunk to emit (None marks the end)"""
+        timestamp = datetime.now().isoformat()
+        log_id = f"{call_type}_{timestamp.replace(':', '-')}"
+        started = time.perf_counter()
+        first_chunk_ms = None
+        chunks = []
+        error = None
+
         try:
-            response = self.model.generate_content(prompt)
-            
-            # Handle response safely
-            if response is None:
-                response_text = "Error: API returned None response"
-            elif hasattr(response, 'text') and response.text:
-                response_text = response.text
-            elif hasattr(response, 'parts') and response.parts and len(response.parts) > 0:
-                response_text = response.parts[0].text
-            elif hasattr(response, 'candidates') and response.candidates and len(response.candidates) > 0:
-                candidate = response.candidates[0]
-                if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
-                    response_text = candidate.content.parts[0].text
-                else:
-                    response_text = f"Error: Unable to extract text from response structure: {str(response)}"
-            else:
-                response_text = f"Error: Unexpected response format: {str(response)}"
+            async with self._semaphore:
+                async for chunk in self.resilience.stream(lambda: self._open_stream(prompt), key=call_type):
+                    if first_chunk_ms is None:
+                        first_chunk_ms = round((time.perf_counter() - started) * 1000, 1)
+                    chunks.append(chunk)
+                    emit(chunk)
         except Exception as e:
-            response_text = f"Error generating content: {str(e)}\nFull exception: {type(e).__name__}"
-        
-        # Log output
-        output_log = {
+            error = f"{type(e).__name__}: {str(e)}"
+        finally:
+            emit(None)
+
+        response_text = ''.join(chunks)
+        get_log_writer().log({
+            'kind': 'llm_call',
+            'log_id': log_id,
             'timestamp': timestamp,
             'call_type': call_type,
+            'model': self.model_name,
+            'backend': self.backend.name,
+            'streamed': True,
+            'prompt': prompt,
             'response': response_text,
-            'model': 'gemini-1.5-flash'
-        }
-        
-        try:
-            with open(f'llm_logs/{log_id}_OUTPUT.json', 'w', encoding='utf-8') as f:
-                json.dump(output_log, f, indent=2, ensure_ascii=False)
-            
-            # Also save raw response
-            with open(f'llm_logs/{log_id}_OUTPUT_RAW.txt', 'w', encoding='utf-8') as f:
-                f.write(response_text)
-        except Exception as e:
-            print(f"Warning: Could not save output logs: {str(e)}")
-        
-        return {
+            'error': error,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+            'time_to_first_chunk_ms': first_chunk_ms
+        })
+        self._record_metrics(call_type, prompt, response_text, error, time.perf_counter() - started)
+
+        result = {
+            'success': error is None,
             'response': response_text,
             'log_id': log_id,
-            'timestamp': timestamp
+            'timestamp': timestamp,
+            'time_to_first_chunk_ms': first_chunk_ms
         }
-
+        if error:
+            result['error'] = error
+        return result
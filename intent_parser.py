@@ -0,0 +1,254 @@
+"""
+Intent Parser for Project Samarth
+Deterministic fast path that writes pandas code for common question shapes without LLM Call #1
+"""
+
+import re
+import threading
+from typing import Dict, Any, Callable, List, Optional, Set
+from data_loader import AgriculturalDataLoader
+from entity_vocabulary import EntityVocabulary
+from config import INTENT_PARSER
+
+# Slot in the question skeleton, e.g. "how many mandis are there in {state}"
+SLOT = r"\{(?P<slot>state|district|crop)\}"
+
+COUNT_MANDIS_PATTERNS = [
+    re.compile(
+        r"^(?:how many|number of|count(?: of)?|total number of|count the) (?:agmark )?(?:mandis|mandi|markets|apmc markets|apmcs)"
+        r"(?: are there| are| exist| there are)? (?:in|at|within) (?:the )?(?:state of |district of )?" + SLOT + r"(?: state| district)?$"
+    ),
+    re.compile(r"^how many (?:mandis|markets|apmcs) (?:does|do) (?:the )?(?:state of |district of )?" + SLOT + r"(?: state| district)? have$"),
+]
+
+LIST_DISTRICTS_PATTERNS = [
+    re.compile(
+        r"^(?:list|show|name|give me|get|what are|which are)?(?: me)?(?: all| the)* districts (?:are )?(?:in|of) (?:the )?(?:state of )?"
+        + SLOT + r"(?: state)?$"
+    ),
+    re.compile(r"^which districts are (?:there )?in (?:the )?(?:state of )?" + SLOT + r"(?: state)?$"),
+]
+
+NEIGHBOURS_PATTERNS = [
+    re.compile(
+        r"^(?:list|show|name|give me|get|what are|which are)?(?: me)?(?: all| the)* "
+        r"(?:neighbou?ring districts|neighbou?rs|neighbou?r districts|districts neighbou?ring|districts bordering|bordering districts|adjacent districts|districts adjacent to)"
+        r"(?: of| to| for)? (?:the )?(?:district )?" + SLOT + r"(?: district)?$"
+    ),
+    re.compile(r"^which districts (?:border|neighbou?r|are adjacent to|are next to|are neighbou?rs of) (?:the )?(?:district )?" + SLOT + r"(?: district)?$"),
+]
+
+CROP_TYPE_PATTERNS = [
+    re.compile(r"^(?:list|show|name|give me|get|what are|which are)?(?: me)?(?: all| the)* (?P<type>[a-z ]+?) crops$"),
+    re.compile(r"^(?:list|show|name|give me|get|what are|which are)?(?: me)?(?: all| the)* crops (?:of|in) (?:the )?(?:type|category) (?P<type>[a-z ]+)$"),
+    re.compile(r"^which crops are (?P<type>[a-z ]+)$"),
+]
+
+# Everyday names for the English 'Type Meanings' of agmark_crops crop types
+CROP_TYPE_SYNONYMS = {
+    'pulse': 'dal', 'pulses': 'dal', 'lentil': 'dal', 'lentils': 'dal',
+    'vegetable': 'vegetables', 'fruit': 'fruits', 'flower': 'flowers',
+    'spice': 'spices', 'grain': 'grains', 'cereal': 'grains', 'cereals': 'grains',
+    'oilseed': 'seeds', 'oilseeds': 'seeds', 'seed': 'seeds',
+    'dry fruit': 'dry fruits', 'medicinal': 'medicinal', 'medicine': 'medicinal'
+}
+
+
+class IntentParser:
+    """
+    Recognizes a few high-traffic question shapes over the entity vocabulary:
+    mandi counts for a state or district, districts of a state, neighbours of
+    a district, and crops of a type. A recognized question gets ready-made
+    pandas code, so LLM Call #1 is skipped entirely.
+
+    The whole question must match a shape, and the entity must exist in the
+    dataset the code reads (by its own spelling there); otherwise parse()
+    returns None and the question goes to the LLM as usual.
+    """
+
+    def __init__(self, vocabulary: EntityVocabulary, data_loader: AgriculturalDataLoader, enabled: bool = INTENT_PARSER):
+        self.vocabulary = vocabulary
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self.mandi_states = self._known_values(data_loader, 'agmark_mandis_and_locations', ['State Name'])
+        self.mandi_districts = self._known_values(data_loader, 'agmark_mandis_and_locations', ['District Name - Agmark'])
+        self.hierarchy_states = self._known_values(data_loader, 'location_hierarchy', ['State Name'])
+
+        # The neighbour map keeps its real header in the first data row
+        neighbours_df = data_loader.get_dataframe('district_neighbour_map_india')
+        self.neighbour_districts: Set[str] = set()
+        if neighbours_df is not None and neighbours_df.shape[1] > 2:
+            district_cells = neighbours_df.iloc[1:, 1:].to_numpy().ravel()
+            self.neighbour_districts = {str(v).strip().lower() for v in district_cells if isinstance(v, str) and v.strip()}
+
+        # English crop type -> the (Hindi) value stored in 'Crop Type'
+        self.crop_types: Dict[str, str] = {}
+        crops_df = data_loader.get_dataframe('agmark_crops')
+        if crops_df is not None and {'Crop Types', 'Type Meanings'} <= set(crops_df.columns):
+            for hindi, meaning in crops_df[['Crop Types', 'Type Meanings']].dropna().itertuples(index=False):
+                meaning = str(meaning).strip().lower()
+                if meaning != 'ignore':
+                    self.crop_types[meaning] = str(hindi).strip()
+
+        self._intents: List[Callable[[str, Dict[str, str]], Optional[Dict[str, Any]]]] = [
+            self._count_mandis, self._list_districts, self._neighbours
+        ]
+
+    def parse(self, question: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns:
+            Dict with intent, query_code and relevant_datasets, or None when
+            the question is not one of the known shapes
+        """
+        parsed = self._parse(question) if self.enabled else None
+        with self._lock:
+            if parsed is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return parsed
+
+    def stats(self) -> Dict[str, Any]:
+        """How often LLM Call #1 was skipped"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 3) if total else 0.0
+            }
+
+    def _parse(self, question: str) -> Optional[Dict[str, Any]]:
+        normalized = self._normalize(question)
+        crop_type = self._crop_type(normalized)
+        if crop_type is not None:
+            return crop_type
+
+        mentions = self.vocabulary.find_mentions(question)
+        if len(mentions) != 1:
+            return None
+        mention = mentions[0]
+        skeleton = self._normalize(
+            question[:mention.start] + ' {' + mention.entity_type + '} ' + question[mention.end:]
+        )
+        # Both spellings: as typed, and as first seen in the data
+        names = {
+            'typed': self._normalize(question[mention.start:mention.end]),
+            'canonical': mention.value.strip().lower()
+        }
+        for intent in self._intents:
+            parsed = intent(skeleton, names)
+            if parsed is not None:
+                return parsed
+        return None
+
+    def _count_mandis(self, skeleton: str, names: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        match = self._match(COUNT_MANDIS_PATTERNS, skeleton)
+        if match is None:
+            return None
+        if match.group('slot') == 'state':
+            column, known = 'State Name', self.mandi_states
+        elif match.group('slot') == 'district':
+            column, known = 'District Name - Agmark', self.mandi_districts
+        else:
+            return None
+        name = self._resolve(names, known)
+        if name is None:
+            return None
+        code = (
+            "mandis_df = data_loader.get_dataframe('agmark_mandis_and_locations')\n"
+            f"result = int((mandis_df[{column!r}].str.strip().str.lower() == {name!r}).sum())"
+        )
+        return self._parsed('count_mandis', code, ['agmark_mandis_and_locations'])
+
+    def _list_districts(self, skeleton: str, names: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        match = self._match(LIST_DISTRICTS_PATTERNS, skeleton)
+        if match is None or match.group('slot') != 'state':
+            return None
+        name = self._resolve(names, self.hierarchy_states)
+        if name is None:
+            return None
+        code = (
+            "locations_df = data_loader.get_dataframe('location_hierarchy')\n"
+            f"in_state = locations_df[locations_df['State Name'].str.strip().str.lower() == {name!r}]\n"
+            "result = in_state['District Name'].dropna().str.strip().drop_duplicates().sort_values().reset_index(drop=True)"
+        )
+        return self._parsed('list_districts', code, ['location_hierarchy'])
+
+    def _neighbours(self, skeleton: str, names: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        match = self._match(NEIGHBOURS_PATTERNS, skeleton)
+        if match is None or match.group('slot') == 'crop':
+            return None
+        name = self._resolve(names, self.neighbour_districts)
+        if name is None:
+            return None
+        # Column 1 is the main district, columns 2+ its neighbours; the relation
+        # is read both ways since not every pair is listed from both sides
+        code = (
+            "neighbours_df = data_loader.get_dataframe('district_neighbour_map_india').iloc[1:]\n"
+            "districts = neighbours_df.iloc[:, 1:].apply(lambda col: col.str.strip())\n"
+            "lowered = districts.apply(lambda col: col.str.lower())\n"
+            f"target = {name!r}\n"
+            "as_main = districts[lowered.iloc[:, 0] == target].iloc[:, 1:].to_numpy().ravel()\n"
+            "as_neighbour = districts[(lowered.iloc[:, 1:] == target).any(axis=1)].iloc[:, 0].to_numpy()\n"
+            "found = {name for name in list(as_main) + list(as_neighbour) if isinstance(name, str) and name.lower() != target}\n"
+            "result = pd.Series(sorted(found), name='Neighbouring District')"
+        )
+        return self._parsed('district_neighbours', code, ['district_neighbour_map_india'])
+
+    def _crop_type(self, normalized: str) -> Optional[Dict[str, Any]]:
+        match = self._match(CROP_TYPE_PATTERNS, normalized)
+        if match is None:
+            return None
+        requested = match.group('type').strip()
+        requested = CROP_TYPE_SYNONYMS.get(requested, requested)
+        hindi = self.crop_types.get(requested)
+        if hindi is None:
+            return None
+        code = (
+            "crops_df = data_loader.get_dataframe('agmark_crops')\n"
+            f"of_type = crops_df[crops_df['Crop Type'].str.strip() == {hindi!r}]\n"
+            "result = of_type['Crop Name - Cleaned'].dropna().str.strip().drop_duplicates().sort_values().reset_index(drop=True)"
+        )
+        return self._parsed('crops_of_type', code, ['agmark_crops'])
+
+    def _parsed(self, intent: str, query_code: str, relevant_datasets: List[str]) -> Dict[str, Any]:
+        return {
+            'intent': intent,
+            'query_code': query_code,
+            'relevant_datasets': relevant_datasets
+        }
+
+    def _match(self, patterns: List["re.Pattern"], text: str) -> Optional["re.Match"]:
+        for pattern in patterns:
+            match = pattern.match(text)
+            if match:
+                return match
+        return None
+
+    def _resolve(self, names: Dict[str, str], known: Set[str]) -> Optional[str]:
+        """The entity's spelling as stored in the target dataset, if it is there at all"""
+        for name in (names['typed'], names['canonical']):
+            if name in known:
+                return name
+        return None
+
+    def _known_values(self, data_loader: AgriculturalDataLoader, name: str, columns: List[str]) -> Set[str]:
+        df = data_loader.get_dataframe(name)
+        values = set()
+        if df is None:
+            return values
+        for column in columns:
+            if column in df.columns:
+                values.update(df[column].dropna().astype(str).str.strip().str.lower())
+        return values
+
+    def _normalize(self, text: str) -> str:
+        """Lowercase, no punctuation except slot braces, single spaces"""
+        text = re.sub(r"[^\w\s{}&.'-]", ' ', text.lower())
+        text = re.sub(r"(?<!\w)[.'-]+|[.'-]+(?!\w)", ' ', text)
+        return re.sub(r"\s+", ' ', text).strip()
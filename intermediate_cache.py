@@ -0,0 +1,404 @@
+"""
+Intermediate Cache for Project Samarth
+Frames many queries rebuild (mandi counts per state, the districts of the
+location hierarchy, ...) are computed once per data version and shared
+"""
+
+import ast
+import copy
+import dis
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+from types import CodeType, ModuleType
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple, Union
+import numpy as np
+import pandas as pd
+from metrics import REGISTRY
+from config import INTERMEDIATE_CACHE_MAX_BYTES, INTERMEDIATE_CACHE_PROMOTE_AFTER, INTERMEDIATE_CACHE_TRACKED
+
+# Operations worth materializing (aggregations, deduplication, joins): a
+# subexpression is only counted if it contains one of these
+CSE_OPERATIONS = {
+    'size', 'count', 'sum', 'mean', 'median', 'min', 'max', 'std', 'var',
+    'nunique', 'first', 'last', 'agg', 'aggregate', 'prod',
+    'drop_duplicates', 'merge', 'join', 'concat', 'value_counts', 'unique',
+    'pivot_table', 'crosstab', 'explode'
+}
+
+# Calls whose result differs from run to run
+NONDETERMINISTIC = {'sample', 'now', 'today', 'utcnow'}
+
+# Methods that change the object they are called on
+MUTATING_METHODS = {'insert', 'pop', 'update', 'append', 'extend', 'clear', 'remove', 'sort', 'setdefault'}
+
+# Names a subexpression may read without depending on the snippet's own state
+CLOSED_NAMES = {'data_loader', 'pd'}
+
+# Expression nodes a shared subexpression may be built from; anything else
+# (lambdas, comprehensions, walrus) has its own scope or side effects
+CLOSED_NODES = (
+    ast.Constant, ast.Name, ast.Attribute, ast.Subscript, ast.Call, ast.keyword,
+    ast.Slice, ast.Tuple, ast.List, ast.Dict, ast.Set, ast.Compare, ast.BinOp,
+    ast.UnaryOp, ast.BoolOp, ast.IfExp,
+    ast.operator, ast.cmpop, ast.boolop, ast.unaryop, ast.expr_context
+)
+
+LITERAL_TYPES = (str, int, float, bool, type(None))
+
+
+class IntermediateCache:
+    """
+    LRU of computed intermediates under a byte budget.
+
+    get_or_compute() runs fn once per key: concurrent callers for a key
+    being computed wait for it instead of computing it again. Frames and
+    other mutable values are handed out as copies (shallow for pandas
+    objects, which copy-on-write keeps safe), so a query changing what it
+    got back never changes the cached value. Values larger than the whole
+    budget are returned but not kept.
+    """
+
+    def __init__(self, max_bytes: int = INTERMEDIATE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._computing: Dict[Hashable, threading.Lock] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'stored': 0, 'evicted': 0, 'too_large': 0}
+
+    def get_or_compute(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Cached value for key, computing and storing fn() on a miss"""
+        value = self._lookup(key)
+        if value is not None:
+            return value
+        with self._lock:
+            computing = self._computing.setdefault(key, threading.Lock())
+        try:
+            with computing:
+                # Another caller may have stored it while we waited
+                value = self._lookup(key, count_miss=True)
+                if value is not None:
+                    return value
+                value = fn()
+                if value is None:
+                    return None
+                # The caller gets a copy like everyone else, so it cannot change what was stored
+                self._store(key, value)
+                return _share(value)
+        finally:
+            with self._lock:
+                self._computing.pop(key, None)
+
+    def clear(self):
+        """Drop every entry (e.g. the data was reloaded)"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit ratio, entries and memory held"""
+        with self._lock:
+            lookups = self.counters['hits'] + self.counters['misses']
+            return {
+                **self.counters,
+                'hit_ratio': round(self.counters['hits'] / lookups, 3) if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes
+            }
+
+    def _lookup(self, key: Hashable, count_miss: bool = False) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.counters['hits'] += 1
+            elif count_miss:
+                self.counters['misses'] += 1
+        if entry is not None or count_miss:
+            REGISTRY.counter('samarth_cache_lookups_total', 'Cache lookups by cache and result', cache='intermediate', result='hit' if entry is not None else 'miss').inc()
+        return _share(entry[0]) if entry is not None else None
+
+    def _store(self, key: Hashable, value: Any):
+        size = _size_of(value)
+        with self._lock:
+            if size > self.max_bytes:
+                self.counters['too_large'] += 1
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            self.counters['stored'] += 1
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.counters['evicted'] += 1
+
+
+def _share(value: Any) -> Any:
+    """A copy of a cached value that the caller may change freely"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=False)
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    if isinstance(value, (list, dict, set)):
+        return copy.copy(value)
+    return value
+
+
+def _size_of(value: Any) -> int:
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    return sys.getsizeof(value)
+
+
+def function_fingerprint(fn: Callable[[], Any], shared: Tuple[type, ...] = ()) -> Optional[str]:
+    """
+    Hash of what fn computes: its bytecode and constants, plus the values
+    of its closure variables and defaults
+
+    Returns None unless fn reads only literals, modules, builtins and
+    globals whose values are instances of shared (the data loader), since
+    anything else (a frame the query filtered earlier) could make the same
+    function compute something different next time.
+    """
+    code = getattr(fn, '__code__', None)
+    if code is None:
+        return None
+    fn_globals = getattr(fn, '__globals__', {})
+    for name in _global_names(code):
+        if name in fn_globals and not isinstance(fn_globals[name], shared + (ModuleType,)):
+            return None
+    values = [cell.cell_contents for cell in fn.__closure__ or ()]
+    values += list(fn.__defaults__ or ()) + sorted((fn.__kwdefaults__ or {}).items())
+    if not all(_is_literal(value) for value in values):
+        return None
+    return hashlib.sha1(repr((_code_key(code), values)).encode('utf-8')).hexdigest()
+
+
+def _global_names(code: CodeType) -> Set[str]:
+    names = set()
+    for instruction in dis.get_instructions(code):
+        if instruction.opname in ('LOAD_GLOBAL', 'LOAD_NAME'):
+            names.add(instruction.argval)
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            names |= _global_names(const)
+    return names
+
+
+def _code_key(code: CodeType) -> Tuple:
+    consts = tuple(_code_key(const) if isinstance(const, CodeType) else repr(const) for const in code.co_consts)
+    return (code.co_code, code.co_names, consts)
+
+
+def _is_literal(value: Any) -> bool:
+    if isinstance(value, (tuple, frozenset)):
+        return all(_is_literal(item) for item in value)
+    return isinstance(value, LITERAL_TYPES)
+
+
+class CommonSubexpressions:
+    """
+    Finds subexpressions that different snippets compute alike and routes
+    them through the intermediate cache.
+
+    Each top-level statement is analysed in order. Variables bound to
+    expressions over the datasets are substituted, so that
+
+        m = data_loader.get_dataframe('agmark_mandis_and_locations')
+        counts = m.groupby('State Name').size()
+
+    and a later snippet's
+        data_loader.get_dataframe('agmark_mandis_and_locations').groupby('State Name').size().nlargest(5)
+
+    share the normalized AST of the groupby. Subexpressions that read only
+    the datasets (no other variables, nothing random) and contain an
+    operation from CSE_OPERATIONS are counted per snippet; once promote_after
+    snippets have computed one it is rewritten to
+    data_loader.cached_expression(digest, lambda: <expression>).
+
+    Analysis stops at the first statement that may mutate a frame (item or
+    attribute assignment, inplace=True, del, ...) or that is not a plain
+    assignment or expression, since later reads could then see changed data.
+    """
+
+    def __init__(self, promote_after: int = INTERMEDIATE_CACHE_PROMOTE_AFTER, max_tracked: int = INTERMEDIATE_CACHE_TRACKED):
+        self.promote_after = promote_after
+        self.max_tracked = max_tracked
+        self._seen: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {'snippets': 0, 'rewritten_snippets': 0, 'rewritten_expressions': 0}
+
+    def prepare(self, query_code: str) -> Union[str, CodeType]:
+        """
+        query_code, or its compiled rewrite if it computes a promoted
+        subexpression; either can be passed to exec()
+        """
+        try:
+            tree = ast.parse(query_code)
+        except SyntaxError:
+            # Let exec surface the syntax error
+            return query_code
+
+        statements: List[Tuple[ast.stmt, Dict[int, str]]] = []
+        env: Dict[str, ast.AST] = {}
+        for stmt in tree.body:
+            if self._mutates(stmt):
+                break
+            if isinstance(stmt, (ast.Import, ast.ImportFrom)):
+                for alias in stmt.names:
+                    env.pop((alias.asname or alias.name).split('.')[0], None)
+                continue
+            if not isinstance(stmt, (ast.Assign, ast.AnnAssign, ast.Expr)) or stmt.value is None:
+                break
+            digests: Dict[int, str] = {}
+            closed, _ = self._analyse(stmt.value, env, digests)
+            statements.append((stmt, digests))
+            targets = stmt.targets if isinstance(stmt, ast.Assign) else [getattr(stmt, 'target', None)]
+            for target in targets:
+                if isinstance(target, ast.Name) and closed is not None:
+                    env[target.id] = closed
+                elif target is not None:
+                    for node in ast.walk(target):
+                        if isinstance(node, ast.Name):
+                            env.pop(node.id, None)
+
+        promoted = self._count({digest for _, digests in statements for digest in digests.values()})
+        with self._lock:
+            self.counters['snippets'] += 1
+        if not promoted:
+            return query_code
+
+        rewritten = 0
+        for stmt, digests in statements:
+            rewriter = _Rewriter(digests, promoted)
+            stmt.value = rewriter.visit(stmt.value)
+            rewritten += rewriter.rewritten
+        if not rewritten:
+            return query_code
+        with self._lock:
+            self.counters['rewritten_snippets'] += 1
+            self.counters['rewritten_expressions'] += rewritten
+        return compile(ast.fix_missing_locations(tree), '<query>', 'exec')
+
+    def stats(self) -> Dict[str, Any]:
+        """Snippets analysed and how many reused a shared subexpression"""
+        with self._lock:
+            return {**self.counters, 'tracked': len(self._seen)}
+
+    def _count(self, digests: Set[str]) -> Set[str]:
+        """Count this snippet's subexpressions; returns those now promoted"""
+        promoted = set()
+        with self._lock:
+            for digest in digests:
+                self._seen[digest] = self._seen.get(digest, 0) + 1
+                self._seen.move_to_end(digest)
+                if self._seen[digest] >= self.promote_after:
+                    promoted.add(digest)
+            while len(self._seen) > self.max_tracked:
+                self._seen.popitem(last=False)
+        return promoted
+
+    def _analyse(self, node: ast.AST, env: Dict[str, ast.AST], digests: Dict[int, str]) -> Tuple[Optional[ast.AST], bool]:
+        """
+        Normalized form of node with variables substituted, or None if it
+        depends on anything but the datasets, and whether it contains an
+        operation worth caching. Candidates are recorded in digests by id(node)
+        """
+        if not isinstance(node, CLOSED_NODES):
+            return None, False
+        if isinstance(node, ast.Name):
+            if node.id in env:
+                return env[node.id], False
+            return (ast.Name(id=node.id, ctx=ast.Load()) if node.id in CLOSED_NAMES else None), False
+
+        fields = {}
+        closed, has_operation = True, False
+        for field, value in ast.iter_fields(node):
+            if isinstance(value, ast.AST):
+                value, child_operation = self._analyse(value, env, digests)
+                closed = closed and value is not None
+                has_operation = has_operation or child_operation
+            elif isinstance(value, list):
+                items = []
+                for item in value:
+                    if item is None:
+                        # e.g. the key of a **mapping in a dict display
+                        items.append(None)
+                        continue
+                    item, child_operation = self._analyse(item, env, digests)
+                    closed = closed and item is not None
+                    has_operation = has_operation or child_operation
+                    items.append(item)
+                value = items
+            fields[field] = value
+        if not closed:
+            return None, False
+
+        if isinstance(node, ast.Call):
+            name = node.func.attr if isinstance(node.func, ast.Attribute) else None
+            if name in NONDETERMINISTIC or any(kw.arg == 'inplace' for kw in node.keywords):
+                return None, False
+            fields['keywords'] = sorted(fields['keywords'], key=lambda kw: kw.arg or '')
+            has_operation = has_operation or name in CSE_OPERATIONS
+        normalized = type(node)(**fields)
+
+        if has_operation and isinstance(node, (ast.Call, ast.Subscript)):
+            digests[id(node)] = hashlib.sha1(ast.dump(normalized).encode('utf-8')).hexdigest()[:16]
+        return normalized, has_operation
+
+    def _mutates(self, stmt: ast.stmt) -> bool:
+        """Whether stmt may change a frame, or rebind a name subexpressions read"""
+        if isinstance(stmt, (ast.AugAssign, ast.Delete)):
+            return True
+        targets = stmt.targets if isinstance(stmt, ast.Assign) else [stmt.target] if isinstance(stmt, ast.AnnAssign) else []
+        for target in targets:
+            for node in ast.walk(target):
+                if isinstance(node, (ast.Subscript, ast.Attribute)):
+                    return True
+                if isinstance(node, ast.Name) and node.id in CLOSED_NAMES:
+                    return True
+        for node in ast.walk(stmt):
+            if isinstance(node, ast.NamedExpr):
+                return True
+            if isinstance(node, ast.Call):
+                if any(kw.arg == 'inplace' for kw in node.keywords):
+                    return True
+                if isinstance(node.func, ast.Attribute) and node.func.attr in MUTATING_METHODS:
+                    return True
+        return False
+
+
+class _Rewriter(ast.NodeTransformer):
+    """Replaces the outermost promoted subexpressions with cached lookups"""
+
+    def __init__(self, digests: Dict[int, str], promoted: Set[str]):
+        self.digests = digests
+        self.promoted = promoted
+        self.rewritten = 0
+
+    def visit(self, node: ast.AST) -> ast.AST:
+        digest = self.digests.get(id(node))
+        if digest not in self.promoted:
+            return super().visit(node)
+        self.rewritten += 1
+        lookup = ast.Call(
+            func=ast.Attribute(value=ast.Name(id='data_loader', ctx=ast.Load()), attr='cached_expression', ctx=ast.Load()),
+            args=[
+                ast.Constant(value=digest),
+                ast.Lambda(
+                    args=ast.arguments(posonlyargs=[], args=[], vararg=None, kwonlyargs=[], kw_defaults=[], kwarg=None, defaults=[]),
+                    body=node
+                )
+            ],
+            keywords=[]
+        )
+        return ast.copy_location(lookup, node)
@@ -0,0 +1,307 @@
+"""
+LLM Backends for Project Samarth
+Pluggable transports behind GeminiClient: live, record, replay and stub
+"""
+
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import threading
+import httpx
+from typing import Dict, Any, AsyncIterator, Optional
+from log_writer import read_log_records
+
+CANNED_QUERY = """<PANDAS_CODE>
+mandis_df = data_loader.get_dataframe('agmark_mandis_and_locations')
+result = len(mandis_df[mandis_df['State Name'].str.contains('Punjab', case=False)])
+</PANDAS_CODE>"""
+
+CANNED_ANSWER = """There are 349 mandis in Punjab.
+
+Sources:
+- Agmark Mandis and Locations Dataset"""
+
+
+class UnexpectedResponseError(Exception):
+    """
+    The upstream answered without usable text (no candidates, a blocked
+    prompt, empty parts). Not transient, so the call fails without retrying.
+    """
+
+
+def prompt_hash(prompt: str) -> str:
+    """Stable key for a prompt"""
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+
+async def _stream_text(text: str, latency: float, chunk_words: int = 4) -> AsyncIterator[str]:
+    """Yield text a few words at a time, spreading latency across the chunks"""
+    words = text.split(' ')
+    chunks = [' '.join(words[i:i + chunk_words]) for i in range(0, len(words), chunk_words)]
+    for i, chunk in enumerate(chunks):
+        if latency:
+            await asyncio.sleep(latency / len(chunks))
+        yield chunk if i == len(chunks) - 1 else chunk + ' '
+
+
+class LLMBackend:
+    """
+    Turns a prompt into response text. Raises on failure; GeminiClient
+    handles limiting, logging and error reporting around it.
+    """
+
+    name = 'base'
+    # Remote backends count against the API rate limit
+    remote = False
+
+    async def start(self):
+        """Create loop-bound resources (called on the client's event loop)"""
+
+    async def generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    async def generate_stream(self, prompt: str) -> AsyncIterator[str]:
+        """Yield response text in chunks as it arrives (default: all at once)"""
+        yield await self.generate(prompt)
+
+    async def count_tokens(self, text: str) -> Optional[int]:
+        """The model's token count for text, or None if this backend has no tokenizer"""
+        return None
+
+    async def warmup(self):
+        """Resolve the model and open connections ahead of the first call (raises if the model is unusable)"""
+
+    async def close(self):
+        """Release resources (called on the client's event loop)"""
+
+
+class LiveBackend(LLMBackend):
+    """Gemini generateContent over REST, through one pooled HTTP client"""
+
+    name = 'live'
+    remote = True
+
+    def __init__(self, api_key: str, model: str, base_url: str, timeout: float, max_connections: int):
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY not provided")
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._http: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        self._http = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={'x-goog-api-key': self.api_key},
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections
+            )
+        )
+
+    async def generate(self, prompt: str) -> str:
+        response = await self._http.post(
+            f"/models/{self.model}:generateContent",
+            json={'contents': [{'role': 'user', 'parts': [{'text': prompt}]}]}
+        )
+        response.raise_for_status()
+        return self._extract_text(response.json())
+
+    async def generate_stream(self, prompt: str) -> AsyncIterator[str]:
+        """streamGenerateContent as server-sent events, one text chunk per event"""
+        async with self._http.stream(
+            'POST',
+            f"/models/{self.model}:streamGenerateContent",
+            params={'alt': 'sse'},
+            json={'contents': [{'role': 'user', 'parts': [{'text': prompt}]}]}
+        ) as response:
+            response.raise_for_status()
+            payload = None
+            streamed = False
+            async for line in response.aiter_lines():
+                if not line.startswith('data:'):
+                    continue
+                payload = json.loads(line[len('data:'):].strip())
+                for candidate in payload.get('candidates', [])[:1]:
+                    text = ''.join(part.get('text', '') for part in (candidate.get('content') or {}).get('parts', []))
+                    if text:
+                        streamed = True
+                        yield text
+            if not streamed:
+                raise UnexpectedResponseError(f"Stream ended without text: {json.dumps(payload)[:500]}")
+
+    async def warmup(self):
+        """models.get: checks key and model name, and leaves a pooled connection open"""
+        response = await self._http.get(f"/models/{self.model}")
+        response.raise_for_status()
+
+    async def count_tokens(self, text: str) -> Optional[int]:
+        response = await self._http.post(
+            f"/models/{self.model}:countTokens",
+            json={'contents': [{'role': 'user', 'parts': [{'text': text}]}]}
+        )
+        response.raise_for_status()
+        return response.json().get('totalTokens')
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+
+    def _extract_text(self, payload: Dict[str, Any]) -> str:
+        """Join the text parts of the first candidate; raises UnexpectedResponseError if there are none"""
+        if not payload:
+            raise UnexpectedResponseError("API returned an empty response")
+        candidates = payload.get('candidates') or []
+        if not candidates:
+            raise UnexpectedResponseError(f"Unexpected response format: {json.dumps(payload)[:500]}")
+        parts = (candidates[0].get('content') or {}).get('parts') or []
+        text = ''.join(part.get('text', '') for part in parts)
+        if not text:
+            raise UnexpectedResponseError(f"Unable to extract text from response structure: {json.dumps(candidates[0])[:500]}")
+        return text
+
+
+class RecordingBackend(LLMBackend):
+    """Passes calls to another backend and appends each prompt/response pair to a cassette"""
+
+    name = 'record'
+    remote = True
+
+    def __init__(self, inner: LLMBackend, cassette_path: str):
+        self.inner = inner
+        self.cassette_path = cassette_path
+        self._lock = threading.Lock()
+
+    async def start(self):
+        await self.inner.start()
+
+    async def generate(self, prompt: str) -> str:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        response = await self.inner.generate(prompt)
+        self._record(prompt, response, loop.time() - started)
+        return response
+
+    async def generate_stream(self, prompt: str) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        chunks = []
+        async for chunk in self.inner.generate_stream(prompt):
+            chunks.append(chunk)
+            yield chunk
+        self._record(prompt, ''.join(chunks), loop.time() - started)
+
+    async def count_tokens(self, text: str) -> Optional[int]:
+        return await self.inner.count_tokens(text)
+
+    async def warmup(self):
+        await self.inner.warmup()
+
+    def _record(self, prompt: str, response: str, seconds: float):
+        entry = {
+            'prompt_hash': prompt_hash(prompt),
+            'prompt': prompt,
+            'response': response,
+            'duration_ms': round(seconds * 1000, 1)
+        }
+        with self._lock:
+            with open(self.cassette_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+    async def close(self):
+        await self.inner.close()
+
+
+class ReplayBackend(LLMBackend):
+    """
+    Serves recorded responses by prompt hash, after a simulated latency:
+    a fixed number of seconds, or the recorded duration when latency is None.
+    Unknown prompts raise KeyError, so replays never silently diverge.
+    """
+
+    name = 'replay'
+
+    def __init__(self, latency: Optional[float] = 0.0):
+        self.latency = latency
+        self.responses: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def from_cassette(cls, path: str, latency: Optional[float] = 0.0) -> 'ReplayBackend':
+        backend = cls(latency)
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    backend.add(entry['prompt'], entry['response'], entry.get('duration_ms'))
+        return backend
+
+    @classmethod
+    def from_logs(cls, log_dir: str, latency: Optional[float] = 0.0) -> 'ReplayBackend':
+        """Build from llm_call records in log segments, plus legacy *_INPUT.json/*_OUTPUT.json pairs"""
+        backend = cls(latency)
+        for record in read_log_records(log_dir, kind='llm_call'):
+            if not record.get('error') and not record['response'].startswith('Error'):
+                backend.add(record['prompt'], record['response'], record.get('duration_ms'))
+
+        for input_path in glob.glob(os.path.join(log_dir, '*_INPUT.json')):
+            output_path = input_path[:-len('_INPUT.json')] + '_OUTPUT.json'
+            if not os.path.exists(output_path):
+                continue
+            with open(input_path, encoding='utf-8') as f:
+                prompt = json.load(f)['prompt']
+            with open(output_path, encoding='utf-8') as f:
+                response = json.load(f)['response']
+            if not response.startswith('Error'):
+                backend.add(prompt, response)
+        return backend
+
+    def add(self, prompt: str, response: str, duration_ms: Optional[float] = None):
+        self.responses[prompt_hash(prompt)] = {'response': response, 'duration_ms': duration_ms}
+
+    async def generate(self, prompt: str) -> str:
+        response, delay = self._lookup(prompt)
+        if delay:
+            await asyncio.sleep(delay)
+        return response
+
+    async def generate_stream(self, prompt: str) -> AsyncIterator[str]:
+        response, delay = self._lookup(prompt)
+        async for chunk in _stream_text(response, delay):
+            yield chunk
+
+    def _lookup(self, prompt: str):
+        entry = self.responses.get(prompt_hash(prompt))
+        if entry is None:
+            raise KeyError(f"No recorded response for prompt {prompt_hash(prompt)[:12]}")
+        delay = self.latency
+        if delay is None:
+            delay = (entry['duration_ms'] or 0) / 1000
+        return entry['response'], delay
+
+
+class StubBackend(LLMBackend):
+    """Canned responses: a fixed query for query generation prompts, a fixed answer otherwise"""
+
+    name = 'stub'
+
+    def __init__(self, latency: float = 0.0, query_response: str = CANNED_QUERY, answer_response: str = CANNED_ANSWER):
+        self.latency = latency
+        self.query_response = query_response
+        self.answer_response = answer_response
+
+    async def generate(self, prompt: str) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._response(prompt)
+
+    async def generate_stream(self, prompt: str) -> AsyncIterator[str]:
+        async for chunk in _stream_text(self._response(prompt), self.latency):
+            yield chunk
+
+    def _response(self, prompt: str) -> str:
+        return self.query_response if '<PANDAS_CODE>' in prompt else self.answer_response
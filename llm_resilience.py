@@ -0,0 +1,306 @@
+"""
+LLM Resilience for Project Samarth
+Deadlines, jittered retries, hedged requests and a circuit breaker around LLM calls
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, Deque, Optional
+import httpx
+from config import (
+    LLM_DEADLINE_SECONDS, LLM_MAX_RETRIES, LLM_RETRY_BASE_SECONDS, LLM_RETRY_MAX_SECONDS,
+    LLM_HEDGE_PERCENTILE, LLM_HEDGE_MIN_SAMPLES, LLM_HEDGE_MIN_DELAY_SECONDS,
+    LLM_BREAKER_FAILURES, LLM_BREAKER_RESET_SECONDS
+)
+
+# Upstream statuses worth retrying; anything else (400, 403, ...) will not get better
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised without contacting the upstream while the circuit breaker is open"""
+
+
+class DeadlineExceeded(Exception):
+    """The call (including retries and hedges) ran past its deadline"""
+
+
+def is_transient(error: BaseException) -> bool:
+    """Timeouts, connection failures and retryable HTTP statuses"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in TRANSIENT_STATUS_CODES
+    return isinstance(error, (httpx.TransportError, asyncio.TimeoutError, ConnectionError))
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive transient failures and rejects
+    calls for reset_seconds. Then one probe is let through (half-open): success
+    closes the breaker, failure opens it again. Only used from the client's
+    event loop, so it needs no lock.
+    """
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURES, reset_seconds: float = LLM_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == 'closed':
+            return True
+        if self.state == 'open':
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                return False
+            self.state = 'half_open'
+            self._probe_in_flight = False
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def retry_in(self) -> float:
+        """Seconds until an open breaker lets a probe through"""
+        return max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        self.state = 'closed'
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == 'half_open' or self.failures >= self.failure_threshold:
+            self.state = 'open'
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """The call ended without saying anything about upstream health"""
+        self._probe_in_flight = False
+
+
+class LatencyTracker:
+    """Durations of recent successful requests, for percentile-based hedge delays"""
+
+    def __init__(self, window: int = 200):
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float, min_samples: int = 1) -> Optional[float]:
+        if len(self.samples) < max(1, min_samples):
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class ResilientCaller:
+    """
+    Wraps one logical LLM call:
+    - a deadline covering every attempt, hedge and backoff sleep
+    - up to max_retries retries of transient errors, with full-jitter
+      exponential backoff
+    - a hedged duplicate request when the first has not answered within the
+      recent p95 latency for this call type (first success wins, the loser is
+      cancelled)
+    - a circuit breaker that fails fast while the upstream is down
+
+    Non-transient errors are raised at once without retrying.
+    """
+
+    def __init__(
+        self,
+        deadline: float = LLM_DEADLINE_SECONDS,
+        max_retries: int = LLM_MAX_RETRIES,
+        retry_base: float = LLM_RETRY_BASE_SECONDS,
+        retry_max: float = LLM_RETRY_MAX_SECONDS,
+        hedge_percentile: Optional[float] = LLM_HEDGE_PERCENTILE,
+        hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES,
+        hedge_min_delay: float = LLM_HEDGE_MIN_DELAY_SECONDS,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        # None disables hedging
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.latencies: Dict[str, LatencyTracker] = {}
+        self.counters = {
+            'calls': 0, 'retries': 0, 'hedges': 0, 'hedge_wins': 0,
+            'breaker_rejections': 0, 'deadline_exceeded': 0
+        }
+
+    async def call(self, attempt: Callable[[], Awaitable[str]], key: str = 'default', hedge: bool = True) -> str:
+        """
+        Run attempt() under the full policy
+
+        Args:
+            attempt: Makes one upstream request (called again for retries and hedges)
+            key: Latency bucket, e.g. the call type
+            hedge: Allow hedged duplicates (pointless for local backends)
+        """
+        self.counters['calls'] += 1
+        return await self._call(attempt, key, hedge)
+
+    async def stream(self, open_stream: Callable[[], AsyncIterator[str]], key: str = 'default') -> AsyncIterator[str]:
+        """
+        Streaming counterpart of call(): retries only until the first chunk has
+        been yielded (a partial answer cannot be taken back), and never hedges
+        """
+        self.counters['calls'] += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        for attempt_no in range(self.max_retries + 1):
+            self._check_breaker()
+            yielded = False
+            started = time.perf_counter()
+            iterator = open_stream().__aiter__()
+            try:
+                while True:
+                    remaining = deadline - loop.time()
+                    try:
+                        if remaining <= 0:
+                            raise asyncio.TimeoutError()
+                        chunk = await asyncio.wait_for(iterator.__anext__(), remaining)
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        self.counters['deadline_exceeded'] += 1
+                        self.breaker.record_failure()
+                        raise DeadlineExceeded(f"LLM call exceeded its {self.deadline}s deadline")
+                    yielded = True
+                    yield chunk
+            except (asyncio.CancelledError, GeneratorExit):
+                # Cancelled, or the consumer stopped reading: says nothing about upstream health
+                self.breaker.release()
+                raise
+            except Exception as e:
+                if isinstance(e, DeadlineExceeded):
+                    raise
+                if yielded or not is_transient(e):
+                    self.breaker.release()
+                    raise
+                self.breaker.record_failure()
+                await self._backoff(attempt_no, e, deadline - loop.time())
+                continue
+            finally:
+                if hasattr(iterator, 'aclose'):
+                    await iterator.aclose()
+            self.breaker.record_success()
+            self._tracker(key).add(time.perf_counter() - started)
+            return
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters, breaker state and current hedge delays"""
+        return {
+            **self.counters,
+            'breaker_state': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+            'hedge_delay_seconds': {key: self._hedge_delay(key) for key in self.latencies}
+        }
+
+    async def _call(self, attempt: Callable[[], Awaitable[str]], key: str, hedge: bool) -> str:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        for attempt_no in range(self.max_retries + 1):
+            self._check_breaker()
+            # The attempt runs as a task so that running out of time and being
+            # cancelled both reach the breaker (a half-open probe is never left
+            # in flight); backoff sleeps never cross the deadline
+            pending = asyncio.ensure_future(self._hedged(attempt, key, hedge and self.breaker.state == 'closed'))
+            try:
+                done, _ = await asyncio.wait({pending}, timeout=max(0.0, deadline - loop.time()))
+            except asyncio.CancelledError:
+                pending.cancel()
+                self.breaker.release()
+                raise
+            if not done:
+                pending.cancel()
+                self.counters['deadline_exceeded'] += 1
+                self.breaker.record_failure()
+                raise DeadlineExceeded(f"LLM call exceeded its {self.deadline}s deadline")
+            try:
+                text = pending.result()
+            except Exception as e:
+                if not is_transient(e):
+                    self.breaker.release()
+                    raise
+                self.breaker.record_failure()
+                await self._backoff(attempt_no, e, deadline - loop.time())
+                continue
+            self.breaker.record_success()
+            return text
+
+    async def _hedged(self, attempt: Callable[[], Awaitable[str]], key: str, hedge: bool) -> str:
+        """One attempt; a duplicate request is raced against it once it runs past the hedge delay"""
+        delay = self._hedge_delay(key) if hedge else None
+        primary = asyncio.ensure_future(self._timed(attempt, key))
+        tasks = [primary]
+        try:
+            if delay is None:
+                return await primary
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.counters['hedges'] += 1
+                tasks.append(asyncio.ensure_future(self._timed(attempt, key)))
+
+            error = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.counters['hedge_wins'] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _timed(self, attempt: Callable[[], Awaitable[str]], key: str) -> str:
+        started = time.perf_counter()
+        text = await attempt()
+        self._tracker(key).add(time.perf_counter() - started)
+        return text
+
+    async def _backoff(self, attempt_no: int, error: Exception, remaining: float):
+        """Sleep before the next retry, or re-raise if out of retries or time"""
+        if attempt_no >= self.max_retries:
+            raise error
+        delay = random.uniform(0, min(self.retry_max, self.retry_base * 2 ** attempt_no))
+        if delay >= remaining:
+            raise error
+        self.counters['retries'] += 1
+        await asyncio.sleep(delay)
+
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            self.counters['breaker_rejections'] += 1
+            raise CircuitOpenError(
+                f"LLM upstream unavailable after {self.breaker.failures} consecutive failures; "
+                f"retrying in {self.breaker.retry_in():.0f}s"
+            )
+
+    def _hedge_delay(self, key: str) -> Optional[float]:
+        if self.hedge_percentile is None:
+            return None
+        p = self._tracker(key).percentile(self.hedge_percentile, self.hedge_min_samples)
+        return None if p is None else max(p, self.hedge_min_delay)
+
+    def _tracker(self, key: str) -> LatencyTracker:
+        if key not in self.latencies:
+            self.latencies[key] = LatencyTracker()
+        return self.latencies[key]
@@ -0,0 +1,167 @@
+"""
+Background Log Writer for Project Samarth
+Non-blocking, batched JSONL logging for LLM calls and pipeline traces
+"""
+
+import atexit
+import glob
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, Iterator, Optional
+from config import (
+    LOG_DIR, LOG_BUFFER_SIZE, LOG_BATCH_SIZE, LOG_FLUSH_SECONDS,
+    LOG_SEGMENT_MAX_BYTES, LOG_SEGMENT_MAX_SECONDS, LOG_MAX_SEGMENTS
+)
+
+
+class BackgroundLogWriter:
+    """
+    Records are put on a bounded queue and written by one background thread,
+    which appends each batch as a gzip member to the current segment file
+    (LOG_DIR/samarth-<timestamp>.jsonl.gz). Segments rotate by size and age,
+    and only the newest LOG_MAX_SEGMENTS are kept.
+
+    log() never blocks: when the buffer is full the record is dropped and
+    counted, so a stalled disk cannot add request latency.
+    """
+
+    def __init__(
+        self,
+        log_dir: str = LOG_DIR,
+        buffer_size: int = LOG_BUFFER_SIZE,
+        batch_size: int = LOG_BATCH_SIZE,
+        flush_seconds: float = LOG_FLUSH_SECONDS,
+        segment_max_bytes: int = LOG_SEGMENT_MAX_BYTES,
+        segment_max_seconds: float = LOG_SEGMENT_MAX_SECONDS,
+        max_segments: int = LOG_MAX_SEGMENTS
+    ):
+        self.log_dir = log_dir
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_seconds = segment_max_seconds
+        self.max_segments = max_segments
+
+        self.written = 0
+        self.dropped = 0
+
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=buffer_size)
+        self._segment_path: Optional[str] = None
+        self._segment_started = 0.0
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+
+    def log(self, record: Dict[str, Any]) -> bool:
+        """Queue a record for writing; returns False if it was dropped"""
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def flush(self, timeout: float = 5.0):
+        """Wait (up to timeout) until everything queued so far is on disk"""
+        done = threading.Event()
+        try:
+            self._queue.put({'_flush': done}, timeout=timeout)
+        except queue.Full:
+            return
+        done.wait(timeout)
+
+    def close(self, timeout: float = 5.0):
+        """Flush and stop the writer thread"""
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            # Gather a batch until it is full, the flush interval passes or a marker arrives
+            while batch[-1] is not None and '_flush' not in batch[-1] and len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            records = [r for r in batch if r is not None and '_flush' not in r]
+            if records:
+                self._write_batch(records)
+            for marker in batch:
+                if marker is not None and '_flush' in marker:
+                    marker['_flush'].set()
+            if batch[-1] is None:
+                return
+
+    def _write_batch(self, records):
+        try:
+            path = self._current_segment()
+            lines = ''.join(json.dumps(r, ensure_ascii=False, default=str) + '\n' for r in records)
+            with open(path, 'ab') as f:
+                f.write(gzip.compress(lines.encode('utf-8')))
+            self.written += len(records)
+        except Exception as e:
+            self.dropped += len(records)
+            print(f"Warning: Could not write logs: {str(e)}")
+
+    def _current_segment(self) -> str:
+        """Rotate to a new segment when the current one is too big or too old"""
+        now = time.time()
+        if (
+            self._segment_path is None
+            or now - self._segment_started > self.segment_max_seconds
+            or (os.path.exists(self._segment_path) and os.path.getsize(self._segment_path) > self.segment_max_bytes)
+        ):
+            os.makedirs(self.log_dir, exist_ok=True)
+            stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+            self._segment_path = os.path.join(self.log_dir, f"samarth-{stamp}.jsonl.gz")
+            self._segment_started = now
+            self._prune_segments()
+        return self._segment_path
+
+    def _prune_segments(self):
+        segments = sorted(glob.glob(os.path.join(self.log_dir, 'samarth-*.jsonl.gz')))
+        for path in segments[:max(0, len(segments) - self.max_segments + 1)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def read_log_records(log_dir: str = LOG_DIR, kind: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Iterate over logged records, oldest segment first, optionally filtered by kind"""
+    for path in sorted(glob.glob(os.path.join(log_dir, 'samarth-*.jsonl.gz'))):
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    record = json.loads(line)
+                    if kind is None or record.get('kind') == kind:
+                        yield record
+        except (OSError, EOFError, json.JSONDecodeError) as e:
+            # A segment cut short by a crash is still readable up to the last batch
+            print(f"Warning: Stopped reading {path}: {str(e)}")
+
+
+_log_writer: Optional[BackgroundLogWriter] = None
+_log_writer_lock = threading.Lock()
+
+def get_log_writer() -> BackgroundLogWriter:
+    """Process-wide log writer, started on first use and flushed at exit"""
+    global _log_writer
+    with _log_writer_lock:
+        if _log_writer is None:
+            _log_writer = BackgroundLogWriter()
+            atexit.register(_log_writer.close)
+        return _log_writer
@@ -0,0 +1,381 @@
+"""
+Metrics for Project Samarth
+Counters and latency histograms, exposed as get_metrics() and in Prometheus text format,
+plus a readiness endpoint
+"""
+
+import os
+import threading
+import weakref
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Callable, List, Optional, Tuple
+from config import METRICS_PORT
+
+# Histogram resolution: values are kept in log-linear buckets, 2**(SUB_BUCKET_BITS - 1)
+# per power of two, so every recorded value is within ~3% of its bucket bound
+SUB_BUCKET_BITS = 6
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HALF_SUB_BUCKETS = SUB_BUCKETS // 2
+
+# Bucket bounds (in the histogram's unit) reported to Prometheus
+SECONDS_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+SIZE_BUCKETS = [1, 10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+
+
+class _Shards:
+    """
+    Per-thread cells: each thread only ever writes its own cell, so updates
+    need no lock; a lock is taken once per thread to register its cell, and
+    readers sum over all cells (seeing each cell as of some recent moment).
+    When a thread exits its cell is folded into a base cell, so short-lived
+    threads (Streamlit reruns, warmup, background refreshes) do not pile up.
+    """
+
+    def __init__(self, new_cell: Callable[[], list], merge: Callable[[list, list], None]):
+        self._new_cell = new_cell
+        self._merge = merge
+        self._local = threading.local()
+        self._base = new_cell()
+        self._cells: List[list] = []
+        self._lock = threading.Lock()
+
+    def cell(self) -> list:
+        cell = getattr(self._local, 'cell', None)
+        if cell is None:
+            cell = self._new_cell()
+            with self._lock:
+                self._cells.append(cell)
+            self._local.cell = cell
+            # Thread-local values are dropped when their thread ends
+            owner = _ThreadMarker()
+            self._local.owner = owner
+            retire = weakref.finalize(owner, _Shards._retire, weakref.ref(self), cell)
+            # Nothing to fold at interpreter exit
+            retire.atexit = False
+        return cell
+
+    def cells(self) -> List[list]:
+        with self._lock:
+            return [self._base] + self._cells
+
+    @staticmethod
+    def _retire(shards_ref: 'weakref.ref', cell: list):
+        """Fold an exited thread's cell into a fresh base cell (readers keep seeing a consistent set)"""
+        shards = shards_ref()
+        if shards is None:
+            return
+        with shards._lock:
+            # By identity: cells of other threads may hold equal values
+            remaining = [other for other in shards._cells if other is not cell]
+            if len(remaining) == len(shards._cells):
+                return
+            base = shards._new_cell()
+            shards._merge(base, shards._base)
+            shards._merge(base, cell)
+            shards._base = base
+            shards._cells = remaining
+
+
+class _ThreadMarker:
+    """Lives in a thread's local storage; its finalizer runs when the thread exits"""
+
+
+class Counter:
+    """Monotonic count"""
+
+    def __init__(self):
+        self._shards = _Shards(lambda: [0], Counter._merge)
+
+    def inc(self, amount: float = 1):
+        self._shards.cell()[0] += amount
+
+    def value(self) -> float:
+        return sum(cell[0] for cell in self._shards.cells())
+
+    @staticmethod
+    def _merge(into: list, cell: list):
+        into[0] += cell[0]
+
+
+class Histogram:
+    """
+    HDR-style histogram: integer values in `unit`s (1e-6 for microseconds)
+    go into log-linear buckets with bounded relative error, so percentiles
+    stay accurate from microseconds to minutes in a fixed few hundred slots
+    """
+
+    def __init__(self, unit: float = 1e-6, prometheus_buckets: Optional[List[float]] = None):
+        self.unit = unit
+        self.prometheus_buckets = prometheus_buckets or SECONDS_BUCKETS
+        # Cell layout: [count, sum, max, {bucket index: count}]
+        self._shards = _Shards(lambda: [0, 0.0, 0.0, {}], Histogram._merge)
+
+    def observe(self, value: float):
+        cell = self._shards.cell()
+        cell[0] += 1
+        cell[1] += value
+        if value > cell[2]:
+            cell[2] = value
+        index = self._index(int(value / self.unit))
+        buckets = cell[3]
+        buckets[index] = buckets.get(index, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """count, sum, max, p50/p90/p95/p99 and cumulative Prometheus buckets"""
+        count, total, maximum, merged = 0, 0.0, 0.0, {}
+        for cell in self._shards.cells():
+            count += cell[0]
+            total += cell[1]
+            maximum = max(maximum, cell[2])
+            for index, n in list(cell[3].items()):
+                merged[index] = merged.get(index, 0) + n
+
+        ordered = sorted(merged.items())
+        snapshot = {'count': count, 'sum': total, 'max': maximum}
+        for pct in (50, 90, 95, 99):
+            # A bucket's upper bound can overshoot the largest value seen
+            value = self._percentile(ordered, count, pct)
+            snapshot[f"p{pct}"] = None if value is None else min(round(value, 9), maximum)
+        cumulative, seen, position = [], 0, 0
+        for bound in self.prometheus_buckets:
+            while position < len(ordered) and self._upper(ordered[position][0]) * self.unit <= bound:
+                seen += ordered[position][1]
+                position += 1
+            cumulative.append((bound, seen))
+        snapshot['buckets'] = cumulative
+        return snapshot
+
+    @staticmethod
+    def _merge(into: list, cell: list):
+        into[0] += cell[0]
+        into[1] += cell[1]
+        into[2] = max(into[2], cell[2])
+        buckets = into[3]
+        for index, n in cell[3].items():
+            buckets[index] = buckets.get(index, 0) + n
+
+    def _percentile(self, ordered: List[Tuple[int, int]], count: int, pct: float) -> Optional[float]:
+        if not count:
+            return None
+        rank = max(1, int(count * pct / 100 + 0.5))
+        seen = 0
+        for index, n in ordered:
+            seen += n
+            if seen >= rank:
+                return self._upper(index) * self.unit
+        return self._upper(ordered[-1][0]) * self.unit
+
+    def _index(self, value: int) -> int:
+        if value < SUB_BUCKETS:
+            return max(0, value)
+        shift = value.bit_length() - SUB_BUCKET_BITS
+        return SUB_BUCKETS + (shift - 1) * HALF_SUB_BUCKETS + ((value >> shift) - HALF_SUB_BUCKETS)
+
+    def _upper(self, index: int) -> int:
+        """Largest value that falls in bucket index"""
+        if index < SUB_BUCKETS:
+            return index
+        shift, offset = divmod(index - SUB_BUCKETS, HALF_SUB_BUCKETS)
+        shift += 1
+        return ((offset + HALF_SUB_BUCKETS + 1) << shift) - 1
+
+
+class MetricsRegistry:
+    """
+    Named counters and histograms, each with a label set. Collectors are
+    called at read time for gauges derived from components' own stats()
+    (cache hit ratios and the like), so those cost nothing per request.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Any] = {}
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._collectors: List[Callable[[], Dict[str, Tuple[str, Dict[Tuple[Tuple[str, str], ...], float]]]]] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str, **labels: str) -> Counter:
+        return self._get(name, help_text, 'counter', labels, Counter)
+
+    def histogram(self, name: str, help_text: str, unit: float = 1e-6, buckets: Optional[List[float]] = None, **labels: str) -> Histogram:
+        return self._get(name, help_text, 'histogram', labels, lambda: Histogram(unit, buckets))
+
+    def add_collector(self, collector: Callable[[], Dict[str, Tuple[str, Dict[Tuple[Tuple[str, str], ...], float]]]]):
+        """collector() -> {gauge name: (help, {label tuple: value})}"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """{name: {'type', 'help', 'series': [(labels, value or histogram snapshot)]}}"""
+        with self._lock:
+            metrics = list(self._metrics.items())
+            collectors = list(self._collectors)
+        result: Dict[str, Any] = {}
+        for (name, labels), metric in sorted(metrics, key=lambda item: item[0]):
+            kind, help_text = self._help[name]
+            entry = result.setdefault(name, {'type': kind, 'help': help_text, 'series': []})
+            value = metric.value() if kind == 'counter' else metric.snapshot()
+            entry['series'].append((dict(labels), value))
+        for collector in collectors:
+            try:
+                gauges = collector()
+            except Exception:
+                continue
+            for name, (help_text, series) in gauges.items():
+                entry = result.setdefault(name, {'type': 'gauge', 'help': help_text, 'series': []})
+                entry['series'].extend((dict(labels), value) for labels, value in series.items())
+        return result
+
+    def snapshot_of(self, name: str) -> List[Tuple[Dict[str, str], float]]:
+        """(labels, value) for every series of one counter"""
+        with self._lock:
+            metrics = [(labels, metric) for (metric_name, labels), metric in self._metrics.items() if metric_name == name]
+        return [(dict(labels), metric.value()) for labels, metric in metrics]
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for name, entry in self.snapshot().items():
+            lines.append(f"# HELP {name} {entry['help']}")
+            lines.append(f"# TYPE {name} {entry['type']}")
+            for labels, value in entry['series']:
+                if entry['type'] != 'histogram':
+                    lines.append(f"{name}{self._labels(labels)} {self._number(value)}")
+                    continue
+                for bound, seen in value['buckets']:
+                    lines.append(f"{name}_bucket{self._labels({**labels, 'le': self._number(bound)})} {seen}")
+                lines.append(f"{name}_bucket{self._labels({**labels, 'le': '+Inf'})} {value['count']}")
+                lines.append(f"{name}_sum{self._labels(labels)} {self._number(value['sum'])}")
+                lines.append(f"{name}_count{self._labels(labels)} {value['count']}")
+        return '\n'.join(lines) + '\n'
+
+    def _get(self, name: str, help_text: str, kind: str, labels: Dict[str, str], factory: Callable[[], Any]) -> Any:
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = factory()
+                    self._metrics[key] = metric
+                    self._help.setdefault(name, (kind, help_text))
+        return metric
+
+    def _labels(self, labels: Dict[str, str]) -> str:
+        if not labels:
+            return ''
+        escaped = (
+            f'{key}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+            for key, value in sorted(labels.items())
+        )
+        return '{' + ','.join(escaped) + '}'
+
+    def _number(self, value: float) -> str:
+        return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+REGISTRY = MetricsRegistry()
+
+
+def _cache_hit_ratios():
+    """samarth_cache_hit_ratio{cache} from the samarth_cache_lookups_total counters"""
+    lookups: Dict[str, Dict[str, float]] = {}
+    for labels, value in REGISTRY.snapshot_of('samarth_cache_lookups_total'):
+        lookups.setdefault(labels['cache'], {})[labels['result']] = value
+    ratios = {}
+    for cache, counts in lookups.items():
+        total = counts.get('hit', 0) + counts.get('miss', 0)
+        if total:
+            ratios[(('cache', cache),)] = round(counts.get('hit', 0) / total, 4)
+    return {'samarth_cache_hit_ratio': ('Share of lookups answered from cache', ratios)}
+
+REGISTRY.add_collector(_cache_hit_ratios)
+
+
+def get_metrics() -> Dict[str, Any]:
+    """
+    Every metric as plain data: counters and gauges as numbers, histograms
+    as count, sum, max and p50/p90/p95/p99, keyed by name then label values
+
+    e.g. get_metrics()['samarth_stage_seconds']['stage=execute']['p95']
+    """
+    metrics = {}
+    for name, entry in REGISTRY.snapshot().items():
+        series = {}
+        for labels, value in entry['series']:
+            key = ','.join(f"{k}={v}" for k, v in sorted(labels.items())) or 'all'
+            series[key] = {k: v for k, v in value.items() if k != 'buckets'} if entry['type'] == 'histogram' else value
+        metrics[name] = series
+    return metrics
+
+
+# Weak references, so a registered pipeline can still be garbage collected
+_readiness_checks: List[weakref.ref] = []
+
+def add_readiness_check(check: Callable[[], bool]):
+    """Register check() for /ready: the endpoint answers 200 only while every check returns True"""
+    # Checks of collected pipelines are dropped here, so the list stays small
+    _readiness_checks[:] = [ref for ref in _readiness_checks if ref() is not None]
+    _readiness_checks.append(weakref.WeakMethod(check) if hasattr(check, '__self__') else weakref.ref(check))
+
+
+def is_ready() -> bool:
+    """True once every live registered readiness check passes (and at least one is registered)"""
+    checks = [ref() for ref in list(_readiness_checks)]
+    checks = [check for check in checks if check is not None]
+    return bool(checks) and all(check() for check in checks)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path == '/ready':
+            ready = is_ready()
+            body = b'ready\n' if ready else b'warming up\n'
+            self.send_response(200 if ready else 503)
+            self.send_header('Content-Type', 'text/plain; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if path not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = REGISTRY.render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+def start_metrics_server(port: Optional[int] = None) -> Optional[int]:
+    """
+    Serve /metrics and /ready on 127.0.0.1 (once per process; port from
+    $SAMARTH_METRICS_PORT or METRICS_PORT, 0 to disable)
+
+    Returns:
+        The port being served, or None if disabled or unavailable
+    """
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return _server.server_address[1]
+        if port is None:
+            port = int(os.getenv('SAMARTH_METRICS_PORT', METRICS_PORT or 0))
+        if not port:
+            return None
+        try:
+            _server = ThreadingHTTPServer(('127.0.0.1', port), _MetricsHandler)
+        except OSError as e:
+            print(f"Warning: Metrics endpoint not started on port {port}: {str(e)}")
+            return None
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name='metrics-server', daemon=True).start()
+        print(f"✓ Metrics at http://127.0.0.1:{port}/metrics")
+        return port
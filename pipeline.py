@@ -3,50 +3,703 @@ Main Pipeline for Project Samarth
 Orchestrates the 2-LLM call architecture
 """
 
-import json
+import hashlib
+import inspect
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import Future
 from datetime import datetime
-from typing import Dict, Any
-from query_generator_gemini import QueryGeneratorGemini
-from executor import QueryExecutor
-from answer_synthesizer import AnswerSynthesizer
+from functools import partial
+from typing import TYPE_CHECKING, Dict, Any, Generator, Iterable, Iterator, List, Optional, Tuple
+from trace_store import get_trace_store
+from metrics import REGISTRY, add_readiness_check, get_metrics, start_metrics_server
+from conversation_store import PREVIOUS_RESULT, is_follow_up, uses_previous_result
+from request_coalescer import RequestCoalescer, normalize_question
+from config import BATCH_CONCURRENCY
+
+# The components (and through them pandas and httpx) are imported by
+# warmup(), so importing this module stays cheap
+if TYPE_CHECKING:
+    from staged_pipeline import StagedPipeline
 
 class SamarthPipeline:
-    def __init__(self, gemini_api_key: str):
-        self.query_generator = QueryGeneratorGemini(gemini_api_key)
-        self.executor = QueryExecutor()
-        self.answer_synthesizer = AnswerSynthesizer(gemini_api_key)
+    def __init__(self, gemini_api_key: str, warmup: bool = True):
+        """
+        Args:
+            gemini_api_key: Gemini API key (unused by the offline backends)
+            warmup: Load data and build the components now; with False the
+                constructor returns at once and warmup() runs on first use
+                (or call warmup(background=True) and poll is_ready())
+        """
+        self.gemini_api_key = gemini_api_key
+        self.warmup_seconds: Optional[float] = None
+        self.warmup_error: Optional[str] = None
+        self._ready = threading.Event()
+        self._warmup_lock = threading.Lock()
+        self._staged: Optional['StagedPipeline'] = None
+        self._staged_lock = threading.Lock()
+        self.coalescer = RequestCoalescer()
+        add_readiness_check(self.is_ready)
+        start_metrics_server()
+        if warmup:
+            self.warmup()
+    
+    def warmup(self, background: bool = False) -> bool:
+        """
+        Get everything the first question needs ready: load the data once
+        (shared by query generation and execution), build the entity
+        vocabulary, intent parser and schema fragments, and resolve the model
+        with a pooled connection open. Idempotent; concurrent callers wait
+        for the one warmup in progress.
+        
+        Args:
+            background: Run on a daemon thread and return immediately
+        
+        Returns:
+            Whether the pipeline is ready
+        """
+        if self._ready.is_set():
+            return True
+        if background:
+            threading.Thread(target=self._warmup_in_background, name='samarth-warmup', daemon=True).start()
+            return False
+        with self._warmup_lock:
+            if not self._ready.is_set():
+                self._build_components()
+                self._ready.set()
+        return True
+    
+    def is_ready(self) -> bool:
+        """Readiness signal: True once warmup() has finished (also served at /ready)"""
+        return self._ready.is_set()
+    
+    def _warmup_in_background(self):
+        try:
+            self.warmup()
+        except Exception as e:
+            # Raised again by the next foreground warmup() (e.g. the first question)
+            self.warmup_error = f"{type(e).__name__}: {str(e)}"
+            print(f"Warning: Pipeline warmup failed: {self.warmup_error}")
+    
+    def _build_components(self):
+        started = time.perf_counter()
+        from data_loader import AgriculturalDataLoader, enable_copy_on_write
+        from query_generator_gemini import QueryGeneratorGemini
+        from executor import QueryExecutor
+        from answer_synthesizer import AnswerSynthesizer
+        from rule_based_synthesizer import RuleBasedSynthesizer
+        from candidate_racer import CandidateRacer
+        from query_repairer import QueryRepairer
+        from conversation_store import ConversationStore
+        from answer_cache import create_answer_cache
+        
+        enable_copy_on_write()
+        data_loader = AgriculturalDataLoader()
+        data_loader.load_all_data()
+        self.query_generator = QueryGeneratorGemini(self.gemini_api_key, data_loader=data_loader)
+        self.executor = QueryExecutor(data_loader=data_loader)
+        self.answer_synthesizer = AnswerSynthesizer(self.gemini_api_key)
+        self.rule_synthesizer = RuleBasedSynthesizer()
+        self.candidate_racer = CandidateRacer(self.executor)
+        self.query_repairer = QueryRepairer(self.query_generator.gemini, data_loader)
+        self.conversations = ConversationStore(self.executor.result_store)
+        self.answer_cache = create_answer_cache()
+        self.prompt_version = self._prompt_version()
+        self.query_generator.schema_builder.warmup()
+        self.query_generator.gemini.warmup()
+        self.warmup_seconds = round(time.perf_counter() - started, 3)
+        self.warmup_error = None
+        print(f"✓ Pipeline ready in {self.warmup_seconds:.2f}s")
     
-    def process_question(self, question: str) -> Dict[str, Any]:
+    def _prompt_version(self) -> str:
+        """
+        Hash of the model name and the modules that build prompts and
+        templated answers: changing any of them retires cached answers
+        """
+        import query_generator_gemini, schema_builder, intent_parser
+        import answer_synthesizer, rule_based_synthesizer, evidence_encoder
+        
+        digest = hashlib.sha1(self.query_generator.gemini.model_name.encode('utf-8'))
+        for module in (query_generator_gemini, schema_builder, intent_parser, answer_synthesizer, rule_based_synthesizer, evidence_encoder):
+            digest.update(inspect.getsource(module).encode('utf-8'))
+        return digest.hexdigest()[:12]
+    
+    def process_question(self, question: str, session_id: Optional[str] = None) -> Dict[str, Any]:
         """
         Process a single question through the full pipeline
         
+        With a session_id, the question may follow up on that session's
+        previous result (available to the generated code as previous_result)
+        
         Pipeline:
         1. Query Generation (LLM Call #1)
         2. Query Execution (Deterministic)
         3. Evidence Building (Deterministic)
         4. Citation Building (Deterministic)
-        5. Answer Synthesis (LLM Call #2)
+        5. Answer Synthesis (LLM Call #2, or a template for simple results)
         6. Save complete trace
+        
+        Identical questions asked while one is being answered (or shortly
+        after) share its answer (see _coalescing_key), and answers are
+        reused from the persistent answer cache (see _cached_answer)
+        """
+        self.warmup()
+        key = self._coalescing_key(question, session_id)
+        if key is None:
+            return self._answer_question(question, session_id)[0]
+        (result, stored), role = self.coalescer.run(
+            key, partial(self._answer_with_cache, question, session_id),
+            cacheable=lambda answer: self._cacheable(answer[0]),
+            shareable=lambda answer: not self._uses_session(answer[0])
+        )
+        self._count_sharing(role)
+        if role == 'leader':
+            return result
+        return self._shared_answer(question, session_id, result, stored, role)
+    
+    def _answer_with_cache(self, question: str, session_id: Optional[str]) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """_answer_question through the persistent answer cache"""
+        cached = self._cached_answer(question, session_id)
+        if cached is not None:
+            return cached
+        answer = self._answer_question(question, session_id)
+        self._store_answer(question, answer[0])
+        return answer
+    
+    def _answer_question(self, question: str, session_id: Optional[str]) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """
+        The full pipeline for process_question
+        
+        Returns:
+            The result, and the previous-result entry it stored for the
+            session (if any), so requests sharing the answer can adopt it
+        """
+        trace = self._new_trace(question, session_id)
+        prepared = self._run_query_steps(question, trace)
+        if not prepared['success']:
+            return prepared, None
+        exec_result = prepared['exec_result']
+        
+        synthesis_result = self._fast_path_answer(question, trace, prepared)
+        if synthesis_result is not None:
+            return self._finish(question, trace, prepared, synthesis_result), prepared['conversation']
+        
+        # Step 4: Answer Synthesis (LLM Call #2)
+        print("Step 4: Synthesizing answer...")
+        started = time.time()
+        synthesis_result = self.answer_synthesizer.synthesize_answer(
+            question=question,
+            executed_code=exec_result['executed_code'],
+            evidence=exec_result['evidence'],
+            citations=prepared['citations']
+        )
+        self._record_synthesis(trace, synthesis_result, started)
+        
+        return self._finish(question, trace, prepared, synthesis_result), prepared['conversation']
+    
+    def process_question_stream(self, question: str, session_id: Optional[str] = None) -> Generator[Dict[str, Any], None, None]:
+        """
+        Process a question, streaming the answer as LLM Call #2 produces it
+        (session_id as for process_question)
+        
+        Yields:
+            {'type': 'chunk', 'text': ...} for each piece of answer text, then
+            one {'type': 'result', 'result': ...} with the same dict that
+            process_question returns (the trace holds the full answer). An
+            answer shared with an identical request comes as one chunk.
+        """
+        self.warmup()
+        key = self._coalescing_key(question, session_id)
+        role, shared = self.coalescer.join(key) if key is not None else ('leader', None)
+        if role != 'leader':
+            self._count_sharing(role)
+            answer = shared.result()
+            if answer is not None:
+                result = self._shared_answer(question, session_id, *answer, role)
+                if result['success']:
+                    yield {'type': 'chunk', 'text': result['answer']}
+                yield {'type': 'result', 'result': result}
+                return
+            # The request we waited for failed: answer it here, without coalescing
+            shared = None
+        elif shared is not None:
+            self._count_sharing(role)
+        
+        answer = None
+        try:
+            cached = self._cached_answer(question, session_id) if key is not None else None
+            if cached is not None:
+                events = iter([
+                    {'type': 'chunk', 'text': cached[0]['answer']},
+                    {'type': 'result', 'result': cached[0], 'conversation': cached[1]}
+                ])
+            else:
+                events = self._answer_question_stream(question, session_id)
+            for event in events:
+                if event['type'] == 'result':
+                    answer = (event['result'], event.pop('conversation'))
+                    if key is not None and cached is None:
+                        self._store_answer(question, answer[0])
+                yield event
+        finally:
+            # Also reached when the consumer stops early: waiting requests then answer on their own
+            if shared is not None:
+                if answer is not None and self._uses_session(answer[0]):
+                    answer = None
+                self.coalescer.finish(key, shared, answer, cache=answer is not None and self._cacheable(answer[0]))
+    
+    def _answer_question_stream(self, question: str, session_id: Optional[str]) -> Generator[Dict[str, Any], None, None]:
+        """process_question_stream without coalescing; the result event also carries the stored conversation entry"""
+        trace = self._new_trace(question, session_id)
+        prepared = self._run_query_steps(question, trace)
+        if not prepared['success']:
+            yield {'type': 'result', 'result': prepared, 'conversation': None}
+            return
+        exec_result = prepared['exec_result']
+        
+        synthesis_result = self._fast_path_answer(question, trace, prepared)
+        if synthesis_result is not None:
+            yield {'type': 'chunk', 'text': synthesis_result['answer']}
+            yield {'type': 'result', 'result': self._finish(question, trace, prepared, synthesis_result), 'conversation': prepared['conversation']}
+            return
+        
+        # Step 4: Answer Synthesis (LLM Call #2), streamed
+        print("Step 4: Streaming answer...")
+        started = time.time()
+        stream = self.answer_synthesizer.synthesize_answer_stream(
+            question=question,
+            executed_code=exec_result['executed_code'],
+            evidence=exec_result['evidence'],
+            citations=prepared['citations']
+        )
+        while True:
+            try:
+                chunk = next(stream)
+            except StopIteration as stop:
+                synthesis_result = stop.value
+                break
+            yield {'type': 'chunk', 'text': chunk}
+        
+        self._add_step(trace, 'synthesize', {
+            'step': 4,
+            'name': 'Answer Synthesis (LLM Call #2)',
+            'log_id': synthesis_result['log_id'],
+            'evidence_tokens': synthesis_result.get('evidence_tokens'),
+            'prompt_chars': synthesis_result.get('prompt_chars'),
+            'response_chars': len(synthesis_result.get('raw_response', '')),
+            'streamed': True,
+            'time_to_first_chunk_ms': synthesis_result['time_to_first_chunk_ms'],
+            'error': synthesis_result.get('error')
+        }, started)
+        if 'error' in synthesis_result:
+            print(f"Warning: {synthesis_result['error']}")
+        else:
+            print(f"✓ Answer streamed (log: {synthesis_result['log_id']})")
+        
+        yield {'type': 'result', 'result': self._finish(question, trace, prepared, synthesis_result), 'conversation': prepared['conversation']}
+    
+    def _coalescing_key(self, question: str, session_id: Optional[str]) -> Optional[tuple]:
+        """
+        Requests with equal keys get the same answer: the normalized question
+        and data version, and whether there is a session to store the result
+        for. None (answer on its own) for a follow-up to the session's
+        previous result. Other questions are shared and cached unless their
+        code turns out to read previous_result (see _uses_session).
+        """
+        if is_follow_up(question) and self.conversations.has(session_id):
+            return None
+        return (normalize_question(question), self.executor.data_loader.data_version, session_id is not None)
+    
+    def _shared_answer(
+        self,
+        question: str,
+        session_id: Optional[str],
+        result: Dict[str, Any],
+        stored: Optional[Dict[str, Any]],
+        role: str
+    ) -> Dict[str, Any]:
+        """Another request's answer, with a trace of its own pointing at that request"""
+        started = time.time()
+        if stored is not None:
+            self.conversations.share(session_id, stored)
+        trace = self._new_trace(question, session_id)
+        self._add_step(trace, role, {
+            'name': 'Answer shared with an identical request' if role == 'coalesced' else 'Answer cache (short TTL)',
+            'shared_request_id': result['trace']['request_id']
+        }, started)
+        trace['success'] = result['success']
+        if result['success']:
+            trace['final_answer'] = result['answer']
+            trace['citations'] = result['citations']
+        else:
+            trace['error'] = result['error']
+        self._save_trace(trace)
+        print(f"✓ Answer shared ({role}) from request {result['trace']['request_id']}")
+        return {**result, 'question': question, 'trace': trace} if result['success'] else {**result, 'trace': trace}
+    
+    def _cached_answer(self, question: str, session_id: Optional[str]) -> Optional[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+        """
+        The answer from the persistent answer cache, as (result, stored
+        conversation entry), or None on a miss. A stale answer is returned
+        while a background run refreshes it.
+        
+        The cached code is re-run (no LLM call) when there is a session to
+        store the previous result for, or when the result handle's spill file
+        is not on this machine, so follow-ups and paging work as usual.
+        """
+        if self.answer_cache is None:
+            return None
+        started = time.time()
+        cache_key = self._answer_cache_key(question)
+        hit = self.answer_cache.lookup(cache_key)
+        self._count_lookup('answer_cache', hit is not None)
+        if hit is None:
+            return None
+        entry, fresh = hit
+        if not fresh:
+            self._refresh_answer(question, cache_key)
+        
+        trace = self._new_trace(question, session_id)
+        result_handle = entry['result_handle']
+        stored = None
+        re_executed = session_id is not None or (result_handle is not None and not self.executor.result_store.has(result_handle))
+        if re_executed:
+            exec_result = self.executor.execute_query(entry['executed_code'], return_frame=session_id is not None)
+            result_handle = exec_result['evidence']['result_handle'] if exec_result['success'] else None
+            result_frame = exec_result.pop('result_frame', None)
+            if result_frame is not None:
+                stored = self.conversations.put(
+                    session_id, question, entry['executed_code'], result_frame, entry['datasets_used'], result_handle
+                )
+        self._add_step(trace, 'answer_cache', {
+            'name': 'Persistent answer cache',
+            'fresh': fresh,
+            'cached_request_id': entry['request_id'],
+            're_executed': re_executed
+        }, started)
+        trace['final_answer'] = entry['answer']
+        trace['citations'] = entry['citations']
+        trace['success'] = True
+        self._save_trace(trace)
+        print(f"✓ Answer from the answer cache ({'fresh' if fresh else 'stale, refreshing'})")
+        return {
+            'success': True,
+            'question': question,
+            'answer': entry['answer'],
+            'citations': entry['citations'],
+            'result_handle': result_handle,
+            'trace': trace
+        }, stored
+    
+    def _store_answer(self, question: str, result: Dict[str, Any]):
+        """Put a successful answer in the persistent answer cache"""
+        if self.answer_cache is None or not self._cacheable(result):
+            return
+        execution = next((step for step in result['trace']['steps'] if 'executed_code' in step), None)
+        if execution is None:
+            return
+        self.answer_cache.store(self._answer_cache_key(question), {
+            'answer': result['answer'],
+            'citations': result['citations'],
+            'result_handle': result['result_handle'],
+            'executed_code': execution['executed_code'],
+            'datasets_used': execution['datasets_used'],
+            'request_id': result['trace']['request_id']
+        })
+    
+    def _cacheable(self, result: Dict[str, Any]) -> bool:
+        """Only complete answers are reused: never failed queries or failed synthesis, nor one session's follow-ups"""
+        return result['success'] and not result['trace'].get('error') and not self._uses_session(result)
+    
+    def _uses_session(self, result: Dict[str, Any]) -> bool:
+        """Whether the answer was computed from its session's previous result (so belongs to that session alone)"""
+        return any(step.get('previous_result') for step in result['trace']['steps'])
+    
+    def _refresh_answer(self, question: str, cache_key: str):
+        """Recompute a stale cached answer on a background thread (one per key at a time)"""
+        if not self.answer_cache.begin_refresh(cache_key):
+            return
+        
+        def refresh():
+            try:
+                result, _ = self._answer_question(question, None)
+                self._store_answer(question, result)
+            except Exception as e:
+                print(f"Warning: Could not refresh cached answer: {str(e)}")
+            finally:
+                self.answer_cache.end_refresh(cache_key)
+        
+        threading.Thread(target=refresh, name='samarth-answer-refresh', daemon=True).start()
+    
+    def _answer_cache_key(self, question: str) -> str:
+        return self.answer_cache.key(question, self.executor.data_loader.data_version, self.prompt_version)
+    
+    def _count_sharing(self, role: str):
+        REGISTRY.counter('samarth_answer_sharing_total', 'Questions by how they were answered: leader (computed), coalesced or cached', role=role).inc()
+    
+    def process_questions(self, questions: Iterable[str], concurrency: int = BATCH_CONCURRENCY) -> Iterator[Dict[str, Any]]:
+        """
+        Process many questions concurrently, yielding results as they finish
+        
+        Questions flow through the staged pipeline (see staged_pipeline.py),
+        so one question's execution overlaps other questions' LLM calls; at
+        most `concurrency` are in flight at once. Repeated questions are
+        processed once, and each goes through the same coalescer and answer
+        cache as process_question (see _submit_batch_question).
+        
+        Yields:
+            The process_question result plus index (position in questions),
+            question and latency_ms, in completion order
+        """
+        questions = list(questions)
+        repeats: Dict[int, List[int]] = {}
+        first_seen: Dict[str, int] = {}
+        for index, question in enumerate(questions):
+            key = normalize_question(question)
+            if key in first_seen:
+                repeats[first_seen[key]].append(index)
+            else:
+                first_seen[key] = index
+                repeats[index] = []
+        
+        staged = self.staged_pipeline()
+        finished: "queue.Queue[tuple]" = queue.Queue()
+        slots = threading.Semaphore(max(1, concurrency))
+        stop = threading.Event()
+        
+        def on_done(index: int, started: float, future: Future):
+            slots.release()
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'success': False, 'error': str(e)}
+            finished.put((index, result, round((time.perf_counter() - started) * 1000, 1)))
+        
+        def feed():
+            for index in repeats:
+                slots.acquire()
+                if stop.is_set():
+                    return
+                started = time.perf_counter()
+                try:
+                    future = self._submit_batch_question(staged, questions[index])
+                except Exception as e:
+                    future = Future()
+                    future.set_exception(e)
+                future.add_done_callback(partial(on_done, index, started))
+        
+        feeder = threading.Thread(target=feed, name='samarth-batch-feeder', daemon=True)
+        feeder.start()
+        try:
+            for _ in range(len(repeats)):
+                index, result, latency_ms = finished.get()
+                for position in [index] + repeats[index]:
+                    yield {**result, 'index': position, 'question': questions[position], 'latency_ms': latency_ms}
+        finally:
+            # Stopping early abandons questions that have not been submitted
+            stop.set()
+            slots.release()
+    
+    def _submit_batch_question(self, staged: 'StagedPipeline', question: str) -> Future:
+        """
+        A batch question through the coalescer and the persistent answer
+        cache, and through the staged pipeline when neither has the answer
+        
+        Returns:
+            Future resolving to the process_question result
         """
-        trace = {
+        done: Future = Future()
+        key = self._coalescing_key(question, None)
+        role, shared = self.coalescer.join(key)
+        self._count_sharing(role)
+        if role != 'leader':
+            def on_shared(future: Future):
+                answer = future.result()
+                if answer is not None:
+                    done.set_result(self._shared_answer(question, None, *answer, role))
+                    return
+                # The request we waited for failed: answer it here, without
+                # coalescing (off this callback's thread, which may be a stage's)
+                threading.Thread(
+                    target=lambda: self._chain_future(staged.submit(question), done),
+                    name='samarth-batch-retry', daemon=True
+                ).start()
+            shared.add_done_callback(on_shared)
+            return done
+        
+        try:
+            cached = self._cached_answer(question, None)
+        except Exception:
+            self.coalescer.finish(key, shared, None)
+            raise
+        if cached is not None:
+            self.coalescer.finish(key, shared, cached)
+            done.set_result(cached[0])
+            return done
+        
+        def on_staged(future: Future):
+            answer = None
+            try:
+                result = future.result()
+                self._store_answer(question, result)
+                answer = (result, None)
+                done.set_result(result)
+            except Exception as e:
+                done.set_exception(e)
+            finally:
+                self.coalescer.finish(key, shared, answer, cache=answer is not None and self._cacheable(answer[0]))
+        
+        try:
+            staged.submit(question).add_done_callback(on_staged)
+        except Exception:
+            self.coalescer.finish(key, shared, None)
+            raise
+        return done
+    
+    @staticmethod
+    def _chain_future(source: Future, target: Future):
+        """Resolve target with source's outcome once source is done"""
+        def copy(future: Future):
+            try:
+                target.set_result(future.result())
+            except Exception as e:
+                target.set_exception(e)
+        source.add_done_callback(copy)
+    
+    def staged_pipeline(self) -> 'StagedPipeline':
+        """The staged pipeline behind process_questions, started on first use"""
+        from staged_pipeline import StagedPipeline
+        
+        self.warmup()
+        with self._staged_lock:
+            if self._staged is None:
+                self._staged = StagedPipeline(self)
+            return self._staged
+    
+    def _fast_path_answer(self, question: str, trace: Dict[str, Any], prepared: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Step 4 without LLM Call #2, when the result is simple enough to template"""
+        started = time.time()
+        synthesis_result = self.rule_synthesizer.synthesize(
+            question, prepared['exec_result']['evidence'], prepared['citations']
+        )
+        self._count_lookup('answer_fast_path', synthesis_result is not None)
+        if synthesis_result is not None:
+            self._add_step(trace, 'fast_path', {
+                'step': 4,
+                'name': 'Answer Synthesis (Deterministic fast path)',
+                'log_id': synthesis_result['log_id']
+            }, started)
+            print("✓ Answer rendered from template (fast path)")
+        return synthesis_result
+    
+    def _record_synthesis(self, trace: Dict[str, Any], synthesis_result: Dict[str, Any], started: float):
+        """Step 4 trace entry for an answer from LLM Call #2"""
+        self._add_step(trace, 'synthesize', {
+            'step': 4,
+            'name': 'Answer Synthesis (LLM Call #2)',
+            'log_id': synthesis_result['log_id'],
+            'evidence_tokens': synthesis_result.get('evidence_tokens'),
+            'prompt_chars': synthesis_result.get('prompt_chars'),
+            'response_chars': len(synthesis_result.get('raw_response', '')),
+            'error': synthesis_result.get('error')
+        }, started)
+        if 'error' in synthesis_result:
+            print(f"Warning: {synthesis_result['error']}")
+        else:
+            print(f"✓ Answer synthesized (log: {synthesis_result['log_id']})")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """How often LLM calls and recomputation were avoided (intent parser, caches, answer fast path) and per-stage queue stats"""
+        self.warmup()
+        return {
+            'intent_parser': self.query_generator.intent_parser.stats(),
+            'query_template_cache': self.query_generator.template_cache.stats(),
+            'answer_fast_path': self.rule_synthesizer.stats(),
+            'query_candidates': self.candidate_racer.stats(),
+            'query_repair': self.query_repairer.stats(),
+            'conversations': self.conversations.stats(),
+            'answer_sharing': self.coalescer.stats(),
+            'answer_cache': self.answer_cache.stats() if self.answer_cache is not None else {},
+            'intermediate_cache': {
+                **self.executor.data_loader.intermediates.stats(),
+                'subexpressions': self.executor.subexpressions.stats()
+            },
+            'stages': self._staged.stats() if self._staged is not None else {}
+        }
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Process-wide counters and latency percentiles (see metrics.get_metrics; also served at /metrics)"""
+        return get_metrics()
+    
+    def clear_conversation(self, session_id: str):
+        """Forget a session's previous result (later questions start fresh)"""
+        self.warmup()
+        self.conversations.clear(session_id)
+    
+    def _new_trace(self, question: str, session_id: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            'request_id': uuid.uuid4().hex,
+            'session_id': session_id,
             'timestamp': datetime.now().isoformat(),
+            'started_at': time.time(),
             'question': question,
             'steps': []
         }
+    
+    def _add_step(self, trace: Dict[str, Any], stage: str, entry: Dict[str, Any], started: float, ended: Optional[float] = None):
+        """Append a step with its stage name and wall-clock start/end times"""
+        ended = time.time() if ended is None else ended
+        REGISTRY.histogram('samarth_stage_seconds', 'Pipeline step duration', stage=stage).observe(ended - started)
+        trace['steps'].append({
+            **entry,
+            'stage': stage,
+            'started_at': started,
+            'ended_at': ended,
+            'duration_ms': round((ended - started) * 1000, 1)
+        })
+    
+    def _run_query_steps(self, question: str, trace: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Steps 1-3: query generation, execution and citations
         
+        Returns:
+            {'success': True, 'exec_result', 'citations', 'conversation'}, or the final
+            failure result (trace already saved)
+        """
         # Step 1: Query Generation (LLM Call #1)
         print("Step 1: Generating pandas query...")
-        query_result = self.query_generator.generate_query(question)
-        
+        started = time.time()
+        previous = self.conversations.get(trace.get('session_id'))
+        query_result = self.query_generator.generate_query(question, previous)
+        return self._run_execution_steps(question, trace, query_result, started, time.time(), previous)
+    
+    def _run_execution_steps(
+        self,
+        question: str,
+        trace: Dict[str, Any],
+        query_result: Dict[str, Any],
+        generation_started: float,
+        generation_ended: float,
+        previous: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Steps 1-3 once the query is generated: record it, execute it and build
+        citations. previous is the session's last result, exposed to the code
+        as previous_result; a new tabular result replaces it.
+        """
         # Check for errors in query generation
         if 'error' in query_result or query_result.get('query_code') is None:
             error_msg = query_result.get('error', 'Failed to generate query')
-            trace['steps'].append({
+            self._add_step(trace, 'generate', {
                 'step': 1,
                 'name': 'Query Generation (LLM Call #1)',
                 'error': error_msg
-            })
+            }, generation_started, generation_ended)
             trace['final_answer'] = f"Error generating query: {error_msg}"
+            trace['success'] = False
+            trace['error'] = error_msg
             self._save_trace(trace)
             return {
                 'success': False,
@@ -54,26 +707,54 @@ class SamarthPipeline:
                 'trace': trace
             }
         
-        trace['steps'].append({
+        self._add_step(trace, 'generate', {
             'step': 1,
             'name': 'Query Generation (LLM Call #1)',
             'log_id': query_result.get('log_id', 'unknown'),
             'query_code': query_result.get('query_code', ''),
-            'relevant_datasets': query_result.get('relevant_datasets', [])
-        })
+            'relevant_datasets': query_result.get('relevant_datasets', []),
+            'cache_hit': query_result.get('cache_hit', False),
+            'candidates': len(query_result.get('candidates') or [query_result['query_code']]),
+            'prompt_chars': query_result.get('prompt_chars'),
+            'response_chars': len(query_result.get('raw_response', ''))
+        }, generation_started, generation_ended)
+        self._count_lookup('query_generation', query_result.get('cache_hit', False))
         print(f"✓ Generated query (log: {query_result.get('log_id', 'unknown')})")
         
         # Step 2: Query Execution (Deterministic)
-        print("Step 2: Executing query...")
-        exec_result = self.executor.execute_query(query_result['query_code'])
+        session_id = trace.get('session_id')
+        context = {PREVIOUS_RESULT: previous['frame']} if previous is not None else None
+        exec_started = time.time()
+        if query_result.get('candidates'):
+            print(f"Step 2: Racing {len(query_result['candidates'])} candidate queries...")
+            exec_result = self.candidate_racer.race(
+                query_result['candidates'], context=context, return_frame=session_id is not None
+            )
+        else:
+            print("Step 2: Executing query...")
+            exec_result = self.executor.execute_query(
+                query_result['query_code'], context=context, return_frame=session_id is not None
+            )
+        exec_ended = time.time()
+        
+        if not exec_result['success']:
+            # Never serve this code again from the template cache
+            self.query_generator.template_cache.invalidate(question)
+            if self.query_repairer.max_attempts > 0:
+                exec_result = self._repair_query(question, trace, exec_result, context, session_id is not None)
         
         if not exec_result['success']:
-            trace['steps'].append({
+            self._add_step(trace, 'execute', {
                 'step': 2,
                 'name': 'Query Execution',
-                'error': exec_result['error']
-            })
+                'error': exec_result['error'],
+                'candidate_errors': exec_result.get('candidate_errors'),
+                'race': exec_result.get('race'),
+                'repair': exec_result.get('repair')
+            }, exec_started, exec_ended)
             trace['final_answer'] = f"Error executing query: {exec_result['error']}"
+            trace['success'] = False
+            trace['error'] = exec_result['error']
             self._save_trace(trace)
             return {
                 'success': False,
@@ -81,70 +762,185 @@ class SamarthPipeline:
                 'trace': trace
             }
         
-        trace['steps'].append({
+        used_previous = previous is not None and uses_previous_result(exec_result['executed_code'])
+        if used_previous:
+            # The answer still rests on the datasets the previous result came from
+            evidence = exec_result['evidence']
+            evidence['datasets_used'] = list(dict.fromkeys(previous['datasets_used'] + evidence['datasets_used']))
+            self.conversations.record_reuse()
+        elif not query_result.get('cache_hit') or exec_result['executed_code'] != query_result['query_code']:
+            # Only code that ran (generated, race winner or repaired) becomes a template
+            self.query_generator.template_cache.store(
+                question, exec_result['executed_code'], query_result.get('relevant_datasets', [])
+            )
+        result_frame = exec_result.pop('result_frame', None)
+        stored = None
+        if result_frame is not None:
+            stored = self.conversations.put(
+                session_id, question, exec_result['executed_code'], result_frame,
+                exec_result['evidence']['datasets_used'], exec_result['evidence']['result_handle']
+            )
+        
+        self._add_step(trace, 'execute', {
             'step': 2,
             'name': 'Query Execution (Deterministic)',
             'evidence_summary': {
                 'type': exec_result['evidence']['type'],
                 'shape': exec_result['evidence']['shape'],
-                'summary_stats': exec_result['evidence']['summary_stats']
-            }
-        })
+                'summary_stats': exec_result['evidence']['summary_stats'],
+                'result_handle': exec_result['evidence']['result_handle']
+            },
+            'estimated_rows': exec_result['plan']['estimated_rows'],
+            'executed_code': exec_result['executed_code'],
+            'datasets_used': exec_result['evidence']['datasets_used'],
+            'previous_result': used_previous,
+            'race': exec_result.get('race'),
+            'repair': exec_result.get('repair')
+        }, exec_started, exec_ended)
         print(f"✓ Query executed successfully")
         
         # Step 3: Citation Building (Deterministic)
         print("Step 3: Building citations...")
+        started = time.time()
         citations = self.executor.build_citations(exec_result['evidence']['datasets_used'])
-        trace['steps'].append({
+        self._add_step(trace, 'citations', {
             'step': 3,
             'name': 'Citation Building (Deterministic)',
             'citations': citations
-        })
+        }, started)
         print(f"✓ Built {len(citations)} citations")
         
-        # Step 4: Answer Synthesis (LLM Call #2)
-        print("Step 4: Synthesizing answer...")
-        synthesis_result = self.answer_synthesizer.synthesize_answer(
-            question=question,
-            executed_code=exec_result['executed_code'],
-            evidence=exec_result['evidence'],
-            citations=citations
+        return {
+            'success': True,
+            'exec_result': exec_result,
+            'citations': citations,
+            'conversation': stored
+        }
+    
+    def _repair_query(
+        self,
+        question: str,
+        trace: Dict[str, Any],
+        exec_result: Dict[str, Any],
+        context: Optional[Dict[str, Any]] = None,
+        return_frame: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Step 2 retries: send the failure back for a fix (from memory or a small
+        LLM call) and run it, up to QUERY_REPAIR_ATTEMPTS times
+        
+        Returns:
+            The last execute_query result, with repair (attempts, repaired,
+            latency_ms) added
+        """
+        failed = exec_result
+        tried = {failed['executed_code']}
+        started = time.perf_counter()
+        attempts = 0
+        for attempt in range(1, self.query_repairer.max_attempts + 1):
+            print(f"Step 2: Repairing query (attempt {attempt}): {exec_result['error'][:80]}")
+            attempt_started = time.time()
+            attempts = attempt
+            fix = self.query_repairer.fix(
+                question, exec_result['executed_code'], exec_result.get('error_type', 'Error'), exec_result['error'], tried
+            )
+            step = {
+                'step': 2,
+                'name': 'Query Repair',
+                'attempt': attempt,
+                'error': exec_result['error'],
+                'source': fix.get('source'),
+                'log_id': fix['log_id'],
+                'prompt_chars': fix.get('prompt_chars'),
+                'response_chars': fix.get('response_chars')
+            }
+            self._count_lookup('query_repair_memo', fix.get('source') == 'memo')
+            if not fix['success']:
+                step['repair_error'] = fix['error']
+                self._add_step(trace, 'repair', step, attempt_started)
+                break
+            
+            tried.add(fix['query_code'])
+            exec_result = self.executor.execute_query(fix['query_code'], context=context, return_frame=return_frame)
+            step['query_code'] = fix['query_code']
+            step['success'] = exec_result['success']
+            self._add_step(trace, 'repair', step, attempt_started)
+            if exec_result['success']:
+                print(f"✓ Query repaired ({fix['source']})")
+                break
+        
+        elapsed = time.perf_counter() - started
+        self.query_repairer.record(
+            failed['executed_code'], failed.get('error_type', 'Error'), failed['error'],
+            exec_result['executed_code'] if exec_result['success'] else None, elapsed
         )
-        trace['steps'].append({
-            'step': 4,
-            'name': 'Answer Synthesis (LLM Call #2)',
-            'log_id': synthesis_result['log_id']
-        })
-        print(f"✓ Answer synthesized (log: {synthesis_result['log_id']})")
+        return {
+            **exec_result,
+            'repair': {
+                'attempts': attempts,
+                'repaired': exec_result['success'],
+                'latency_ms': round(elapsed * 1000, 1)
+            }
+        }
+    
+    def _finish(
+        self,
+        question: str,
+        trace: Dict[str, Any],
+        prepared: Dict[str, Any],
+        synthesis_result: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Record the answer in the trace, save it and build the final result
+        (a failure when synthesis failed, so the error text is never cached)
+        """
+        citations = prepared['citations']
+        exec_result = prepared['exec_result']
         
         # Final result
         trace['final_answer'] = synthesis_result['answer']
         trace['citations'] = citations
+        trace['success'] = 'error' not in synthesis_result
+        if not trace['success']:
+            trace['error'] = synthesis_result['error']
         
         # Save complete trace
         self._save_trace(trace)
         
+        if not trace['success']:
+            return {
+                'success': False,
+                'error': synthesis_result['error'],
+                'trace': trace
+            }
+        
         return {
             'success': True,
             'question': question,
             'answer': synthesis_result['answer'],
             'citations': citations,
+            'result_handle': exec_result['evidence']['result_handle'],
             'trace': trace
         }
     
+    def get_result_page(self, result_handle: str, cursor: int = 0, page_size: int = 20) -> Dict[str, Any]:
+        """
+        Page through the full result of an earlier question
+        No LLM call and no re-execution: rows are read from the spill file
+        """
+        self.warmup()
+        return self.executor.get_result_page(result_handle, cursor, page_size)
+    
+    def _count_lookup(self, cache: str, hit: bool):
+        REGISTRY.counter('samarth_cache_lookups_total', 'Cache lookups by cache and result', cache=cache, result='hit' if hit else 'miss').inc()
+    
     def _save_trace(self, trace: Dict[str, Any]):
-        """Save complete execution trace"""
-        try:
-            import os
-            os.makedirs('llm_logs', exist_ok=True)
-            
-            timestamp = trace['timestamp'].replace(':', '-')
-            filename = f"llm_logs/TRACE_{timestamp}.json"
-            
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(trace, f, indent=2, ensure_ascii=False)
-            
-            print(f"✓ Trace saved: {filename}")
-        except Exception as e:
-            print(f"Warning: Could not save trace: {str(e)}")
-
+        """Queue the complete execution trace for the background trace store"""
+        trace['ended_at'] = time.time()
+        trace['total_ms'] = round((trace['ended_at'] - trace['started_at']) * 1000, 1)
+        REGISTRY.histogram('samarth_request_seconds', 'Whole-question latency').observe(trace['ended_at'] - trace['started_at'])
+        REGISTRY.counter('samarth_requests_total', 'Questions by outcome', outcome='ok' if trace.get('success') else 'error').inc()
+        if get_trace_store().record(dict(trace)):
+            print(f"✓ Trace logged: {trace['request_id']}")
+        else:
+            print("Warning: Trace buffer full, trace dropped")
@@ -4,70 +4,171 @@ LLM Call #1: Understanding + Query Generation
 """
 
 import re
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from gemini_client import GeminiClient
+from data_loader import AgriculturalDataLoader
 from schema_builder import SchemaBuilder
+from entity_vocabulary import EntityVocabulary
+from query_template_cache import QueryTemplateCache
+from intent_parser import IntentParser
+from conversation_store import PREVIOUS_RESULT, is_follow_up
+from config import QUERY_CANDIDATES
 
 class QueryGeneratorGemini:
-    def __init__(self, api_key: str):
-        self.gemini = GeminiClient(api_key)
-        self.schema_builder = SchemaBuilder()
+    def __init__(self, api_key: str, candidates: int = QUERY_CANDIDATES, data_loader: Optional[AgriculturalDataLoader] = None):
+        self.gemini = GeminiClient.shared(api_key)
+        self.schema_builder = SchemaBuilder(data_loader)
         self.max_results = 20
+        # Alternative snippets requested per LLM call (see CandidateRacer)
+        self.candidates = max(1, candidates)
+        
+        # Entity-parameterized cache of generated code
+        data_loader = self.schema_builder.data_loader
+        reserved = set(data_loader.list_dataframes())
+        for name in data_loader.list_dataframes():
+            reserved.update(str(col) for col in data_loader.get_dataframe(name).columns)
+        self.vocabulary = EntityVocabulary(data_loader)
+        self.template_cache = QueryTemplateCache(self.vocabulary, reserved)
+        self.intent_parser = IntentParser(self.vocabulary, data_loader)
     
-    def generate_query(self, question: str) -> Dict[str, Any]:
+    def generate_query(self, question: str, previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         LLM Call #1: Generate pandas query from natural language question
         
+        Common question shapes are answered by the intent parser, and
+        structurally identical questions that only differ in states, districts
+        or crops are served from the template cache, both without an LLM call.
+        
+        previous is the conversation's last result (ConversationStore.get);
+        the prompt then describes it so follow-ups can refine previous_result.
+        
         Returns:
-            Dict with query_code, relevant_datasets, log_id
+            Dict with query_code, relevant_datasets, log_id, cache_hit, and
+            candidates (all alternative snippets, query_code first) when more
+            than one was requested
         """
         try:
-            # Step 1: Determine relevant datasets
-            relevant_datasets = self.schema_builder.get_relevant_datasets(question)
+            prepared = self.prepare_query(question, previous)
+            if 'prompt' not in prepared:
+                return prepared
+            response = self.gemini.call_llm(prepared['prompt'], 'query_generation')
+            return self.complete_query(question, prepared, response)
+        except Exception as e:
+            return self._error_result(e)
+    
+    async def generate_query_async(self, question: str, prepared: Dict[str, Any]) -> Dict[str, Any]:
+        """generate_query for an already prepared question, awaiting the LLM call"""
+        try:
+            if 'prompt' not in prepared:
+                return prepared
+            response = await self.gemini.call_llm_async(prepared['prompt'], 'query_generation')
+            return self.complete_query(question, prepared, response)
+        except Exception as e:
+            return self._error_result(e)
+    
+    def prepare_query(self, question: str, previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Everything before the LLM call (no I/O)
+        
+        Returns:
+            The final generate_query result when no LLM call is needed,
+            otherwise Dict with prompt and relevant_datasets
+        """
+        try:
+            # Follow-ups skip the intent parser and template cache when there is a previous result
+            follow_up = previous is not None and is_follow_up(question)
+            parsed = None if follow_up else self.intent_parser.parse(question)
+            if parsed is not None:
+                return {
+                    'query_code': parsed['query_code'],
+                    'relevant_datasets': parsed['relevant_datasets'],
+                    'log_id': f"intent_parser:{parsed['intent']}",
+                    'raw_response': '',
+                    'cache_hit': True
+                }
+            
+            cached = None if follow_up else self.template_cache.lookup(question)
+            if cached is not None:
+                return {
+                    'query_code': cached['query_code'],
+                    'relevant_datasets': cached['relevant_datasets'],
+                    'log_id': 'template_cache',
+                    'raw_response': '',
+                    'cache_hit': True
+                }
+            
+            # Step 1: Determine relevant datasets (for a follow-up, the ones
+            # the previous result came from)
+            if follow_up and previous['datasets_used']:
+                relevant_datasets = list(previous['datasets_used'])
+            else:
+                relevant_datasets = self.schema_builder.get_relevant_datasets(question)
             
             # Step 2: Build schema XML for those datasets
             schema_xml = self.schema_builder.build_schema_xml(relevant_datasets)
             
             # Step 3: Build full XML prompt
-            prompt = self._build_query_generation_prompt(question, schema_xml)
-            
-            # Step 4: Call LLM
-            response = self.gemini.call_llm(prompt, 'query_generation')
-            
-            # Step 5: Validate response
-            if response is None:
-                raise ValueError("LLM returned None response")
-            
-            if 'response' not in response:
-                raise ValueError("LLM response missing 'response' key")
-            
-            # Step 6: Extract pandas code from response
-            query_code = self._extract_pandas_code(response['response'])
-            
-            if not query_code or query_code.strip() == "":
-                raise ValueError("Failed to extract pandas code from LLM response")
-            
             return {
-                'query_code': query_code,
-                'relevant_datasets': relevant_datasets,
-                'log_id': response.get('log_id', 'unknown'),
-                'raw_response': response.get('response', '')
+                'prompt': self._build_query_generation_prompt(question, schema_xml, previous),
+                'relevant_datasets': relevant_datasets
             }
         except Exception as e:
-            return {
-                'query_code': None,
-                'relevant_datasets': [],
-                'log_id': 'error',
-                'error': str(e),
-                'raw_response': ''
-            }
+            return self._error_result(e)
+    
+    def complete_query(self, question: str, prepared: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate the LLM response and extract its code (raises on failure)"""
+        relevant_datasets = prepared['relevant_datasets']
+        
+        # Step 5: Validate response
+        if response is None:
+            raise ValueError("LLM returned None response")
+        
+        if 'response' not in response:
+            raise ValueError("LLM response missing 'response' key")
+        
+        # A failed call has no code to extract; don't waste an exec on it
+        if not response.get('success', True):
+            raise ValueError(f"LLM call failed: {response['error']}")
+        
+        # Step 6: Extract pandas code from response
+        if self.candidates > 1:
+            candidates = self._extract_candidates(response['response'])
+        else:
+            candidates = [self._extract_pandas_code(response['response'])]
+        query_code = candidates[0]
+        
+        if not query_code or query_code.strip() == "":
+            raise ValueError("Failed to extract pandas code from LLM response")
+        
+        result = {
+            'query_code': query_code,
+            'relevant_datasets': relevant_datasets,
+            'log_id': response.get('log_id', 'unknown'),
+            'raw_response': response.get('response', ''),
+            'prompt_chars': len(prepared['prompt']),
+            'cache_hit': False
+        }
+        if len(candidates) > 1:
+            result['candidates'] = candidates
+        # The pipeline caches the code as a template once it has run successfully
+        return result
+    
+    def _error_result(self, error: Exception) -> Dict[str, Any]:
+        return {
+            'query_code': None,
+            'relevant_datasets': [],
+            'log_id': 'error',
+            'error': str(error),
+            'raw_response': '',
+            'cache_hit': False
+        }
     
-    def _build_query_generation_prompt(self, question: str, schema_xml: str) -> str:
+    def _build_query_generation_prompt(self, question: str, schema_xml: str, previous: Optional[Dict[str, Any]] = None) -> str:
         """Build XML-structured prompt for query generation"""
         prompt = f"""<SYSTEM>You are a senior data analyst who writes precise pandas queries.</SYSTEM>
 
 {schema_xml}
-
+{self._previous_result_xml(previous)}
 <QUESTION>
 {question}
 </QUESTION>
@@ -75,26 +176,81 @@ class QueryGeneratorGemini:
 <CONSTRAINTS>
 - Use exact dataframe names and column names as shown in <SCHEMA>
 - Access dataframes using: data_loader.get_dataframe('dataset_name')
+- Intermediates other questions also need (e.g. mandi counts per state) can be shared:
+  data_loader.cached('name', lambda: ...), where the lambda reads only data_loader
 - Prefer boolean masking, groupby/agg, sort_values
-- Always cap outputs with .head({self.max_results})
+- Return the full result; only use .head(n) when the question asks for a top-N
+  (the executor keeps the first {self.max_results} rows as evidence and pages the rest)
 - Avoid joins unless necessary; if joining, explain key columns
 - Handle null values appropriately
 - Use .str.contains() with case=False for string matching
-- Return a single code block that assigns final result to variable named 'result'
+- Return a single code block that assigns final result to variable named 'result'{self._previous_result_constraint(previous)}
 </CONSTRAINTS>
 
 <OUTPUT_FORMAT>
-Return only the pandas code inside <PANDAS_CODE> tags.
+{self._output_instruction()}
 Example:
 <PANDAS_CODE>
 # Get mandis in Punjab
 mandis_df = data_loader.get_dataframe('agmark_mandis_and_locations')
-result = mandis_df[mandis_df['State Name'].str.contains('Punjab', case=False)].head({self.max_results})
+result = mandis_df[mandis_df['State Name'].str.contains('Punjab', case=False)]
 </PANDAS_CODE>
 </OUTPUT_FORMAT>"""
         
         return prompt
     
+    def _previous_result_xml(self, previous: Optional[Dict[str, Any]]) -> str:
+        """<PREVIOUS_RESULT> section: the last question, its code and the shape of its result"""
+        if previous is None:
+            return ""
+        columns = "\n".join(
+            f"    <column name=\"{col}\" dtype=\"{dtype}\"/>"
+            for col, dtype in zip(previous['columns'], previous['dtypes'])
+        )
+        sample_rows = ""
+        for i, row in enumerate(previous['frame'].head(3).to_dict('records')):
+            fields = ", ".join(f"{key}={value}" for key, value in row.items())
+            sample_rows += f"    <row index=\"{i}\">{fields}</row>\n"
+        return f"""
+<PREVIOUS_RESULT name="{PREVIOUS_RESULT}" rows="{previous['rows']}">
+  <question>{previous['question']}</question>
+  <code>
+{previous['query_code']}
+  </code>
+  <columns>
+{columns}
+  </columns>
+  <sample_rows>
+{sample_rows}  </sample_rows>
+</PREVIOUS_RESULT>
+"""
+    
+    def _previous_result_constraint(self, previous: Optional[Dict[str, Any]]) -> str:
+        if previous is None:
+            return ""
+        return (
+            f"\n- If the question follows up on the previous one (\"those\", \"now only ...\"), start from\n"
+            f"  the DataFrame {PREVIOUS_RESULT} (see <PREVIOUS_RESULT>) instead of the source datasets"
+        )
+    
+    def _output_instruction(self) -> str:
+        if self.candidates == 1:
+            return "Return only the pandas code inside <PANDAS_CODE> tags."
+        return (
+            f"Return {self.candidates} alternative solutions, each inside its own <PANDAS_CODE> tags, best first.\n"
+            "Make them genuinely different (e.g. exact vs. contains matching, other candidate columns\n"
+            "or datasets), so that if one fails or finds nothing another may still work."
+        )
+    
+    def _extract_candidates(self, response: str) -> List[str]:
+        """Every distinct <PANDAS_CODE> block, at most self.candidates"""
+        candidates = []
+        for block in re.findall(r'<PANDAS_CODE>(.*?)</PANDAS_CODE>', response, re.DOTALL):
+            code = block.strip()
+            if code and code not in candidates:
+                candidates.append(code)
+        return candidates[:self.candidates] or [self._extract_pandas_code(response)]
+    
     def _extract_pandas_code(self, response: str) -> str:
         """Extract code from <PANDAS_CODE> tags"""
         match = re.search(r'<PANDAS_CODE>(.*?)</PANDAS_CODE>', response, re.DOTALL)
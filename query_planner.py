@@ -0,0 +1,570 @@
+"""
+Query Planner - Static cost estimation for generated pandas code
+Predicts row explosion from merges, groupbys and explodes before execution
+"""
+
+import ast
+import operator
+import re
+from typing import Dict, Any, Callable, List, Optional, Tuple
+import pandas as pd
+from data_loader import AgriculturalDataLoader
+from config import MAX_ESTIMATED_ROWS, PLANNER_MODE, EXPLODE_DEFAULT_FACTOR
+
+# GroupBy methods that reduce each group to one row
+GROUP_REDUCERS = {
+    'size', 'count', 'sum', 'mean', 'median', 'min', 'max', 'std', 'var',
+    'nunique', 'first', 'last', 'agg', 'aggregate', 'prod'
+}
+
+# Methods that cap the row count at their first argument
+ROW_LIMITERS = {'head', 'tail', 'nlargest', 'nsmallest', 'sample'}
+
+# Calls that only reformat a column before it is compared in a filter
+COLUMN_FORMATTERS = {'strip', 'lstrip', 'rstrip', 'lower', 'upper', 'title', 'casefold', 'astype'}
+
+NUMERIC_COMPARISONS = {ast.Gt: operator.gt, ast.GtE: operator.ge, ast.Lt: operator.lt, ast.LtE: operator.le}
+
+# Methods returning a boolean mask
+MASK_METHODS = {'isin', 'contains', 'startswith', 'endswith', 'between', 'isna', 'isnull', 'notna', 'notnull'}
+
+# A filter condition: column and a test for one of its values
+Condition = Tuple[str, Callable[[Any], bool]]
+
+
+class QueryPlanner:
+    """
+    Walks the AST of a query and estimates the cardinality of every merge,
+    groupby and explode, using key-frequency statistics from the data loader.
+
+    Filters on a dataset's columns (comparisons with constants, isin,
+    str.contains/startswith/endswith, combined with & | ~) are applied to
+    those statistics, so a filtered merge is costed on the matching keys.
+    String tests ignore case and surrounding spaces, which errs high. Other
+    filters are assumed to keep every row; operations after one are marked
+    after_filter, and a plan that is over the limit only because of those
+    is 'uncertain' (warned about rather than refused).
+    """
+
+    def __init__(
+        self,
+        data_loader: AgriculturalDataLoader,
+        max_estimated_rows: int = MAX_ESTIMATED_ROWS,
+        mode: str = PLANNER_MODE
+    ):
+        if mode not in ('refuse', 'warn', 'off'):
+            raise ValueError(f"Unknown planner mode: {mode}")
+        self.data_loader = data_loader
+        self.max_estimated_rows = max_estimated_rows
+        self.mode = mode
+
+    def plan(self, query_code: str) -> Dict[str, Any]:
+        """
+        Estimate the cost of a query without running it
+
+        Returns:
+            Dict with operations (one entry per merge/groupby/explode),
+            estimated_rows (the largest intermediate), exceeds_limit and
+            uncertain (every operation over the limit follows a filter
+            whose selectivity is unknown)
+        """
+        plan = {
+            'operations': [],
+            'estimated_rows': 0,
+            'exceeds_limit': False,
+            'uncertain': False
+        }
+        if self.mode == 'off':
+            return plan
+
+        try:
+            tree = ast.parse(query_code)
+        except SyntaxError:
+            # Let exec surface the syntax error
+            return plan
+
+        env: Dict[str, Dict[str, Any]] = {}
+        for stmt in tree.body:
+            self._visit_statement(stmt, env, plan['operations'])
+
+        if plan['operations']:
+            plan['estimated_rows'] = max(op['estimated_rows'] for op in plan['operations'])
+        over = [op for op in plan['operations'] if op['estimated_rows'] > self.max_estimated_rows]
+        plan['exceeds_limit'] = bool(over)
+        plan['uncertain'] = bool(over) and all(op.get('after_filter') for op in over)
+        return plan
+
+    def _visit_statement(self, stmt: ast.stmt, env: Dict[str, Dict[str, Any]], operations: List[Dict[str, Any]]):
+        """Track frame estimates through assignments, in statement order"""
+        if isinstance(stmt, ast.Assign):
+            estimate = self._estimate(stmt.value, env, operations)
+            if self._is_mask(stmt.value):
+                # Remembered so that frame[mask] can apply it later
+                estimate = {'mask': stmt.value}
+            for target in stmt.targets:
+                if isinstance(target, ast.Name):
+                    if estimate is None:
+                        env.pop(target.id, None)
+                    else:
+                        env[target.id] = estimate
+        elif isinstance(stmt, (ast.Expr, ast.AugAssign, ast.AnnAssign)) and stmt.value is not None:
+            self._estimate(stmt.value, env, operations)
+        else:
+            # Loops, conditionals etc.: visit nested statements in order
+            for field in ('body', 'orelse', 'finalbody'):
+                for child in getattr(stmt, field, []) or []:
+                    self._visit_statement(child, env, operations)
+
+    def _estimate(self, node: ast.AST, env: Dict[str, Dict[str, Any]], operations: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Estimate the frame an expression evaluates to
+
+        Returns a dict with dataset, rows, full_rows, column, unique_keys,
+        list_len, conditions (filters applied to the dataset), matched_rows
+        (dataset rows meeting them) and filtered (an unknown filter was
+        applied), or None if the expression cannot be traced to a dataset.
+        """
+        if isinstance(node, ast.Name):
+            frame = env.get(node.id)
+            return None if frame is None or 'mask' in frame else frame
+
+        if isinstance(node, ast.Subscript):
+            base = self._estimate(node.value, env, operations)
+            if base is None:
+                return None
+            key = node.slice
+            if isinstance(key, ast.Constant) and isinstance(key.value, str):
+                return dict(base, column=key.value)
+            if isinstance(key, ast.Tuple) and key.elts:
+                # .loc[rows, columns]
+                key = key.elts[0]
+            if isinstance(key, ast.Name) and 'mask' in env.get(key.id, {}):
+                key = env[key.id]['mask']
+            if isinstance(key, (ast.List, ast.Slice, ast.Constant)) or (isinstance(key, ast.Name) and key.id not in env):
+                # Column lists and slices keep (at most) every row
+                return dict(base, column=None)
+            return self._estimate_filter(base, key, env)
+
+        if isinstance(node, ast.Attribute):
+            # Accessors (.str, .dt, .loc, .iloc) keep the underlying estimate
+            return self._estimate(node.value, env, operations)
+
+        if not isinstance(node, ast.Call):
+            return self._visit_children(node, env, operations)
+
+        func = node.func
+        name = func.attr if isinstance(func, ast.Attribute) else func.id if isinstance(func, ast.Name) else None
+
+        if name == 'get_dataframe' and node.args and isinstance(node.args[0], ast.Constant):
+            df = self.data_loader.get_dataframe(node.args[0].value)
+            if df is None:
+                return None
+            return self._frame(node.args[0].value, len(df))
+
+        if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id == 'pd':
+            if name == 'merge' and len(node.args) >= 2:
+                left = self._estimate(node.args[0], env, operations)
+                right = self._estimate(node.args[1], env, operations)
+                return self._estimate_merge(node, left, right, operations)
+            if name == 'concat' and node.args and isinstance(node.args[0], (ast.List, ast.Tuple)):
+                parts = [self._estimate(elt, env, operations) for elt in node.args[0].elts]
+                if any(part is None for part in parts):
+                    return None
+                return self._frame(None, sum(part['rows'] for part in parts), filtered=any(part.get('filtered') for part in parts))
+            return self._visit_children(node, env, operations)
+
+        if not isinstance(func, ast.Attribute):
+            return self._visit_children(node, env, operations)
+
+        base = self._estimate(func.value, env, operations)
+        if base is None:
+            for arg in list(node.args) + [kw.value for kw in node.keywords]:
+                self._estimate(arg, env, operations)
+            return None
+
+        if name in ('merge', 'join') and node.args:
+            right = self._estimate(node.args[0], env, operations)
+            return self._estimate_merge(node, base, right, operations, is_join=(name == 'join'))
+
+        if name == 'groupby':
+            keys = self._string_list(self._argument(node, 0, 'by'))
+            groups = self._estimate_groups(base, keys)
+            operations.append({
+                'op': 'groupby',
+                'line': node.lineno,
+                'keys': keys,
+                'estimated_rows': groups,
+                'after_filter': bool(base.get('filtered'))
+            })
+            return dict(base, grouped_rows=groups, group_keys=keys)
+
+        if 'grouped_rows' in base:
+            # Aggregations collapse to one row per group; transforms keep every row
+            if name in GROUP_REDUCERS:
+                return self._frame(None, base['grouped_rows'], unique_keys=base['group_keys'], filtered=base.get('filtered'))
+            return dict(
+                self._frame(base['dataset'], base['rows'], base['full_rows'], filtered=base.get('filtered')),
+                conditions=base.get('conditions') or [],
+                matched_rows=base.get('matched_rows')
+            )
+
+        if name in ROW_LIMITERS:
+            limit = self._argument(node, 0, 'n')
+            if isinstance(limit, ast.Constant) and isinstance(limit.value, int):
+                return dict(base, rows=min(base['rows'], limit.value))
+            return base
+
+        if name == 'split' and base.get('column') and base.get('dataset'):
+            separator = self._argument(node, 0, 'pat')
+            sep = separator.value if isinstance(separator, ast.Constant) else None
+            return dict(base, list_len=self._average_pieces(base['dataset'], base['column'], sep))
+
+        if name == 'explode':
+            factor = base.get('list_len') or EXPLODE_DEFAULT_FACTOR
+            rows = int(base['rows'] * factor)
+            operations.append({
+                'op': 'explode',
+                'line': node.lineno,
+                'factor': round(factor, 2),
+                'estimated_rows': rows,
+                'after_filter': bool(base.get('filtered'))
+            })
+            return dict(base, rows=rows, list_len=None)
+
+        if name in ('drop_duplicates', 'unique', 'value_counts'):
+            keys = self._string_list(self._argument(node, 0, 'subset'))
+            if base.get('column'):
+                keys = [base['column']]
+            if keys and base.get('dataset'):
+                return self._frame(None, self._estimate_groups(base, keys), unique_keys=keys, filtered=base.get('filtered'))
+            return base
+
+        if name == 'query':
+            # A filter written as a string: its selectivity is unknown
+            return dict(base, filtered=True)
+
+        # Everything else (sort_values, reset_index, fillna, str ops, ...) keeps the row count
+        return base
+
+    def _visit_children(self, node: ast.AST, env: Dict[str, Dict[str, Any]], operations: List[Dict[str, Any]]) -> None:
+        """Untraceable expression: still look inside it for merges and groupbys"""
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, ast.expr):
+                self._estimate(child, env, operations)
+        return None
+
+    def _estimate_merge(
+        self,
+        node: ast.Call,
+        left: Optional[Dict[str, Any]],
+        right: Optional[Dict[str, Any]],
+        operations: List[Dict[str, Any]],
+        is_join: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """Estimate merge output from the joint key frequencies on both sides"""
+        if left is None or right is None:
+            return None
+
+        how = self._constant(self._keyword(node, 'how')) or ('left' if is_join else 'inner')
+        on = self._string_list(self._keyword(node, 'on'))
+        left_keys = self._string_list(self._keyword(node, 'left_on')) or on
+        right_keys = self._string_list(self._keyword(node, 'right_on')) or ([] if is_join else on)
+        if not left_keys and not right_keys and not is_join:
+            left_keys = right_keys = self._common_columns(left, right)
+
+        if how == 'cross':
+            rows = left['rows'] * right['rows']
+        else:
+            rows = self._join_size(left, left_keys, right, right_keys)
+            if how == 'left':
+                rows = max(rows, left['rows'])
+            elif how == 'right':
+                rows = max(rows, right['rows'])
+            elif how == 'outer':
+                rows = max(rows, left['rows'] + right['rows'])
+
+        filtered = bool(left.get('filtered') or right.get('filtered'))
+        operations.append({
+            'op': 'join' if is_join else 'merge',
+            'line': node.lineno,
+            'how': how,
+            'left_keys': left_keys,
+            'right_keys': right_keys,
+            'estimated_rows': int(rows),
+            'after_filter': filtered
+        })
+        return self._frame(None, int(rows), filtered=filtered)
+
+    def _join_size(self, left: Dict[str, Any], left_keys: List[str], right: Dict[str, Any], right_keys: List[str]) -> int:
+        """
+        Sum over shared keys of freq_left(k) * freq_right(k) (counting only
+        rows that pass each side's filters), scaled down when either side was
+        already limited. A side whose keys are known to be unique (an
+        aggregate) matches at most one row per key.
+        """
+        if self._is_unique_on(right, right_keys):
+            return left['rows']
+        if self._is_unique_on(left, left_keys):
+            return right['rows']
+
+        left_freq = self._frequencies(left, left_keys)
+        right_freq = self._frequencies(right, right_keys)
+        if left_freq is None or right_freq is None:
+            # No statistics: assume one side is unique on the key
+            return max(left['rows'], right['rows'])
+
+        shared = left_freq.index.intersection(right_freq.index)
+        full = float((left_freq.reindex(shared).to_numpy() * right_freq.reindex(shared).to_numpy()).sum())
+        return int(full * self._sampled(left) * self._sampled(right))
+
+    def _sampled(self, frame: Dict[str, Any]) -> float:
+        """Rows the frame has per dataset row passing its filters (below 1 after head(), above after explode())"""
+        matched = frame.get('matched_rows') if frame.get('conditions') else frame['full_rows']
+        return frame['rows'] / matched if matched else 0.0
+
+    def _estimate_groups(self, frame: Dict[str, Any], keys: List[str]) -> int:
+        """Number of distinct key combinations, capped by the frame's row count"""
+        if self._is_unique_on(frame, keys):
+            return frame['rows']
+        frequencies = self._frequencies(frame, keys)
+        if frequencies is None:
+            return frame['rows']
+        return min(len(frequencies), frame['rows'])
+
+    def _frequencies(self, frame: Dict[str, Any], keys: List[str]):
+        """Key frequencies in the frame's dataset, among rows that pass its filters"""
+        if not frame.get('dataset') or not keys:
+            return None
+        conditions = frame.get('conditions')
+        if not conditions:
+            return self.data_loader.get_key_frequencies(frame['dataset'], keys)
+        columns = list(dict.fromkeys(list(keys) + [column for column, _ in conditions]))
+        frequencies = self._matching(frame['dataset'], columns, conditions)
+        if frequencies is None:
+            return self.data_loader.get_key_frequencies(frame['dataset'], keys)
+        if frequencies.empty:
+            return pd.Series([], index=pd.MultiIndex.from_tuples([], names=keys), dtype='int64')
+        grouped = frequencies.groupby(level=list(range(len(keys)))).sum()
+        if not isinstance(grouped.index, pd.MultiIndex):
+            # Keep one-column keys as 1-tuples, like get_key_frequencies
+            grouped.index = pd.MultiIndex.from_arrays([grouped.index], names=keys)
+        return grouped
+
+    def _estimate_filter(self, base: Dict[str, Any], mask: ast.AST, env: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """frame[mask]: apply the conditions the mask is made of to the dataset statistics"""
+        conditions, known = self._conditions(mask, base, env)
+        filtered = dict(base, conditions=(base.get('conditions') or []) + conditions)
+        if not known:
+            filtered['filtered'] = True
+        if conditions:
+            columns = list(dict.fromkeys(column for column, _ in filtered['conditions']))
+            matching = self._matching(base['dataset'], columns, filtered['conditions'])
+            if matching is None:
+                filtered['conditions'] = base.get('conditions') or []
+                filtered['filtered'] = True
+            else:
+                matched = int(matching.sum())
+                filtered['matched_rows'] = matched
+                filtered['rows'] = min(base['rows'], matched)
+        return filtered
+
+    def _matching(self, dataset: str, columns: List[str], conditions: List[Condition]):
+        """Frequencies of (columns) values among dataset rows meeting every condition, or None"""
+        frequencies = self.data_loader.get_key_frequencies(dataset, columns)
+        if frequencies is None:
+            return None
+        positions = [(columns.index(column), test) for column, test in conditions]
+        keep = [all(test(key[i]) for i, test in positions) for key in frequencies.index]
+        return frequencies[keep]
+
+    def _conditions(self, mask: ast.AST, base: Dict[str, Any], env: Dict[str, Dict[str, Any]]) -> Tuple[List[Condition], bool]:
+        """
+        Conditions a boolean mask is the conjunction of
+
+        Returns:
+            (conditions, known), known being False if part of the mask could
+            not be read (that part is assumed to keep every row)
+        """
+        if isinstance(mask, ast.Name) and 'mask' in env.get(mask.id, {}):
+            mask = env[mask.id]['mask']
+        if isinstance(mask, ast.BoolOp) and isinstance(mask.op, ast.And):
+            parts = mask.values
+        elif isinstance(mask, ast.BinOp) and isinstance(mask.op, ast.BitAnd):
+            parts = [mask.left, mask.right]
+        else:
+            condition = self._condition(mask, base, env)
+            return ([condition], True) if condition is not None else ([], False)
+        conditions, known = [], True
+        for part in parts:
+            part_conditions, part_known = self._conditions(part, base, env)
+            conditions += part_conditions
+            known = known and part_known
+        return conditions, known
+
+    def _condition(self, mask: ast.AST, base: Dict[str, Any], env: Dict[str, Dict[str, Any]]) -> Optional[Condition]:
+        """One column's test from a comparison, isin or str method (or | and ~ of those on one column)"""
+        if not base.get('dataset'):
+            return None
+        if isinstance(mask, ast.UnaryOp) and isinstance(mask.op, ast.Invert):
+            inner = self._condition(mask.operand, base, env)
+            return None if inner is None else (inner[0], lambda value, test=inner[1]: not test(value))
+        if isinstance(mask, ast.BinOp) and isinstance(mask.op, ast.BitOr):
+            left = self._condition(mask.left, base, env)
+            right = self._condition(mask.right, base, env)
+            if left is None or right is None or left[0] != right[0]:
+                return None
+            return left[0], lambda value, a=left[1], b=right[1]: a(value) or b(value)
+
+        if isinstance(mask, ast.Compare) and len(mask.ops) == 1:
+            column, constant, op = self._column_of(mask.left, base, env), mask.comparators[0], type(mask.ops[0])
+            if column is None:
+                column, constant, op = self._column_of(mask.comparators[0], base, env), mask.left, self._mirrored(op)
+            if column is None or not isinstance(constant, ast.Constant):
+                return None
+            value = constant.value
+            if op in (ast.Eq, ast.NotEq):
+                target = self._normalized(value)
+                equal = lambda cell: self._normalized(cell) == target
+                return (column, equal) if op is ast.Eq else (column, lambda cell: not equal(cell))
+            if op in NUMERIC_COMPARISONS and isinstance(value, (int, float)) and not isinstance(value, bool):
+                compare = NUMERIC_COMPARISONS[op]
+                return column, lambda cell: self._number(cell) is not None and compare(self._number(cell), value)
+            return None
+
+        if not (isinstance(mask, ast.Call) and isinstance(mask.func, ast.Attribute)):
+            return None
+        name = mask.func.attr
+        column = self._column_of(mask.func.value, base, env)
+        argument = self._argument(mask, 0, 'values' if name == 'isin' else 'pat')
+        if column is None or argument is None:
+            return None
+        if name == 'isin' and isinstance(argument, (ast.List, ast.Tuple, ast.Set)):
+            if not all(isinstance(elt, ast.Constant) for elt in argument.elts):
+                return None
+            targets = {self._normalized(elt.value) for elt in argument.elts}
+            return column, lambda cell: self._normalized(cell) in targets
+        if name in ('startswith', 'endswith'):
+            prefixes = argument.elts if isinstance(argument, ast.Tuple) else [argument]
+            if not all(isinstance(elt, ast.Constant) and isinstance(elt.value, str) for elt in prefixes):
+                return None
+            affixes = tuple(elt.value.strip().lower() for elt in prefixes)
+            return column, lambda cell: getattr(self._normalized(cell), name)(affixes)
+        if name == 'contains' and isinstance(argument, ast.Constant) and isinstance(argument.value, str):
+            regex = self._constant(self._keyword(mask, 'regex'))
+            try:
+                pattern = re.compile(argument.value if regex is not False else re.escape(argument.value), re.IGNORECASE)
+            except re.error:
+                return None
+            return column, lambda cell: cell is not None and pattern.search(str(cell)) is not None
+        return None
+
+    def _is_mask(self, node: ast.AST) -> bool:
+        """Whether an expression looks like a boolean row mask"""
+        if isinstance(node, (ast.Compare, ast.BoolOp)):
+            return True
+        if isinstance(node, ast.UnaryOp):
+            return isinstance(node.op, ast.Invert)
+        if isinstance(node, ast.BinOp):
+            return isinstance(node.op, (ast.BitAnd, ast.BitOr))
+        return isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in MASK_METHODS
+
+    def _column_of(self, node: ast.AST, base: Dict[str, Any], env: Dict[str, Dict[str, Any]]) -> Optional[str]:
+        """Column of base's dataset that node reads (through .str and formatting calls), if any"""
+        while True:
+            if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in COLUMN_FORMATTERS:
+                node = node.func.value
+            elif isinstance(node, ast.Attribute) and node.attr == 'str':
+                node = node.value
+            else:
+                break
+        if isinstance(node, ast.Subscript) and isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str):
+            frame = self._estimate(node.value, env, [])
+            column = node.slice.value
+        elif isinstance(node, ast.Name):
+            frame = env.get(node.id)
+            column = frame.get('column') if frame else None
+        else:
+            return None
+        if frame is None or column is None or frame.get('dataset') != base['dataset']:
+            return None
+        return column
+
+    def _mirrored(self, op: type) -> type:
+        """The comparison with its operands swapped ('5 < x' is 'x > 5')"""
+        return {ast.Gt: ast.Lt, ast.Lt: ast.Gt, ast.GtE: ast.LtE, ast.LtE: ast.GtE}.get(op, op)
+
+    def _normalized(self, value: Any) -> str:
+        return str(value).strip().lower()
+
+    def _number(self, value: Any) -> Optional[float]:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    def _is_unique_on(self, frame: Dict[str, Any], keys: List[str]) -> bool:
+        unique_keys = frame.get('unique_keys')
+        return bool(unique_keys) and bool(keys) and set(unique_keys) <= set(keys)
+
+    def _common_columns(self, left: Dict[str, Any], right: Dict[str, Any]) -> List[str]:
+        if not left.get('dataset') or not right.get('dataset'):
+            return []
+        left_df = self.data_loader.get_dataframe(left['dataset'])
+        right_df = self.data_loader.get_dataframe(right['dataset'])
+        return [col for col in left_df.columns if col in right_df.columns]
+
+    def _average_pieces(self, dataset: str, column: str, separator: Optional[str]) -> Optional[float]:
+        """Mean number of pieces str.split would produce on a dataset column"""
+        df = self.data_loader.get_dataframe(dataset)
+        if df is None or column not in df.columns:
+            return None
+        values = df[column].dropna().astype(str)
+        if values.empty:
+            return None
+        if separator is None:
+            return float(values.str.split().str.len().mean())
+        return float(values.str.count(re.escape(separator)).mean() + 1)
+
+    def _frame(
+        self,
+        dataset: Optional[str],
+        rows: int,
+        full_rows: Optional[int] = None,
+        unique_keys: Optional[List[str]] = None,
+        filtered: bool = False
+    ) -> Dict[str, Any]:
+        return {
+            'dataset': dataset,
+            'rows': rows,
+            'full_rows': full_rows or max(rows, 1),
+            'column': None,
+            'unique_keys': unique_keys,
+            'list_len': None,
+            'conditions': [],
+            'matched_rows': None,
+            'filtered': bool(filtered)
+        }
+
+    def _argument(self, node: ast.Call, position: int, keyword: str) -> Optional[ast.AST]:
+        if len(node.args) > position:
+            return node.args[position]
+        return self._keyword(node, keyword)
+
+    def _keyword(self, node: ast.Call, name: str) -> Optional[ast.AST]:
+        for kw in node.keywords:
+            if kw.arg == name:
+                return kw.value
+        return None
+
+    def _constant(self, node: Optional[ast.AST]) -> Any:
+        return node.value if isinstance(node, ast.Constant) else None
+
+    def _string_list(self, node: Optional[ast.AST]) -> List[str]:
+        """Literal column name or list of names; anything else is unknown"""
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            return [node.value]
+        if isinstance(node, (ast.List, ast.Tuple)):
+            names = [elt.value for elt in node.elts if isinstance(elt, ast.Constant) and isinstance(elt.value, str)]
+            if len(names) == len(node.elts):
+                return names
+        return []
@@ -0,0 +1,238 @@
+"""
+Query Repairer for Project Samarth
+Fixes generated pandas code that failed to execute, remembering fixes that worked
+"""
+
+import ast
+import difflib
+import io
+import re
+import threading
+import tokenize
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Set, Tuple
+from gemini_client import GeminiClient
+from data_loader import AgriculturalDataLoader
+from llm_resilience import LatencyTracker
+from config import QUERY_REPAIR_ATTEMPTS, QUERY_REPAIR_MEMO_SIZE
+
+# Tokens that may differ between a failing snippet and its fix without
+# changing what the fix means
+IGNORED_TOKENS = {tokenize.COMMENT, tokenize.NL, tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT, tokenize.ENDMARKER}
+
+
+class QueryRepairer:
+    """
+    Proposes a fix for a failed snippet: first from memory, then from a
+    small LLM call carrying only the question, the failing code, the error
+    and the columns of the datasets the code reads (closest matches called
+    out for a KeyError).
+
+    A fix that ran successfully is remembered under the error signature
+    (error type, message and datasets). If it only changed string literals
+    (e.g. 'State' -> 'State Name') the substitution is reapplied to any code
+    failing the same way; otherwise it is reused for the identical code only.
+    """
+
+    def __init__(
+        self,
+        gemini: GeminiClient,
+        data_loader: AgriculturalDataLoader,
+        max_attempts: int = QUERY_REPAIR_ATTEMPTS,
+        memo_size: int = QUERY_REPAIR_MEMO_SIZE
+    ):
+        self.gemini = gemini
+        self.data_loader = data_loader
+        self.max_attempts = max_attempts
+        self.memo_size = memo_size
+        self._substitutions: "OrderedDict[str, Dict[str, str]]" = OrderedDict()
+        self._exact: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.repair_times = LatencyTracker(window=500)
+        self.counters = {
+            'failed_queries': 0, 'repaired': 0, 'attempts': 0,
+            'memo_fixes': 0, 'llm_fixes': 0, 'memo_stored': 0
+        }
+
+    def fix(self, question: str, query_code: str, error_type: str, error: str, tried: Set[str]) -> Dict[str, Any]:
+        """
+        Propose corrected code for a failure; codes in tried are not proposed again
+
+        Returns:
+            Dict with success, query_code, source ('memo' or 'llm') and
+            log_id, or success False and error
+        """
+        signature = self.signature(query_code, error_type, error)
+        memo_code = self._from_memo(signature, query_code)
+        with self._lock:
+            self.counters['attempts'] += 1
+            if memo_code is not None and memo_code not in tried:
+                self.counters['memo_fixes'] += 1
+                return {'success': True, 'query_code': memo_code, 'source': 'memo', 'log_id': 'repair_memo'}
+            self.counters['llm_fixes'] += 1
+
+        prompt = self._build_repair_prompt(question, query_code, error_type, error)
+        response = self.gemini.call_llm(prompt, 'query_repair')
+        sizes = {'prompt_chars': len(prompt), 'response_chars': len(response.get('response', ''))}
+        if not response.get('success', True):
+            return {'success': False, 'error': f"LLM call failed: {response['error']}", 'log_id': response.get('log_id', 'error'), **sizes}
+        fixed = self._extract_code(response.get('response', ''))
+        if not fixed or fixed in tried:
+            return {'success': False, 'error': 'No new code in repair response', 'log_id': response.get('log_id', 'unknown'), **sizes}
+        return {'success': True, 'query_code': fixed, 'source': 'llm', 'log_id': response.get('log_id', 'unknown'), **sizes}
+
+    def record(self, failed_code: str, error_type: str, error: str, fixed_code: Optional[str], seconds: float):
+        """Note the outcome of one failed query's repair loop; remember the fix if there is one"""
+        with self._lock:
+            self.counters['failed_queries'] += 1
+            self.repair_times.add(seconds)
+            if fixed_code is None:
+                return
+            self.counters['repaired'] += 1
+            signature = self.signature(failed_code, error_type, error)
+            self._remember(self._exact, (signature, failed_code), fixed_code)
+            substitutions = self._literal_substitutions(failed_code, fixed_code)
+            if substitutions:
+                self._remember(self._substitutions, signature, substitutions)
+            self.counters['memo_stored'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Repair rate, where fixes came from and the latency repairs add"""
+        with self._lock:
+            failed = self.counters['failed_queries']
+            samples = self.repair_times.samples
+            return {
+                **self.counters,
+                'repair_rate': round(self.counters['repaired'] / failed, 3) if failed else 0.0,
+                'memo_size': len(self._exact) + len(self._substitutions),
+                'repair_ms_mean': round(sum(samples) / len(samples) * 1000, 1) if samples else None,
+                'repair_ms_p95': round(self.repair_times.percentile(95) * 1000, 1) if samples else None
+            }
+
+    def signature(self, query_code: str, error_type: str, error: str) -> str:
+        """e.g. "KeyError: 'State' @ agmark_mandis_and_locations" """
+        message = re.sub(r"\s+", ' ', error).strip()[:200]
+        return f"{error_type}: {message} @ {','.join(self._datasets_used(query_code))}"
+
+    def _from_memo(self, signature: str, query_code: str) -> Optional[str]:
+        with self._lock:
+            exact = self._exact.get((signature, query_code))
+            if exact is not None:
+                self._exact.move_to_end((signature, query_code))
+                return exact
+            substitutions = self._substitutions.get(signature)
+            if substitutions is not None:
+                self._substitutions.move_to_end(signature)
+        if substitutions is None:
+            return None
+        fixed = self._substitute(query_code, substitutions)
+        return fixed if fixed != query_code else None
+
+    def _remember(self, memo: OrderedDict, key: Any, value: Any):
+        memo[key] = value
+        memo.move_to_end(key)
+        while len(memo) > self.memo_size:
+            memo.popitem(last=False)
+
+    def _literal_substitutions(self, failed_code: str, fixed_code: str) -> Optional[Dict[str, str]]:
+        """Old -> new string literal, if that is all the fix changed"""
+        old_tokens, new_tokens = self._tokens(failed_code), self._tokens(fixed_code)
+        if old_tokens is None or new_tokens is None or len(old_tokens) != len(new_tokens):
+            return None
+        substitutions: Dict[str, str] = {}
+        for old, new in zip(old_tokens, new_tokens):
+            if old.type != new.type:
+                return None
+            if old.string == new.string:
+                continue
+            if old.type != tokenize.STRING:
+                return None
+            old_value, new_value = self._literal(old.string), self._literal(new.string)
+            if old_value is None or new_value is None or substitutions.get(old_value, new_value) != new_value:
+                return None
+            substitutions[old_value] = new_value
+        return substitutions or None
+
+    def _substitute(self, query_code: str, substitutions: Dict[str, str]) -> str:
+        """Rewrite every string literal equal to a key of substitutions"""
+        line_offsets = [0]
+        for line in query_code.splitlines(keepends=True):
+            line_offsets.append(line_offsets[-1] + len(line))
+        tokens = self._tokens(query_code) or []
+        pieces, last = [], 0
+        for token in tokens:
+            value = self._literal(token.string) if token.type == tokenize.STRING else None
+            if value not in substitutions:
+                continue
+            start = line_offsets[token.start[0] - 1] + token.start[1]
+            end = line_offsets[token.end[0] - 1] + token.end[1]
+            pieces.append(query_code[last:start])
+            pieces.append(repr(substitutions[value]))
+            last = end
+        pieces.append(query_code[last:])
+        return ''.join(pieces)
+
+    def _tokens(self, query_code: str) -> Optional[List[tokenize.TokenInfo]]:
+        try:
+            tokens = tokenize.generate_tokens(io.StringIO(query_code).readline)
+            return [token for token in tokens if token.type not in IGNORED_TOKENS]
+        except (tokenize.TokenError, SyntaxError):
+            return None
+
+    def _literal(self, token_string: str) -> Optional[str]:
+        try:
+            value = ast.literal_eval(token_string)
+        except (ValueError, SyntaxError):
+            # f-strings and the like are not safe to rewrite
+            return None
+        return value if isinstance(value, str) else None
+
+    def _datasets_used(self, query_code: str) -> List[str]:
+        return sorted(set(re.findall(r"get_dataframe\(['\"]([^'\"]+)['\"]\)", query_code)))
+
+    def _build_repair_prompt(self, question: str, query_code: str, error_type: str, error: str) -> str:
+        """Small XML prompt: the failure plus the schema of the datasets the code reads"""
+        datasets = self._datasets_used(query_code) or list(self.data_loader.list_dataframes())
+        missing = self._literal(error) if error_type == 'KeyError' else None
+
+        schema = "<SCHEMA>\n"
+        for name in datasets:
+            df = self.data_loader.get_dataframe(name)
+            if df is None:
+                continue
+            schema += f"  <DATASET name=\"{name}\">\n"
+            for col in df.columns:
+                schema += f"    <column name=\"{col}\" dtype=\"{df[col].dtype}\"/>\n"
+            if missing is not None:
+                closest = difflib.get_close_matches(missing, [str(col) for col in df.columns], n=3, cutoff=0.4)
+                if closest:
+                    schema += f"    <closest_to_missing>{', '.join(closest)}</closest_to_missing>\n"
+            schema += "  </DATASET>\n"
+        schema += "</SCHEMA>"
+
+        return f"""<SYSTEM>You fix pandas queries that failed to run.</SYSTEM>
+
+<QUESTION>
+{question}
+</QUESTION>
+
+<FAILED_CODE>
+{query_code}
+</FAILED_CODE>
+
+<ERROR>
+{error_type}: {error}
+</ERROR>
+
+{schema}
+
+<OUTPUT_FORMAT>
+Return only the corrected code inside <PANDAS_CODE> tags. Change only what the error
+requires, use exact names from <SCHEMA>, and assign the final result to 'result'.
+</OUTPUT_FORMAT>"""
+
+    def _extract_code(self, response: str) -> str:
+        match = re.search(r'<PANDAS_CODE>(.*?)</PANDAS_CODE>', response, re.DOTALL)
+        if match is None:
+            match = re.search(r'```python(.*?)```', response, re.DOTALL)
+        return match.group(1).strip() if match else ''
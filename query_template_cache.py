@@ -0,0 +1,189 @@
+"""
+Query Template Cache for Project Samarth
+Reuses generated pandas code across questions that differ only in entity names
+"""
+
+import ast
+import io
+import re
+import threading
+import tokenize
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Set, Tuple
+from entity_vocabulary import EntityVocabulary, EntityMention
+from conversation_store import uses_previous_result
+from config import QUERY_TEMPLATE_CACHE_SIZE
+
+
+class QueryTemplateCache:
+    """
+    "How many mandis are there in Punjab?" and "... in Gujarat?" share the
+    skeleton "how many mandis are there in {state}?". On a miss the generated
+    code is stored with each entity literal turned into a slot; on a hit the
+    new question's entities are filled into the slots and no LLM call is made.
+
+    A template is only stored when every entity appears exactly once among
+    the code's string literals (ignoring dataset and column names), and a
+    filled template is only used if each new literal again appears exactly
+    once, so a substitution can never touch the wrong string.
+    """
+
+    def __init__(self, vocabulary: EntityVocabulary, reserved_strings: Set[str], max_size: int = QUERY_TEMPLATE_CACHE_SIZE):
+        self.vocabulary = vocabulary
+        # Dataset and column names: literals that must never be treated as slots
+        self.reserved_strings = {s.lower() for s in reserved_strings}
+        self.max_size = max_size
+        self._templates: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.rejected = 0
+
+    def lookup(self, question: str) -> Optional[Dict[str, Any]]:
+        """
+        Fill a cached template for this question
+
+        Returns:
+            Dict with query_code and relevant_datasets, or None on a miss
+        """
+        skeleton, mentions = self._skeleton(question)
+        with self._lock:
+            template = self._templates.get(skeleton)
+            if template is not None:
+                self._templates.move_to_end(skeleton)
+
+        query_code = None
+        if template is not None:
+            query_code = self._fill(template['code'], [m.value for m in mentions])
+
+        with self._lock:
+            if query_code is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return {
+            'query_code': query_code,
+            'relevant_datasets': template['relevant_datasets']
+        }
+
+    def store(self, question: str, query_code: str, relevant_datasets: List[str]) -> bool:
+        """Turn generated code into a template; returns False if it is not safely parameterizable"""
+        if uses_previous_result(query_code):
+            # Depends on the conversation, not only on the question
+            with self._lock:
+                self.rejected += 1
+            return False
+        skeleton, mentions = self._skeleton(question)
+        code_template = self._parameterize(query_code, mentions)
+        with self._lock:
+            if code_template is None:
+                self.rejected += 1
+                return False
+            self._templates[skeleton] = {
+                'code': code_template,
+                'relevant_datasets': relevant_datasets
+            }
+            self._templates.move_to_end(skeleton)
+            while len(self._templates) > self.max_size:
+                self._templates.popitem(last=False)
+            self.stores += 1
+        return True
+
+    def invalidate(self, question: str):
+        """Drop the template serving this question (e.g. its code failed to execute)"""
+        skeleton, _ = self._skeleton(question)
+        with self._lock:
+            self._templates.pop(skeleton, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss metrics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+                'stores': self.stores,
+                'rejected': self.rejected,
+                'size': len(self._templates)
+            }
+
+    def _skeleton(self, question: str) -> Tuple[str, List[EntityMention]]:
+        """Question with entity mentions replaced by typed slots, normalized"""
+        mentions = self.vocabulary.find_mentions(question)
+        parts, last = [], 0
+        for mention in mentions:
+            parts.append(question[last:mention.start])
+            parts.append('{' + mention.entity_type + '}')
+            last = mention.end
+        parts.append(question[last:])
+        skeleton = re.sub(r"\s+", ' ', ''.join(parts).lower()).strip()
+        return skeleton, mentions
+
+    def _parameterize(self, query_code: str, mentions: List[EntityMention]) -> Optional[List[Any]]:
+        """
+        Split code into literal text and slot indices, e.g.
+        ["result = df[df['State Name'] == '", 0, "']"]
+        """
+        segments: List[Any] = []
+        spans = []
+        for index, mention in enumerate(mentions):
+            found = self._find_in_literals(query_code, mention.value)
+            if len(found) != 1:
+                return None
+            spans.append((found[0][0], found[0][1], index))
+
+        last = 0
+        for start, end, index in sorted(spans):
+            if start < last:
+                return None
+            segments.append(query_code[last:start])
+            segments.append(index)
+            last = end
+        segments.append(query_code[last:])
+        return segments
+
+    def _fill(self, code_template: List[Any], values: List[str]) -> Optional[str]:
+        slots = [segment for segment in code_template if isinstance(segment, int)]
+        if sorted(slots) != list(range(len(values))):
+            return None
+        # Values are spliced inside existing string literals; refuse anything that could end one
+        if any(re.search(r"['\"\\\n]", value) for value in values):
+            return None
+
+        code = ''.join(values[segment] if isinstance(segment, int) else segment for segment in code_template)
+        for value in values:
+            if len(self._find_in_literals(code, value)) != 1:
+                return None
+        return code
+
+    def _find_in_literals(self, query_code: str, value: str) -> List[Tuple[int, int]]:
+        """
+        Absolute (start, end) spans of whole-word, case-insensitive matches of
+        value inside the code's string literals, skipping dataset/column names
+        """
+        pattern = re.compile(r"(?<!\w)" + re.escape(value) + r"(?!\w)", re.IGNORECASE)
+        line_offsets = [0]
+        for line in query_code.splitlines(keepends=True):
+            line_offsets.append(line_offsets[-1] + len(line))
+
+        spans = []
+        try:
+            tokens = list(tokenize.generate_tokens(io.StringIO(query_code).readline))
+        except (tokenize.TokenError, SyntaxError):
+            return []
+        for token in tokens:
+            if token.type != tokenize.STRING:
+                continue
+            try:
+                literal = ast.literal_eval(token.string)
+            except (ValueError, SyntaxError):
+                # f-strings and the like are not safe to rewrite
+                continue
+            if not isinstance(literal, str) or literal.lower() in self.reserved_strings:
+                continue
+            token_start = line_offsets[token.start[0] - 1] + token.start[1]
+            for match in pattern.finditer(token.string):
+                spans.append((token_start + match.start(), token_start + match.end()))
+        return spans
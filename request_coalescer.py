@@ -0,0 +1,126 @@
+"""
+Request Coalescer for Project Samarth
+Identical questions asked at the same time share one pipeline run
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from config import ANSWER_CACHE_TTL_SECONDS, ANSWER_CACHE_SIZE
+
+
+def normalize_question(question: str) -> str:
+    """Case, spacing and trailing punctuation do not change the answer"""
+    return re.sub(r"\s+", ' ', question.strip().lower()).rstrip('?.! ')
+
+
+class RequestCoalescer:
+    """
+    Single-flight execution with a short-TTL answer cache behind it.
+
+    The first caller for a key (the leader) computes the answer; callers
+    arriving while it is in flight wait for it instead of starting their own
+    LLM calls and execution. Successful answers stay cached for ttl_seconds.
+    If the leader fails or gives up (returns None), waiting callers are told
+    to compute the answer themselves.
+
+    Answers are kept as the leader produced them: callers must not modify
+    what they get back.
+    """
+
+    def __init__(self, ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS, max_entries: int = ANSWER_CACHE_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._answers: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {'leaders': 0, 'coalesced': 0, 'cached': 0, 'leader_failures': 0}
+
+    def join(self, key: Hashable) -> Tuple[str, Future]:
+        """
+        Returns:
+            ('cached', done future), ('coalesced', the in-flight future) or
+            ('leader', a new future the caller must pass to finish())
+        """
+        with self._lock:
+            cached = self._answers.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                self._answers.move_to_end(key)
+                self.counters['cached'] += 1
+                future = Future()
+                future.set_result(cached[1])
+                return 'cached', future
+            if cached is not None:
+                del self._answers[key]
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.counters['coalesced'] += 1
+                return 'coalesced', future
+            future = Future()
+            self._in_flight[key] = future
+            self.counters['leaders'] += 1
+            return 'leader', future
+
+    def finish(self, key: Hashable, future: Future, answer: Any, cache: bool = True):
+        """Hand the leader's answer (None if it failed) to everyone waiting, and cache it"""
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+            if answer is None:
+                self.counters['leader_failures'] += 1
+            elif cache and self.ttl_seconds > 0:
+                self._answers[key] = (time.monotonic() + self.ttl_seconds, answer)
+                self._answers.move_to_end(key)
+                while len(self._answers) > self.max_entries:
+                    self._answers.popitem(last=False)
+        future.set_result(answer)
+
+    def run(
+        self,
+        key: Hashable,
+        compute: Callable[[], Any],
+        cacheable: Callable[[Any], bool] = lambda answer: True,
+        shareable: Callable[[Any], bool] = lambda answer: True
+    ) -> Tuple[Any, str]:
+        """
+        compute() once for all concurrent callers with this key. An answer
+        that is not shareable goes to the leader only (waiting callers compute
+        their own); one that is not cacheable is shared but not kept.
+
+        Returns:
+            (answer, role), role being 'leader', 'coalesced' or 'cached'
+        """
+        role, future = self.join(key)
+        if role != 'leader':
+            answer = future.result()
+            if answer is not None:
+                return answer, role
+            # The leader failed: try on our own
+            return compute(), 'leader'
+        answer = None
+        try:
+            answer = compute()
+            return answer, role
+        finally:
+            if answer is not None and not shareable(answer):
+                self.finish(key, future, None)
+            else:
+                self.finish(key, future, answer, cache=answer is not None and cacheable(answer))
+
+    def clear(self):
+        """Forget cached answers (in-flight ones still complete)"""
+        with self._lock:
+            self._answers.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """How many callers shared an answer instead of computing it"""
+        with self._lock:
+            now = time.monotonic()
+            return {
+                **self.counters,
+                'in_flight': len(self._in_flight),
+                'cached_answers': sum(1 for expires, _ in self._answers.values() if expires > now)
+            }
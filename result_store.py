@@ -0,0 +1,149 @@
+"""
+Result Store for Project Samarth
+Spills full query results to Parquet once so front-ends can page through them
+"""
+
+import os
+import time
+import uuid
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from typing import Dict, Any, Optional
+from config import SPILL_DIR, SPILL_ROW_GROUP_SIZE, SPILL_TTL_SECONDS, SPILL_EXPIRE_INTERVAL_SECONDS
+
+
+class ResultStore:
+    """
+    Writes each full result to a zstd-compressed Parquet file identified by a
+    result handle. Row groups are SPILL_ROW_GROUP_SIZE rows, so a page read
+    only decodes the row groups that overlap the requested cursor range.
+    Expired files are swept by save() at most every expire_interval seconds.
+    """
+
+    def __init__(
+        self,
+        spill_dir: str = SPILL_DIR,
+        ttl_seconds: int = SPILL_TTL_SECONDS,
+        expire_interval: float = SPILL_EXPIRE_INTERVAL_SECONDS
+    ):
+        self.spill_dir = spill_dir
+        self.ttl_seconds = ttl_seconds
+        self.expire_interval = expire_interval
+        self._expired_at = 0.0
+        os.makedirs(self.spill_dir, exist_ok=True)
+
+    def save(self, result: pd.DataFrame) -> Optional[str]:
+        """
+        Spill a full DataFrame result to disk
+
+        Returns:
+            Result handle, or None if the result could not be spilled
+        """
+        if not isinstance(result, pd.DataFrame):
+            return None
+
+        if time.time() - self._expired_at >= self.expire_interval:
+            self._expire_old_spills()
+
+        handle = uuid.uuid4().hex
+        try:
+            table = self._to_table(result)
+            pq.write_table(
+                table,
+                self._path(handle),
+                row_group_size=SPILL_ROW_GROUP_SIZE,
+                compression='zstd'
+            )
+        except Exception as e:
+            print(f"Warning: Could not spill result: {str(e)}")
+            return None
+        return handle
+
+    def has(self, handle: str) -> bool:
+        """Whether the handle's spill file exists here (e.g. not written by another replica, not expired)"""
+        try:
+            return os.path.exists(self._path(handle))
+        except KeyError:
+            return False
+
+    def load(self, handle: str) -> pd.DataFrame:
+        """The whole spilled result (raises KeyError once the handle has expired)"""
+        path = self._path(handle)
+        if not os.path.exists(path):
+            raise KeyError(f"Unknown or expired result handle: {handle}")
+        return pq.read_table(path).to_pandas()
+
+    def read_page(self, handle: str, cursor: int = 0, page_size: int = 20) -> Dict[str, Any]:
+        """
+        Read page_size rows starting at row offset cursor
+
+        Returns:
+            Dict with rows (DataFrame), total_rows, cursor and next_cursor
+            (None once the last row has been read)
+        """
+        path = self._path(handle)
+        if not os.path.exists(path):
+            raise KeyError(f"Unknown or expired result handle: {handle}")
+
+        parquet_file = pq.ParquetFile(path)
+        metadata = parquet_file.metadata
+        total_rows = metadata.num_rows
+        cursor = max(0, min(cursor, total_rows))
+        end = min(cursor + page_size, total_rows)
+
+        # Only decode the row groups that overlap [cursor, end)
+        groups = []
+        group_start = 0
+        first_group_start = None
+        for i in range(metadata.num_row_groups):
+            group_rows = metadata.row_group(i).num_rows
+            if group_start < end and group_start + group_rows > cursor:
+                groups.append(i)
+                if first_group_start is None:
+                    first_group_start = group_start
+            group_start += group_rows
+
+        if groups:
+            table = parquet_file.read_row_groups(groups)
+            rows = table.slice(cursor - first_group_start, end - cursor).to_pandas()
+        else:
+            rows = parquet_file.schema_arrow.empty_table().to_pandas()
+
+        return {
+            'handle': handle,
+            'rows': rows,
+            'total_rows': total_rows,
+            'cursor': cursor,
+            'next_cursor': end if end < total_rows else None
+        }
+
+    def _to_table(self, df: pd.DataFrame) -> pa.Table:
+        """Convert to Arrow, stringifying columns Arrow cannot type (mixed objects)"""
+        df = df.copy(deep=False)
+        df.columns = [str(col) for col in df.columns]
+        try:
+            return pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            for col in df.columns:
+                if df[col].dtype == object:
+                    df[col] = df[col].map(lambda v: None if v is None else str(v))
+            return pa.Table.from_pandas(df, preserve_index=False)
+
+    def _expire_old_spills(self):
+        """Delete spill files older than the TTL"""
+        self._expired_at = time.time()
+        cutoff = self._expired_at - self.ttl_seconds
+        try:
+            for name in os.listdir(self.spill_dir):
+                path = os.path.join(self.spill_dir, name)
+                if name.endswith('.parquet') and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+        except OSError as e:
+            print(f"Warning: Could not clean spill directory: {str(e)}")
+
+    def _path(self, handle: str) -> str:
+        # Handles are hex uuids; reject anything that could escape the directory
+        if not handle or not all(c in '0123456789abcdef' for c in handle):
+            raise KeyError(f"Invalid result handle: {handle}")
+        return os.path.join(self.spill_dir, f"{handle}.parquet")
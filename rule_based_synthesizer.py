@@ -0,0 +1,155 @@
+"""
+Rule-Based Answer Synthesizer for Project Samarth
+Deterministic fast path that answers simple results without LLM Call #2
+"""
+
+import re
+import threading
+from typing import Dict, Any, List, Optional
+from config import ANSWER_FAST_PATH, FAST_PATH_MAX_LIST_ITEMS
+
+COUNT_PATTERNS = [
+    # "How many mandis are there in Punjab?" -> noun "mandis", rest " in Punjab"
+    re.compile(r"^how many (?P<noun>.+?)\s+(?:are there|is there|were there|are|exist)\b(?P<rest>.*)$", re.IGNORECASE),
+    re.compile(r"^how many (?P<noun>.+)$", re.IGNORECASE),
+    re.compile(r"^(?:what is |give me |find )?(?:the )?(?:number|count|total number) of (?P<noun>.+)$", re.IGNORECASE),
+    re.compile(r"^count (?:the |all )?(?P<noun>.+)$", re.IGNORECASE),
+]
+
+# A verb left inside the captured phrase means the question has more
+# structure than the template can restate ("how many mandis does Punjab have")
+VERB_WORDS = {
+    'do', 'does', 'did', 'has', 'have', 'had', 'is', 'was', 'can', 'could',
+    'will', 'would', 'should', 'compare', 'versus', 'vs'
+}
+
+LIST_PATTERNS = [
+    # "List all districts in Punjab" -> noun "districts in Punjab"
+    re.compile(r"^(?:list|show|name|give me|get)(?: me)?(?: all| the| every)* (?P<noun>.+)$", re.IGNORECASE),
+    re.compile(r"^(?:which|what) (?:are|were) (?:the |all )?(?P<noun>.+)$", re.IGNORECASE),
+]
+
+
+class RuleBasedSynthesizer:
+    """
+    Answers questions whose evidence needs no interpretation: a count
+    question over a single number (a scalar or a one-row, one-number
+    result), or a count/list question over a short, uncapped list of names.
+    Anything else returns None so the caller falls back to the LLM.
+
+    Answers follow the LLM's output format (text, then a Sources list built
+    from QueryExecutor.build_citations), and hit/fallback counts are kept
+    for stats().
+    """
+
+    def __init__(self, enabled: bool = ANSWER_FAST_PATH, max_list_items: int = FAST_PATH_MAX_LIST_ITEMS):
+        self.enabled = enabled
+        self.max_list_items = max_list_items
+        self._lock = threading.Lock()
+        self.fast_path = 0
+        self.fallbacks = 0
+
+    def synthesize(self, question: str, evidence: Dict[str, Any], citations: List[Dict[str, str]]) -> Optional[Dict[str, Any]]:
+        """
+        Returns:
+            Same dict shape as AnswerSynthesizer.synthesize_answer, or None
+            when the result needs the LLM
+        """
+        answer = self._render(question.strip(), evidence) if self.enabled else None
+        with self._lock:
+            if answer is None:
+                self.fallbacks += 1
+                return None
+            self.fast_path += 1
+
+        if citations:
+            answer += "\n\nSources:\n" + '\n'.join(f"- {citation['name']}" for citation in citations)
+        return {
+            'answer': answer,
+            'citations': citations,
+            'log_id': 'fast_path',
+            'raw_response': ''
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """How often the fast path answered instead of the LLM"""
+        with self._lock:
+            total = self.fast_path + self.fallbacks
+            return {
+                'enabled': self.enabled,
+                'fast_path': self.fast_path,
+                'llm_fallbacks': self.fallbacks,
+                'fast_path_ratio': round(self.fast_path / total, 3) if total else 0.0
+            }
+
+    def _render(self, question: str, evidence: Dict[str, Any]) -> Optional[str]:
+        count_match = self._match(COUNT_PATTERNS, question)
+        list_match = None if count_match else self._match(LIST_PATTERNS, question)
+        if count_match is None and list_match is None:
+            return None
+
+        number = self._single_number(evidence)
+        if number is not None:
+            return self._count_sentence(count_match, number) if count_match else None
+
+        names = self._short_name_list(evidence)
+        if names is None:
+            return None
+        bullets = '\n'.join(f"- {name}" for name in names)
+        if count_match:
+            return f"{self._count_sentence(count_match, len(names))[:-1]}:\n{bullets}"
+        noun = list_match.group('noun').strip()
+        return f"{noun[0].upper()}{noun[1:]} ({len(names)}):\n{bullets}"
+
+    def _match(self, patterns: List["re.Pattern"], question: str) -> Optional["re.Match"]:
+        question = question.rstrip('?.! ')
+        for pattern in patterns:
+            match = pattern.match(question)
+            if match and not VERB_WORDS & set(' '.join(match.groups('')).lower().split()):
+                return match
+        return None
+
+    def _count_sentence(self, match: "re.Match", count: Any) -> str:
+        noun = match.group('noun').strip()
+        rest = match.groupdict().get('rest') or ''
+        rest = rest.rstrip()
+        if isinstance(count, float) and not count.is_integer():
+            return f"The number of {noun}{rest} is {count:,}."
+        count = int(count)
+        if count == 1:
+            return f"There is 1 matching result for {noun}{rest}."
+        return f"There are {count:,} {noun}{rest}."
+
+    def _single_number(self, evidence: Dict[str, Any]) -> Optional[Any]:
+        """The number in a scalar, or in a one-row result with exactly one numeric column"""
+        if evidence['type'] == 'Scalar':
+            value = evidence['values']
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                return value
+            return None
+        if evidence['type'] not in ('DataFrame', 'Series') or evidence['summary_stats'].get('total_rows') != 1:
+            return None
+        numbers = [
+            values[0] for values in evidence['values']
+            if isinstance(values[0], (int, float)) and not isinstance(values[0], bool)
+        ]
+        return numbers[0] if len(numbers) == 1 else None
+
+    def _short_name_list(self, evidence: Dict[str, Any]) -> Optional[List[str]]:
+        """All values of a single text column (or a list of strings), if short and uncapped"""
+        stats = evidence['summary_stats'] or {}
+        if stats.get('capped'):
+            return None
+        if evidence['type'] in ('DataFrame', 'Series'):
+            if len(evidence['columns']) != 1:
+                return None
+            values = evidence['values'][0]
+        elif evidence['type'] == 'Other' and isinstance(evidence['values'], list):
+            values = evidence['values']
+        else:
+            return None
+        if not values or len(values) > self.max_list_items:
+            return None
+        if not all(isinstance(value, str) and value.strip() for value in values):
+            return None
+        return values
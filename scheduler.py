@@ -0,0 +1,103 @@
+"""
+Fair Scheduler for Project Samarth
+Round-robin dispatch of queued work from many clients onto a bounded pool
+"""
+
+import threading
+from collections import deque, OrderedDict
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Dict
+
+
+class FairScheduler:
+    """
+    Queues work per client and keeps at most max_in_flight jobs on the pool,
+    taking the next job from each client in turn. One client submitting a
+    burst of queries cannot starve the others.
+
+    Futures can be cancelled while they are still queued; once a job has
+    started it runs to completion.
+    """
+
+    def __init__(self, pool: Executor, max_in_flight: int):
+        self.pool = pool
+        self.max_in_flight = max_in_flight
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def submit(self, client_id: str, fn: Callable, *args: Any) -> Future:
+        """Queue fn(*args) for client_id and return a Future for its result"""
+        future = Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("Cannot submit after shutdown")
+            self._queues.setdefault(client_id, deque()).append((future, fn, args))
+        self._dispatch()
+        return future
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Number of queued (not yet started) jobs per client"""
+        with self._lock:
+            return {client: len(queue) for client, queue in self._queues.items()}
+
+    def shutdown(self, wait: bool = True, cancel_pending: bool = False):
+        """Stop accepting work; optionally cancel everything still queued"""
+        with self._lock:
+            self._shutdown = True
+            if cancel_pending:
+                for queue in self._queues.values():
+                    for future, _, _ in queue:
+                        future.cancel()
+                self._queues.clear()
+        self.pool.shutdown(wait=wait)
+
+    def _dispatch(self):
+        """Fill free pool slots, one job per client per round"""
+        while True:
+            with self._lock:
+                if self._in_flight >= self.max_in_flight:
+                    return
+                job = self._next_job()
+                if job is None:
+                    return
+                self._in_flight += 1
+
+            future, fn, args = job
+            try:
+                pool_future = self.pool.submit(fn, *args)
+            except Exception as e:
+                self._finish(future, None, e)
+                continue
+            pool_future.add_done_callback(lambda done, future=future: self._on_done(future, done))
+
+    def _next_job(self):
+        """Pop the next runnable job, rotating the serviced client to the back"""
+        while self._queues:
+            client_id, queue = next(iter(self._queues.items()))
+            job = queue.popleft()
+            if queue:
+                self._queues.move_to_end(client_id)
+            else:
+                del self._queues[client_id]
+            # Skips jobs cancelled while queued and marks the rest running
+            if job[0].set_running_or_notify_cancel():
+                return job
+        return None
+
+    def _on_done(self, future: Future, pool_future: Future):
+        if pool_future.cancelled():
+            error = RuntimeError("Job cancelled by the pool")
+        else:
+            error = pool_future.exception()
+        self._finish(future, None if error else pool_future.result(), error)
+
+    def _finish(self, future: Future, result: Any, error: BaseException):
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+        with self._lock:
+            self._in_flight -= 1
+        self._dispatch()
@@ -3,14 +3,20 @@ Schema Builder for Project Samarth
 Builds minimal schema context for LLM prompts
 """
 
-import pandas as pd
-from typing import Dict, List
+import time
+from typing import Dict, List, Optional
 from data_loader import AgriculturalDataLoader
+from metrics import REGISTRY, SIZE_BUCKETS
 
 class SchemaBuilder:
-    def __init__(self):
-        self.data_loader = AgriculturalDataLoader()
-        self.data_loader.load_all_data()
+    def __init__(self, data_loader: Optional[AgriculturalDataLoader] = None):
+        # Pass an already loaded data loader to share it (see SamarthPipeline.warmup)
+        if data_loader is None:
+            data_loader = AgriculturalDataLoader()
+            data_loader.load_all_data()
+        self.data_loader = data_loader
+        # Per-dataset <DATASET> fragments; the loaded frames never change
+        self._dataset_xml: Dict[str, str] = {}
     
     def get_relevant_datasets(self, question: str) -> List[str]:
         """
@@ -43,40 +49,58 @@ class SchemaBuilder:
         """
         Build XML-formatted schema context for specified datasets
         """
+        started = time.perf_counter()
         schema_xml = "<SCHEMA>\n"
         
         for df_name in dataset_names:
-            df = self.data_loader.get_dataframe(df_name)
-            if df is None:
-                continue
-            
-            schema_xml += f"  <DATASET name=\"{df_name}\">\n"
-            schema_xml += f"    <row_count>{len(df)}</row_count>\n"
-            schema_xml += "    <columns>\n"
-            
-            for col in df.columns:
-                dtype = str(df[col].dtype)
-                unique_count = df[col].nunique()
-                null_count = df[col].isnull().sum()
-                
-                schema_xml += f"      <column name=\"{col}\" dtype=\"{dtype}\" unique=\"{unique_count}\" nulls=\"{null_count}\"/>\n"
-            
-            schema_xml += "    </columns>\n"
-            schema_xml += "    <sample_rows>\n"
-            
-            # Get 2-3 sample rows
-            sample_rows = df.head(3).to_dict('records')
-            for i, row in enumerate(sample_rows):
-                schema_xml += f"      <row index=\"{i}\">\n"
-                for key, value in row.items():
-                    # Escape XML special characters
-                    value_str = str(value).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-                    schema_xml += f"        <field name=\"{key}\">{value_str}</field>\n"
-                schema_xml += "      </row>\n"
-            
-            schema_xml += "    </sample_rows>\n"
-            schema_xml += "  </DATASET>\n\n"
+            schema_xml += self._dataset_fragment(df_name)
         
         schema_xml += "</SCHEMA>"
+        REGISTRY.histogram('samarth_schema_build_seconds', 'Time to build the schema context for a prompt').observe(time.perf_counter() - started)
+        REGISTRY.histogram('samarth_schema_chars', 'Schema context size in characters', unit=1, buckets=SIZE_BUCKETS).observe(len(schema_xml))
+        return schema_xml
+    
+    def warmup(self):
+        """Build the schema fragment of every dataset ahead of the first prompt"""
+        for df_name in self.data_loader.list_dataframes():
+            self._dataset_fragment(df_name)
+    
+    def _dataset_fragment(self, df_name: str) -> str:
+        """<DATASET> element with columns (dtype, unique and null counts) and sample rows"""
+        fragment = self._dataset_xml.get(df_name)
+        if fragment is not None:
+            return fragment
+        
+        df = self.data_loader.get_dataframe(df_name)
+        if df is None:
+            return ""
+        
+        schema_xml = f"  <DATASET name=\"{df_name}\">\n"
+        schema_xml += f"    <row_count>{len(df)}</row_count>\n"
+        schema_xml += "    <columns>\n"
+        
+        for col in df.columns:
+            dtype = str(df[col].dtype)
+            unique_count = df[col].nunique()
+            null_count = df[col].isnull().sum()
+            
+            schema_xml += f"      <column name=\"{col}\" dtype=\"{dtype}\" unique=\"{unique_count}\" nulls=\"{null_count}\"/>\n"
+        
+        schema_xml += "    </columns>\n"
+        schema_xml += "    <sample_rows>\n"
+        
+        # Get 2-3 sample rows
+        sample_rows = df.head(3).to_dict('records')
+        for i, row in enumerate(sample_rows):
+            schema_xml += f"      <row index=\"{i}\">\n"
+            for key, value in row.items():
+                # Escape XML special characters
+                value_str = str(value).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+                schema_xml += f"        <field name=\"{key}\">{value_str}</field>\n"
+            schema_xml += "      </row>\n"
+        
+        schema_xml += "    </sample_rows>\n"
+        schema_xml += "  </DATASET>\n\n"
+        
+        self._dataset_xml[df_name] = schema_xml
         return schema_xml
-
@@ -0,0 +1,220 @@
+"""
+Staged Pipeline for Project Samarth
+Runs questions through explicit stages joined by bounded queues, so many
+in-flight questions keep the CPU and the LLM connection busy at once
+"""
+
+import asyncio
+import atexit
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Callable, List, Optional
+from llm_resilience import LatencyTracker
+from config import STAGE_QUEUE_SIZE, STAGE_CPU_WORKERS, STAGE_IO_WORKERS
+
+
+class Stage:
+    """
+    One step of the pipeline: a bounded queue feeding `workers` worker
+    coroutines. CPU stages run their handler on the stage's own thread pool,
+    I/O stages await it on the event loop. The handler returns the name of
+    the next stage, or None once it has resolved the job's future.
+    """
+
+    def __init__(self, name: str, kind: str, handler: Callable, workers: int, queue_size: int):
+        self.name = name
+        self.kind = kind
+        self.handler = handler
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'samarth-{name}') if kind == 'cpu' else None
+        self.in_flight = 0
+        self.processed = 0
+        self.failed = 0
+        self.wait_times = LatencyTracker(window=500)
+        self.service_times = LatencyTracker(window=500)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'kind': self.kind,
+            'workers': self.workers,
+            'queue_depth': self.queue.qsize(),
+            'queue_capacity': self.queue.maxsize,
+            'in_flight': self.in_flight,
+            'processed': self.processed,
+            'failed': self.failed,
+            'wait_ms': self._summary(self.wait_times),
+            'service_ms': self._summary(self.service_times)
+        }
+
+    def _summary(self, tracker: LatencyTracker) -> Dict[str, Optional[float]]:
+        samples = tracker.samples
+        if not samples:
+            return {'mean': None, 'p95': None}
+        return {
+            'mean': round(sum(samples) / len(samples) * 1000, 1),
+            'p95': round(tracker.percentile(95) * 1000, 1)
+        }
+
+
+class StagedPipeline:
+    """
+    SamarthPipeline.process_question split at its I/O boundaries:
+
+    - plan (CPU): intent parser, template cache, schema and prompt for LLM Call #1
+    - generate (I/O): LLM Call #1 (skipped when plan already has the code)
+    - execute (CPU): query execution, evidence, citations, then the answer
+      fast path or the evidence encoding and prompt for LLM Call #2
+    - synthesize (I/O): LLM Call #2, trace and final result
+
+    Every stage has a bounded queue, so a slow stage pushes back on the one
+    before it and submit() blocks once the plan queue is full. Results are
+    the same dicts process_question returns.
+    """
+
+    def __init__(
+        self,
+        pipeline,
+        queue_size: int = STAGE_QUEUE_SIZE,
+        cpu_workers: int = STAGE_CPU_WORKERS,
+        io_workers: int = STAGE_IO_WORKERS
+    ):
+        self.pipeline = pipeline
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='samarth-stages', daemon=True)
+        self._thread.start()
+        self._workers: List[asyncio.Task] = []
+
+        specs = [
+            ('plan', 'cpu', self._plan, cpu_workers),
+            ('generate', 'io', self._generate, io_workers),
+            ('execute', 'cpu', self._execute, cpu_workers),
+            ('synthesize', 'io', self._synthesize, io_workers)
+        ]
+        self.stages: Dict[str, Stage] = asyncio.run_coroutine_threadsafe(
+            self._setup(specs, queue_size), self._loop
+        ).result()
+        atexit.register(self.close)
+
+    async def _setup(self, specs: List[tuple], queue_size: int) -> Dict[str, Stage]:
+        """Create queues and workers on the pipeline's own loop"""
+        stages = {}
+        for name, kind, handler, workers in specs:
+            stage = Stage(name, kind, handler, max(1, workers), queue_size)
+            stages[name] = stage
+            for _ in range(stage.workers):
+                self._workers.append(self._loop.create_task(self._work(stage)))
+        return stages
+
+    def submit(self, question: str) -> Future:
+        """
+        Queue a question (blocking while the first stage is full)
+
+        Returns:
+            Future resolving to the process_question result
+        """
+        job = {'question': question, 'future': Future()}
+        asyncio.run_coroutine_threadsafe(self._put('plan', job), self._loop).result()
+        return job['future']
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Queue depth, in-flight count and wait/service times per stage"""
+        return asyncio.run_coroutine_threadsafe(self._stats(), self._loop).result()
+
+    async def _stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stage.stats() for name, stage in self.stages.items()}
+
+    def close(self):
+        """Stop the workers, the loop and the stage thread pools (queued questions are dropped)"""
+        if not self._loop.is_running():
+            return
+        asyncio.run_coroutine_threadsafe(self._cancel_workers(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        for stage in self.stages.values():
+            if stage.pool is not None:
+                stage.pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _cancel_workers(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+    async def _put(self, stage_name: str, job: Dict[str, Any]):
+        job['queued_at'] = time.perf_counter()
+        await self.stages[stage_name].queue.put(job)
+
+    async def _work(self, stage: Stage):
+        while True:
+            job = await stage.queue.get()
+            started = time.perf_counter()
+            stage.wait_times.add(started - job['queued_at'])
+            stage.in_flight += 1
+            try:
+                if stage.pool is not None:
+                    next_stage = await self._loop.run_in_executor(stage.pool, stage.handler, job)
+                else:
+                    next_stage = await stage.handler(job)
+            except Exception as e:
+                stage.failed += 1
+                next_stage = None
+                job['future'].set_exception(e)
+            finally:
+                stage.in_flight -= 1
+                stage.processed += 1
+                stage.service_times.add(time.perf_counter() - started)
+                stage.queue.task_done()
+            if next_stage is not None:
+                await self._put(next_stage, job)
+
+    def _plan(self, job: Dict[str, Any]) -> Optional[str]:
+        job['trace'] = self.pipeline._new_trace(job['question'])
+        print("Step 1: Generating pandas query...")
+        job['generation_started'] = time.time()
+        prepared = self.pipeline.query_generator.prepare_query(job['question'])
+        if 'prompt' not in prepared:
+            job['query_result'] = prepared
+            job['generation_ended'] = time.time()
+            return 'execute'
+        job['query_prompt'] = prepared
+        return 'generate'
+
+    async def _generate(self, job: Dict[str, Any]) -> Optional[str]:
+        job['query_result'] = await self.pipeline.query_generator.generate_query_async(
+            job['question'], job.pop('query_prompt')
+        )
+        job['generation_ended'] = time.time()
+        return 'execute'
+
+    def _execute(self, job: Dict[str, Any]) -> Optional[str]:
+        question, trace = job['question'], job['trace']
+        prepared = self.pipeline._run_execution_steps(
+            question, trace, job.pop('query_result'), job['generation_started'], job['generation_ended']
+        )
+        if not prepared['success']:
+            job['future'].set_result(prepared)
+            return None
+
+        synthesis_result = self.pipeline._fast_path_answer(question, trace, prepared)
+        if synthesis_result is not None:
+            job['future'].set_result(self.pipeline._finish(question, trace, prepared, synthesis_result))
+            return None
+
+        print("Step 4: Synthesizing answer...")
+        job['synthesis_started'] = time.time()
+        exec_result = prepared['exec_result']
+        job['prepared'] = prepared
+        job['synthesis_prompt'] = self.pipeline.answer_synthesizer.prepare_synthesis(
+            question, exec_result['executed_code'], exec_result['evidence'], prepared['citations']
+        )
+        return 'synthesize'
+
+    async def _synthesize(self, job: Dict[str, Any]) -> Optional[str]:
+        prepared = job['prepared']
+        synthesis_result = await self.pipeline.answer_synthesizer.synthesize_answer_async(
+            job.pop('synthesis_prompt'), prepared['citations']
+        )
+        self.pipeline._record_synthesis(job['trace'], synthesis_result, job['synthesis_started'])
+        job['future'].set_result(self.pipeline._finish(job['question'], job['trace'], prepared, synthesis_result))
+        return None
@@ -5,9 +5,9 @@ Clean interface for agricultural Q&A system
 
 import streamlit as st
 import os
+import uuid
 from dotenv import load_dotenv
 from pipeline import SamarthPipeline
-from data_loader import AgriculturalDataLoader
 
 # Load environment
 load_dotenv()
@@ -57,39 +57,52 @@ st.markdown("""
 
 def initialize_session_state():
     """Initialize session state"""
-    if 'pipeline' not in st.session_state:
-        st.session_state.pipeline = None
     if 'history' not in st.session_state:
         st.session_state.history = []
+    if 'session_id' not in st.session_state:
+        # Follow-up questions refine this session's previous result
+        st.session_state.session_id = uuid.uuid4().hex
     if 'question_input' not in st.session_state:
         st.session_state.question_input = ""
+    if 'result_cursor' not in st.session_state:
+        st.session_state.result_cursor = 0
 
 def set_question_input(question):
     """Callback to set the question input text."""
     st.session_state.question_input = question
 
+@st.cache_resource(show_spinner=False)
+def create_pipeline(api_key):
+    """
+    One pipeline per server process, shared by every browser session, so
+    identical questions from different users are answered once (sessions
+    are kept apart by session_id)
+    """
+    pipeline = SamarthPipeline(api_key, warmup=False)
+    # Data loads in the background while the page renders; the first
+    # question waits for it if it is not done yet
+    pipeline.warmup(background=True)
+    return pipeline
+
 def load_pipeline():
-    """Load the pipeline"""
-    if st.session_state.pipeline is None:
-        # Try Streamlit secrets first (for cloud deployment), then environment variable (for local)
-        try:
-            api_key = st.secrets["GEMINI_API_KEY"]
-        except:
-            api_key = os.getenv('GEMINI_API_KEY')
-        
-        if not api_key:
-            st.error("❌ GEMINI_API_KEY not configured. Please set it in Streamlit Cloud secrets or .env file")
-            st.stop()
-        
-        with st.spinner("Loading agricultural data..."):
-            try:
-                st.session_state.pipeline = SamarthPipeline(api_key)
-                st.success("✅ System ready!")
-            except Exception as e:
-                st.error(f"❌ Error initializing pipeline: {str(e)}")
-                import traceback
-                st.code(traceback.format_exc())
-                st.stop()
+    """Load the shared pipeline"""
+    # Try Streamlit secrets first (for cloud deployment), then environment variable (for local)
+    try:
+        api_key = st.secrets["GEMINI_API_KEY"]
+    except:
+        api_key = os.getenv('GEMINI_API_KEY')
+    
+    if not api_key:
+        st.error("❌ GEMINI_API_KEY not configured. Please set it in Streamlit Cloud secrets or .env file")
+        st.stop()
+    
+    try:
+        return create_pipeline(api_key)
+    except Exception as e:
+        st.error(f"❌ Error initializing pipeline: {str(e)}")
+        import traceback
+        st.code(traceback.format_exc())
+        st.stop()
 
 def display_datasets_info():
     """Display dataset information in sidebar"""
@@ -156,6 +169,46 @@ def display_sample_questions():
             use_container_width=True
         )
 
+RESULT_PAGE_SIZE = 20
+
+def set_result_cursor(cursor):
+    """Callback to move the result table to another page."""
+    st.session_state.result_cursor = max(0, cursor)
+
+def display_result_pages(pipeline, result_handle):
+    """Page through a spilled full result without re-running the query"""
+    try:
+        page = pipeline.get_result_page(
+            result_handle, st.session_state.result_cursor, RESULT_PAGE_SIZE
+        )
+    except KeyError:
+        st.info("The full result for this answer has expired.")
+        return
+    
+    first_row = page['cursor'] + 1
+    last_row = page['cursor'] + len(page['rows'])
+    with st.expander(f"📑 Full Result ({page['total_rows']:,} rows)"):
+        st.dataframe(page['rows'], use_container_width=True, hide_index=True)
+        col_prev, col_info, col_next = st.columns([1, 2, 1])
+        with col_prev:
+            st.button(
+                "◀ Previous",
+                key="result_prev",
+                disabled=page['cursor'] == 0,
+                on_click=set_result_cursor,
+                args=(page['cursor'] - RESULT_PAGE_SIZE,)
+            )
+        with col_info:
+            st.caption(f"Rows {first_row}-{last_row} of {page['total_rows']:,}")
+        with col_next:
+            st.button(
+                "Next ▶",
+                key="result_next",
+                disabled=page['next_cursor'] is None,
+                on_click=set_result_cursor,
+                args=(page['next_cursor'] or 0,)
+            )
+
 def main():
     """Main app"""
     initialize_session_state()
@@ -165,7 +218,7 @@ def main():
     st.markdown('<p class="subtitle">Intelligent Q&A System for Indian Agricultural & Climate Data</p>', unsafe_allow_html=True)
     
     # Load pipeline
-    load_pipeline()
+    pipeline = load_pipeline()
     
     # Sidebar
     with st.sidebar:
@@ -183,6 +236,10 @@ def main():
         
         st.markdown("---")
         st.markdown("### 📈 System Stats")
+        if pipeline.is_ready():
+            st.caption("✅ System ready")
+        else:
+            st.caption("⏳ Loading agricultural data...")
         st.metric("Total Records", "11,330")
         st.metric("Datasets", "6")
     
@@ -205,13 +262,29 @@ def main():
         with col_btn2:
             if st.button("🗑️ Clear History", use_container_width=True):
                 st.session_state.history = []
+                pipeline.clear_conversation(st.session_state.session_id)
                 st.session_state.question_input = ""
                 st.rerun()
         
         if ask_button and user_question:
             with st.spinner("Processing your question..."):
                 try:
-                    result = st.session_state.pipeline.process_question(user_question)
+                    # Show the answer as it is generated, then settle into history
+                    answer_placeholder = st.empty()
+                    streamed_answer = ""
+                    result = None
+                    for event in pipeline.process_question_stream(
+                        user_question, session_id=st.session_state.session_id
+                    ):
+                        if event['type'] == 'chunk':
+                            streamed_answer += event['text']
+                            answer_placeholder.markdown(
+                                f'<div class="answer-box">{streamed_answer}▌</div>',
+                                unsafe_allow_html=True
+                            )
+                        else:
+                            result = event['result']
+                    answer_placeholder.empty()
                     
                     if result is None:
                         st.error("❌ Error: Pipeline returned None. Please check your API key and internet connection.")
@@ -220,8 +293,10 @@ def main():
                         st.session_state.history.insert(0, {
                             'question': user_question,
                             'answer': result.get('answer', 'No answer generated'),
-                            'citations': result.get('citations', [])
+                            'citations': result.get('citations', []),
+                            'result_handle': result.get('result_handle')
                         })
+                        st.session_state.result_cursor = 0
                         # Rerun to display history and prevent re-submission
                         st.rerun()
                         
@@ -245,6 +320,9 @@ def main():
             st.markdown("### 📋 Answer")
             st.markdown(f'<div class="answer-box">{latest_item["answer"]}</div>', unsafe_allow_html=True)
 
+            if latest_item.get('result_handle'):
+                display_result_pages(pipeline, latest_item['result_handle'])
+
             if latest_item['citations']:
                 st.markdown("### 📚 Data Sources")
                 for citation in latest_item['citations']:
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Local stub of the Gemini generateContent / streamGenerateContent / countTokens / models.get REST endpoints
+Lets GeminiClient be exercised and benchmarked offline, optionally with
+injected faults (503s, slow responses, or a full outage) to test retries,
+hedging and the circuit breaker
+
+Usage: python stub_gemini_server.py [PORT] [LATENCY_SECONDS] [ERROR_RATE] [SLOW_RATE]
+Then: export GEMINI_BASE_URL=http://127.0.0.1:PORT/v1beta
+"""
+
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from llm_backends import CANNED_QUERY, CANNED_ANSWER
+from evidence_encoder import estimate_tokens
+
+
+class StubGeminiHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so clients can reuse pooled connections
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        match = re.match(r'^/v1beta/models/([^/:?]+)$', self.path)
+        if not match:
+            self._send(404, {'error': {'code': 404, 'message': f'Unknown path {self.path}'}})
+            return
+        self._send(200, {'name': f"models/{match.group(1)}", 'displayName': match.group(1)})
+
+    def do_POST(self):
+        match = re.match(r'^/v1beta/models/[^/:]+:(generateContent|streamGenerateContent|countTokens)', self.path)
+        if not match:
+            self._send(404, {'error': {'code': 404, 'message': f'Unknown path {self.path}'}})
+            return
+
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        prompt = ''.join(
+            part.get('text', '')
+            for content in body.get('contents', [])
+            for part in content.get('parts', [])
+        )
+
+        if match.group(1) == 'countTokens':
+            self._send(200, {'totalTokens': estimate_tokens(prompt)})
+            return
+
+        self.server.record_request(self.client_address)
+        fault = self.server.pick_fault()
+        if fault == 'error':
+            time.sleep(self.server.latency / 2)
+            self._send(self.server.error_status, {
+                'error': {'code': self.server.error_status, 'message': 'Injected fault', 'status': 'UNAVAILABLE'}
+            })
+            return
+        if fault == 'slow':
+            time.sleep(self.server.slow_latency)
+
+        text = CANNED_QUERY if '<PANDAS_CODE>' in prompt else CANNED_ANSWER
+
+        if match.group(1) == 'streamGenerateContent':
+            self._send_stream(text)
+            return
+
+        time.sleep(self.server.latency)
+        self._send(200, {
+            'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]}}]
+        })
+
+    def _send_stream(self, text, chunk_words=4):
+        """Server-sent events over chunked encoding, latency spread across the chunks"""
+        words = text.split(' ')
+        chunks = [' '.join(words[i:i + chunk_words]) for i in range(0, len(words), chunk_words)]
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for i, chunk in enumerate(chunks):
+            time.sleep(self.server.latency / len(chunks))
+            piece = chunk if i == len(chunks) - 1 else chunk + ' '
+            event = json.dumps({'candidates': [{'content': {'role': 'model', 'parts': [{'text': piece}]}}]})
+            data = f"data: {event}\r\n\r\n".encode('utf-8')
+            self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _send(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def handle_one_request(self):
+        try:
+            super().handle_one_request()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up on this request (e.g. a cancelled hedge)
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubGeminiServer(ThreadingHTTPServer):
+    """
+    Threaded stub server that counts requests and distinct client connections.
+    Faults: error_rate of requests fail with error_status, slow_rate take an
+    extra slow_latency seconds, and setting down=True fails every request.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        port: int = 0,
+        latency: float = 0.2,
+        error_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_latency: float = 2.0,
+        error_status: int = 503,
+        seed: int = None
+    ):
+        super().__init__(('127.0.0.1', port), StubGeminiHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_status = error_status
+        self.down = False
+        self.request_count = 0
+        self.fault_counts = {'error': 0, 'slow': 0}
+        self.connections = set()
+        self._random = random.Random(seed)
+        self._stats_lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1beta"
+
+    def record_request(self, client_address):
+        with self._stats_lock:
+            self.request_count += 1
+            self.connections.add(client_address)
+
+    def pick_fault(self):
+        """'error', 'slow' or None for the current request"""
+        with self._stats_lock:
+            roll = self._random.random()
+            if self.down or roll < self.error_rate:
+                fault = 'error'
+            elif roll < self.error_rate + self.slow_rate:
+                fault = 'slow'
+            else:
+                return None
+            self.fault_counts[fault] += 1
+            return fault
+
+    def start(self) -> 'StubGeminiServer':
+        """Serve on a background thread"""
+        threading.Thread(target=self.serve_forever, name='stub-gemini', daemon=True).start()
+        return self
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    error_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    slow_rate = float(sys.argv[4]) if len(sys.argv) > 4 else 0.0
+    server = StubGeminiServer(port, latency, error_rate=error_rate, slow_rate=slow_rate)
+    print(f"Stub Gemini server on {server.base_url} (latency {latency}s, "
+          f"error rate {error_rate:.0%}, slow rate {slow_rate:.0%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for a Redis server, speaking enough of the protocol (RESP)
+for the answer cache: PING, GET, SET (EX/PX/NX/XX), DEL, EXISTS, PTTL,
+DBSIZE, FLUSHDB, SELECT, AUTH and QUIT, with key expiry and an optional
+cap on the number of keys (least recently used evicted first)
+Lets the 'redis' answer cache backend be exercised offline, including an
+outage (down=True drops every connection)
+
+Usage: python stub_redis_server.py [PORT] [MAX_KEYS]
+Then: export SAMARTH_ANSWER_CACHE=redis SAMARTH_ANSWER_CACHE_URL=redis://127.0.0.1:PORT/0
+"""
+
+import socketserver
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+class StubRedisHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        while not self.server.down:
+            try:
+                args = self._read_command()
+            except (ConnectionError, ValueError):
+                return
+            if args is None:
+                return
+            self.server.record_command()
+            name = args[0].upper()
+            reply = self.server.execute(name, args[1:])
+            try:
+                self.wfile.write(reply)
+                self.wfile.flush()
+            except ConnectionError:
+                return
+            if name == b'QUIT':
+                return
+
+    def _read_command(self):
+        """One command as a list of bytes (RESP array of bulk strings), or None at EOF"""
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            # Inline command, e.g. from telnet
+            return line.split()
+        args = []
+        for _ in range(int(line[1:-2])):
+            header = self.rfile.readline()
+            if not header.startswith(b'$'):
+                raise ValueError(f"Expected a bulk string, got {header[:20]!r}")
+            args.append(self.rfile.read(int(header[1:-2]) + 2)[:-2])
+        return args
+
+
+class StubRedisServer(socketserver.ThreadingTCPServer):
+    """
+    Threaded stand-in holding one keyspace (SELECT is accepted and ignored).
+    Counts commands; setting down=True closes connections as they make
+    their next request.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port: int = 0, max_keys: int = None):
+        super().__init__(('127.0.0.1', port), StubRedisHandler)
+        self.max_keys = max_keys
+        self.down = False
+        self.command_count = 0
+        self.evicted = 0
+        self._data: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"redis://127.0.0.1:{self.server_address[1]}/0"
+
+    def record_command(self):
+        with self._lock:
+            self.command_count += 1
+
+    def execute(self, name: bytes, args: list) -> bytes:
+        with self._lock:
+            try:
+                handler = getattr(self, f"_cmd_{name.decode('ascii', 'replace').lower()}", None)
+                if handler is None:
+                    return b"-ERR unknown command '%s'\r\n" % name
+                return handler(args)
+            except (IndexError, ValueError):
+                return b"-ERR wrong number or type of arguments for '%s'\r\n" % name
+
+    def start(self) -> 'StubRedisServer':
+        """Serve on a background thread"""
+        threading.Thread(target=self.serve_forever, name='stub-redis', daemon=True).start()
+        return self
+
+    # Commands (called with the lock held)
+
+    def _cmd_ping(self, args):
+        return _bulk(args[0]) if args else b"+PONG\r\n"
+
+    def _cmd_auth(self, args):
+        return b"+OK\r\n"
+
+    def _cmd_select(self, args):
+        int(args[0])
+        return b"+OK\r\n"
+
+    def _cmd_quit(self, args):
+        return b"+OK\r\n"
+
+    def _cmd_get(self, args):
+        entry = self._live(args[0])
+        return _bulk(entry[0] if entry else None)
+
+    def _cmd_set(self, args):
+        key, value, options = args[0], args[1], [arg.upper() for arg in args[2:]]
+        expires_at = None
+        for i, option in enumerate(options):
+            if option == b'EX':
+                expires_at = time.time() + int(args[3 + i])
+            elif option == b'PX':
+                expires_at = time.time() + int(args[3 + i]) / 1000
+        exists = self._live(key) is not None
+        if (b'NX' in options and exists) or (b'XX' in options and not exists):
+            return _bulk(None)
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while self.max_keys is not None and len(self._data) > self.max_keys:
+            self._data.popitem(last=False)
+            self.evicted += 1
+        return b"+OK\r\n"
+
+    def _cmd_del(self, args):
+        removed = sum(1 for key in args if self._live(key) is not None and self._data.pop(key, None) is not None)
+        return b":%d\r\n" % removed
+
+    def _cmd_exists(self, args):
+        return b":%d\r\n" % sum(1 for key in args if self._live(key) is not None)
+
+    def _cmd_pttl(self, args):
+        entry = self._live(args[0])
+        if entry is None:
+            return b":-2\r\n"
+        return b":-1\r\n" if entry[1] is None else b":%d\r\n" % int((entry[1] - time.time()) * 1000)
+
+    def _cmd_dbsize(self, args):
+        return b":%d\r\n" % sum(1 for key in list(self._data) if self._live(key) is not None)
+
+    def _cmd_flushdb(self, args):
+        self._data.clear()
+        return b"+OK\r\n"
+
+    def _live(self, key: bytes):
+        """(value, expires_at) for an unexpired key (now most recently used), else None"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.time():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+
+def _bulk(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 6379
+    max_keys = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    server = StubRedisServer(port, max_keys)
+    print(f"Stub Redis server on {server.url} (max keys: {max_keys or 'unlimited'})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
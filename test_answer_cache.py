@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Tests for the persistent answer cache (answer_cache.py) and how the
+pipeline uses it. Runs offline: stub LLM backend, stub Redis server
+"""
+
+import time
+
+import pytest
+from answer_cache import AnswerCache, MemoryAnswerBackend, SQLiteAnswerBackend, RedisAnswerBackend
+from stub_redis_server import StubRedisServer
+
+ANSWER = {
+    'answer': "There are 349 mandis in Punjab.",
+    'citations': [],
+    'result_handle': None,
+    'executed_code': "result = 349",
+    'datasets_used': [],
+    'request_id': 'r1'
+}
+
+
+@pytest.fixture
+def redis_server():
+    server = StubRedisServer().start()
+    yield server
+    server.shutdown()
+
+
+def test_key_ignores_case_spacing_and_punctuation():
+    cache = AnswerCache(MemoryAnswerBackend())
+    assert cache.key("How many mandis in Punjab?", 'v1', 'p1') == cache.key("  how many  mandis in punjab", 'v1', 'p1')
+    assert cache.key("How many mandis in Punjab?", 'v1', 'p1') != cache.key("How many mandis in Punjab?", 'v2', 'p1')
+    assert cache.key("How many mandis in Punjab?", 'v1', 'p1') != cache.key("How many mandis in Punjab?", 'v1', 'p2')
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite', 'redis'])
+def test_fresh_stale_and_expired(backend, tmp_path, redis_server):
+    backends = {
+        'memory': lambda: MemoryAnswerBackend(),
+        'sqlite': lambda: SQLiteAnswerBackend(str(tmp_path / 'answers.db')),
+        'redis': lambda: RedisAnswerBackend(redis_server.url)
+    }
+    cache = AnswerCache(backends[backend](), fresh_seconds=0.2, stale_seconds=0.3)
+    key = cache.key("How many mandis in Punjab?", 'v1', 'p1')
+    assert cache.lookup(key) is None
+    assert cache.store(key, ANSWER)
+    assert cache.lookup(key) == (ANSWER, True)
+    time.sleep(0.25)
+    assert cache.lookup(key) == (ANSWER, False)
+    time.sleep(0.3)
+    assert cache.lookup(key) is None
+    cache.close()
+
+
+@pytest.mark.parametrize('value', [b'not json', b'{"answer": {}}', b'[1, 2]'])
+def test_corrupt_entry_is_a_miss_and_is_deleted(value):
+    backend = MemoryAnswerBackend()
+    cache = AnswerCache(backend, retry_seconds=0)
+    key = cache.key("How many mandis in Punjab?", 'v1', 'p1')
+    backend.set(key, value, 60)
+    assert cache.lookup(key) is None
+    assert cache.stats()['errors'] == 1
+    assert backend.get(key) is None
+    assert cache.store(key, ANSWER)
+    assert cache.lookup(key) == (ANSWER, True)
+
+
+def test_oversized_answer_is_not_stored():
+    cache = AnswerCache(MemoryAnswerBackend(), max_entry_bytes=100)
+    key = cache.key("q", 'v1', 'p1')
+    assert not cache.store(key, {**ANSWER, 'answer': 'x' * 200})
+    assert cache.lookup(key) is None
+
+
+def test_unreachable_backend_is_skipped_then_retried(redis_server):
+    cache = AnswerCache(RedisAnswerBackend(redis_server.url), retry_seconds=0.2)
+    key = cache.key("q", 'v1', 'p1')
+    redis_server.down = True
+    assert cache.lookup(key) is None
+    commands = redis_server.command_count
+    assert cache.lookup(key) is None
+    assert redis_server.command_count == commands
+    redis_server.down = False
+    time.sleep(0.25)
+    assert cache.store(key, ANSWER)
+    assert cache.lookup(key) == (ANSWER, True)
+
+
+def test_only_one_refresh_per_key():
+    cache = AnswerCache(MemoryAnswerBackend())
+    assert cache.begin_refresh('k')
+    assert not cache.begin_refresh('k')
+    cache.end_refresh('k')
+    assert cache.begin_refresh('k')
+
+
+@pytest.fixture
+def llm_synthesis(pipeline, monkeypatch):
+    """Send every answer through LLM Call #2 (no templated fast path), with a fresh in-memory cache"""
+    monkeypatch.setattr(pipeline, 'answer_cache', AnswerCache(MemoryAnswerBackend()))
+    monkeypatch.setattr(pipeline.rule_synthesizer, 'synthesize', lambda *args: None)
+    pipeline.coalescer.clear()
+    return pipeline
+
+
+class FailingGemini:
+    """Stands in for the answer synthesizer's client: every call fails after the request was sent"""
+
+    def call_llm(self, prompt, call_type):
+        return {'success': False, 'error': 'ConnectError: connection refused', 'log_id': 'error', 'response': ''}
+
+    def call_llm_stream(self, prompt, call_type):
+        yield "There are"
+        return {'success': False, 'error': 'ReadTimeout', 'log_id': 'error', 'response': "There are",
+                'time_to_first_chunk_ms': 1.0}
+
+
+def test_successful_answer_is_served_from_cache(llm_synthesis):
+    question = "How many mandis are in Punjab?"
+    first = llm_synthesis.process_question(question)
+    assert first['success']
+    llm_synthesis.coalescer.clear()
+    second = llm_synthesis.process_question(question)
+    assert second['answer'] == first['answer']
+    assert second['trace']['steps'][0]['stage'] == 'answer_cache'
+
+
+def test_synthesis_failure_is_not_cached(llm_synthesis, monkeypatch):
+    question = "How many mandis are in Punjab, in total?"
+    gemini = llm_synthesis.answer_synthesizer.gemini
+    monkeypatch.setattr(llm_synthesis.answer_synthesizer, 'gemini', FailingGemini())
+    failed = llm_synthesis.process_question(question)
+    assert not failed['success']
+    assert 'ConnectError' in failed['error']
+    assert failed['trace']['steps'][-1]['stage'] == 'synthesize'
+    assert llm_synthesis.answer_cache.stats()['stores'] == 0
+
+    monkeypatch.setattr(llm_synthesis.answer_synthesizer, 'gemini', gemini)
+    llm_synthesis.coalescer.clear()
+    answered = llm_synthesis.process_question(question)
+    assert answered['success']
+    assert answered['trace']['steps'][0]['stage'] != 'answer_cache'
+    assert not answered['answer'].startswith('Error')
+
+
+def test_streamed_synthesis_failure_is_not_cached(llm_synthesis, monkeypatch):
+    question = "How many mandis does Punjab have?"
+    monkeypatch.setattr(llm_synthesis.answer_synthesizer, 'gemini', FailingGemini())
+    events = list(llm_synthesis.process_question_stream(question, session_id='s-stream'))
+    result = events[-1]['result']
+    assert not result['success']
+    assert 'ReadTimeout' in result['error']
+    assert llm_synthesis.answer_cache.stats()['stores'] == 0
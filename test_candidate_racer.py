@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Tests for racing alternative query candidates (candidate_racer.py)
+"""
+
+import pytest
+from candidate_racer import CandidateRacer
+from data_loader import AgriculturalDataLoader
+from executor import QueryExecutor
+
+MANDIS = "m = data_loader.get_dataframe('agmark_mandis_and_locations')\n"
+FAILING = MANDIS + "result = m[m['State'] == 'Punjab']\n"
+EMPTY = MANDIS + "result = m[m['State Name'] == 'Atlantis']\n"
+PUNJAB = MANDIS + "result = m[m['State Name'] == 'Punjab']\n"
+
+
+@pytest.fixture(scope='module')
+def executor():
+    loader = AgriculturalDataLoader()
+    loader.load_all_data()
+    return QueryExecutor(data_loader=loader)
+
+
+def test_first_non_empty_success_wins(executor):
+    racer = CandidateRacer(executor)
+    result = racer.race([FAILING, EMPTY, PUNJAB])
+    assert result['success']
+    assert result['executed_code'] == PUNJAB
+    assert result['race']['winner'] == 2
+    assert result['race']['candidates'] == 3
+    assert racer.stats()['wins_by_candidate'] == {2: 1}
+
+
+def test_empty_result_is_the_answer_when_nothing_else_works(executor):
+    racer = CandidateRacer(executor)
+    result = racer.race([FAILING, EMPTY])
+    assert result['success']
+    assert result['race']['winner'] == 1
+    assert result['race']['failed'] == 1
+    assert racer.counters['empty_only'] == 1
+
+
+def test_all_failed_reports_every_error(executor):
+    racer = CandidateRacer(executor)
+    result = racer.race([FAILING, MANDIS + "result = undefined_name\n"])
+    assert not result['success']
+    assert result['executed_code'] == FAILING
+    assert result['race']['winner'] is None
+    assert len(result['candidate_errors']) == 2
+    assert racer.stats()['success_rate'] == 0.0
+
+
+def test_scalar_results(executor):
+    racer = CandidateRacer(executor)
+    assert racer._is_empty({'values': float('nan')})
+    assert racer._is_empty({'values': None})
+    assert not racer._is_empty({'values': 0})
+    result = racer.race([MANDIS + "result = len(m[m['State Name'] == 'Punjab'])\n"])
+    assert result['success']
+    assert result['race']['winner'] == 0
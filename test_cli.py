@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Tests for the CLI batch mode (cli.py --batch): reading questions and
+writing one JSONL result per question
+"""
+
+import json
+
+from cli import read_batch, run_batch
+
+LINES = [
+    '{"id": "q1", "question": "How many mandis are in Punjab?"}',
+    '"List all districts in Goa"',
+    '',
+    'How many mandis are in Punjab?',
+    '{"id": "q4", "question": "How many mandis are in Kerala?"}',
+]
+
+
+def write_batch(tmp_path):
+    path = tmp_path / 'in.jsonl'
+    path.write_text('\n'.join(LINES) + '\n', encoding='utf-8')
+    return str(path)
+
+
+def test_read_batch_accepts_objects_strings_and_plain_lines(tmp_path):
+    assert read_batch(write_batch(tmp_path)) == [
+        {'id': 'q1', 'question': "How many mandis are in Punjab?"},
+        {'question': "List all districts in Goa"},
+        {'question': "How many mandis are in Punjab?"},
+        {'id': 'q4', 'question': "How many mandis are in Kerala?"},
+    ]
+
+
+def test_run_batch_writes_every_result(pipeline, tmp_path, capsys):
+    out_path = tmp_path / 'out.jsonl'
+    run_batch(pipeline, write_batch(tmp_path), str(out_path), concurrency=2)
+    records = [json.loads(line) for line in out_path.read_text(encoding='utf-8').splitlines()]
+    assert sorted(record['index'] for record in records) == [0, 1, 2, 3]
+    by_index = {record['index']: record for record in records}
+    assert [by_index[i]['id'] for i in range(4)] == ['q1', None, None, 'q4']
+    assert all(record['success'] and record['answer'] for record in records)
+    assert by_index[0]['answer'] == by_index[2]['answer']
+    assert by_index[0]['citations']
+    assert all(record['latency_ms'] >= 0 for record in records)
+
+    output = capsys.readouterr().out
+    assert "BATCH COMPLETE: 4 questions" in output
+    assert "Succeeded:  4/4" in output
+    assert "Latency:    p50" in output
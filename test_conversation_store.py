@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Tests for per-session previous results (conversation_store.py): LRU and
+byte limits, and frames kept only as spill handles
+"""
+
+import pandas as pd
+import pytest
+from conversation_store import ConversationStore, uses_previous_result
+from result_store import ResultStore
+
+
+@pytest.fixture
+def result_store(tmp_path):
+    return ResultStore(spill_dir=str(tmp_path))
+
+
+def frame(rows=3):
+    return pd.DataFrame({'District Name': [f"District {i}" for i in range(rows)], 'Mandis': range(rows)})
+
+
+def test_put_and_get(result_store):
+    store = ConversationStore(result_store)
+    store.put('s1', "Top districts", "result = ...", frame(), ['agmark_mandis_and_locations'])
+    entry = store.get('s1')
+    assert entry['rows'] == 3
+    assert entry['columns'] == ['District Name', 'Mandis']
+    assert entry['frame'].equals(frame())
+    assert store.get('s2') is None
+    assert store.get(None) is None
+    assert store.stats()['found'] == 1
+
+
+def test_least_recently_used_session_is_evicted(result_store):
+    store = ConversationStore(result_store, max_sessions=2)
+    store.put('s1', "q", "", frame(), [])
+    store.put('s2', "q", "", frame(), [])
+    store.get('s1')
+    store.put('s3', "q", "", frame(), [])
+    assert store.has('s1') and store.has('s3')
+    assert not store.has('s2')
+    assert store.stats()['evicted'] == 1
+
+
+def test_byte_budget_keeps_at_least_the_latest_session(result_store):
+    size = int(frame(1000).memory_usage(index=True, deep=True).sum())
+    store = ConversationStore(result_store, max_bytes=size + 1)
+    store.put('s1', "q", "", frame(1000), [])
+    store.put('s2', "q", "", frame(1000), [])
+    assert not store.has('s1')
+    assert store.has('s2')
+    assert store.stats()['bytes'] == size
+
+
+def test_large_frame_is_kept_as_its_spill_handle(result_store):
+    store = ConversationStore(result_store, max_frame_bytes=100)
+    big = frame(1000)
+    store.put('s1', "q", "", big, [], result_handle=result_store.save(big))
+    assert store.stats()['bytes'] == 0
+    assert store.get('s1')['frame'].equals(big)
+    # Not spilled: nothing is kept
+    store.put('s2', "q", "", big, [])
+    assert not store.has('s2')
+
+
+def test_expired_spill_forgets_the_session(result_store):
+    store = ConversationStore(result_store, max_frame_bytes=100)
+    store.put('s1', "q", "", frame(1000), [], result_handle='0123abcd')
+    assert store.get('s1') is None
+    assert not store.has('s1')
+
+
+def test_uses_previous_result():
+    assert uses_previous_result("result = previous_result.head(5)")
+    assert not uses_previous_result("result = my_previous_results")
+    assert not uses_previous_result(None)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Tests for evidence encoding (evidence_encoder.py): compact tables, the
+token budget and the exact-count path
+"""
+
+import asyncio
+
+from evidence_encoder import EvidenceEncoder, estimate_tokens
+from gemini_client import GeminiClient
+from llm_backends import StubBackend
+
+
+def table(rows):
+    return {
+        'type': 'dataframe',
+        'shape': [rows, 3],
+        'columns': ['District Name', 'Mandi Count', 'District Code'],
+        'values': [
+            [f"District {i}" for i in range(rows)],
+            list(range(rows)),
+            [f"D{i:04d}" for i in range(rows)]
+        ],
+        'datasets_used': ['agmark_mandis_and_locations'],
+        'summary_stats': {'total_rows': rows}
+    }
+
+
+class CountingTokens:
+    def __init__(self, factor=1.0, answer=True):
+        self.factor = factor
+        self.answer = answer
+        self.calls = 0
+
+    def __call__(self, text):
+        self.calls += 1
+        return int(estimate_tokens(text) * self.factor) if self.answer else None
+
+
+def test_table_is_compact_and_drops_identifier_columns():
+    encoded = EvidenceEncoder().encode("Mandis per district", "result = df", table(3))
+    lines = encoded['text'].splitlines()
+    assert 'District Name|Mandi Count' in lines
+    assert 'District 0|0' in lines
+    assert encoded['columns_dropped'] == ['District Code']
+
+
+def test_rows_are_trimmed_to_the_budget():
+    encoded = EvidenceEncoder(token_budget=200).encode("Mandis per district", "", table(500))
+    assert encoded['tokens'] <= 200
+    assert 1 <= encoded['rows_shown'] < 500
+    assert encoded['token_source'] == 'estimate'
+
+
+def test_small_evidence_makes_no_count_call():
+    count = CountingTokens()
+    EvidenceEncoder(token_budget=2000, count_tokens=count).encode("q", "", table(3))
+    assert count.calls == 0
+
+
+def test_exact_count_is_made_at_most_once():
+    count = CountingTokens()
+    encoded = EvidenceEncoder(token_budget=200, count_tokens=count).encode("q", "", table(500))
+    assert count.calls == 1
+    assert encoded['token_source'] == 'api'
+    assert encoded['tokens'] <= 200
+
+
+def test_exact_count_over_budget_trims_again_without_another_call():
+    count = CountingTokens(factor=1.5)
+    encoded = EvidenceEncoder(token_budget=200, count_tokens=count).encode("q", "", table(500))
+    assert count.calls == 1
+    assert encoded['tokens'] <= 200
+    assert encode_rows(200, 500) > encoded['rows_shown']
+
+
+def encode_rows(budget, rows):
+    return EvidenceEncoder(token_budget=budget).encode("q", "", table(rows))['rows_shown']
+
+
+def test_failed_count_falls_back_to_the_estimate():
+    count = CountingTokens(answer=False)
+    encoded = EvidenceEncoder(token_budget=200, count_tokens=count).encode("q", "", table(500))
+    assert count.calls == 1
+    assert encoded['token_source'] == 'estimate'
+    assert encoded['tokens'] <= 200
+
+
+class SlowTokenizer(StubBackend):
+    async def count_tokens(self, text):
+        await asyncio.sleep(5)
+        return 1
+
+
+def test_client_count_tokens_gives_up_after_its_timeout():
+    gemini = GeminiClient('key', backend=SlowTokenizer())
+    try:
+        assert gemini.count_tokens("some evidence", timeout=0.05) is None
+    finally:
+        gemini.close()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Tests for evidence bundles (QueryExecutor._build_evidence): column-wise
+encoding, row bounds and summary stats over the full result
+"""
+
+import pytest
+from data_loader import AgriculturalDataLoader
+from executor import QueryExecutor
+from config import EVIDENCE_MAX_CHARS
+
+MANDIS = "m = data_loader.get_dataframe('agmark_mandis_and_locations')\n"
+
+
+@pytest.fixture(scope='module')
+def data_loader():
+    loader = AgriculturalDataLoader()
+    loader.load_all_data()
+    return loader
+
+
+@pytest.fixture(scope='module')
+def executor(data_loader, tmp_path_factory):
+    executor = QueryExecutor(data_loader=data_loader)
+    executor.result_store.spill_dir = str(tmp_path_factory.mktemp('spill'))
+    return executor
+
+
+def evidence(executor, code, max_results=20):
+    result = executor.execute_query(MANDIS + code, max_results=max_results)
+    assert result['success'], result.get('error')
+    return result['evidence']
+
+
+def test_series_of_unique_values_has_no_positional_index(executor, data_loader):
+    found = evidence(executor, "result = m['State Name'].unique()\n")
+    states = data_loader.get_dataframe('agmark_mandis_and_locations')['State Name'].unique()
+    assert found['type'] == 'Series'
+    assert found['columns'] == ['value']
+    assert found['values'] == [list(states[:20])]
+    assert 'numeric' not in found['summary_stats']
+    assert found['summary_stats']['top_categories']['value'] == {'unique': len(states)}
+    assert found['summary_stats']['total_rows'] == len(states)
+    assert found['summary_stats']['capped']
+    assert found['result_handle'] is not None
+
+
+def test_filtered_series_drops_its_source_row_labels(executor):
+    found = evidence(executor, "result = m[m['State Name'] == 'Goa']['District Name - Agmark']\n")
+    assert found['columns'] == ['District Name - Agmark']
+
+
+def test_named_index_is_kept_as_a_column(executor, data_loader):
+    found = evidence(executor, "result = m.groupby('State Name').size().sort_values(ascending=False)\n", max_results=3)
+    counts = data_loader.get_dataframe('agmark_mandis_and_locations').groupby('State Name').size().sort_values(ascending=False)
+    assert found['columns'] == ['State Name', 'value']
+    assert found['values'] == [list(counts.index[:3]), [int(v) for v in counts[:3]]]
+    stats = found['summary_stats']['numeric']['value']
+    assert stats['count'] == len(counts)
+    assert stats['sum'] == counts.sum()
+    assert stats['max'] == counts.max()
+
+
+def test_dataframe_is_encoded_column_wise_and_capped(executor, data_loader):
+    code = "result = m[m['State Name'] == 'Punjab'][['Mandi Name - Agmark', 'District ID']]\n"
+    found = evidence(executor, code, max_results=5)
+    punjab = data_loader.get_dataframe('agmark_mandis_and_locations')
+    punjab = punjab[punjab['State Name'] == 'Punjab']
+    assert found['type'] == 'DataFrame'
+    assert found['shape'] == [len(punjab), 2]
+    assert found['columns'] == ['Mandi Name - Agmark', 'District ID']
+    assert found['values'][0] == list(punjab['Mandi Name - Agmark'][:5])
+    assert len(found['values'][1]) == 5
+    assert found['summary_stats']['rows_returned'] == 5
+    assert found['summary_stats']['total_rows'] == len(punjab)
+    assert found['summary_stats']['numeric']['District ID']['count'] == punjab['District ID'].count()
+    assert round(found['summary_stats']['numeric']['District ID']['mean'], 4) == round(punjab['District ID'].mean(), 4)
+    # The full result can be paged by its handle
+    page = executor.get_result_page(found['result_handle'], cursor=5, page_size=5)
+    assert list(page['rows']['Mandi Name - Agmark']) == list(punjab['Mandi Name - Agmark'][5:10])
+
+
+def test_long_values_and_lists_are_bounded(executor):
+    found = evidence(executor, "result = 'x' * 5000\n")
+    assert found['type'] == 'Scalar'
+    assert len(found['values']) < EVIDENCE_MAX_CHARS + 50
+    found = evidence(executor, "result = list(range(100))\n")
+    assert found['values'] == list(range(20))
+    assert found['summary_stats'] == {'total_items': 100, 'items_returned': 20, 'capped': True}
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared GeminiClient (gemini_client.py): the rate limiter,
+the global concurrency bound and the pooled connection, all offline
+"""
+
+import asyncio
+import time
+
+from gemini_client import AsyncRateLimiter, GeminiClient
+from llm_backends import LiveBackend, StubBackend
+from llm_resilience import ResilientCaller
+from stub_gemini_server import StubGeminiServer
+
+
+class CountingBackend(StubBackend):
+    """Stub backend recording the most calls it ever had in flight"""
+
+    def __init__(self, latency):
+        super().__init__(latency=latency)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def generate(self, prompt):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return await super().generate(prompt)
+        finally:
+            self.in_flight -= 1
+
+
+def burst(client, count):
+    async def calls():
+        return await asyncio.gather(*(client.call_llm_async("prompt", 'test') for _ in range(count)))
+    return asyncio.run(calls())
+
+
+def test_rate_limiter_allows_a_burst_then_paces():
+    async def acquire(limiter, count):
+        started = time.monotonic()
+        for _ in range(count):
+            await limiter.acquire()
+        return time.monotonic() - started
+
+    # 600/minute: ten at once, then one every 0.1s
+    limiter = AsyncRateLimiter(600)
+    assert asyncio.run(acquire(limiter, 10)) < 0.05
+    assert asyncio.run(acquire(limiter, 5)) >= 0.4
+
+
+def test_concurrency_is_bounded_by_the_semaphore():
+    backend = CountingBackend(latency=0.05)
+    client = GeminiClient('key', backend=backend, max_concurrency=3, resilience=ResilientCaller(hedge_percentile=None))
+    try:
+        started = time.perf_counter()
+        responses = burst(client, 12)
+        elapsed = time.perf_counter() - started
+        assert all(response['success'] for response in responses)
+        assert backend.max_in_flight == 3
+        # Four waves of three calls
+        assert elapsed >= 0.2
+    finally:
+        client.close()
+
+
+def test_remote_calls_are_paced_and_share_pooled_connections():
+    server = StubGeminiServer(latency=0.01).start()
+    client = GeminiClient(
+        'key', max_concurrency=2, requests_per_minute=600,
+        backend=LiveBackend('key', 'gemini-test', server.base_url, 5.0, 2),
+        resilience=ResilientCaller(hedge_percentile=None)
+    )
+    try:
+        started = time.perf_counter()
+        responses = burst(client, 15)
+        elapsed = time.perf_counter() - started
+        assert all(response['success'] for response in responses)
+        assert server.request_count == 15
+        # Ten go out at once, the other five wait for the limiter
+        assert elapsed >= 0.4
+        assert len(server.connections) <= 2
+    finally:
+        client.close()
+        server.shutdown()
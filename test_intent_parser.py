@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Tests for the deterministic intent parser (intent_parser.py): which
+questions it answers and that its code gives the right result
+"""
+
+import pandas as pd
+import pytest
+from data_loader import AgriculturalDataLoader
+from entity_vocabulary import EntityVocabulary
+from intent_parser import IntentParser
+
+
+@pytest.fixture(scope='module')
+def data_loader():
+    loader = AgriculturalDataLoader()
+    loader.load_all_data()
+    return loader
+
+
+@pytest.fixture
+def parser(data_loader):
+    return IntentParser(EntityVocabulary(data_loader), data_loader, enabled=True)
+
+
+def run(data_loader, parsed):
+    namespace = {'data_loader': data_loader, 'pd': pd}
+    exec(parsed['query_code'], namespace)
+    return namespace['result']
+
+
+@pytest.mark.parametrize('question', [
+    "How many mandis are in Punjab?",
+    "how many mandis are there in the state of PUNJAB",
+    "Number of markets in Punjab state",
+    "How many mandis does Punjab have?",
+])
+def test_mandi_count_for_a_state(parser, data_loader, question):
+    parsed = parser.parse(question)
+    assert parsed['intent'] == 'count_mandis'
+    mandis = data_loader.get_dataframe('agmark_mandis_and_locations')
+    assert run(data_loader, parsed) == (mandis['State Name'].str.strip() == 'Punjab').sum()
+
+
+def test_mandi_count_for_a_district(parser, data_loader):
+    parsed = parser.parse("How many mandis are in Ludhiana district?")
+    mandis = data_loader.get_dataframe('agmark_mandis_and_locations')
+    expected = (mandis['District Name - Agmark'].str.strip().str.lower() == 'ludhiana').sum()
+    assert expected > 0
+    assert run(data_loader, parsed) == expected
+
+
+def test_districts_of_a_state(parser, data_loader):
+    parsed = parser.parse("List all districts in Punjab")
+    assert parsed['relevant_datasets'] == ['location_hierarchy']
+    locations = data_loader.get_dataframe('location_hierarchy')
+    expected = sorted(locations[locations['State Name'] == 'Punjab']['District Name'].dropna().str.strip().unique())
+    assert list(run(data_loader, parsed)) == expected
+
+
+def test_neighbours_are_read_both_ways(parser, data_loader):
+    parsed = parser.parse("What are the neighbouring districts of Ludhiana?")
+    assert parsed['intent'] == 'district_neighbours'
+    neighbours = list(run(data_loader, parsed))
+    assert neighbours == sorted(neighbours)
+    assert neighbours
+    assert 'Ludhiana' not in neighbours
+
+
+def test_crops_of_a_type(parser, data_loader):
+    parsed = parser.parse("Show me all vegetable crops")
+    assert parsed['intent'] == 'crops_of_type'
+    crops = run(data_loader, parsed)
+    assert len(crops) > 0
+    assert crops.is_unique
+
+
+@pytest.mark.parametrize('question', [
+    "How many mandis are in Punjab and Gujarat?",
+    "Which district of Punjab has the most mandis?",
+    "How many mandis are in Wheat?",
+    "Show me all imaginary crops",
+    "How many mandis are there in Atlantis?",
+])
+def test_other_questions_go_to_the_llm(parser, question):
+    assert parser.parse(question) is None
+
+
+def test_disabled_parser_and_stats(data_loader):
+    parser = IntentParser(EntityVocabulary(data_loader), data_loader, enabled=False)
+    assert parser.parse("How many mandis are in Punjab?") is None
+    assert parser.stats() == {'enabled': False, 'hits': 0, 'misses': 1, 'hit_ratio': 0.0}
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Tests for shared intermediates (intermediate_cache.py): the byte-bounded
+cache, function fingerprints and common-subexpression rewriting
+"""
+
+import threading
+import time
+from types import CodeType
+
+import pandas as pd
+import pytest
+from data_loader import AgriculturalDataLoader
+from intermediate_cache import CommonSubexpressions, IntermediateCache, function_fingerprint
+
+COUNTS = "m = data_loader.get_dataframe('agmark_mandis_and_locations')\nresult = m.groupby('State Name').size()\n"
+TOP = "result = data_loader.get_dataframe('agmark_mandis_and_locations').groupby('State Name').size().nlargest(5)\n"
+
+
+@pytest.fixture(scope='module')
+def data_loader():
+    loader = AgriculturalDataLoader()
+    loader.load_all_data()
+    return loader
+
+
+def test_concurrent_callers_compute_once():
+    cache = IntermediateCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.05)
+        return pd.Series([1, 2, 3])
+
+    threads = [threading.Thread(target=cache.get_or_compute, args=('k', compute)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert cache.stats()['stored'] == 1
+
+
+def test_callers_cannot_change_the_cached_frame():
+    cache = IntermediateCache()
+    first = cache.get_or_compute('k', lambda: pd.DataFrame({'Mandis': [1, 2]}))
+    first.loc[0, 'Mandis'] = 100
+    again = cache.get_or_compute('k', lambda: None)
+    assert list(again['Mandis']) == [1, 2]
+    listed = cache.get_or_compute('l', lambda: ['Punjab'])
+    listed.append('Kerala')
+    assert cache.get_or_compute('l', lambda: None) == ['Punjab']
+
+
+def test_byte_budget_evicts_least_recently_used():
+    frame = pd.DataFrame({'x': range(1000)})
+    size = int(frame.memory_usage(index=True, deep=True).sum())
+    cache = IntermediateCache(max_bytes=size * 2)
+    cache.get_or_compute('a', lambda: frame.copy())
+    cache.get_or_compute('b', lambda: frame.copy())
+    cache.get_or_compute('a', lambda: None)
+    cache.get_or_compute('c', lambda: frame.copy())
+    stats = cache.stats()
+    assert stats['entries'] == 2
+    assert stats['evicted'] == 1
+    assert cache.get_or_compute('b', lambda: 'recomputed') == 'recomputed'
+
+
+def test_value_over_the_budget_is_returned_but_not_kept():
+    cache = IntermediateCache(max_bytes=10)
+    assert len(cache.get_or_compute('k', lambda: pd.Series(range(100)))) == 100
+    assert cache.stats()['too_large'] == 1
+    assert cache.stats()['entries'] == 0
+
+
+def test_fingerprint_only_for_functions_of_the_datasets(data_loader):
+    filtered = pd.DataFrame({'x': [1]})
+    assert function_fingerprint(lambda: 'Punjab'.lower()) == function_fingerprint(lambda: 'Punjab'.lower())
+    assert function_fingerprint(lambda: 'Punjab') != function_fingerprint(lambda: 'Kerala')
+    assert function_fingerprint(lambda: len(filtered)) is None
+
+
+def test_shared_subexpression_is_rewritten_after_promotion(data_loader):
+    subexpressions = CommonSubexpressions(promote_after=2)
+    assert subexpressions.prepare(COUNTS) == COUNTS
+    prepared = subexpressions.prepare(TOP)
+    assert isinstance(prepared, CodeType)
+
+    namespace = {'data_loader': data_loader, 'pd': pd}
+    exec(prepared, namespace)
+    expected = data_loader.get_dataframe('agmark_mandis_and_locations').groupby('State Name').size().nlargest(5)
+    assert namespace['result'].equals(expected)
+    assert subexpressions.stats()['rewritten_expressions'] == 1
+
+
+def test_mutation_stops_the_analysis():
+    subexpressions = CommonSubexpressions(promote_after=1)
+    code = "m = data_loader.get_dataframe('agmark_mandis_and_locations')\nm['x'] = 1\nresult = m.groupby('State Name').size()\n"
+    assert subexpressions.prepare(code) == code
+    sampled = "result = data_loader.get_dataframe('agmark_mandis_and_locations').sample(5).groupby('State Name').size()\n"
+    assert subexpressions.prepare(sampled) == sampled
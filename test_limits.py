@@ -42,28 +42,29 @@ def test_limits():
         "How many districts have more than 20 mandis?"
     ]
     
-    results = []
+    results = [None] * len(test_queries)
     
-    for i, question in enumerate(test_queries, 1):
+    # Run the queries concurrently; report each one as it finishes
+    for result in pipeline.process_questions(test_queries, concurrency=len(test_queries)):
+        i = result['index'] + 1
+        question = result['question']
         print(f"\n{'='*70}")
         print(f"TEST {i}/5: {question}")
         print('='*70)
         
         try:
-            result = pipeline.process_question(question)
-            
             if result['success']:
                 print(f"\n✅ SUCCESS")
                 print(f"\nAnswer: {result['answer'][:200]}...")
                 print(f"\nSources: {len(result['citations'])} dataset(s)")
-                results.append({'query': question, 'status': 'SUCCESS'})
+                results[i - 1] = {'query': question, 'status': 'SUCCESS'}
             else:
                 print(f"\n❌ FAILED: {result['error']}")
-                results.append({'query': question, 'status': 'FAILED', 'error': result['error']})
+                results[i - 1] = {'query': question, 'status': 'FAILED', 'error': result['error']}
                 
         except Exception as e:
             print(f"\n❌ ERROR: {str(e)[:100]}...")
-            results.append({'query': question, 'status': 'ERROR', 'error': str(e)[:100]})
+            results[i - 1] = {'query': question, 'status': 'ERROR', 'error': str(e)[:100]}
     
     # Summary
     print(f"\n\n{'='*70}")
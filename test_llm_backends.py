@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Tests for the LLM backends (llm_backends.py) as seen through GeminiClient
+"""
+
+import asyncio
+import json
+import threading
+
+import httpx
+import pytest
+from gemini_client import GeminiClient
+from llm_backends import LiveBackend, StubBackend, UnexpectedResponseError, CANNED_ANSWER
+from llm_resilience import ResilientCaller
+
+
+class MockLiveBackend(LiveBackend):
+    """LiveBackend answering every request with a fixed payload, counting requests"""
+
+    def __init__(self, payload):
+        super().__init__('key', 'gemini-test', 'http://gemini.test/v1beta', 5.0, 4)
+        self.payload = payload
+        self.requests = 0
+
+    async def start(self):
+        def respond(request):
+            self.requests += 1
+            if request.url.params.get('alt') == 'sse':
+                return httpx.Response(200, text=f"data: {json.dumps(self.payload)}\n\n")
+            return httpx.Response(200, json=self.payload)
+
+        self._http = httpx.AsyncClient(base_url=self.base_url, transport=httpx.MockTransport(respond))
+
+
+def client(backend):
+    return GeminiClient('key', backend=backend, resilience=ResilientCaller(retry_base=0.01, hedge_percentile=None))
+
+
+@pytest.mark.parametrize('payload', [
+    {},
+    {'candidates': []},
+    {'candidates': [{'content': {'parts': []}, 'finishReason': 'SAFETY'}]},
+    {'promptFeedback': {'blockReason': 'OTHER'}}
+])
+def test_unusable_payload_fails_the_call_without_retrying(payload):
+    backend = MockLiveBackend(payload)
+    gemini = client(backend)
+    try:
+        response = gemini.call_llm("prompt", 'test')
+        assert not response['success']
+        assert response['error'].startswith('UnexpectedResponseError')
+        assert response['response'] == ''
+        assert backend.requests == 1
+    finally:
+        gemini.close()
+
+
+def test_stream_without_text_fails():
+    backend = MockLiveBackend({'candidates': [{'content': {'parts': []}, 'finishReason': 'SAFETY'}]})
+    gemini = client(backend)
+    try:
+        stream = gemini.call_llm_stream("prompt", 'test')
+        chunks = []
+        while True:
+            try:
+                chunks.append(next(stream))
+            except StopIteration as stop:
+                response = stop.value
+                break
+        assert chunks == []
+        assert not response['success']
+        assert 'UnexpectedResponseError' in response['error']
+    finally:
+        gemini.close()
+
+
+class SlowStreamBackend(StubBackend):
+    """Streams one chunk, then stalls; records whether the stream was cancelled"""
+
+    def __init__(self):
+        super().__init__()
+        self.cancelled = threading.Event()
+
+    async def generate_stream(self, prompt):
+        try:
+            yield 'There are '
+            await asyncio.sleep(30)
+            yield '349.'
+        except asyncio.CancelledError:
+            self.cancelled.set()
+            raise
+
+
+def test_closing_the_stream_cancels_the_call():
+    backend = SlowStreamBackend()
+    gemini = client(backend)
+    try:
+        stream = gemini.call_llm_stream("prompt", 'test')
+        assert next(stream) == 'There are '
+        stream.close()
+        assert backend.cancelled.wait(5)
+    finally:
+        gemini.close()
+
+
+def test_text_parts_are_joined():
+    backend = MockLiveBackend({'candidates': [{'content': {'parts': [{'text': 'There are '}, {'text': '349.'}]}}]})
+    gemini = client(backend)
+    try:
+        response = gemini.call_llm("prompt", 'test')
+        assert response['success']
+        assert response['response'] == 'There are 349.'
+    finally:
+        gemini.close()
+
+
+def test_extract_text_raises_on_missing_candidates():
+    with pytest.raises(UnexpectedResponseError):
+        MockLiveBackend({})._extract_text({'candidates': None})
+
+
+def test_stub_backend_answers_offline():
+    gemini = client(StubBackend())
+    try:
+        assert gemini.call_llm("Summarize the evidence", 'answer_synthesis')['response'] == CANNED_ANSWER
+    finally:
+        gemini.close()
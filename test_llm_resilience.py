@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Tests for the LLM call policy (llm_resilience.py): retries, deadlines,
+hedging and the circuit breaker
+"""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+from llm_resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded, ResilientCaller
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def caller(**kwargs):
+    options = {'deadline': 1.0, 'max_retries': 2, 'retry_base': 0.01, 'retry_max': 0.02, 'hedge_percentile': None}
+    options.update(kwargs)
+    return ResilientCaller(**options)
+
+
+def test_transient_errors_are_retried():
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        if len(calls) < 3:
+            raise httpx.ConnectError("connection refused")
+        return "ok"
+
+    policy = caller()
+    assert run(policy.call(attempt)) == "ok"
+    assert policy.counters['retries'] == 2
+    assert policy.breaker.state == 'closed'
+
+
+def test_non_transient_errors_are_not_retried():
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        raise ValueError("bad payload")
+
+    with pytest.raises(ValueError):
+        run(caller().call(attempt))
+    assert len(calls) == 1
+
+
+def test_breaker_opens_then_probes():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.1)
+    policy = caller(max_retries=0, breaker=breaker)
+
+    async def failing():
+        raise httpx.ConnectError("connection refused")
+
+    async def working():
+        return "ok"
+
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectError):
+            run(policy.call(failing))
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        run(policy.call(working))
+    time.sleep(0.12)
+    assert run(policy.call(working)) == "ok"
+    assert breaker.state == 'closed'
+
+
+def test_probe_past_its_deadline_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.05)
+    policy = caller(deadline=0.1, max_retries=0, breaker=breaker)
+
+    async def failing():
+        raise httpx.ConnectError("connection refused")
+
+    async def hanging():
+        await asyncio.sleep(10)
+
+    async def working():
+        return "ok"
+
+    with pytest.raises(httpx.ConnectError):
+        run(policy.call(failing))
+    time.sleep(0.06)
+    with pytest.raises(DeadlineExceeded):
+        run(policy.call(hanging))
+    assert policy.counters['deadline_exceeded'] == 1
+    assert breaker.state == 'open'
+    # The breaker was not left waiting on a probe that will never finish
+    time.sleep(0.06)
+    assert run(policy.call(working)) == "ok"
+    assert breaker.state == 'closed'
+
+
+def test_cancelled_probe_is_released():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.05)
+    policy = caller(max_retries=0, breaker=breaker)
+
+    async def failing():
+        raise httpx.ConnectError("connection refused")
+
+    async def cancel_probe():
+        task = asyncio.ensure_future(policy.call(lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    async def working():
+        return "ok"
+
+    with pytest.raises(httpx.ConnectError):
+        run(policy.call(failing))
+    time.sleep(0.06)
+    run(cancel_probe())
+    assert run(policy.call(working)) == "ok"
+
+
+def test_stream_probe_past_its_deadline_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    policy = caller(deadline=0.1, max_retries=0, breaker=breaker)
+
+    async def hanging():
+        await asyncio.sleep(10)
+        yield "never"
+
+    async def consume():
+        return [chunk async for chunk in policy.stream(hanging)]
+
+    with pytest.raises(DeadlineExceeded):
+        run(consume())
+    assert breaker.state == 'open'
+    assert not breaker._probe_in_flight
+
+
+def test_slow_request_is_hedged():
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        await asyncio.sleep(0.5 if len(calls) == 1 else 0.01)
+        return f"answer {len(calls)}"
+
+    policy = caller(hedge_percentile=95, hedge_min_samples=1, hedge_min_delay=0.05)
+    policy._tracker('default').add(0.01)
+    assert run(policy.call(attempt)) == "answer 2"
+    assert policy.counters['hedges'] == 1
+    assert policy.counters['hedge_wins'] == 1
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Tests for the background log writer (log_writer.py): batching, segment
+rotation and dropping records when the buffer is full
+"""
+
+import glob
+import os
+import threading
+
+from log_writer import BackgroundLogWriter, read_log_records
+
+
+def segments(log_dir):
+    return sorted(glob.glob(os.path.join(str(log_dir), 'samarth-*.jsonl.gz')))
+
+
+def test_records_are_readable_after_flush(tmp_path):
+    writer = BackgroundLogWriter(log_dir=str(tmp_path), flush_seconds=0.01)
+    try:
+        for i in range(25):
+            writer.log({'kind': 'llm_call' if i % 5 else 'trace', 'i': i})
+        writer.flush()
+        assert writer.written == 25
+        assert [r['i'] for r in read_log_records(str(tmp_path))] == list(range(25))
+        assert [r['i'] for r in read_log_records(str(tmp_path), kind='trace')] == [0, 5, 10, 15, 20]
+    finally:
+        writer.close()
+
+
+def test_segments_rotate_by_size_and_old_ones_are_pruned(tmp_path):
+    writer = BackgroundLogWriter(log_dir=str(tmp_path), flush_seconds=0.01, segment_max_bytes=50, max_segments=3)
+    try:
+        for i in range(6):
+            writer.log({'kind': 'trace', 'padding': 'x' * 200, 'i': i})
+            writer.flush()
+        assert len(segments(tmp_path)) == 3
+        assert [r['i'] for r in read_log_records(str(tmp_path))] == [3, 4, 5]
+    finally:
+        writer.close()
+
+
+def test_full_buffer_drops_instead_of_blocking(tmp_path):
+    writer = BackgroundLogWriter(log_dir=str(tmp_path), buffer_size=2, flush_seconds=0.01)
+    blocked = threading.Event()
+    original = writer._write_batch
+
+    def stalled(records):
+        blocked.wait(5)
+        original(records)
+
+    writer._write_batch = stalled
+    try:
+        results = [writer.log({'i': i}) for i in range(20)]
+        assert not all(results)
+        assert writer.dropped == results.count(False)
+    finally:
+        blocked.set()
+        writer.close()
+
+
+def test_truncated_segment_is_read_up_to_the_last_batch(tmp_path, capsys):
+    writer = BackgroundLogWriter(log_dir=str(tmp_path), flush_seconds=0.01)
+    writer.log({'i': 1})
+    writer.flush()
+    writer.close()
+    with open(segments(tmp_path)[0], 'ab') as f:
+        f.write(b'\x1f\x8b\x08\x00garbage')
+    assert [r['i'] for r in read_log_records(str(tmp_path))] == [1]
+    assert 'Warning: Stopped reading' in capsys.readouterr().out
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Tests for metrics.py: sharded counters and histograms, Prometheus output
+and readiness checks
+"""
+
+import threading
+
+import metrics
+from metrics import Counter, Histogram, MetricsRegistry
+
+
+def in_threads(target, count):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_counter_sums_concurrent_threads():
+    counter = Counter()
+
+    def work():
+        for _ in range(1000):
+            counter.inc()
+
+    in_threads(work, 8)
+    assert counter.value() == 8000
+
+
+def test_exited_threads_do_not_leave_cells_behind():
+    counter = Counter()
+    histogram = Histogram()
+
+    def work():
+        counter.inc()
+        histogram.observe(0.02)
+
+    for _ in range(300):
+        in_threads(work, 1)
+    assert counter.value() == 300
+    assert histogram.snapshot()['count'] == 300
+    # Only the base cell is left once the threads are gone
+    assert len(counter._shards.cells()) == 1
+    assert len(histogram._shards.cells()) == 1
+
+
+def test_live_thread_keeps_its_cell():
+    counter = Counter()
+    counter.inc(5)
+    in_threads(lambda: counter.inc(2), 3)
+    counter.inc()
+    assert counter.value() == 12
+    assert len(counter._shards.cells()) == 2
+
+
+def test_exiting_thread_retires_its_own_cell_among_equal_ones():
+    counter = Counter()
+    counter.inc()
+    done = threading.Event()
+    exit_now = threading.Event()
+
+    def long_lived():
+        counter.inc()
+        done.set()
+        exit_now.wait(5)
+
+    thread = threading.Thread(target=long_lived)
+    thread.start()
+    done.wait(5)
+    # Equal-valued cells: [1] for this thread and [1] for the other
+    in_threads(lambda: counter.inc(), 1)
+    exit_now.set()
+    thread.join()
+    counter.inc()
+    assert counter.value() == 4
+    assert len(counter._shards.cells()) == 2
+
+
+def test_histogram_percentiles_within_bucket_error():
+    histogram = Histogram()
+    for ms in range(1, 1001):
+        histogram.observe(ms / 1000)
+    snapshot = histogram.snapshot()
+    assert snapshot['count'] == 1000
+    assert snapshot['max'] == 1.0
+    for pct, expected in ((50, 0.5), (90, 0.9), (99, 0.99)):
+        assert abs(snapshot[f"p{pct}"] - expected) / expected < 0.04
+
+
+def test_histogram_merges_exited_threads_into_percentiles():
+    histogram = Histogram()
+    in_threads(lambda: histogram.observe(0.1), 50)
+    in_threads(lambda: histogram.observe(1.0), 50)
+    snapshot = histogram.snapshot()
+    assert snapshot['count'] == 100
+    assert abs(snapshot['p50'] - 0.1) < 0.004
+    assert snapshot['p99'] == 1.0
+
+
+def test_prometheus_rendering():
+    registry = MetricsRegistry()
+    registry.counter('test_requests_total', 'Requests', outcome='ok').inc(3)
+    registry.histogram('test_seconds', 'Latency').observe(0.2)
+    text = registry.render_prometheus()
+    assert 'test_requests_total{outcome="ok"} 3' in text
+    assert 'test_seconds_bucket{le="0.25"} 1' in text
+    assert 'test_seconds_count 1' in text
+
+
+def test_readiness_checks_of_collected_objects_are_pruned():
+    class Component:
+        def __init__(self, ready):
+            self.ready = ready
+
+        def is_ready(self):
+            return self.ready
+
+    before = list(metrics._readiness_checks)
+    metrics._readiness_checks[:] = []
+    try:
+        for _ in range(100):
+            metrics.add_readiness_check(Component(False).is_ready)
+        kept = Component(True)
+        metrics.add_readiness_check(kept.is_ready)
+        assert len(metrics._readiness_checks) <= 2
+        assert metrics.is_ready()
+    finally:
+        metrics._readiness_checks[:] = before
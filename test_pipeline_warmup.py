@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Tests for pipeline start-up (SamarthPipeline.warmup / is_ready): cheap
+import and construction, then a readiness signal once warmup finishes
+"""
+
+import subprocess
+import sys
+import time
+
+import metrics
+from pipeline import SamarthPipeline
+
+
+def test_import_does_not_load_pandas():
+    code = "import sys, pipeline; print('pandas' in sys.modules)"
+    assert subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.strip() == 'False'
+
+
+def test_not_ready_before_warmup_and_ready_after():
+    pipeline = SamarthPipeline('offline', warmup=False)
+    assert not pipeline.is_ready()
+    assert not hasattr(pipeline, 'executor')
+    assert not metrics.is_ready()
+    assert pipeline.warmup()
+    assert pipeline.is_ready()
+    assert pipeline.warmup_seconds is not None
+    # The data is loaded once, for query generation and execution alike
+    assert pipeline.executor.data_loader is pipeline.query_generator.schema_builder.data_loader
+
+
+def test_background_warmup():
+    pipeline = SamarthPipeline('offline', warmup=False)
+    assert not pipeline.warmup(background=True)
+    deadline = time.monotonic() + 60
+    while not pipeline.is_ready() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert pipeline.is_ready()
+    assert pipeline.warmup_error is None
+
+
+def test_first_question_warms_up():
+    pipeline = SamarthPipeline('offline', warmup=False)
+    result = pipeline.process_question("How many mandis are in Punjab?")
+    assert result['success']
+    assert pipeline.is_ready()
+
+
+def test_failed_background_warmup_is_reported(monkeypatch):
+    pipeline = SamarthPipeline('offline', warmup=False)
+
+    def fail():
+        raise OSError("data directory missing")
+
+    monkeypatch.setattr(pipeline, '_build_components', fail)
+    pipeline.warmup(background=True)
+    deadline = time.monotonic() + 5
+    while pipeline.warmup_error is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert pipeline.warmup_error == "OSError: data directory missing"
+    assert not pipeline.is_ready()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Tests for copy-on-write query views (data_loader.QueryDataView): what a
+query does to its frames never reaches the shared datasets
+"""
+
+import warnings
+
+import pandas as pd
+import pytest
+from data_loader import AgriculturalDataLoader, QueryDataView, enable_copy_on_write
+from executor import QueryExecutor
+
+MANDIS = "m = data_loader.get_dataframe('agmark_mandis_and_locations')\n"
+
+
+@pytest.fixture(scope='module')
+def data_loader():
+    loader = AgriculturalDataLoader()
+    loader.load_all_data()
+    return loader
+
+
+def test_view_changes_stay_in_the_view(data_loader):
+    shared = data_loader.get_dataframe('agmark_mandis_and_locations')
+    before = shared.copy()
+    view = QueryDataView(data_loader)
+    frame = view.get_dataframe('agmark_mandis_and_locations')
+    frame['Extra'] = 1
+    frame.loc[0, 'State Name'] = 'Changed'
+    frame.drop(columns=['Source'], inplace=True)
+    # The same view keeps its own changes
+    assert view.get_dataframe('agmark_mandis_and_locations').loc[0, 'State Name'] == 'Changed'
+    assert shared.equals(before)
+    assert QueryDataView(data_loader).get_dataframe('agmark_mandis_and_locations').equals(before)
+
+
+def test_mutating_query_does_not_affect_the_next(data_loader):
+    executor = QueryExecutor(data_loader=data_loader)
+    mutating = MANDIS + "m['State Name'] = 'Nowhere'\nm.dropna(inplace=True)\nresult = m['State Name'].nunique()\n"
+    assert executor.execute_query(mutating)['evidence']['values'] == 1
+    counted = executor.execute_query(MANDIS + "result = m['State Name'].nunique()\n")
+    assert counted['evidence']['values'] == data_loader.get_dataframe('agmark_mandis_and_locations')['State Name'].nunique()
+    assert counted['evidence']['values'] > 1
+
+
+def test_unknown_dataset(data_loader):
+    assert QueryDataView(data_loader).get_dataframe('no_such_dataset') is None
+
+
+def test_schema_members_are_the_loaders(data_loader):
+    view = QueryDataView(data_loader)
+    assert view.schema_info is data_loader.schema_info
+    assert view.get_schema_context() == data_loader.get_schema_context()
+    assert view.search_dataframes("mandis in Punjab") == data_loader.search_dataframes("mandis in Punjab")
+
+
+def test_enabling_copy_on_write_does_not_warn():
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        enable_copy_on_write()
+    if int(pd.__version__.split('.')[0]) < 3:
+        assert pd.get_option('mode.copy_on_write')
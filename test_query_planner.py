@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Tests for the query planner (query_planner.py): join, groupby and explode
+estimates, filters before them, and how the executor acts on the plan
+"""
+
+import pytest
+from data_loader import AgriculturalDataLoader
+from executor import QueryExecutor
+from query_planner import QueryPlanner
+
+MANDIS = "m = data_loader.get_dataframe('agmark_mandis_and_locations')\n"
+LOCATIONS = "l = data_loader.get_dataframe('location_hierarchy')\n"
+
+
+@pytest.fixture(scope='module')
+def data_loader():
+    loader = AgriculturalDataLoader()
+    loader.load_all_data()
+    return loader
+
+
+@pytest.fixture
+def planner(data_loader):
+    return QueryPlanner(data_loader, max_estimated_rows=500_000)
+
+
+def actual_rows(data_loader, code):
+    namespace = {'data_loader': data_loader}
+    exec(code, namespace)
+    return len(namespace['result'])
+
+
+def estimate(planner, code):
+    return planner.plan(code)['operations'][-1]['estimated_rows']
+
+
+def test_unfiltered_merge_exceeds_the_limit(planner, data_loader):
+    code = MANDIS + LOCATIONS + "result = m.merge(l, on='State Name')\n"
+    plan = planner.plan(code)
+    assert plan['exceeds_limit']
+    assert not plan['uncertain']
+    assert plan['estimated_rows'] == actual_rows(data_loader, code)
+
+
+@pytest.mark.parametrize('mask', [
+    "m['State Name'].str.contains('Punjab', case=False)",
+    "m['State Name'] == 'Punjab'",
+    "m['State Name'].str.strip().str.lower() == 'punjab'",
+    "m['State Name'].isin(['Punjab', 'Haryana'])",
+    "(m['State Name'] == 'Punjab') | (m['State Name'] == 'Haryana')",
+])
+def test_filter_before_merge_is_applied(planner, data_loader, mask):
+    code = MANDIS + LOCATIONS + f"p = m[{mask}]\nresult = p.merge(l, on='State Name')\n"
+    plan = planner.plan(code)
+    assert not plan['exceeds_limit']
+    assert plan['estimated_rows'] == actual_rows(data_loader, code)
+
+
+def test_mask_assigned_to_a_name_and_used_in_loc(planner, data_loader):
+    code = (
+        MANDIS + LOCATIONS
+        + "mask = ~m['State Name'].isin(['Uttar Pradesh', 'Maharashtra', 'Rajasthan', 'Madhya Pradesh', 'Gujarat'])\n"
+        + "p = m.loc[mask, ['State Name', 'District ID']]\n"
+        + "result = p.merge(l, on='State Name')\n"
+    )
+    assert estimate(planner, code) == actual_rows(data_loader, code)
+
+
+def test_named_masks_combined(planner, data_loader):
+    code = (
+        MANDIS + LOCATIONS
+        + "north = m['State Name'].isin(['Punjab', 'Haryana'])\n"
+        + "not_haryana = m['State Name'] != 'Haryana'\n"
+        + "result = m[north & not_haryana].merge(l, on='State Name')\n"
+    )
+    assert estimate(planner, code) == actual_rows(data_loader, code)
+
+
+def test_filters_on_both_sides_and_head(planner, data_loader):
+    code = (
+        MANDIS + LOCATIONS
+        + "p = m[m['State Name'].str.startswith('Punjab')].head(100)\n"
+        + "b = l[l['Present in IMD Agromet'].notna() & (l['State Name'] == 'Punjab')]\n"
+        + "result = p.merge(b, on='State Name')\n"
+    )
+    plan = planner.plan(code)
+    # head() keeps a share of the filtered rows; notna() is not read, so err high
+    p_rows = 100
+    punjab_blocks = (data_loader.get_dataframe('location_hierarchy')['State Name'] == 'Punjab').sum()
+    assert plan['operations'][-1]['estimated_rows'] == p_rows * punjab_blocks
+    assert plan['operations'][-1]['after_filter']
+
+
+def test_groupby_after_filter(planner, data_loader):
+    code = MANDIS + "result = m[m['State Name'] == 'Punjab'].groupby('District Name - Agmark').size()\n"
+    assert estimate(planner, code) == actual_rows(data_loader, code)
+
+
+def test_unknown_filter_is_uncertain(planner):
+    code = MANDIS + LOCATIONS + "p = m[m['State Name'].map(len) > 5]\nresult = p.merge(l, on='State Name')\n"
+    plan = planner.plan(code)
+    assert plan['exceeds_limit']
+    assert plan['uncertain']
+    assert plan['operations'][-1]['after_filter']
+
+
+def test_query_string_is_an_unknown_filter(planner):
+    code = MANDIS + LOCATIONS + "p = m.query('`State Name` == \"Punjab\"')\nresult = p.merge(l, on='State Name')\n"
+    assert planner.plan(code)['uncertain']
+
+
+def test_explode_uses_measured_list_length(planner, data_loader):
+    code = MANDIS + "result = m['State Name'].str.split(' ').explode()\n"
+    plan = planner.plan(code)
+    assert plan['operations'][-1]['op'] == 'explode'
+    assert abs(plan['estimated_rows'] - actual_rows(data_loader, code)) <= 1
+
+
+@pytest.fixture(scope='module')
+def executor(data_loader):
+    executor = QueryExecutor(data_loader=data_loader)
+    executor.planner.max_estimated_rows = 500_000
+    return executor
+
+
+def test_executor_refuses_a_certain_estimate(executor):
+    result = executor.execute_query(MANDIS + LOCATIONS + "result = m.merge(l, on='State Name')\n")
+    assert not result['success']
+    assert result['error_type'] == 'QueryRefused'
+
+
+def test_executor_only_warns_after_an_unknown_filter(executor, capsys):
+    code = MANDIS + LOCATIONS + "p = m[m['State Name'].map(len) == 6]\nresult = p.merge(l, on='State Name')\n"
+    result = executor.execute_query(code)
+    assert result['success']
+    assert 'unknown selectivity' in capsys.readouterr().out
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Tests for the query repairer (query_repairer.py): LLM fixes, the repair
+prompt and memoized fixes
+"""
+
+import pytest
+from data_loader import AgriculturalDataLoader
+from query_repairer import QueryRepairer
+
+FAILED = (
+    "df = data_loader.get_dataframe('agmark_mandis_and_locations')\n"
+    "result = df[df['State'] == 'Punjab']\n"
+)
+FIXED = FAILED.replace("'State'", "'State Name'")
+
+
+class ScriptedGemini:
+    """Answers every call with the next scripted response, keeping the prompts"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.prompts = []
+
+    def call_llm(self, prompt, call_type):
+        self.prompts.append(prompt)
+        return self.responses.pop(0)
+
+
+def reply(code):
+    return {'success': True, 'response': f"<PANDAS_CODE>\n{code}\n</PANDAS_CODE>", 'log_id': 'log-1'}
+
+
+@pytest.fixture(scope='module')
+def data_loader():
+    loader = AgriculturalDataLoader()
+    loader.load_all_data()
+    return loader
+
+
+def test_llm_fix_and_repair_prompt(data_loader):
+    gemini = ScriptedGemini(reply(FIXED))
+    repairer = QueryRepairer(gemini, data_loader)
+    fixed = repairer.fix("Mandis in Punjab", FAILED, 'KeyError', "'State'", set())
+    assert fixed['success']
+    assert fixed['source'] == 'llm'
+    assert fixed['query_code'] == FIXED.strip()
+    prompt = gemini.prompts[0]
+    assert '<DATASET name="agmark_mandis_and_locations">' in prompt
+    assert '<DATASET name="location_hierarchy">' not in prompt
+    assert '<closest_to_missing>State Name' in prompt
+
+
+def test_literal_fix_is_reapplied_to_other_code(data_loader):
+    repairer = QueryRepairer(ScriptedGemini(), data_loader)
+    repairer.record(FAILED, 'KeyError', "'State'", FIXED, 0.5)
+    other = FAILED.replace("'Punjab'", "'Kerala'")
+    fixed = repairer.fix("Mandis in Kerala", other, 'KeyError', "'State'", set())
+    assert fixed == {'success': True, 'query_code': other.replace("'State'", "'State Name'"), 'source': 'memo', 'log_id': 'repair_memo'}
+
+
+def test_structural_fix_is_only_reused_for_the_same_code(data_loader):
+    failed = "df = data_loader.get_dataframe('agmark_mandis_and_locations')\nresult = df.State.count()\n"
+    fixed_code = "df = data_loader.get_dataframe('agmark_mandis_and_locations')\nresult = df['State Name'].count()\n"
+    repairer = QueryRepairer(ScriptedGemini({'success': False, 'error': 'unavailable'}), data_loader)
+    repairer.record(failed, 'AttributeError', "no attribute 'State'", fixed_code, 0.5)
+    assert repairer.fix("q", failed, 'AttributeError', "no attribute 'State'", set())['query_code'] == fixed_code
+    other = failed.replace('count()', 'nunique()')
+    assert not repairer.fix("q", other, 'AttributeError', "no attribute 'State'", set())['success']
+
+
+def test_tried_fix_is_not_proposed_again(data_loader):
+    other_fix = FAILED.replace("'State'", "'State Name - Agmark'")
+    gemini = ScriptedGemini(reply(other_fix))
+    repairer = QueryRepairer(gemini, data_loader)
+    repairer.record(FAILED, 'KeyError', "'State'", FIXED, 0.5)
+    fixed = repairer.fix("q", FAILED, 'KeyError', "'State'", {FIXED})
+    assert fixed['source'] == 'llm'
+    assert fixed['query_code'] == other_fix.strip()
+
+
+def test_response_without_new_code_fails(data_loader):
+    repairer = QueryRepairer(ScriptedGemini({'success': True, 'response': 'No idea', 'log_id': 'log-2'}), data_loader)
+    fixed = repairer.fix("q", FAILED, 'KeyError', "'State'", set())
+    assert not fixed['success']
+    assert fixed['error'] == 'No new code in repair response'
+
+
+def test_stats(data_loader):
+    repairer = QueryRepairer(ScriptedGemini(), data_loader)
+    repairer.record(FAILED, 'KeyError', "'State'", FIXED, 0.2)
+    repairer.record(FAILED, 'KeyError', "'Mandi'", None, 0.4)
+    stats = repairer.stats()
+    assert stats['failed_queries'] == 2
+    assert stats['repaired'] == 1
+    assert stats['repair_rate'] == 0.5
+    assert stats['memo_size'] == 2
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Tests for the entity-parameterized query template cache
+(query_template_cache.py), and when the pipeline stores and drops templates
+"""
+
+import pytest
+from data_loader import AgriculturalDataLoader
+from entity_vocabulary import EntityVocabulary
+from gemini_client import GeminiClient
+from llm_backends import StubBackend
+from query_template_cache import QueryTemplateCache
+
+PUNJAB_CODE = (
+    "df = data_loader.get_dataframe('agmark_mandis_and_locations')\n"
+    "result = len(df[df['State Name'] == 'Punjab'])\n"
+)
+
+
+@pytest.fixture(scope='module')
+def vocabulary():
+    loader = AgriculturalDataLoader()
+    loader.load_all_data()
+    return EntityVocabulary(loader)
+
+
+@pytest.fixture
+def cache(vocabulary):
+    return QueryTemplateCache(vocabulary, {'agmark_mandis_and_locations', 'State Name', 'District Name - Agmark'})
+
+
+def test_template_is_filled_for_another_entity(cache):
+    assert cache.lookup("How many mandis are in Punjab?") is None
+    assert cache.store("How many mandis are in Punjab?", PUNJAB_CODE, ['agmark_mandis_and_locations'])
+    hit = cache.lookup("how many mandis are in  Gujarat?")
+    assert hit['query_code'] == PUNJAB_CODE.replace('Punjab', 'Gujarat')
+    assert hit['relevant_datasets'] == ['agmark_mandis_and_locations']
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_different_entity_types_do_not_share_a_template(cache):
+    cache.store("How many mandis are in Punjab?", PUNJAB_CODE, ['agmark_mandis_and_locations'])
+    assert cache.lookup("How many mandis are in Ludhiana?") is None
+
+
+def test_several_slots_keep_their_order(cache):
+    code = "result = df[df['State Name'].isin(['Punjab', 'Gujarat'])]\n"
+    assert cache.store("Mandis in Punjab and Gujarat", code, [])
+    hit = cache.lookup("Mandis in Kerala and Bihar")
+    assert hit['query_code'] == "result = df[df['State Name'].isin(['Kerala', 'Bihar'])]\n"
+
+
+def test_entity_used_twice_is_not_stored(cache):
+    code = "a = df[df['State Name'] == 'Punjab']\nprint('Punjab')\nresult = a\n"
+    assert not cache.store("How many mandis are in Punjab?", code, [])
+    assert cache.stats()['rejected'] == 1
+    assert cache.lookup("How many mandis are in Gujarat?") is None
+
+
+def test_entity_missing_from_the_code_is_not_stored(cache):
+    assert not cache.store("How many mandis are in Punjab?", "result = len(df)\n", [])
+
+
+def test_reserved_strings_and_comments_are_never_slots(cache):
+    code = "# mandis in Punjab\nresult = df[df['State Name'] == 'Punjab']['District Name - Agmark']\n"
+    assert cache.store("Districts in Punjab", code, [])
+    hit = cache.lookup("Districts in Kerala")
+    assert hit['query_code'] == "# mandis in Punjab\nresult = df[df['State Name'] == 'Kerala']['District Name - Agmark']\n"
+
+
+def test_code_reading_the_previous_result_is_not_stored(cache):
+    assert not cache.store("Only those in Punjab", "result = previous_result[previous_result['State Name'] == 'Punjab']\n", [])
+
+
+def test_invalidate_and_lru_eviction(vocabulary):
+    cache = QueryTemplateCache(vocabulary, {'State Name'}, max_size=1)
+    cache.store("How many mandis are in Punjab?", PUNJAB_CODE, [])
+    cache.invalidate("How many mandis are in Kerala?")
+    assert cache.lookup("How many mandis are in Gujarat?") is None
+    cache.store("How many mandis are in Punjab?", PUNJAB_CODE, [])
+    cache.store("Districts in Punjab", "result = df[df['State Name'] == 'Punjab']\n", [])
+    assert cache.stats()['size'] == 1
+    assert cache.lookup("How many mandis are in Gujarat?") is None
+    assert cache.lookup("Districts in Gujarat") is not None
+
+
+def test_values_that_could_end_a_literal_are_refused(cache):
+    template = ["result = df[df['State Name'] == '", 0, "']"]
+    assert cache._fill(template, ["Punjab"]) == "result = df[df['State Name'] == 'Punjab']"
+    assert cache._fill(template, ["x' or 'y"]) is None
+    assert cache._fill(template, []) is None
+
+
+@pytest.fixture
+def generating(pipeline, monkeypatch):
+    """Have LLM Call #1 return the given code, with repairs off"""
+    clients = []
+
+    def generate(code):
+        client = GeminiClient('key', backend=StubBackend(query_response=f"<PANDAS_CODE>\n{code}</PANDAS_CODE>"))
+        clients.append(client)
+        monkeypatch.setattr(pipeline.query_generator, 'gemini', client)
+        return pipeline
+
+    monkeypatch.setattr(pipeline.query_repairer, 'max_attempts', 0)
+    yield generate
+    for client in clients:
+        client.close()
+
+
+def test_pipeline_stores_generated_code_once_it_runs(generating):
+    pipeline = generating(
+        "m = data_loader.get_dataframe('agmark_mandis_and_locations')\n"
+        "result = m[m['State Name'] == 'Punjab'].groupby('District Name - Agmark').size()\n"
+    )
+    assert pipeline.process_question("Which districts of Punjab have the most mandis?")['success']
+    hit = pipeline.query_generator.template_cache.lookup("Which districts of Kerala have the most mandis?")
+    assert "== 'Kerala'" in hit['query_code']
+
+
+def test_pipeline_does_not_store_code_that_fails(generating):
+    pipeline = generating("m = data_loader.get_dataframe('agmark_mandis_and_locations')\nresult = m[m['State'] == 'Bihar']\n")
+    stores = pipeline.query_generator.template_cache.stats()['stores']
+    assert not pipeline.process_question("Show the mandis of Bihar sorted by district")['success']
+    assert pipeline.query_generator.template_cache.stats()['stores'] == stores
+    assert pipeline.query_generator.template_cache.lookup("Show the mandis of Assam sorted by district") is None
+
+
+def test_pipeline_drops_a_template_whose_code_fails(generating):
+    pipeline = generating(PUNJAB_CODE)
+    template_cache = pipeline.query_generator.template_cache
+    # The template's code reads a frame that is never defined
+    assert template_cache.store("Show every mandi of Punjab by name", "result = df[df['State Name'] == 'Punjab']\n", [])
+    result = pipeline.process_question("Show every mandi of Gujarat by name")
+    assert not result['success']
+    assert result['trace']['steps'][0]['cache_hit']
+    assert template_cache.lookup("Show every mandi of Punjab by name") is None
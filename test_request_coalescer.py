@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Tests for request coalescing (request_coalescer.py) and when the pipeline
+shares answers between sessions
+"""
+
+import threading
+import time
+
+import pytest
+from request_coalescer import RequestCoalescer, normalize_question
+from conversation_store import is_follow_up
+
+
+def run_concurrently(coalescer, key, compute, count, **kwargs):
+    results = [None] * count
+    start = threading.Barrier(count)
+
+    def ask(index):
+        start.wait()
+        results[index] = coalescer.run(key, compute, **kwargs)
+
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def slow_compute(calls, answer='answer'):
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return answer
+    return compute
+
+
+def test_normalize_question():
+    assert normalize_question("  How many  Mandis in Punjab?? ") == "how many mandis in punjab"
+
+
+def test_concurrent_callers_share_one_computation():
+    calls = []
+    results = run_concurrently(RequestCoalescer(), 'k', slow_compute(calls), 8)
+    assert len(calls) == 1
+    assert sorted(role for _, role in results) == ['coalesced'] * 7 + ['leader']
+    assert all(answer == 'answer' for answer, _ in results)
+
+
+def test_answers_are_cached_for_the_ttl():
+    coalescer = RequestCoalescer(ttl_seconds=0.1)
+    calls = []
+    assert coalescer.run('k', slow_compute(calls)) == ('answer', 'leader')
+    assert coalescer.run('k', slow_compute(calls)) == ('answer', 'cached')
+    time.sleep(0.12)
+    assert coalescer.run('k', slow_compute(calls)) == ('answer', 'leader')
+    assert len(calls) == 2
+
+
+def test_uncacheable_answer_is_shared_but_not_kept():
+    calls = []
+    coalescer = RequestCoalescer()
+    results = run_concurrently(coalescer, 'k', slow_compute(calls), 4, cacheable=lambda answer: False)
+    assert len(calls) == 1
+    assert all(answer == 'answer' for answer, _ in results)
+    assert coalescer.run('k', slow_compute(calls))[1] == 'leader'
+
+
+def test_unshareable_answer_goes_to_the_leader_only():
+    calls = []
+    results = run_concurrently(RequestCoalescer(), 'k', slow_compute(calls), 4, shareable=lambda answer: False)
+    assert len(calls) == 4
+    assert all(role == 'leader' for _, role in results)
+
+
+def test_failed_leader_lets_waiting_callers_compute():
+    coalescer = RequestCoalescer()
+    role, future = coalescer.join('k')
+    assert role == 'leader'
+    waiting = []
+    thread = threading.Thread(target=lambda: waiting.append(coalescer.run('k', lambda: 'own answer')))
+    thread.start()
+    time.sleep(0.05)
+    coalescer.finish('k', future, None)
+    thread.join()
+    assert waiting == [('own answer', 'leader')]
+    assert coalescer.stats()['leader_failures'] == 1
+
+
+def test_follow_up_detection():
+    assert is_follow_up("Now only those in Ludhiana")
+    assert is_follow_up("Which of them have IMD coverage?")
+    assert not is_follow_up("How many mandis are in Punjab?")
+
+
+def give_previous_result(pipeline, session_id):
+    import pandas as pd
+    frame = pd.DataFrame({'District Name': ['Pune', 'Nashik'], 'Mandis': [40, 30]})
+    pipeline.conversations.put(session_id, "Top districts in Maharashtra by mandis", "result = ...", frame, ['agmark_mandis_and_locations'])
+
+
+def test_session_with_previous_result_still_shares_new_questions(pipeline):
+    pipeline.coalescer.clear()
+    give_previous_result(pipeline, 's-coalesce')
+    question = "How many mandis are in Gujarat?"
+    assert pipeline._coalescing_key(question, 's-coalesce') is not None
+    answered = pipeline.process_question(question, session_id='s-other')
+    assert answered['success']
+    shared = pipeline.process_question(question, session_id='s-coalesce')
+    assert shared['trace']['steps'][0]['stage'] in ('cached', 'answer_cache')
+    assert shared['answer'] == answered['answer']
+
+
+def test_follow_up_is_answered_on_its_own(pipeline):
+    give_previous_result(pipeline, 's-follow')
+    assert pipeline._coalescing_key("Now only those starting with P", 's-follow') is None
+    # Without a previous result the same words are an ordinary question
+    assert pipeline._coalescing_key("Now only those starting with P", 's-new') is not None
+
+
+def test_answer_using_previous_result_is_neither_shared_nor_cached(pipeline):
+    trace = {'steps': [{'stage': 'execute', 'previous_result': True}]}
+    result = {'success': True, 'answer': "2 of them", 'trace': trace}
+    assert pipeline._uses_session(result)
+    assert not pipeline._cacheable(result)
+    trace['steps'][0]['previous_result'] = False
+    assert pipeline._cacheable(result)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Tests for spilled results (result_store.py): paging by cursor, expiry and
+handle validation
+"""
+
+import os
+import time
+
+import pandas as pd
+import pytest
+from config import SPILL_ROW_GROUP_SIZE
+from result_store import ResultStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ResultStore(spill_dir=str(tmp_path))
+
+
+def frame(rows):
+    return pd.DataFrame({'District Name': [f"District {i}" for i in range(rows)], 'Mandis': range(rows)})
+
+
+def test_pages_cover_the_result_in_order(store):
+    rows = SPILL_ROW_GROUP_SIZE * 2 + 500
+    handle = store.save(frame(rows))
+    seen, cursor = [], 0
+    while cursor is not None:
+        page = store.read_page(handle, cursor, page_size=700)
+        assert page['total_rows'] == rows
+        seen += list(page['rows']['Mandis'])
+        cursor = page['next_cursor']
+    assert seen == list(range(rows))
+
+
+def test_page_across_a_row_group_boundary(store):
+    handle = store.save(frame(SPILL_ROW_GROUP_SIZE + 10))
+    page = store.read_page(handle, SPILL_ROW_GROUP_SIZE - 5, page_size=10)
+    assert list(page['rows']['Mandis']) == list(range(SPILL_ROW_GROUP_SIZE - 5, SPILL_ROW_GROUP_SIZE + 5))
+
+
+def test_cursor_past_the_end_gives_an_empty_last_page(store):
+    handle = store.save(frame(5))
+    page = store.read_page(handle, 50)
+    assert page['rows'].empty
+    assert list(page['rows'].columns) == ['District Name', 'Mandis']
+    assert page['cursor'] == 5
+    assert page['next_cursor'] is None
+
+
+def test_load_round_trips_mixed_object_columns(store):
+    df = pd.DataFrame({'value': [1, 'two', None], 3: ['a', 'b', 'c']})
+    loaded = store.load(store.save(df))
+    assert list(loaded.columns) == ['value', '3']
+    assert list(loaded['value'][:2]) == ['1', 'two']
+    assert pd.isna(loaded['value'][2])
+
+
+def test_non_frames_are_not_spilled(store):
+    assert store.save(pd.Series([1, 2])) is None
+
+
+def test_old_spills_expire(tmp_path):
+    store = ResultStore(spill_dir=str(tmp_path), ttl_seconds=60, expire_interval=0)
+    old = store.save(frame(3))
+    stale = time.time() - 120
+    os.utime(os.path.join(str(tmp_path), f"{old}.parquet"), (stale, stale))
+    new = store.save(frame(3))
+    assert not store.has(old)
+    assert store.has(new)
+    with pytest.raises(KeyError):
+        store.read_page(old)
+
+
+def test_expiry_sweeps_are_throttled(tmp_path):
+    store = ResultStore(spill_dir=str(tmp_path), ttl_seconds=60, expire_interval=3600)
+    old = store.save(frame(3))
+    stale = time.time() - 120
+    os.utime(os.path.join(str(tmp_path), f"{old}.parquet"), (stale, stale))
+    # The first save swept already; the next sweep is an interval away
+    store.save(frame(3))
+    assert store.has(old)
+    store._expired_at -= 3600
+    store.save(frame(3))
+    assert not store.has(old)
+
+
+@pytest.mark.parametrize('handle', ['', '../config', 'ABC', 'a/b'])
+def test_invalid_handles_are_rejected(store, handle):
+    assert not store.has(handle)
+    with pytest.raises(KeyError):
+        store.load(handle)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Tests for template answers (rule_based_synthesizer.py) over real executor
+evidence, and when they fall back to the LLM
+"""
+
+import pytest
+from data_loader import AgriculturalDataLoader
+from executor import QueryExecutor
+from rule_based_synthesizer import RuleBasedSynthesizer
+
+MANDIS = "m = data_loader.get_dataframe('agmark_mandis_and_locations')\n"
+PUNJAB = "m[m['State Name'] == 'Punjab']"
+
+
+@pytest.fixture(scope='module')
+def executor():
+    loader = AgriculturalDataLoader()
+    loader.load_all_data()
+    return QueryExecutor(data_loader=loader)
+
+
+def evidence(executor, code):
+    result = executor.execute_query(MANDIS + code)
+    assert result['success'], result.get('error')
+    return result['evidence']
+
+
+def test_count_over_a_scalar(executor):
+    synthesizer = RuleBasedSynthesizer(enabled=True)
+    citations = executor.build_citations(['agmark_mandis_and_locations'])
+    answer = synthesizer.synthesize("How many mandis are there in Punjab?", evidence(executor, f"result = len({PUNJAB})\n"), citations)
+    assert answer['answer'].startswith("There are 349 mandis in Punjab.\n\nSources:\n- ")
+    assert answer['log_id'] == 'fast_path'
+    assert answer['citations'] == citations
+
+
+def test_count_over_a_one_row_frame(executor):
+    code = f"result = {PUNJAB}.groupby('State Name').size().reset_index(name='Mandis')\n"
+    answer = RuleBasedSynthesizer(enabled=True).synthesize("Number of mandis in Punjab", evidence(executor, code), [])
+    assert answer['answer'] == "There are 349 mandis in Punjab."
+
+
+def test_short_list_is_rendered_as_bullets(executor):
+    code = "result = m[m['State Name'] == 'Goa']['District Name - Agmark'].drop_duplicates().sort_values()\n"
+    found = evidence(executor, code)
+    answer = RuleBasedSynthesizer(enabled=True).synthesize("List all districts in Goa", found, [])
+    names = found['values'][-1]
+    assert answer['answer'] == f"Districts in Goa ({len(names)}):\n" + '\n'.join(f"- {name}" for name in names)
+
+
+@pytest.mark.parametrize('question, code', [
+    # Needs interpretation
+    ("Which state has the most mandis?", "result = m['State Name'].value_counts()\n"),
+    # A verb the template cannot restate
+    ("How many mandis does Punjab have?", f"result = len({PUNJAB})\n"),
+    # Too many names to list
+    ("List all mandis in Punjab", f"result = {PUNJAB}['Mandi Name - Agmark']\n"),
+])
+def test_other_results_fall_back_to_the_llm(executor, question, code):
+    synthesizer = RuleBasedSynthesizer(enabled=True)
+    assert synthesizer.synthesize(question, evidence(executor, code), []) is None
+    assert synthesizer.stats()['llm_fallbacks'] == 1
+
+
+def test_disabled(executor):
+    synthesizer = RuleBasedSynthesizer(enabled=False)
+    assert synthesizer.synthesize("How many mandis are in Punjab?", evidence(executor, f"result = len({PUNJAB})\n"), []) is None
+    assert not synthesizer.stats()['enabled']
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Tests for the fair scheduler (scheduler.py): round-robin between clients,
+the in-flight bound, cancellation and shutdown
+"""
+
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor, wait
+
+import pytest
+from scheduler import FairScheduler
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = FairScheduler(ThreadPoolExecutor(max_workers=4), max_in_flight=1)
+    yield scheduler
+    scheduler.shutdown(cancel_pending=True)
+
+
+def blocker(scheduler):
+    """Occupy the only slot until the returned event is set"""
+    release = threading.Event()
+    future = scheduler.submit('blocker', release.wait)
+    return release, future
+
+
+def test_clients_are_served_in_turn(scheduler):
+    release, first = blocker(scheduler)
+    order = []
+    futures = [scheduler.submit('a', order.append, f"a{i}") for i in range(3)]
+    futures += [scheduler.submit('b', order.append, f"b{i}") for i in range(2)]
+    assert scheduler.queue_depths() == {'a': 3, 'b': 2}
+    release.set()
+    wait(futures + [first])
+    assert order == ['a0', 'b0', 'a1', 'b1', 'a2']
+
+
+def test_in_flight_is_bounded():
+    scheduler = FairScheduler(ThreadPoolExecutor(max_workers=8), max_in_flight=2)
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def job():
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+
+    try:
+        wait([scheduler.submit(f"client {i % 3}", job) for i in range(12)])
+        assert peak[0] == 2
+    finally:
+        scheduler.shutdown()
+
+
+def test_queued_job_can_be_cancelled(scheduler):
+    release, first = blocker(scheduler)
+    calls = []
+    cancelled = scheduler.submit('a', calls.append, 'cancelled')
+    kept = scheduler.submit('a', calls.append, 'kept')
+    assert cancelled.cancel()
+    release.set()
+    kept.result(timeout=5)
+    assert calls == ['kept']
+    with pytest.raises(CancelledError):
+        cancelled.result()
+
+
+def test_job_errors_reach_the_future_and_free_the_slot(scheduler):
+    def failing():
+        raise ValueError("bad query")
+
+    with pytest.raises(ValueError):
+        scheduler.submit('a', failing).result(timeout=5)
+    assert scheduler.submit('a', lambda: 'next').result(timeout=5) == 'next'
+
+
+def test_shutdown_cancels_pending_and_refuses_new_work():
+    scheduler = FairScheduler(ThreadPoolExecutor(max_workers=1), max_in_flight=1)
+    release, first = blocker(scheduler)
+    pending = scheduler.submit('a', lambda: 'never')
+    scheduler.shutdown(wait=False, cancel_pending=True)
+    assert pending.cancelled()
+    # The running job still finishes
+    release.set()
+    assert first.result(timeout=5)
+    with pytest.raises(RuntimeError):
+        scheduler.submit('a', lambda: 'late')
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Tests for the staged pipeline (staged_pipeline.py) and the batch API built
+on it (SamarthPipeline.process_questions)
+"""
+
+import pytest
+from staged_pipeline import StagedPipeline
+
+QUESTIONS = [
+    "How many mandis are in Punjab?",
+    "How many mandis are in Gujarat?",
+    "List all districts in Goa",
+    "How many mandis are in Punjab?",
+]
+
+
+def test_batch_results_match_single_questions(pipeline):
+    results = list(pipeline.process_questions(QUESTIONS, concurrency=2))
+    assert sorted(result['index'] for result in results) == [0, 1, 2, 3]
+    by_index = {result['index']: result for result in results}
+    assert all(result['success'] for result in results)
+    assert by_index[0]['answer'] == by_index[3]['answer']
+    single = pipeline.process_question(QUESTIONS[1])
+    assert by_index[1]['answer'] == single['answer']
+
+
+def test_every_stage_reports_its_work(pipeline):
+    staged = StagedPipeline(pipeline, queue_size=2, cpu_workers=1, io_workers=2)
+    try:
+        futures = [staged.submit(f"How many mandis are in {state}?") for state in ('Kerala', 'Bihar', 'Assam')]
+        assert all(future.result(timeout=30)['success'] for future in futures)
+        stats = staged.stats()
+        assert stats['plan']['processed'] == 3
+        assert stats['execute']['processed'] == 3
+        assert stats['plan']['queue_capacity'] == 2
+        assert all(stage['in_flight'] == 0 for stage in stats.values())
+    finally:
+        staged.close()
+
+
+def test_batch_dedups_normalized_questions(pipeline):
+    variants = ["How many mandis are in Haryana?", "how many  mandis are in haryana", "HOW MANY MANDIS ARE IN HARYANA?!"]
+    before = pipeline.staged_pipeline().stats()['plan']['processed']
+    results = list(pipeline.process_questions(variants))
+    assert sorted(result['index'] for result in results) == [0, 1, 2]
+    assert len({result['answer'] for result in results}) == 1
+    assert [result['question'] for result in sorted(results, key=lambda result: result['index'])] == variants
+    assert pipeline.staged_pipeline().stats()['plan']['processed'] - before <= 1
+
+
+def test_batch_reuses_answers_from_single_questions(pipeline):
+    question = "How many mandis are in Rajasthan?"
+    single = pipeline.process_question(question)
+    pipeline.coalescer.clear()
+    before = pipeline.staged_pipeline().stats()['plan']['processed']
+    hits = pipeline.answer_cache.stats()['hits']
+    [result] = pipeline.process_questions([question])
+    assert result['answer'] == single['answer']
+    assert result['trace']['steps'][0]['stage'] == 'answer_cache'
+    assert pipeline.answer_cache.stats()['hits'] == hits + 1
+    assert pipeline.staged_pipeline().stats()['plan']['processed'] == before
+
+
+def test_batch_answers_are_shared_with_single_questions(pipeline):
+    question = "List all districts in Sikkim"
+    [result] = pipeline.process_questions([question])
+    assert result['success']
+    shared = pipeline.process_question(question)
+    assert shared['answer'] == result['answer']
+    assert shared['trace']['steps'][0]['stage'] in ('cached', 'answer_cache')
+
+
+class BrokenGenerator:
+    def prepare_query(self, question):
+        raise RuntimeError("planner crashed")
+
+
+class BrokenPipeline:
+    query_generator = BrokenGenerator()
+
+    def _new_trace(self, question):
+        return {'steps': []}
+
+
+def test_stage_error_fails_only_that_question():
+    staged = StagedPipeline(BrokenPipeline(), queue_size=2, cpu_workers=1, io_workers=1)
+    try:
+        future = staged.submit("How many mandis are in Punjab?")
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
+        assert staged.stats()['plan']['failed'] == 1
+        # The worker is still serving the queue
+        with pytest.raises(RuntimeError):
+            staged.submit("Another question").result(timeout=5)
+    finally:
+        staged.close()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Tests for the SQLite trace store (trace_store.py): per-step rows, latency
+percentiles and retention
+"""
+
+import os
+import sqlite3
+import time
+
+import pytest
+from trace_store import TraceStore, latency_percentiles, parse_duration
+
+
+def trace(request_id, started_at, execute_ms, success=True):
+    steps = [
+        {'step': 1, 'stage': 'generate', 'started_at': started_at, 'ended_at': started_at + 0.1, 'duration_ms': 100.0,
+         'prompt_chars': 900, 'response_chars': 120, 'cache_hit': False, 'log_id': 'log-1'},
+        {'step': 2, 'stage': 'execute', 'started_at': started_at + 0.1, 'ended_at': started_at + 0.1 + execute_ms / 1000,
+         'duration_ms': execute_ms, 'evidence_summary': {'type': 'dataframe', 'shape': [3, 2]},
+         'error': None if success else 'KeyError: State'},
+    ]
+    return {
+        'request_id': request_id, 'started_at': started_at, 'ended_at': started_at + 1, 'total_ms': 100.0 + execute_ms,
+        'question': "How many mandis are in Punjab?", 'success': success, 'steps': steps
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TraceStore(path=os.path.join(str(tmp_path), 'traces.db'), flush_seconds=0.01)
+    yield store
+    store.close()
+
+
+def test_traces_are_stored_per_request_and_step(store):
+    now = time.time()
+    store.record(trace('r1', now, 50.0))
+    store.flush()
+    with sqlite3.connect(store.path) as conn:
+        assert conn.execute("SELECT evidence_type, evidence_shape, success FROM requests").fetchall() == [('dataframe', '[3, 2]', 1)]
+        stages = conn.execute("SELECT stage, cache_hit, log_id FROM stages ORDER BY step").fetchall()
+    assert stages == [('generate', 0, 'log-1'), ('execute', None, None)]
+
+
+def test_saving_a_trace_again_replaces_its_steps(store):
+    now = time.time()
+    first = trace('r1', now, 50.0)
+    store.record(first)
+    store.flush()
+    store.record({**first, 'steps': first['steps'] + [
+        {'stage': 'synthesize', 'started_at': now + 0.2, 'ended_at': now + 0.3, 'duration_ms': 100.0}
+    ]})
+    store.flush()
+    with sqlite3.connect(store.path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM requests").fetchone() == (1,)
+        stages = conn.execute("SELECT stage FROM stages WHERE request_id = 'r1' ORDER BY started_at").fetchall()
+    assert stages == [('generate',), ('execute',), ('synthesize',)]
+
+
+def test_latency_percentiles_by_stage(store):
+    now = time.time()
+    for i in range(100):
+        store.record(trace(f"r{i}", now, float(i + 1), success=i % 10 != 0))
+    store.flush()
+    summary = store.latency_percentiles(stages=['execute', 'total'])
+    assert set(summary) == {'execute', 'total'}
+    assert summary['execute']['count'] == 100
+    assert summary['execute']['errors'] == 10
+    assert summary['execute']['p50'] == 51.0
+    assert summary['execute']['max'] == 100.0
+    assert summary['total']['errors'] == 10
+
+
+def test_time_window_and_retention(tmp_path):
+    path = os.path.join(str(tmp_path), 'traces.db')
+    store = TraceStore(path=path, retention_days=1, flush_seconds=0.01)
+    now = time.time()
+    try:
+        store.record(trace('old', now - 3 * 86400, 10.0))
+        store.record(trace('recent', now - 7200, 20.0))
+        store.record(trace('new', now, 30.0))
+        store.flush()
+    finally:
+        store.close()
+    assert latency_percentiles(path, since_seconds=3600)['execute']['count'] == 1
+    assert latency_percentiles(path, since_seconds=None)['execute']['count'] == 2
+
+
+def test_parse_duration():
+    assert parse_duration('90s') == 90
+    assert parse_duration('30m') == 1800
+    assert parse_duration('7d') == 7 * 86400
+    assert parse_duration('15') == 15
@@ -0,0 +1,268 @@
+"""
+Trace Store for Project Samarth
+Pipeline traces in SQLite (WAL mode), queryable by time and stage
+
+Usage:
+    python trace_store.py                      # latency percentiles per stage, last hour
+    python trace_store.py --since 24h --stage execute --stage synthesize
+"""
+
+import argparse
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Dict, Any, Iterable, List, Optional
+from log_writer import BackgroundLogWriter
+from config import TRACE_DB_PATH, TRACE_RETENTION_DAYS, LOG_BUFFER_SIZE, LOG_BATCH_SIZE, LOG_FLUSH_SECONDS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS requests (
+    request_id TEXT PRIMARY KEY,
+    started_at REAL NOT NULL,
+    ended_at REAL,
+    total_ms REAL,
+    question TEXT,
+    success INTEGER,
+    error TEXT,
+    evidence_type TEXT,
+    evidence_shape TEXT,
+    trace_json TEXT
+);
+CREATE TABLE IF NOT EXISTS stages (
+    request_id TEXT NOT NULL,
+    step INTEGER,
+    stage TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    ended_at REAL NOT NULL,
+    duration_ms REAL NOT NULL,
+    prompt_chars INTEGER,
+    response_chars INTEGER,
+    cache_hit INTEGER,
+    evidence_shape TEXT,
+    error TEXT,
+    log_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_requests_started_at ON requests (started_at);
+CREATE INDEX IF NOT EXISTS idx_stages_stage_started_at ON stages (stage, started_at);
+CREATE INDEX IF NOT EXISTS idx_stages_request_id ON stages (request_id);
+"""
+
+# How often the writer deletes traces older than the retention period
+PRUNE_INTERVAL_SECONDS = 3600
+
+
+class TraceStore(BackgroundLogWriter):
+    """
+    One row per request (with the full trace as JSON) and one row per step,
+    with wall-clock start/end times, prompt and response sizes, cache hits,
+    evidence shape and errors.
+
+    Writes go through the BackgroundLogWriter queue: record() never blocks,
+    and the writer thread inserts each batch in one transaction on its own
+    connection. WAL mode lets latency_percentiles() and the CLI read while
+    the writer appends. Traces older than retention_days are deleted hourly.
+    """
+
+    def __init__(
+        self,
+        path: str = TRACE_DB_PATH,
+        retention_days: float = TRACE_RETENTION_DAYS,
+        buffer_size: int = LOG_BUFFER_SIZE,
+        batch_size: int = LOG_BATCH_SIZE,
+        flush_seconds: float = LOG_FLUSH_SECONDS
+    ):
+        self.path = path
+        self.retention_days = retention_days
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pruned_at = 0.0
+        super().__init__(
+            log_dir=os.path.dirname(path) or '.',
+            buffer_size=buffer_size,
+            batch_size=batch_size,
+            flush_seconds=flush_seconds
+        )
+
+    def record(self, trace: Dict[str, Any]) -> bool:
+        """Queue a finished trace; returns False if it was dropped"""
+        return self.log(trace)
+
+    def latency_percentiles(
+        self,
+        since_seconds: Optional[float] = 3600,
+        stages: Optional[Iterable[str]] = None,
+        percentiles: Iterable[float] = (50, 90, 95, 99)
+    ) -> Dict[str, Dict[str, Any]]:
+        """Duration percentiles per stage; see latency_percentiles()"""
+        return latency_percentiles(self.path, since_seconds, stages, percentiles)
+
+    def _write_batch(self, records):
+        """Insert a batch of traces in one transaction (writer thread only)"""
+        try:
+            conn = self._writer_connection()
+            with conn:
+                for trace in records:
+                    self._insert(conn, trace)
+                if time.time() - self._pruned_at > PRUNE_INTERVAL_SECONDS:
+                    self._prune(conn)
+            self.written += len(records)
+        except Exception as e:
+            self.dropped += len(records)
+            print(f"Warning: Could not write traces: {str(e)}")
+
+    def _writer_connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._connection = conn
+        return self._connection
+
+    def _insert(self, conn: sqlite3.Connection, trace: Dict[str, Any]):
+        steps = trace.get('steps', [])
+        execution = next((s for s in steps if s.get('stage') == 'execute' and 'evidence_summary' in s), None)
+        evidence = execution['evidence_summary'] if execution else {}
+        conn.execute(
+            "INSERT OR REPLACE INTO requests VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                trace['request_id'],
+                trace['started_at'],
+                trace.get('ended_at'),
+                trace.get('total_ms'),
+                trace.get('question'),
+                int(bool(trace.get('success'))),
+                trace.get('error'),
+                evidence.get('type'),
+                self._shape(evidence),
+                json.dumps(trace, ensure_ascii=False, default=str)
+            )
+        )
+        # A re-saved trace replaces its step rows (steps need not have unique numbers)
+        conn.execute("DELETE FROM stages WHERE request_id = ?", (trace['request_id'],))
+        conn.executemany(
+            "INSERT INTO stages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    trace['request_id'],
+                    step.get('step'),
+                    step['stage'],
+                    step['started_at'],
+                    step['ended_at'],
+                    step['duration_ms'],
+                    step.get('prompt_chars'),
+                    step.get('response_chars'),
+                    None if step.get('cache_hit') is None else int(step['cache_hit']),
+                    self._shape(step.get('evidence_summary') or {}),
+                    step.get('error'),
+                    step.get('log_id')
+                )
+                for step in steps if 'stage' in step
+            ]
+        )
+
+    def _shape(self, evidence_summary: Dict[str, Any]) -> Optional[str]:
+        shape = evidence_summary.get('shape')
+        return json.dumps(shape) if shape is not None else None
+
+    def _prune(self, conn: sqlite3.Connection):
+        cutoff = time.time() - self.retention_days * 86400
+        conn.execute("DELETE FROM stages WHERE started_at < ?", (cutoff,))
+        conn.execute("DELETE FROM requests WHERE started_at < ?", (cutoff,))
+        self._pruned_at = time.time()
+
+
+_trace_store: Optional[TraceStore] = None
+_trace_store_lock = threading.Lock()
+
+def get_trace_store() -> TraceStore:
+    """Process-wide trace store, started on first use and flushed at exit"""
+    global _trace_store
+    with _trace_store_lock:
+        if _trace_store is None:
+            _trace_store = TraceStore()
+            atexit.register(_trace_store.close)
+        return _trace_store
+
+
+def latency_percentiles(
+    path: str = TRACE_DB_PATH,
+    since_seconds: Optional[float] = 3600,
+    stages: Optional[Iterable[str]] = None,
+    percentiles: Iterable[float] = (50, 90, 95, 99)
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Duration percentiles (ms) per stage over the last since_seconds (None
+    for all), plus 'total' for whole requests
+
+    Returns:
+        {stage: {'count', 'errors', 'p50', ..., 'max'}}
+    """
+    since = time.time() - since_seconds if since_seconds else 0.0
+    stages = list(stages or [])
+    durations: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    with closing(sqlite3.connect(path, timeout=10)) as conn:
+        conn.executescript(SCHEMA)
+        query = "SELECT stage, duration_ms, error FROM stages WHERE started_at >= ?"
+        params: List[Any] = [since]
+        if stages:
+            query += f" AND stage IN ({','.join('?' * len(stages))})"
+            params.extend(stages)
+        for stage, duration, error in conn.execute(query + " ORDER BY stage, duration_ms", params):
+            durations.setdefault(stage, []).append(duration)
+            errors[stage] = errors.get(stage, 0) + (error is not None)
+        if not stages or 'total' in stages:
+            rows = conn.execute(
+                "SELECT total_ms, success FROM requests WHERE started_at >= ? AND total_ms IS NOT NULL ORDER BY total_ms",
+                (since,)
+            ).fetchall()
+            if rows:
+                durations['total'] = [total for total, _ in rows]
+                errors['total'] = sum(1 for _, success in rows if not success)
+
+    summary = {}
+    for stage, values in durations.items():
+        summary[stage] = {'count': len(values), 'errors': errors.get(stage, 0)}
+        for pct in percentiles:
+            summary[stage][f"p{pct:g}"] = round(values[min(len(values) - 1, int(len(values) * pct / 100))], 1)
+        summary[stage]['max'] = round(values[-1], 1)
+    return summary
+
+
+def parse_duration(text: str) -> float:
+    """'90s', '30m', '1h', '7d' (or plain seconds) -> seconds"""
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    if text and text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency percentiles from the Project Samarth trace store")
+    parser.add_argument('--db', default=TRACE_DB_PATH, help=f"trace database (default: {TRACE_DB_PATH})")
+    parser.add_argument('--since', default='1h', help="time window, e.g. 30m, 1h, 7d, or 'all' (default: 1h)")
+    parser.add_argument('--stage', action='append', help="only this stage (repeatable); 'total' is the whole request")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"No trace database at {args.db}")
+        return
+    since = None if args.since == 'all' else parse_duration(args.since)
+    window = 'all time' if since is None else f"last {args.since}"
+    summary = latency_percentiles(args.db, since_seconds=since, stages=args.stage)
+    if not summary:
+        print(f"No traces ({window})")
+        return
+
+    print(f"{'stage':<12} {'count':>7} {'errors':>7} {'p50':>9} {'p90':>9} {'p95':>9} {'p99':>9} {'max':>9}   (ms, {window})")
+    for stage, row in sorted(summary.items(), key=lambda item: item[0] == 'total'):
+        print(f"{stage:<12} {row['count']:>7} {row['errors']:>7} {row['p50']:>9} {row['p90']:>9} {row['p95']:>9} {row['p99']:>9} {row['max']:>9}")
+
+
+if __name__ == "__main__":
+    main()